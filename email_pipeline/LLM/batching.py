@@ -0,0 +1,103 @@
+"""
+📦 LLM/batching.py
+
+Micro-batching for small, high-volume LLM calls.
+
+Graph nodes run in worker threads and block on `submit(...).result()`. A
+collector thread gathers the items submitted within `window_s` of the first one
+(or until `max_size` are waiting), runs one batched call for all of them on a
+small pool, and resolves every waiting node with its own result. The static
+prompt is paid once per batch instead of once per email.
+"""
+
+import time
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Collects items and resolves them with one `batch_fn(items) -> results` call per batch.
+
+    `batch_fn` returns one result per item (same order); None means "no answer for
+    this item" and is passed through so the caller can fall back. If `batch_fn`
+    raises, every item of the batch resolves to None.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[T]], List[Optional[R]]], max_size: int = 16,
+                 window_s: float = 0.1, concurrency: int = 4, name: str = "batch"):
+        self.batch_fn = batch_fn
+        self.max_size = max_size
+        self.window_s = window_s
+        self.name = name
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[T, Future]] = []
+        self._first_at = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"{name}-call")
+        self._collector: Optional[threading.Thread] = None
+        self.metrics = defaultdict(int)
+
+    def submit(self, item: T) -> "Future[Optional[R]]":
+        future: Future = Future()
+        with self._cond:
+            if self._collector is None:
+                self._collector = threading.Thread(target=self._collect, name=f"{self.name}-collector", daemon=True)
+                self._collector.start()
+            if not self._pending:
+                self._first_at = time.monotonic()
+            self._pending.append((item, future))
+            self.metrics["items"] += 1
+            self._cond.notify()
+        return future
+
+    def _collect(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Wait out the window unless the batch fills up first
+                while len(self._pending) < self.max_size:
+                    remaining = self._first_at + self.window_s - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending[:self.max_size], self._pending[self.max_size:]
+                if self._pending:
+                    self._first_at = time.monotonic()
+            self._executor.submit(self._run, batch)
+
+    def _run(self, batch: List[Tuple[T, Future]]) -> None:
+        items = [item for item, _ in batch]
+        failed = False
+        try:
+            results = self.batch_fn(items)
+        except Exception as e:
+            print(f"⚠️ {self.name}: batch of {len(items)} failed ({e}); falling back per item")
+            failed, results = True, [None] * len(items)
+
+        with self._cond:
+            self.metrics["batches"] += 1
+            self.metrics["batched_items"] += len(items)
+            self.metrics["failed_batches"] += failed
+            self.metrics["unanswered"] += sum(result is None for result in results)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: items, batches, avg_batch_size, unanswered (fell back) and failed_batches.
+        """
+        batches = self.metrics["batches"]
+        return {
+            "items": self.metrics["items"],
+            "batches": batches,
+            "avg_batch_size": self.metrics["batched_items"] / batches if batches else 0.0,
+            "unanswered": self.metrics["unanswered"],
+            "failed_batches": self.metrics["failed_batches"],
+        }
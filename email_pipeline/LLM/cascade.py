@@ -0,0 +1,220 @@
+"""
+🪜 LLM/cascade.py
+
+Per-node model tiers with escalation.
+
+Every LLM call goes through an ordered list of tiers (model, max_tokens,
+endpoint). The first tier is tried first; the call escalates to the next tier
+only when the output fails validation (malformed JSON / schema mismatch / refusal)
+or the node's confidence check rejects it. Rate limits and timeouts are retried on
+the same tier as before (see `utils.retry`).
+
+Disabled (MODEL_CASCADE=0) every node keeps the single gpt-4o-mini tier. Enabled,
+classification and shipping updates start on a small, short-output model and the
+other nodes escalate from gpt-4o-mini to gpt-4o.
+
+Tiers can be overridden per node with MODEL_CASCADE_CONFIG (JSON string or path),
+"default" applying to nodes without an entry, e.g.
+
+    {"classify": [{"model": "qwen2.5-7b-instruct", "max_tokens": 16, "base_url": "http://localhost:8000/v1"},
+                  {"model": "gpt-4o-mini", "max_tokens": 16}]}
+
+LLM_BASE_URL points every tier without its own `base_url` at one OpenAI-compatible
+server (vLLM, llama.cpp, Ollama, ...).
+"""
+
+import os
+import json
+import time
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Optional, Tuple, TypeVar
+from utils.retry import ErrorKind, RetryExhaustedError, retry_call
+
+T = TypeVar("T")
+
+MODEL_CASCADE = os.getenv("MODEL_CASCADE", "0") == "1"
+MODEL_CASCADE_CONFIG = os.getenv("MODEL_CASCADE_CONFIG", "")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL") or None
+
+# Latency samples kept per (node, tier) for the percentiles
+_LATENCY_SAMPLES = 5000
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    """
+    Attributes:
+        model (str): Model name sent to the endpoint.
+        max_tokens (Optional[int]): Output cap (None = endpoint default).
+        temperature (float): Sampling temperature.
+        base_url (Optional[str]): OpenAI-compatible endpoint (None = OpenAI).
+        api_key_env (str): Env var holding the endpoint's API key.
+    """
+    model: str
+    max_tokens: Optional[int] = 1500
+    temperature: float = 0.1
+    base_url: Optional[str] = LLM_BASE_URL
+    api_key_env: str = "OPENAI_API_KEY"
+
+    @property
+    def api_key(self) -> Optional[str]:
+        # Local servers usually ignore the key but the clients require one
+        return os.getenv(self.api_key_env) or ("local" if self.base_url else None)
+
+    @property
+    def label(self) -> str:
+        return f"{self.model}@{self.base_url}" if self.base_url else self.model
+
+
+DEFAULT_NODE = "default"
+
+LEGACY_CASCADES: Dict[str, Tuple[ModelTier, ...]] = {
+    DEFAULT_NODE: (ModelTier("gpt-4o-mini"),),
+    "classify": (ModelTier("gpt-4o-mini", max_tokens=None),),
+}
+
+DEFAULT_CASCADES: Dict[str, Tuple[ModelTier, ...]] = {
+    DEFAULT_NODE: (ModelTier("gpt-4o-mini"), ModelTier("gpt-4o")),
+    # Labels are a few tokens; 20 leaves room for the longest one
+    "classify": (ModelTier("gpt-4.1-nano", max_tokens=20), ModelTier("gpt-4o-mini", max_tokens=20)),
+    "shipping_update": (ModelTier("gpt-4.1-nano", max_tokens=600), ModelTier("gpt-4o-mini")),
+}
+
+
+def load_cascades(enabled: bool = MODEL_CASCADE, raw: str = MODEL_CASCADE_CONFIG) -> Dict[str, Tuple[ModelTier, ...]]:
+    """
+    Build the node -> tiers table: legacy or default tiers, then per-node overrides
+    from a JSON string (or a path to a JSON file).
+    """
+    cascades = dict(DEFAULT_CASCADES if enabled else LEGACY_CASCADES)
+    if not raw:
+        return cascades
+    if os.path.exists(raw):
+        with open(raw, encoding="utf-8") as f:
+            raw = f.read()
+    for node, tiers in json.loads(raw).items():
+        if not tiers:
+            raise ValueError(f"Model cascade for {node!r} has no tiers")
+        cascades[node] = tuple(ModelTier(**tier) for tier in tiers)
+    return cascades
+
+
+CASCADES = load_cascades()
+
+
+def tiers_for(node: str) -> Tuple[ModelTier, ...]:
+    return CASCADES.get(node) or CASCADES[DEFAULT_NODE]
+
+
+# --------------------------------------------------
+# 📊 Per-tier metrics
+# --------------------------------------------------
+
+class CascadeStats:
+    """
+    Calls, latency and escalations per (node, tier), thread-safe (nodes run in worker threads).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: defaultdict(int))
+        self._latency: Dict[tuple, Deque[float]] = defaultdict(lambda: deque(maxlen=_LATENCY_SAMPLES))
+        self._reasons = defaultdict(int)
+
+    def record(self, node: str, tier: ModelTier, latency: float, outcome: str, reason: Optional[str] = None) -> None:
+        """
+        Args:
+            outcome (str): "accepted", "escalated" or "failed".
+            reason (Optional[str]): Why the tier's output was rejected (for escalations).
+        """
+        key = (node, tier.label)
+        with self._lock:
+            self._counts[key]["calls"] += 1
+            self._counts[key][outcome] += 1
+            self._latency[key].append(latency)
+            if reason:
+                self._reasons[(node, reason)] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._latency.clear()
+            self._reasons.clear()
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: {node: {"tiers": {tier: {calls, accepted, escalated, failed, escalation_rate,
+                  latency_p50, latency_p95}}, "reasons": {reason: count}}}, latencies in seconds.
+        """
+        stats = defaultdict(lambda: {"tiers": {}, "reasons": {}})
+        with self._lock:
+            for (node, label), counts in self._counts.items():
+                latencies = sorted(self._latency[(node, label)])
+                stats[node]["tiers"][label] = {
+                    "calls": counts["calls"],
+                    "accepted": counts["accepted"],
+                    "escalated": counts["escalated"],
+                    "failed": counts["failed"],
+                    "escalation_rate": counts["escalated"] / counts["calls"] if counts["calls"] else 0.0,
+                    "latency_p50": latencies[len(latencies) // 2] if latencies else 0.0,
+                    "latency_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0,
+                }
+            for (node, reason), count in self._reasons.items():
+                stats[node]["reasons"][reason] = count
+        return dict(stats)
+
+
+cascade_stats = CascadeStats()
+
+
+# --------------------------------------------------
+# 🪜 Cascade runner
+# --------------------------------------------------
+
+def run_cascade(node: str, call: Callable[[ModelTier], T],
+                check: Optional[Callable[[T], Optional[str]]] = None, label: str = "openai") -> T:
+    """
+    Run `call(tier)` on the node's tiers until one produces an acceptable result.
+
+    Args:
+        node (str): Cascade key (graph node or prompt name, e.g. "classify", "fallback_match").
+        call (Callable): Makes one LLM request with the given tier and returns the parsed result.
+        check (Optional[Callable]): Returns a rejection reason (low confidence) or None to accept.
+        label (str): Prefix for retry log lines.
+
+    Returns:
+        The first accepted result; the last tier's result is returned even if the check rejects it.
+
+    Raises:
+        RetryExhaustedError: When a tier keeps failing for transient reasons, or the last tier
+                             still produces invalid output.
+    """
+    tiers = tiers_for(node)
+    for position, tier in enumerate(tiers):
+        last = position == len(tiers) - 1
+        start = time.perf_counter()
+        try:
+            # Invalid output is not retried on a tier that can escalate
+            result = retry_call(call, tier, label=f"{label}:{tier.model}",
+                                fail_fast=() if last else (ErrorKind.JSON_DECODE,))
+        except RetryExhaustedError as e:
+            latency = time.perf_counter() - start
+            if last or e.kind is not ErrorKind.JSON_DECODE:
+                cascade_stats.record(node, tier, latency, "failed")
+                raise
+            cascade_stats.record(node, tier, latency, "escalated", "invalid_output")
+            print(f"🪜 {node}: {tier.model} returned invalid output; escalating to {tiers[position + 1].model}")
+            continue
+
+        latency = time.perf_counter() - start
+        reason = check(result) if check else None
+        if reason and not last:
+            cascade_stats.record(node, tier, latency, "escalated", reason)
+            print(f"🪜 {node}: {tier.model} result rejected ({reason}); escalating to {tiers[position + 1].model}")
+            continue
+
+        cascade_stats.record(node, tier, latency, "accepted")
+        return result
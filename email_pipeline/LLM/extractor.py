@@ -1,61 +1,351 @@
 import os
-import re
 import json
-import openai
-from typing import Optional, List, Dict
+import time
+import functools
+import orjson
+from typing import Callable, List, Dict, Optional, Type, TypeVar, get_args
 from dotenv import load_dotenv
-from prompts.templates import FALLBACK_MATCH_PROMPT
+from pydantic import BaseModel
+from prompts.registry import PROMPTS
+from shared.schemas import (
+    response_format_for, OrderExtraction, ShippingExtraction, ShippingUpdateExtraction,
+    RefundExtraction, ReturnConfirmationExtraction, ReturnUpdateExtraction
+)
+from LLM.usage import record_openai_usage
+from LLM.cascade import ModelTier, run_cascade, tiers_for
+from LLM.speculation import SPECULATIVE_PREFETCH, speculative_prefetcher
+from LLM.streaming import STREAM_EXTRACTION, StreamInterruptedError, StreamingJSONParser
+from parser.fingerprint import template_store
+from utils.retry import ErrorKind, RetryExhaustedError, retry_call
+from workflow.journal import journal
 
 # Load OpenAI API Key from environment
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+SchemaT = TypeVar("SchemaT", bound=BaseModel)
 
-def query_openai(prompt: str) -> Optional[dict]:
+
+@functools.lru_cache(maxsize=None)
+def get_openai_client(base_url: Optional[str] = None, api_key: Optional[str] = None):
+    """
+    Shared OpenAI client per endpoint, created (and the SDK imported) on first use.
+
+    One client keeps its HTTP connection pool across calls instead of opening a new one per request;
+    model tiers on a local OpenAI-compatible server (`base_url`) get their own client.
+    """
+    import openai
+
+    return openai.OpenAI(api_key=api_key or OPENAI_API_KEY, base_url=base_url)
+
+
+def _complete_json(messages: List[dict], schema: Optional[Type[SchemaT]] = None, name: str = "extract",
+                   tier: Optional[ModelTier] = None):
+    """
+    Single OpenAI round trip: send the prompt and parse the JSON response.
+
+    `tier` picks the model, output cap and endpoint (defaults to the first tier for `name`).
+
+    With a `schema`, the request uses strict JSON-schema structured outputs and the
+    response is parsed with orjson and validated into the pydantic model in one pass.
+
+    Raises:
+        orjson.JSONDecodeError: If the response is not valid JSON (e.g. truncated).
+        pydantic.ValidationError: If the response does not fit the schema.
+        openai.OpenAIError: On API failures (rate limit, timeout, ...).
+    """
+    tier = tier or tiers_for(name)[0]
+    start = time.perf_counter()
+    response = get_openai_client(tier.base_url, tier.api_key).chat.completions.create(
+        model=tier.model,
+        messages=messages,
+        temperature=tier.temperature,
+        max_tokens=tier.max_tokens,
+        response_format=response_format_for(schema) if schema else {"type": "json_object"}
+    )
+    record_openai_usage(name, response, time.perf_counter() - start)
+
+    message = response.choices[0].message
+    if getattr(message, "refusal", None):
+        print(f"⚠️ OpenAI refused extraction: {message.refusal}")
+        return None
+
+    data = orjson.loads(message.content)
+    return schema.model_validate(data) if schema else data
+
+
+def query_openai(messages: List[dict], schema: Optional[Type[SchemaT]] = None, name: str = "extract"):
     """
     Send a structured extraction prompt to OpenAI and parse the JSON response.
 
+    The call runs through the model cascade for `name` (see `LLM.cascade`): rate limits
+    and timeouts are retried with exponential backoff (see `utils.retry.RETRY_POLICIES`),
+    while malformed JSON, refusals and low-confidence results escalate to the next tier.
+
     Args:
-        prompt (str): The formatted prompt to send.
+        messages (List[dict]): Chat messages rendered by a `prompts.registry` prompt
+                               (static, cache-friendly system message + per-email user message).
+        schema (Optional[Type[BaseModel]]): Pydantic model from `shared.schemas` describing
+                                            the expected output. Without it, the raw dict is returned.
+        name (str): Prompt name recorded in `LLM.usage` (e.g. "order", "fallback_match").
 
     Returns:
-        Optional[dict]: Parsed JSON response or None on failure.
+        The validated model instance (or parsed dict without a schema); None if the model refused.
+
+    Raises:
+        RetryExhaustedError: When the call keeps failing after all retries.
     """
     try:
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Extract structured data from emails. "
-                        "Return ONLY valid JSON. Enclose all keys and string values in double quotes. "
-                        "Return no more than 5 items. No explanation or extra text."
-                    )
-                },
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
-            max_tokens=1500,
-            response_format={"type": "json_object"}
+        return run_cascade(
+            name,
+            lambda tier: _complete_json(messages, schema, name, tier),
+            check=lambda result: check_extraction(name, result),
         )
+    except RetryExhaustedError as e:
+        print(f"❌ OpenAI query failed: {e}")
+        raise
 
-        content = response.choices[0].message.content.strip()
 
-        # Strip trailing commas before parsing (optional cleanup)
-        content = re.sub(r',\s*([}\]])', r'\1', content)
+# Node -> confidence check: returns why a cheap tier's result should be escalated, or None
+CONFIDENCE_CHECKS = {
+    # A shipping update without any identifier cannot be matched to an order row
+    "shipping_update": lambda result: None if (
+        result.order_info.tracking_num or result.order_info.order_id
+    ) else "no identifiers",
+}
 
-        return json.loads(content)
 
-    except json.JSONDecodeError as json_err:
-        print(f"❌ Failed to decode JSON: {json_err}")
-        print("🔎 Raw content from OpenAI:")
-        print(content)
-        return None
-    except Exception as e:
-        print(f"❌ OpenAI query error: {e}")
+def check_extraction(name: str, result) -> Optional[str]:
+    """
+    Decide whether a tier's result is good enough to stop the cascade.
+
+    Returns:
+        Optional[str]: The rejection reason, or None to accept the result.
+    """
+    if result is None:
+        return "refusal"
+    check = CONFIDENCE_CHECKS.get(name)
+    return check(result) if check else None
+
+
+# --------------------------------------------------
+# 📬 Per-node email extraction
+# --------------------------------------------------
+
+# Graph node -> (compiled prompt, output schema)
+EXTRACTION_SPECS = {
+    "order": (PROMPTS["order"], OrderExtraction),
+    "shipping": (PROMPTS["shipping"], ShippingExtraction),
+    "shipping_update": (PROMPTS["shipping_update"], ShippingUpdateExtraction),
+    "refund": (PROMPTS["refund"], RefundExtraction),
+    "return_confirmation": (PROMPTS["return_confirmation"], ReturnConfirmationExtraction),
+    "return_update": (PROMPTS["return_update"], ReturnUpdateExtraction),
+}
+
+
+def _email_messages(node: str, email_record: dict) -> List[dict]:
+    prompt = EXTRACTION_SPECS[node][0]
+    return prompt.messages(
+        subject=email_record.get("subject", ""),
+        body=email_record.get("msg", "")
+    )
+
+
+def run_extraction(node: str, email_record: dict):
+    """
+    Run the LLM extraction for a graph node on an email record.
+
+    Args:
+        node (str): Key of EXTRACTION_SPECS (e.g. "order", "refund").
+        email_record (dict): The email_extracts row (subject + cleaned msg are used).
+
+    Returns:
+        The validated schema instance for the node, or None if the model refused.
+    """
+    return query_openai(_email_messages(node, email_record), EXTRACTION_SPECS[node][1], name=node)
+
+
+# --------------------------------------------------
+# 🌊 Streaming extraction
+# --------------------------------------------------
+
+@functools.lru_cache(maxsize=None)
+def _part_models(schema: Type[BaseModel]) -> Dict[str, Type[BaseModel]]:
+    """Top-level field -> model (the item model for `items`)."""
+    models = {}
+    for key, field in schema.model_fields.items():
+        annotation = field.annotation
+        models[key] = get_args(annotation)[0] if key == "items" else annotation
+    return models
+
+
+def _stream_json(messages: List[dict], schema: Type[SchemaT], name: str, tier: ModelTier,
+                 on_event: Callable[[str, object, BaseModel], None]):
+    """
+    Streaming variant of `_complete_json`: validated top-level fields and items are
+    passed to `on_event(kind, key, value)` as soon as their JSON is complete.
+    """
+    models = _part_models(schema)
+    parser = StreamingJSONParser(array_key="items")
+    start = time.perf_counter()
+    stream = get_openai_client(tier.base_url, tier.api_key).chat.completions.create(
+        model=tier.model,
+        messages=messages,
+        temperature=tier.temperature,
+        max_tokens=tier.max_tokens,
+        response_format=response_format_for(schema),
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+
+    usage_chunk, refusal = None, ""
+    for chunk in stream:
+        if getattr(chunk, "usage", None):
+            usage_chunk = chunk
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        refusal += getattr(delta, "refusal", None) or ""
+        if delta.content:
+            for kind, key, value in parser.feed(delta.content):
+                model = models["items"] if kind == "item" else models.get(key)
+                if model is not None:
+                    on_event(kind, key, model.model_validate(value))
+
+    if usage_chunk is not None:
+        record_openai_usage(name, usage_chunk, time.perf_counter() - start)
+    if refusal:
+        print(f"⚠️ OpenAI refused extraction: {refusal}")
         return None
+    return schema.model_validate(orjson.loads(parser.text))
+
+
+def stream_extraction(node: str, email_record: dict, on_event: Callable[[str, object, BaseModel], None]):
+    """
+    Run the node's extraction as a stream on its first model tier.
+
+    Failures before the first item is dispatched are retried as usual; if the stream
+    produced nothing usable (malformed output or refusal) the regular cascade takes over.
+    Once items have been dispatched there is no retry or escalation: the error is
+    raised as `StreamInterruptedError` so the email is dead-lettered instead of
+    having its items written twice.
+
+    Returns:
+        The validated schema instance, or None if the model refused.
+    """
+    messages = _email_messages(node, email_record)
+    schema = EXTRACTION_SPECS[node][1]
+    tier = tiers_for(node)[0]
+    dispatched = 0
+
+    def dispatch(kind: str, key, value: BaseModel) -> None:
+        nonlocal dispatched
+        on_event(kind, key, value)
+        dispatched += kind == "item"
+
+    def attempt():
+        try:
+            return _stream_json(messages, schema, node, tier, dispatch)
+        except Exception as e:
+            if dispatched:
+                raise StreamInterruptedError(dispatched, e) from e
+            raise
+
+    try:
+        result = retry_call(attempt, label=f"openai-stream:{tier.model}", fail_fast=(ErrorKind.JSON_DECODE,))
+    except RetryExhaustedError as e:
+        if e.kind is not ErrorKind.JSON_DECODE:
+            raise
+        print(f"⚠️ Streamed {node} extraction was invalid ({e.cause}); retrying without streaming")
+        return query_openai(messages, schema, name=node)
+
+    if result is None and not dispatched:
+        return query_openai(messages, schema, name=node)
+    return result
+
+
+# --------------------------------------------------
+# 📬 Extraction entry point
+# --------------------------------------------------
+
+def extract_email(node: str, email_record: dict,
+                  on_field: Optional[Callable[[str, BaseModel], None]] = None,
+                  on_item: Optional[Callable[[BaseModel], None]] = None):
+    """
+    Extraction entry point used by the nodes.
+
+    0. An extraction journaled before a crash (PROCESSING_JOURNAL=1) is reused as is.
+    1. Emails matching a verified sender template are extracted locally
+       (see `parser.fingerprint`, enabled with TEMPLATE_EXTRACTION=1).
+    2. Otherwise a speculative result started during classification is reused
+       when available (see `LLM.speculation`), else `run_extraction` calls the LLM.
+    3. LLM results are fed back to the template store to learn/verify its rules,
+       and journaled so a resumed email does not pay for them twice.
+
+    With `on_item`, every extracted item is handed to the callbacks exactly once:
+    `on_field(key, value)` for the email-level objects first, then `on_item(item)`.
+    With STREAM_EXTRACTION=1 an LLM extraction is streamed and items are handed
+    over while the rest is still generating (see `LLM.streaming`). `on_field` may be
+    called again with the final values, so it should only store them.
+    """
+    email_id = email_record.get("id")
+    streamed = 0
+
+    def on_event(kind: str, key, value: BaseModel) -> None:
+        nonlocal streamed
+        if kind == "item":
+            on_item(value)
+            streamed += 1
+        elif on_field:
+            on_field(key, value)
+
+    result = None
+    journaled = journal.extraction(email_id, node)
+    if journaled is not None:
+        print(f"📓 Using journaled {node} extraction for email ID {email_id}")
+        release_extraction(email_record)
+        result = EXTRACTION_SPECS[node][1].model_validate(journaled)
+
+    if result is None and template_store is not None:
+        local = template_store.extract(node, email_record, EXTRACTION_SPECS[node][1])
+        if local is not None:
+            release_extraction(email_record)
+            result = local
+
+    if result is None:
+        hit = False
+        if SPECULATIVE_PREFETCH:
+            hit, result = speculative_prefetcher.claim(email_id, node)
+            if hit:
+                print(f"🔮 Using speculative {node} extraction for email ID {email_id}")
+        if not hit:
+            if on_item and STREAM_EXTRACTION:
+                result = stream_extraction(node, email_record, on_event)
+            else:
+                result = run_extraction(node, email_record)
+
+        if template_store is not None and result is not None:
+            template_store.learn(node, email_record, result)
+        if result is not None:
+            journal.extracted(email_id, node, result.model_dump(mode="json"))
+
+    # Nothing was streamed (template, speculation, fallback or streaming off): hand everything over now
+    if on_item and result is not None and not streamed:
+        for key in type(result).model_fields:
+            if key != "items":
+                on_event("field", key, getattr(result, key))
+        for item in result.items:
+            on_event("item", None, item)
+    return result
+
+
+def release_extraction(email_record: dict) -> None:
+    """
+    Tell the extraction layer a node will not call `extract_email` for this email
+    (e.g. it was resolved without the LLM), so any speculative prefetch is dropped.
+    """
+    if SPECULATIVE_PREFETCH:
+        speculative_prefetcher.discard(email_record.get("id"))
 
 
 def match_item_desc_via_gpt(item_description: str, candidate_items: List[Dict]) -> dict:
@@ -67,17 +357,22 @@ def match_item_desc_via_gpt(item_description: str, candidate_items: List[Dict])
         candidate_items (list): List of known items from DB.
 
     Returns:
-        dict: Best-matching candidate row or empty dict if no confident match.
+        dict: Best-matching candidate row, or empty dict if no confident match or the call failed.
     """
     if not candidate_items:
         return {}
 
-    prompt = FALLBACK_MATCH_PROMPT.format(
+    messages = PROMPTS["fallback_match"].messages(
         short_desc=item_description,
         candidates=json.dumps(candidate_items, indent=2)
     )
 
-    result = query_openai(prompt)
+    try:
+        result = query_openai(messages, name="fallback_match")
+    except RetryExhaustedError as e:
+        # Last-resort matcher: a failed call skips the item instead of failing the email
+        print(f"⚠️ GPT item match failed, skipping item: {e}")
+        return {}
     return result if isinstance(result, dict) and "entry_id" in result else {}
 
 
@@ -92,17 +387,21 @@ def match_item_desc_via_gpt_returns(item_description: str, candidate_items: List
         candidate_items (list): Known return items in DB.
 
     Returns:
-        dict: Matched item row or empty dict if none found.
+        dict: Matched item row, or empty dict if none found or the call failed.
     """
     if not candidate_items:
         return {}
 
-    prompt = FALLBACK_MATCH_PROMPT.format(
+    messages = PROMPTS["fallback_match"].messages(
         short_desc=item_description,
         candidates=json.dumps(candidate_items, indent=2)
     )
 
-    result = query_openai(prompt)
+    try:
+        result = query_openai(messages, name="fallback_match")
+    except RetryExhaustedError as e:
+        print(f"⚠️ GPT return item match failed, skipping item: {e}")
+        return {}
 
     # Only accept result if it matches one of the known candidates
     if isinstance(result, dict) and result in candidate_items:
@@ -0,0 +1,179 @@
+import os
+import threading
+import contextvars
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from utils.helpers import sender_domain
+
+# --------------------------------------------------
+# 🔮 Speculative extraction prefetch
+# --------------------------------------------------
+#
+# Classification and extraction normally run back to back. For senders whose
+# route is predictable (carriers -> shipping_update, a retailer that mostly
+# sends shipping confirmations, ...) the likely extractor's LLM call is started
+# concurrently with `classify_node`. If the router picks that node the result is
+# reused (hit); otherwise it is cancelled or discarded (miss).
+#
+# Enable with SPECULATIVE_PREFETCH=1.
+
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "0") == "1"
+MIN_SENDER_SAMPLES = int(os.getenv("SPECULATION_MIN_SAMPLES", "5"))
+MIN_ROUTE_SHARE = float(os.getenv("SPECULATION_MIN_SHARE", "0.8"))
+
+# Carrier mail is always a post-shipment update (see CLASSIFICATION_INSTRUCTIONS)
+SEED_ROUTES = {
+    "ups.com": "shipping_update",
+    "fedex.com": "shipping_update",
+    "usps.com": "shipping_update",
+    "dhl.com": "shipping_update",
+    "ontrac.com": "shipping_update",
+    "lasership.com": "shipping_update",
+}
+
+
+class SenderHistory:
+    """
+    Per-sender-domain counts of the node each email was routed to.
+    """
+
+    def __init__(self, min_samples: int = MIN_SENDER_SAMPLES, min_share: float = MIN_ROUTE_SHARE):
+        self.min_samples = min_samples
+        self.min_share = min_share
+        self._lock = threading.Lock()
+        self._routes = defaultdict(Counter)
+
+    def observe(self, domain: str, route: str) -> None:
+        if not domain:
+            return
+        with self._lock:
+            self._routes[domain][route] += 1
+
+    def predict(self, domain: str) -> Optional[str]:
+        """
+        Return the node this sender is most likely routed to, or None if it is not predictable.
+        """
+        with self._lock:
+            counts = self._routes.get(domain)
+            if counts:
+                total = sum(counts.values())
+                route, hits = counts.most_common(1)[0]
+                if total >= self.min_samples and hits / total >= self.min_share:
+                    return route
+        return SEED_ROUTES.get(domain)
+
+
+class SpeculativePrefetcher:
+    """
+    Starts the predicted extractor's LLM call in a worker thread and hands the
+    result to the node if the router agrees with the prediction.
+    """
+
+    def __init__(self, history: SenderHistory, max_workers: int = 8):
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculate")
+        self._lock = threading.Lock()
+        self._pending: dict = {}
+        self.metrics = Counter()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.metrics[key] += 1
+
+    def start(self, record: dict, extract_fn: Callable[[str, dict], object],
+              valid_routes: Optional[set] = None) -> Optional[str]:
+        """
+        Start a speculative extraction for `record` if its sender is predictable.
+
+        Args:
+            record (dict): The email record.
+            extract_fn (Callable): `extract_fn(node, record)` performing the real LLM extraction.
+            valid_routes (Optional[set]): Nodes that support prefetch (others are skipped).
+
+        Returns:
+            Optional[str]: The predicted node, or None if nothing was started.
+        """
+        email_id = record.get("id")
+        node = self.history.predict(sender_domain(record.get("from", "")))
+        if email_id is None or not node or (valid_routes and node not in valid_routes):
+            return None
+
+        # contextvars don't propagate to executor threads on their own
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, extract_fn, node, record)
+        with self._lock:
+            self._pending[email_id] = (node, future)
+        self._count("started")
+        return node
+
+    def settle(self, record: dict, route: str) -> None:
+        """
+        Record the router's decision: learn from it and drop a mispredicted prefetch.
+        """
+        email_id = record.get("id")
+        self.history.observe(sender_domain(record.get("from", "")), route)
+
+        with self._lock:
+            pending = self._pending.get(email_id)
+            if pending and pending[0] != route:
+                self._pending.pop(email_id)
+            else:
+                pending = None
+
+        if pending:
+            node, future = pending
+            self._count("misses")
+            if future.cancel():
+                self._count("cancelled")
+            else:
+                self._count("discarded")
+            print(f"🔮 Speculation miss for email ID {email_id}: predicted {node}, routed to {route}")
+
+    def discard(self, email_id) -> None:
+        """
+        Drop a prefetch that is no longer needed (e.g. the email was extracted locally).
+        """
+        with self._lock:
+            pending = self._pending.pop(email_id, None)
+        if pending and not pending[1].cancel():
+            self._count("discarded")
+
+    def claim(self, email_id, node: str) -> tuple[bool, object]:
+        """
+        Take the prefetched result for (email_id, node).
+
+        Returns:
+            tuple: (hit, result). On a miss, or if the speculative call failed, (False, None)
+                   so the caller performs the extraction itself.
+        """
+        with self._lock:
+            pending = self._pending.get(email_id)
+            if not pending or pending[0] != node:
+                return False, None
+            self._pending.pop(email_id)
+
+        _, future = pending
+        try:
+            result = future.result()
+        except Exception as e:
+            self._count("failed")
+            print(f"⚠️ Speculative extraction failed for email ID {email_id}: {e}")
+            return False, None
+
+        self._count("hits")
+        return True, result
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: started / hits / misses / cancelled / discarded / failed counts and hit_rate.
+        """
+        with self._lock:
+            stats = dict(self.metrics)
+        settled = stats.get("hits", 0) + stats.get("misses", 0)
+        stats["hit_rate"] = round(stats.get("hits", 0) / settled, 3) if settled else 0.0
+        return stats
+
+
+speculative_prefetcher = SpeculativePrefetcher(SenderHistory())
@@ -0,0 +1,162 @@
+"""
+🌊 LLM/streaming.py
+
+Incremental parsing of streamed JSON extractions.
+
+Extraction schemas put the email-level object (`order_info` / `return_info`)
+before the `items` array, and structured outputs generate keys in schema order.
+`StreamingJSONParser` scans the tokens as they arrive and reports every top-level
+value and every `items` element the moment its closing brace is seen, so nodes can
+match and write item 1 while the model is still generating item 5.
+
+Enable with STREAM_EXTRACTION=1 (order and return nodes).
+"""
+
+import os
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+import orjson
+
+STREAM_EXTRACTION = os.getenv("STREAM_EXTRACTION", "0") == "1"
+
+_WHITESPACE = " \t\r\n"
+
+
+class StreamInterruptedError(Exception):
+    """
+    The stream failed after items were already dispatched; retrying would dispatch them twice.
+    """
+
+    def __init__(self, dispatched: int, cause: BaseException):
+        super().__init__(f"stream failed after {dispatched} dispatched item(s): {cause}")
+        self.dispatched = dispatched
+        self.cause = cause
+
+
+class StreamingJSONParser:
+    """
+    Push parser for one JSON object arriving in chunks.
+
+    `feed` returns the values completed by the chunk, in order:
+        ("field", key, value)  - a top-level value other than the streamed array
+        ("item", index, value) - an element of the top-level `array_key` array
+
+    Only structure is tracked (depth, strings, escapes); values are decoded with
+    orjson once complete. `text` holds everything fed so far for the final parse.
+    """
+
+    def __init__(self, array_key: str = "items"):
+        self.array_key = array_key
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[Tuple[int, int]] = None  # last complete string at depth 1
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self._item_count = 0
+
+    @property
+    def text(self) -> str:
+        return self._buf
+
+    def _in_array(self) -> bool:
+        return self._key == self.array_key and self._value_start is not None
+
+    def feed(self, chunk: str) -> List[tuple]:
+        self._buf += chunk
+        buf, events = self._buf, []
+
+        for pos in range(self._pos, len(buf)):
+            char = buf[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._value_start is None:
+                        self._last_string = (self._string_start, pos + 1)
+                continue
+
+            if char in _WHITESPACE:
+                continue
+
+            # First character of a top-level value
+            if self._depth == 1 and self._key is not None and self._value_start is None and char not in ",:":
+                self._value_start = pos
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 3 and char == "{" and self._in_array():
+                    self._item_start = pos
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 2 and self._item_start is not None:
+                    events.append(("item", self._item_count, orjson.loads(buf[self._item_start:pos + 1])))
+                    self._item_count += 1
+                    self._item_start = None
+                elif self._depth == 1 and self._value_start is not None:
+                    self._complete_value(buf[self._value_start:pos + 1], events)
+                elif self._depth == 0 and self._value_start is not None:
+                    # Scalar value closed by the object's brace
+                    self._complete_value(buf[self._value_start:pos].rstrip(_WHITESPACE), events)
+            elif self._depth == 1:
+                if char == ":" and self._last_string is not None:
+                    start, end = self._last_string
+                    self._key = orjson.loads(buf[start:end])
+                    self._last_string = None
+                elif char == "," and self._value_start is not None:
+                    self._complete_value(buf[self._value_start:pos].rstrip(_WHITESPACE), events)
+
+        self._pos = len(buf)
+        return events
+
+    def _complete_value(self, raw: str, events: List[tuple]) -> None:
+        if self._key != self.array_key:
+            events.append(("field", self._key, orjson.loads(raw)))
+        self._key = None
+        self._value_start = None
+
+
+class ItemPipeline:
+    """
+    Runs per-item work off the stream-reading thread, one item at a time and in order.
+
+    A single worker keeps the node's shared state (accumulated updates, inserted rows)
+    race-free while the stream keeps being consumed.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream-items")
+        self._futures: List[Future] = []
+
+    def submit(self, fn: Callable, *args) -> None:
+        from utils.profiling import profiler
+
+        # contextvars (LLM usage attribution: node, email, tenant) don't propagate to executor threads on their own
+        context = contextvars.copy_context()
+        self._futures.append(self._executor.submit(context.run, profiler.bind(fn), *args))
+
+    def wait(self) -> list:
+        """
+        Wait for every submitted item and shut the worker down.
+
+        Returns:
+            list: Each item's result, in submission order.
+
+        Raises:
+            The first exception raised by an item's work.
+        """
+        try:
+            return [future.result() for future in self._futures]
+        finally:
+            self._executor.shutdown(wait=True)
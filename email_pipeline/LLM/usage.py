@@ -0,0 +1,293 @@
+import csv
+import json
+import time
+import functools
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, field
+from typing import Callable, Iterable, List, Optional
+from utils.helpers import sender_domain
+
+# --------------------------------------------------
+# 📈 LLM usage & cost accounting
+# --------------------------------------------------
+#
+# Every LLM call records prompt / completion / cached tokens and wall time,
+# attributed to the email, graph node and retailer (sender domain) that
+# triggered it. Attribution is carried in a context variable set by
+# `attribute_node`, so LLM helpers don't need extra arguments. A call serving
+# several emails (micro-batched classification) is split evenly across them with
+# `shared_usage_context`, so per-email and per-tenant totals stay complete.
+#
+# OpenAI caches prompt prefixes of 1024+ tokens automatically; `cached_tokens`
+# shows the effect of the static system prefixes in prompts/templates.py.
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICING = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+}
+
+
+@dataclass
+class UsageAttribution:
+    email_id: Optional[int] = None
+    node: str = "unknown"
+    retailer: str = "unknown"
+    user_id: Optional[str] = None
+    shares: tuple = ()  # per-email attributions a shared call is split across
+
+
+@dataclass
+class UsageRecord:
+    email_id: Optional[int]
+    node: str
+    retailer: str
+    prompt: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+    wall_time: float
+    cost_usd: float
+    user_id: Optional[str] = None
+    share: float = 1.0  # fraction of the call this record carries (< 1 for shared calls)
+    timestamp: float = field(default_factory=time.time)
+
+
+_attribution: contextvars.ContextVar[UsageAttribution] = contextvars.ContextVar(
+    "llm_usage_attribution", default=UsageAttribution()
+)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> float:
+    """
+    Estimate the USD cost of a call from MODEL_PRICING (0.0 for unknown models).
+    """
+    pricing = next((p for name, p in MODEL_PRICING.items() if model.startswith(name)), None)
+    if not pricing:
+        return 0.0
+    input_price, cached_price, output_price = pricing
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+class UsageStore:
+    """
+    Thread-safe in-process store of `UsageRecord`s with grouping and export helpers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records: List[UsageRecord] = []
+        self._listeners: List[Callable[[UsageRecord], None]] = []
+
+    def add(self, record: UsageRecord) -> None:
+        with self._lock:
+            self._records.append(record)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(record)
+
+    def add_listener(self, listener: Callable[[UsageRecord], None]) -> None:
+        """
+        Call `listener(record)` for every new record (e.g. per-tenant budget tracking).
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[UsageRecord], None]) -> None:
+        """Stop calling a listener registered with `add_listener`."""
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+    def records(self, **filters) -> List[UsageRecord]:
+        """
+        Return records matching all given field values, e.g. `records(retailer="amazon.com")`.
+        """
+        with self._lock:
+            snapshot = list(self._records)
+        return [r for r in snapshot if all(getattr(r, k) == v for k, v in filters.items())]
+
+    def summary(self, by: Iterable[str] = ("node",), **filters) -> dict:
+        """
+        Aggregate usage grouped by one or more record fields.
+
+        Args:
+            by (Iterable[str]): Fields to group by, e.g. ("retailer",) or ("retailer", "node").
+            **filters: Optional exact-match filters applied before grouping.
+
+        Returns:
+            dict: {group key: {calls, prompt_tokens, completion_tokens, cached_tokens,
+                   cache_ratio, wall_time, avg_wall_time, cost_usd}}
+        """
+        by = tuple(by)
+        groups = defaultdict(lambda: defaultdict(float))
+        for r in self.records(**filters):
+            key = getattr(r, by[0]) if len(by) == 1 else tuple(getattr(r, f) for f in by)
+            entry = groups[key]
+            entry["calls"] += r.share
+            entry["prompt_tokens"] += r.prompt_tokens
+            entry["completion_tokens"] += r.completion_tokens
+            entry["cached_tokens"] += r.cached_tokens
+            entry["wall_time"] += r.wall_time
+            entry["cost_usd"] += r.cost_usd
+
+        result = {}
+        for key, entry in groups.items():
+            calls = entry["calls"]
+            result[key] = {
+                "calls": int(calls) if calls.is_integer() else round(calls, 3),
+                "prompt_tokens": int(entry["prompt_tokens"]),
+                "completion_tokens": int(entry["completion_tokens"]),
+                "cached_tokens": int(entry["cached_tokens"]),
+                "cache_ratio": round(entry["cached_tokens"] / entry["prompt_tokens"], 3)
+                if entry["prompt_tokens"] else 0.0,
+                "wall_time": round(entry["wall_time"], 3),
+                "avg_wall_time": round(entry["wall_time"] / calls, 3),
+                "cost_usd": round(entry["cost_usd"], 6),
+            }
+        return result
+
+    def export_json(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([asdict(r) for r in self.records()], f, indent=2)
+
+    def export_csv(self, path: str) -> None:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(UsageRecord.__dataclass_fields__))
+            writer.writeheader()
+            writer.writerows(asdict(r) for r in self.records())
+
+
+usage_store = UsageStore()
+
+
+# --------------------------------------------------
+# 🏷️ Attribution
+# --------------------------------------------------
+
+@contextmanager
+def usage_context(email_id: Optional[int] = None, node: str = "unknown", retailer: str = "unknown",
+                  user_id: Optional[str] = None):
+    """
+    Attribute all LLM calls made inside the block to an email / node / retailer / user.
+    """
+    token = _attribution.set(UsageAttribution(email_id=email_id, node=node, retailer=retailer, user_id=user_id))
+    try:
+        yield
+    finally:
+        _attribution.reset(token)
+
+
+def _record_attribution(record: dict, node: str) -> UsageAttribution:
+    return UsageAttribution(
+        email_id=record.get("id"),
+        node=node,
+        retailer=sender_domain(record.get("from", "")) or "unknown",
+        user_id=record.get("user_id")
+    )
+
+
+@contextmanager
+def shared_usage_context(records: List[dict], node: str):
+    """
+    Split the usage of LLM calls made inside the block evenly across the emails in
+    `records` (one record per email, each attributed to its email / retailer / user).
+    """
+    shares = tuple(_record_attribution(record, node) for record in records)
+    token = _attribution.set(UsageAttribution(node=node, retailer="batch", shares=shares))
+    try:
+        yield
+    finally:
+        _attribution.reset(token)
+
+
+def attribute_node(node_name: str) -> Callable:
+    """
+    Decorate a LangGraph node so LLM calls inside it are attributed to the node,
+    the email ID, the sender's domain and the mailbox owner (user_id).
+    """
+    def decorator(node: Callable[..., dict]) -> Callable[..., dict]:
+        @functools.wraps(node)
+        def wrapper(state, *args, **kwargs):
+            token = _attribution.set(_record_attribution(state.get("record") or {}, node_name))
+            try:
+                return node(state, *args, **kwargs)
+            finally:
+                _attribution.reset(token)
+        return wrapper
+    return decorator
+
+
+def _record(prompt: str, model: str, prompt_tokens: int, completion_tokens: int,
+            cached_tokens: int, wall_time: float) -> None:
+    attribution = _attribution.get()
+    shares = attribution.shares or (attribution,)
+    count = len(shares)
+    cost = estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens)
+
+    def split(total: int, index: int) -> int:
+        # Integer shares that add up to the call's total
+        return total // count + (index < total % count)
+
+    for index, share in enumerate(shares):
+        usage_store.add(UsageRecord(
+            email_id=share.email_id,
+            node=share.node,
+            retailer=share.retailer,
+            prompt=prompt,
+            model=model,
+            prompt_tokens=split(prompt_tokens, index),
+            completion_tokens=split(completion_tokens, index),
+            cached_tokens=split(cached_tokens, index),
+            wall_time=wall_time / count,
+            cost_usd=cost / count,
+            user_id=share.user_id,
+            share=1 / count,
+        ))
+
+
+def record_openai_usage(prompt: str, response, wall_time: float) -> None:
+    """
+    Record usage from an OpenAI `chat.completions` response.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    _record(
+        prompt=prompt,
+        model=getattr(response, "model", "") or "",
+        prompt_tokens=usage.prompt_tokens or 0,
+        completion_tokens=usage.completion_tokens or 0,
+        cached_tokens=getattr(details, "cached_tokens", 0) or 0,
+        wall_time=wall_time,
+    )
+
+
+def record_langchain_usage(prompt: str, message, wall_time: float) -> None:
+    """
+    Record usage from a LangChain `AIMessage` (`usage_metadata`).
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return
+    metadata = getattr(message, "response_metadata", None) or {}
+    _record(
+        prompt=prompt,
+        model=metadata.get("model_name", ""),
+        prompt_tokens=usage.get("input_tokens", 0),
+        completion_tokens=usage.get("output_tokens", 0),
+        cached_tokens=(usage.get("input_token_details") or {}).get("cache_read", 0) or 0,
+        wall_time=wall_time,
+    )
@@ -0,0 +1,556 @@
+"""
+🧪 loadgen/corpus.py
+
+Synthetic email corpus for load tests and capacity planning.
+
+Generates realistic HTML emails for every classification category (order and
+shipping confirmations, order updates, carrier shipping updates, return
+confirmations / updates, refunds, promos, goods and services receipts) together
+with their ground truth: the label the classifier should return and the
+extraction the node's LLM call should produce.
+
+The emails tell a consistent story per user: shipping confirmations, carrier
+updates, returns and refunds refer to orders (items, order IDs, valid UPS / USPS
+tracking numbers) generated earlier, so the matching paths hit real rows. Tenants
+are Zipf-skewed, body sizes are log-normal (BODY_KB_MEDIAN / BODY_KB_SIGMA) and
+item counts geometric (ITEMS_MEAN, capped at ITEMS_MAX).
+
+Every email carries a reference token (`REF_PATTERN`, e.g. "LG00001234") in
+its header line; the LLM stand-in in `loadgen/standins.py` uses it to answer with
+the ground truth.
+
+`python -m loadgen.corpus --emails 1000 --out corpus.jsonl` writes a corpus
+(one row + truth per line) and prints its category and size mix.
+"""
+
+import os
+import re
+import math
+import random
+import argparse
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Type
+from pydantic import BaseModel
+from shared.schemas import (
+    OrderExtraction, ShippingExtraction, ShippingUpdateExtraction,
+    RefundExtraction, ReturnConfirmationExtraction, ReturnUpdateExtraction,
+)
+
+BODY_KB_MEDIAN = float(os.getenv("BODY_KB_MEDIAN", "24"))
+BODY_KB_SIGMA = float(os.getenv("BODY_KB_SIGMA", "0.8"))
+ITEMS_MEAN = float(os.getenv("ITEMS_MEAN", "2"))
+ITEMS_MAX = int(os.getenv("ITEMS_MAX", "12"))
+
+# Share of each category in a generated corpus (roughly a consumer inbox)
+CATEGORY_MIX: Dict[str, float] = {
+    "promos": 0.35,
+    "retailer order confirmation": 0.12,
+    "retailer shipping confirmation": 0.10,
+    "shipping update": 0.15,
+    "retailer order update": 0.03,
+    "return confirmation": 0.04,
+    "return update": 0.03,
+    "refund": 0.05,
+    "goods receipt": 0.05,
+    "services receipt": 0.08,
+}
+
+# Label -> schema of the extraction the routed node requests (ignored categories have none)
+CATEGORY_SCHEMAS: Dict[str, Type[BaseModel]] = {
+    "retailer order confirmation": OrderExtraction,
+    "retailer shipping confirmation": ShippingExtraction,
+    "retailer order update": ShippingExtraction,
+    "shipping update": ShippingUpdateExtraction,
+    "return confirmation": ReturnConfirmationExtraction,
+    "return update": ReturnUpdateExtraction,
+    "refund": RefundExtraction,
+}
+
+REF_PATTERN = re.compile(r"\bLG(\d{8})\b")
+
+RETAILERS = [
+    ("Everlane", "everlane.com"), ("J.Crew", "jcrew.com"), ("Uniqlo", "uniqlo.com"),
+    ("Nordstrom", "nordstrom.com"), ("Madewell", "madewell.com"), ("Patagonia", "patagonia.com"),
+    ("Lululemon", "lululemon.com"), ("Banana Republic", "bananarepublic.com"),
+]
+PRODUCTS = [
+    ("Relaxed Crew Tee", 28.0), ("Slim Fit Chino", 79.5), ("Merino Crewneck Sweater", 110.0),
+    ("Organic Cotton Hoodie", 68.0), ("Linen Button-Down Shirt", 59.99), ("High-Rise Straight Jean", 128.0),
+    ("Packable Down Jacket", 199.0), ("Everyday Jogger", 54.0), ("Oxford Shirt", 49.5),
+    ("Wool Overcoat", 298.0), ("Running Short", 38.0), ("Ribbed Tank", 24.0),
+]
+COLORS = ["Black", "Navy", "Heather Grey", "Olive", "White", "Bone", "Rust", "Dusty Blue"]
+SIZES = ["XS", "S", "M", "L", "XL", "XXL", "30x32", "32x30", "8", "10.5"]
+SERVICES = [
+    ("Uber", "uber.com", "Thanks for riding", "Trip fare"),
+    ("DoorDash", "doordash.com", "Your order from Sweetgreen", "Harvest Bowl"),
+    ("Spotify", "spotify.com", "Your receipt", "Premium Individual"),
+    ("Lyft", "lyft.com", "Your ride with Maria", "Ride fare"),
+]
+STORES = [("Apple Store", "apple.com"), ("IKEA", "ikea.com"), ("Best Buy", "bestbuy.com")]
+RETURN_REASONS = ["Too small", "Too large", "Changed my mind", "Not as described", "Arrived damaged"]
+SHIPPING_STATUSES = [
+    ("in transit", "Your package is in transit"),
+    ("out for delivery", "Your package is out for delivery"),
+    ("delivered", "Your package was delivered"),
+    ("delayed", "Your delivery is running late"),
+]
+
+
+@dataclass
+class SyntheticEmail:
+    """One generated `email_extracts` row with its ground truth."""
+    row: dict
+    category: str
+    extraction: Optional[dict]  # what the routed node's LLM call should return (JSON)
+
+    @property
+    def ref(self) -> str:
+        return f"LG{self.row['id']:08d}"
+
+    @property
+    def size(self) -> int:
+        return len(self.row["msg"])
+
+
+# --------------------------------------------------
+# 🔢 Identifiers
+# --------------------------------------------------
+
+def ups_tracking(rng: random.Random) -> str:
+    """A UPS 1Z number with a valid check digit (see `parser.identifiers`)."""
+    body = "".join(rng.choice("0123456789ABCDEFGHJKLMNPRSTUVWXYZ") for _ in range(15))
+    total = 0
+    for index, char in enumerate(body):
+        value = int(char) if char.isdigit() else (ord(char) - 63) % 10
+        total += value * 2 if index % 2 else value
+    return f"1Z{body}{(10 - total % 10) % 10}"
+
+
+def usps_tracking(rng: random.Random) -> str:
+    """A 22-digit USPS IMpb number with a valid mod-10 check digit."""
+    digits = [9, 4, 0, 0] + [rng.randint(0, 9) for _ in range(17)]
+    total = sum(d * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits)))
+    return "".join(map(str, digits)) + str((10 - total % 10) % 10)
+
+
+def _blank(model: Type[BaseModel]) -> dict:
+    return dict.fromkeys(model.model_fields)
+
+
+def _truth(schema: Type[BaseModel], info: dict, items: Optional[List[dict]] = None) -> dict:
+    """Complete, validated extraction JSON (every field present, unknown ones null)."""
+    info_key = next(key for key in schema.model_fields if key != "items")
+    info_model = schema.model_fields[info_key].annotation
+    data = {info_key: {**_blank(info_model), **info}}
+    if "items" in schema.model_fields:
+        item_model = schema.model_fields["items"].annotation.__args__[0]
+        data["items"] = [{**_blank(item_model), **item} for item in items or []]
+    return schema.model_validate(data).model_dump(mode="json")
+
+
+# --------------------------------------------------
+# 🖼️ HTML rendering
+# --------------------------------------------------
+
+_FILLER = (
+    "You are receiving this email because you made a purchase or created an account with us. "
+    "Prices and availability are subject to change. Free shipping applies to standard delivery "
+    "within the contiguous US. Returns are accepted within 30 days of delivery in original condition. "
+)
+
+
+def _table(rows: List[List[str]]) -> str:
+    cells = "".join(
+        "<tr>" + "".join(f'<td style="padding:6px 12px;border-bottom:1px solid #eee">{cell}</td>' for cell in row) + "</tr>"
+        for row in rows
+    )
+    return f'<table role="presentation" width="100%" cellpadding="0" cellspacing="0">{cells}</table>'
+
+
+def render_html(brand: str, ref: str, title: str, blocks: List[str], target_bytes: int, rng: random.Random) -> str:
+    """
+    Wrap content blocks in a retailer-style layout (preheader, header, tables, footer),
+    padded with recommendation and legal blocks to roughly `target_bytes`.
+    """
+    head = (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><style>"
+        "body{margin:0;font-family:Helvetica,Arial,sans-serif}.btn{background:#111;color:#fff}"
+        "@media only screen and (max-width:600px){.col{width:100%!important}}</style></head>"
+        '<body><div style="display:none;max-height:0;overflow:hidden">'
+        f"{title}&nbsp;&zwnj;&nbsp;&zwnj;</div>"
+        f'<table width="100%" style="background:#f6f6f6"><tr><td align="center">'
+        f'<p style="font-size:11px;color:#999">View in browser · {ref}</p>'
+        f'<h1 style="font-size:22px">{brand}</h1><h2>{title}</h2>'
+    )
+    body = "".join(f"<div class=\"col\">{block}</div>" for block in blocks)
+    footer = (
+        f'<p style="font-size:11px;color:#999">{_FILLER}</p>'
+        '<p style="font-size:11px"><a href="https://example.com/unsubscribe">Unsubscribe</a> · '
+        '<a href="https://example.com/privacy">Privacy</a></p>'
+        '<img src="https://example.com/open.gif" width="1" height="1" alt="">'
+        "</td></tr></table></body></html>"
+    )
+
+    padding = []
+    size = len(head) + len(body) + len(footer)
+    while size < target_bytes:
+        name, price = rng.choice(PRODUCTS)
+        block = (
+            '<table class="col" width="50%"><tr><td>'
+            f'<img src="https://cdn.example.com/{name.replace(" ", "-").lower()}.jpg" width="260" alt="{name}">'
+            f'<p style="font-size:13px">You may also like: {name} — ${price:.2f}</p>'
+            f'<p style="font-size:10px;color:#aaa">{_FILLER}</p></td></tr></table>'
+        )
+        padding.append(block)
+        size += len(block)
+    return head + body + "".join(padding) + footer
+
+
+# --------------------------------------------------
+# 🏭 Generator
+# --------------------------------------------------
+
+class CorpusGenerator:
+    """
+    Stateful generator: orders, shipments and returns are remembered per user so
+    later emails refer to them.
+    """
+
+    def __init__(self, seed: int = 7, users: int = 50, mix: Optional[Dict[str, float]] = None,
+                 body_kb_median: float = BODY_KB_MEDIAN, body_kb_sigma: float = BODY_KB_SIGMA,
+                 items_mean: float = ITEMS_MEAN, items_max: int = ITEMS_MAX, start_id: int = 1):
+        self.rng = random.Random(seed)
+        self.users = [f"00000000-0000-4000-8000-{i:012d}" for i in range(users)]
+        # Zipf-like tenant skew: a few heavy users, a long tail
+        self.user_weights = [1 / (rank + 1) ** 1.1 for rank in range(users)]
+        self.mix = mix or CATEGORY_MIX
+        self.body_kb_median = body_kb_median
+        self.body_kb_sigma = body_kb_sigma
+        self.items_mean = items_mean
+        self.items_max = items_max
+        self.next_id = start_id
+        self.orders: List[dict] = []
+        self.returns: List[dict] = []
+
+    def _user(self) -> str:
+        return self.rng.choices(self.users, self.user_weights)[0]
+
+    def _target_bytes(self) -> int:
+        mu = math.log(self.body_kb_median * 1024)
+        return int(self.rng.lognormvariate(mu, self.body_kb_sigma))
+
+    def _item_count(self) -> int:
+        extra = int(self.rng.expovariate(1 / max(self.items_mean - 1, 0.01)))
+        return max(1, min(self.items_max, 1 + extra))
+
+    def _row(self, user_id: str, sender: str, subject: str, html: str, email_id: int) -> dict:
+        return {
+            "id": email_id,
+            "from": sender,
+            "subject": subject,
+            "msg": html,
+            "user_id": user_id,
+            "user_email": f"user{self.users.index(user_id)}@example.com",
+        }
+
+    def generate(self, count: int) -> List["SyntheticEmail"]:
+        return [self.email() for _ in range(count)]
+
+    def email(self, category: Optional[str] = None) -> SyntheticEmail:
+        """Generate the next email (of `category`, else drawn from the mix)."""
+        category = category or self.rng.choices(list(self.mix), list(self.mix.values()))[0]
+        email_id = self.next_id
+        self.next_id += 1
+        ref = f"LG{email_id:08d}"
+        user_id = self._user()
+        builder = getattr(self, "_" + category.replace(" ", "_"))
+        sender, subject, title, blocks, extraction = builder(user_id)
+        html = render_html(sender.split("@")[-1], ref, title, blocks, self._target_bytes(), self.rng)
+        return SyntheticEmail(self._row(user_id, sender, subject, html, email_id), category, extraction)
+
+    # ---------- story state ----------
+
+    def _order_for(self, user_id: str, shipped: bool = False) -> dict:
+        """An earlier order of this user (created silently when there is none yet)."""
+        candidates = [o for o in self.orders if o["user_id"] == user_id and (o["tracking_num"] or not shipped)]
+        if candidates:
+            return self.rng.choice(candidates[-20:])
+        order = self._new_order(user_id)
+        if shipped:
+            self._ship(order)
+        return order
+
+    def _new_order(self, user_id: str) -> dict:
+        retailer, domain = self.rng.choice(RETAILERS)
+        items = []
+        for _ in range(self._item_count()):
+            name, price = self.rng.choice(PRODUCTS)
+            items.append({
+                "item_desc": name, "item_price": price, "item_qty": self.rng.choice([1, 1, 1, 2]),
+                "item_color": self.rng.choice(COLORS), "item_size": self.rng.choice(SIZES),
+                "item_sku": f"{self.rng.randint(100000, 999999)}",
+            })
+        order = {
+            "user_id": user_id, "retailer": retailer, "domain": domain, "items": items,
+            "order_id": f"{self.rng.randint(10, 99)}{self.rng.randint(1000000, 9999999)}",
+            "order_date": f"2026-{self.rng.randint(1, 9):02d}-{self.rng.randint(1, 28):02d}",
+            "tracking_num": None, "carrier": None, "emailed": False,
+        }
+        self.orders.append(order)
+        return order
+
+    def _ship(self, order: dict) -> None:
+        if self.rng.random() < 0.6:
+            order["carrier"], order["tracking_num"] = "UPS", ups_tracking(self.rng)
+        else:
+            order["carrier"], order["tracking_num"] = "USPS", usps_tracking(self.rng)
+
+    def _item_rows(self, items: List[dict], with_price: bool = True) -> str:
+        rows = [[
+            f"<b>{item['item_desc']}</b><br>Color: {item['item_color']}<br>Size: {item['item_size']}",
+            f"Qty {item['item_qty']}", f"${item['item_price']:.2f}" if with_price else "",
+        ] for item in items]
+        return _table(rows)
+
+    # ---------- categories ----------
+
+    def _retailer_order_confirmation(self, user_id: str):
+        order = self._new_order(user_id)
+        order["emailed"] = True
+        subtotal = sum(item["item_price"] * item["item_qty"] for item in order["items"])
+        tax = round(subtotal * 0.08, 2)
+        blocks = [
+            f"<p>Thanks for your order! We're getting it ready.</p><p>Order #{order['order_id']} · "
+            f"placed {order['order_date']}</p>",
+            self._item_rows(order["items"]),
+            _table([["Subtotal", f"${subtotal:.2f}"], ["Tax", f"${tax:.2f}"], ["Total", f"${subtotal + tax:.2f}"]]),
+        ]
+        truth = _truth(OrderExtraction, {
+            "retailer": order["retailer"], "order_id": order["order_id"], "order_date": order["order_date"],
+            "order_total": round(subtotal + tax, 2), "tax_total": tax,
+        }, [dict(item) for item in order["items"]])
+        sender = f"orders@{order['domain']}"
+        return sender, f"Your {order['retailer']} order #{order['order_id']} is confirmed", "Order confirmed", blocks, truth
+
+    def _shipment_email(self, user_id: str, update: bool):
+        order = self._order_for(user_id)
+        if not order["tracking_num"]:
+            self._ship(order)
+        items = order["items"] if not update else self.rng.sample(order["items"], max(1, len(order["items"]) // 2))
+        text = ("Good news — part of your order is delayed but the rest is on its way." if update
+                else "Your package has shipped and is on its way.")
+        blocks = [
+            f"<p>{text}</p><p>Order #{order['order_id']}</p>"
+            f"<p>{order['carrier']} tracking: <a href=\"https://track.example.com\">{order['tracking_num']}</a></p>",
+            self._item_rows(items, with_price=False),
+        ]
+        truth = _truth(ShippingExtraction, {"retailer": order["retailer"], "order_id": order["order_id"]}, [
+            {**item, "tracking_num": order["tracking_num"], "carrier": order["carrier"],
+             "status": "delayed" if update else "shipped"}
+            for item in items
+        ])
+        subject = (f"An update on your order #{order['order_id']}" if update
+                   else f"Your {order['retailer']} order has shipped!")
+        return f"shipping@{order['domain']}", subject, "Order update" if update else "It's on the way", blocks, truth
+
+    def _retailer_shipping_confirmation(self, user_id: str):
+        return self._shipment_email(user_id, update=False)
+
+    def _retailer_order_update(self, user_id: str):
+        return self._shipment_email(user_id, update=True)
+
+    def _shipping_update(self, user_id: str):
+        order = self._order_for(user_id, shipped=True)
+        status, headline = self.rng.choice(SHIPPING_STATUSES)
+        carrier = order["carrier"]
+        blocks = [
+            f"<p>{headline}.</p><p>Tracking number: {order['tracking_num']}</p>"
+            f"<p>Shipped by {order['retailer']}</p>",
+            _table([["Status", status.title()], ["Service", f"{carrier} Ground"]]),
+        ]
+        truth = _truth(ShippingUpdateExtraction, {
+            "tracking_num": order["tracking_num"], "carrier": carrier, "status": status,
+            "shipping_method": f"{carrier} Ground",
+        })
+        sender = "mcinfo@ups.com" if carrier == "UPS" else "auto-reply@usps.com"
+        return sender, f"{carrier} Update: {headline}", headline, blocks, truth
+
+    def _return_items(self, order: dict) -> List[dict]:
+        items = self.rng.sample(order["items"], max(1, len(order["items"]) // 2))
+        return [{
+            "return_item_desc": item["item_desc"], "return_item_sku": item["item_sku"],
+            "return_item_qty": item["item_qty"], "return_item_size": item["item_size"],
+            "return_item_color": item["item_color"], "return_reason": self.rng.choice(RETURN_REASONS),
+            "item_amt": item["item_price"],
+        } for item in items]
+
+    def _return_rows(self, items: List[dict]) -> str:
+        return _table([[
+            f"<b>{item['return_item_desc']}</b><br>{item['return_item_color']} / {item['return_item_size']}",
+            item["return_reason"], f"${item['item_amt']:.2f}",
+        ] for item in items])
+
+    def _return_confirmation(self, user_id: str):
+        order = self._order_for(user_id)
+        items = self._return_items(order)
+        ret = {"user_id": user_id, "order": order, "items": items, "emailed": True,
+               "return_id": f"R{self.rng.randint(10000000, 99999999)}"}
+        self.returns.append(ret)
+        amount = round(sum(item["item_amt"] for item in items), 2)
+        blocks = [
+            f"<p>Your return has been approved. Return #{ret['return_id']} for order #{order['order_id']}.</p>"
+            "<p>Print the prepaid label and drop the package off at any UPS location within 14 days.</p>",
+            self._return_rows(items),
+            _table([["Estimated refund", f"${amount:.2f}"]]),
+        ]
+        truth = _truth(ReturnConfirmationExtraction, {
+            "retailer": order["retailer"], "return_id": ret["return_id"], "order_id": order["order_id"],
+            "exp_refund_amt": amount, "return_method": "UPS drop-off", "status": "return approved",
+        }, items)
+        return f"returns@{order['domain']}", f"Your return #{ret['return_id']} is approved", "Return approved", blocks, truth
+
+    def _return_for(self, user_id: str) -> dict:
+        candidates = [r for r in self.returns if r["user_id"] == user_id]
+        if candidates:
+            return self.rng.choice(candidates[-20:])
+        self._return_confirmation(user_id)
+        self.returns[-1]["emailed"] = False
+        return self.returns[-1]
+
+    def _return_update(self, user_id: str):
+        ret = self._return_for(user_id)
+        order = ret["order"]
+        blocks = [
+            f"<p>We've received your return package for return #{ret['return_id']}.</p>"
+            "<p>Your refund will be processed within 5–7 business days.</p>",
+            self._return_rows(ret["items"]),
+        ]
+        truth = _truth(ReturnUpdateExtraction, {
+            "retailer": order["retailer"], "return_id": ret["return_id"], "order_id": order["order_id"],
+            "status": "return received",
+        }, ret["items"])
+        return f"returns@{order['domain']}", "We've received your return", "Return received", blocks, truth
+
+    def _refund(self, user_id: str):
+        ret = self._return_for(user_id)
+        order = ret["order"]
+        amount = round(sum(item["item_amt"] for item in ret["items"]), 2)
+        blocks = [
+            f"<p>Your refund of ${amount:.2f} has been issued to your original payment method.</p>"
+            f"<p>Return #{ret['return_id']} · Order #{order['order_id']}</p>",
+            self._return_rows(ret["items"]),
+        ]
+        truth = _truth(RefundExtraction, {
+            "retailer": order["retailer"], "return_id": ret["return_id"], "order_id": order["order_id"],
+            "refund_amt": amount, "refund_method": "original payment method", "refund_status": "issued",
+        }, ret["items"])
+        return f"refunds@{order['domain']}", f"Your refund of ${amount:.2f} is on its way", "Refund issued", blocks, truth
+
+    def _promos(self, user_id: str):
+        retailer, domain = self.rng.choice(RETAILERS)
+        percent = self.rng.choice([15, 20, 25, 30, 40, 50])
+        picks = self.rng.sample(PRODUCTS, 4)
+        blocks = [
+            f"<p style=\"font-size:28px\">{percent}% OFF EVERYTHING</p><p>Ends Sunday. Use code SAVE{percent}.</p>"
+            '<a class="btn" href="https://example.com/shop">SHOP NOW</a>',
+            _table([[name, f"<s>${price:.2f}</s> ${price * (100 - percent) / 100:.2f}"] for name, price in picks]),
+        ]
+        subject = self.rng.choice([f"{percent}% off starts now", "New arrivals you'll love", "Last chance: sale ends tonight"])
+        return f"news@{domain}", subject, f"{retailer} Sale", blocks, None
+
+    def _goods_receipt(self, user_id: str):
+        store, domain = self.rng.choice(STORES)
+        total = round(self.rng.uniform(20, 1500), 2)
+        blocks = [
+            f"<p>Thanks for shopping at {store}. Your items were picked up in store.</p>"
+            f"<p>Invoice number: INV-{self.rng.randint(1000000, 9999999)}</p>",
+            _table([["Item", "Accessory bundle"], ["Total paid", f"${total:.2f}"]]),
+        ]
+        return f"receipts@{domain}", f"Your receipt from {store}", "Receipt", blocks, None
+
+    def _services_receipt(self, user_id: str):
+        brand, domain, headline, line = self.rng.choice(SERVICES)
+        total = round(self.rng.uniform(8, 80), 2)
+        blocks = [f"<p>{headline}.</p>", _table([[line, f"${total:.2f}"], ["Total", f"${total:.2f}"]])]
+        return f"receipts@{domain}", f"Your {brand} receipt", headline, blocks, None
+
+
+    def seed_tables(self) -> Dict[str, List[dict]]:
+        """
+        DB rows for the orders and returns later emails refer to but whose own
+        confirmation email is not in the corpus (placed before it starts).
+        """
+        orders = [
+            {"user_id": order["user_id"], "user_email": f"user{self.users.index(order['user_id'])}@example.com",
+             "retailer": order["retailer"], "order_id": order["order_id"], "order_date": order["order_date"], **item}
+            for order in self.orders if not order["emailed"] for item in order["items"]
+        ]
+        returns = [
+            {"return_id": ret["return_id"], "order_id": ret["order"]["order_id"],
+             "retailer": ret["order"]["retailer"], "status": "return approved", **item}
+            for ret in self.returns if not ret["emailed"] for item in ret["items"]
+        ]
+        return {"order_details": orders, "returns_refunds": returns}
+
+
+class Corpus:
+    """Generated emails indexed by id, for the stand-ins to look up by reference token."""
+
+    def __init__(self, emails: List[SyntheticEmail]):
+        self.emails = emails
+        self.by_id = {email.row["id"]: email for email in emails}
+
+    def find(self, text: str) -> List[SyntheticEmail]:
+        """Emails whose reference token appears in `text`, in order of appearance."""
+        return [self.by_id[int(m.group(1))] for m in REF_PATTERN.finditer(text) if int(m.group(1)) in self.by_id]
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: emails, per-category counts and body size percentiles (bytes).
+        """
+        sizes = sorted(email.size for email in self.emails)
+        counts: Dict[str, int] = {}
+        for email in self.emails:
+            counts[email.category] = counts.get(email.category, 0) + 1
+
+        def pct(q: float) -> int:
+            return sizes[min(len(sizes) - 1, int(q * len(sizes)))] if sizes else 0
+
+        return {"emails": len(self.emails), "categories": counts,
+                "size_p50": pct(0.5), "size_p95": pct(0.95), "size_max": sizes[-1] if sizes else 0}
+
+
+def main():
+    import orjson
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic email corpus")
+    parser.add_argument("--emails", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--body-kb-median", type=float, default=BODY_KB_MEDIAN)
+    parser.add_argument("--body-kb-sigma", type=float, default=BODY_KB_SIGMA)
+    parser.add_argument("--items-mean", type=float, default=ITEMS_MEAN)
+    parser.add_argument("--out", metavar="PATH", help="Write rows + ground truth as JSONL")
+    args = parser.parse_args()
+
+    generator = CorpusGenerator(seed=args.seed, users=args.users, body_kb_median=args.body_kb_median,
+                                body_kb_sigma=args.body_kb_sigma, items_mean=args.items_mean)
+    corpus = Corpus(generator.generate(args.emails))
+    stats = corpus.summary()
+    print(f"🧪 {stats['emails']} emails | body p50 {stats['size_p50'] / 1024:.1f}KB | "
+          f"p95 {stats['size_p95'] / 1024:.1f}KB | max {stats['size_max'] / 1024:.1f}KB")
+    for category, count in sorted(stats["categories"].items(), key=lambda kv: -kv[1]):
+        print(f"   {category}: {count}")
+
+    if args.out:
+        with open(args.out, "wb") as f:
+            for email in corpus.emails:
+                f.write(orjson.dumps({"row": email.row, "category": email.category,
+                                      "extraction": email.extraction}) + b"\n")
+        print(f"💾 Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+📈 loadgen/driver.py
+
+Open-loop load driver for capacity planning.
+
+Synthetic emails (`loadgen.corpus`) arrive on a schedule that does not wait for
+the pipeline: at a fixed rate, as a Poisson process, or as Poisson with bursts
+(BURST_FACTOR x the rate for BURST_LENGTH seconds every BURST_EVERY seconds).
+Each arrival goes through a `FairScheduler` realtime lane into `run_email`,
+exactly like a realtime email, while OpenAI and Supabase are replaced by the
+local stand-ins of `loadgen/standins.py` (configurable latency, LLM capacity and
+error rate). Latency is measured from the scheduled arrival, so queueing counts.
+
+Each rate of `--rates` is one step; the step results form the latency curve, and
+the first step that misses the offered rate (throughput below 90%), the p95
+SLO (`--slo`) or keeps more than 1% failures marks the saturation point:
+
+    python -m loadgen.driver --rates 1,2,4,8 --duration 30 --arrival bursty --json curve.json
+
+The stand-ins run as threads in the driver's process; their work is mostly
+sleeping, but on a small machine they do compete with the pipeline for CPU.
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+from typing import List, Optional
+
+ARRIVAL_PROCESSES = ("fixed", "poisson", "bursty")
+BURST_FACTOR = float(os.getenv("BURST_FACTOR", "5"))
+BURST_EVERY = float(os.getenv("BURST_EVERY", "30"))
+BURST_LENGTH = float(os.getenv("BURST_LENGTH", "5"))
+
+# Saturation criteria
+MIN_THROUGHPUT_RATIO = 0.9
+MAX_FAILURE_RATIO = 0.01
+
+
+def arrival_times(process: str, rate: float, duration: float, rng: random.Random,
+                  burst_factor: float = BURST_FACTOR, burst_every: float = BURST_EVERY,
+                  burst_length: float = BURST_LENGTH) -> List[float]:
+    """
+    Arrival offsets (seconds from the start of the step) for an open-loop step.
+
+    Args:
+        process (str): "fixed" (every 1/rate s), "poisson" (exponential gaps) or
+                       "bursty" (Poisson at burst_factor x rate during the first
+                       burst_length s of every burst_every s, at `rate` otherwise).
+    """
+    if process not in ARRIVAL_PROCESSES:
+        raise ValueError(f"unknown arrival process {process!r}")
+    if process == "fixed":
+        return [i / rate for i in range(int(duration * rate))]
+
+    times, now = [], 0.0
+    while True:
+        in_burst = process == "bursty" and now % burst_every < burst_length
+        current = rate * burst_factor if in_burst else rate
+        gap = rng.expovariate(current)
+        if in_burst and now + gap > now - now % burst_every + burst_length:
+            # The burst ended before the next arrival: continue from its end at the base rate
+            now = now - now % burst_every + burst_length
+            continue
+        now += gap
+        if now >= duration:
+            return times
+        times.append(now)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_step(rate: float, duration: float, times: List[float], rows: List[dict],
+                   concurrency: Optional[int], drain_timeout: float) -> dict:
+    """
+    Fire `rows` at `times` (open loop) and wait for them to finish.
+
+    Throughput is completions over the step window, stretched by however long the
+    backlog took to drain beyond a typical email's latency.
+
+    Returns:
+        dict: rate, offered and achieved throughput (emails/s), arrivals, completed, failed,
+              unfinished, latency percentiles (seconds, from the scheduled arrival) and
+              peak in-flight emails.
+    """
+    from workflow.graph import run_email
+    from workflow.scheduler import REALTIME, SCHEDULER_CONCURRENCY, FairScheduler
+
+    scheduler = FairScheduler(concurrency=concurrency or SCHEDULER_CONCURRENCY)
+    latencies: List[float] = []
+    failed = 0
+    in_flight = peak = 0
+    last_done = 0.0
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def process(row: dict, scheduled: float) -> None:
+        nonlocal failed, in_flight, peak, last_done
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await scheduler.run(row["user_id"], REALTIME, lambda: run_email(row, f"load-{row['id']}"))
+            latencies.append(loop.time() - scheduled)
+        except Exception:
+            failed += 1
+        finally:
+            in_flight -= 1
+            last_done = loop.time() - start
+
+    tasks = []
+    for offset, row in zip(times, rows):
+        delay = start + offset - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(process(row, start + offset)))
+
+    done, pending = await asyncio.wait(tasks, timeout=drain_timeout) if tasks else (set(), set())
+    for task in pending:
+        task.cancel()
+    await scheduler.close()
+
+    p50 = _percentile(latencies, 0.5)
+    window = max(duration, last_done - p50)
+    return {
+        "rate": rate,
+        "offered": len(tasks) / duration,
+        "throughput": len(latencies) / window,
+        "arrivals": len(tasks),
+        "completed": len(latencies),
+        "failed": failed,
+        "unfinished": len(pending),
+        "latency_p50": p50,
+        "latency_p95": _percentile(latencies, 0.95),
+        "latency_p99": _percentile(latencies, 0.99),
+        "latency_max": max(latencies, default=0.0),
+        "peak_in_flight": peak,
+        "scheduler": scheduler.summary(),
+    }
+
+
+def saturation_reason(step: dict, slo: float) -> Optional[str]:
+    """Why a step counts as saturated, or None if the pipeline kept up."""
+    if step["throughput"] < MIN_THROUGHPUT_RATIO * step["offered"]:
+        return "throughput below offered rate"
+    if step["latency_p95"] > slo:
+        return f"p95 above {slo:.1f}s SLO"
+    if step["arrivals"] and (step["failed"] + step["unfinished"]) / step["arrivals"] > MAX_FAILURE_RATIO:
+        return "failures"
+    return None
+
+
+def start_standins(args, corpus, seed_tables: dict):
+    """
+    Start the LLM and DB stand-ins and point the pipeline's environment at them.
+    Must run before any pipeline module reads its configuration.
+    """
+    from loadgen.standins import FakeLLMServer, FakePostgrest, LatencyModel
+
+    llm = FakeLLMServer(corpus, ttft=LatencyModel(args.llm_ttft_ms, seed=args.seed), token_ms=args.llm_token_ms,
+                        capacity=args.llm_capacity, error_rate=args.llm_error_rate, seed=args.seed).start()
+    db = FakePostgrest(LatencyModel(args.db_latency_ms, seed=args.seed + 1), tables=seed_tables).start()
+
+    os.environ["LLM_BASE_URL"] = f"{llm.url}/v1"
+    os.environ["OPENAI_API_KEY"] = "stand-in"
+    os.environ["SUPABASE_URL"] = db.url
+    os.environ["SUPABASE_SERVICE_ROLE_KEY"] = os.environ["SUPABASE_KEY"] = "stand.in.key"
+    return llm, db
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Open-loop load test against local LLM / DB stand-ins")
+    parser.add_argument("--rates", default="1,2,4", help="Comma-separated arrival rates (emails/s), one step each")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of arrivals per step")
+    parser.add_argument("--arrival", choices=ARRIVAL_PROCESSES, default="poisson")
+    parser.add_argument("--burst-factor", type=float, default=BURST_FACTOR)
+    parser.add_argument("--burst-every", type=float, default=BURST_EVERY)
+    parser.add_argument("--burst-length", type=float, default=BURST_LENGTH)
+    parser.add_argument("--concurrency", type=int, help="Scheduler concurrency (default: SCHEDULER_CONCURRENCY)")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="Max seconds to wait for a step to finish")
+    parser.add_argument("--slo", type=float, default=10, help="p95 latency SLO in seconds")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--body-kb-median", type=float)
+    parser.add_argument("--items-mean", type=float)
+    parser.add_argument("--llm-ttft-ms", type=float, default=400, help="Median LLM time to first token")
+    parser.add_argument("--llm-token-ms", type=float, default=8, help="LLM generation time per output token")
+    parser.add_argument("--llm-capacity", type=int, default=0, help="Concurrent LLM calls before 429s (0 = unlimited)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--db-latency-ms", type=float, default=15, help="Median DB request latency")
+    parser.add_argument("--json", metavar="PATH", help="Write the step results to PATH")
+    return parser.parse_args()
+
+
+async def run(args: argparse.Namespace) -> List[dict]:
+    from loadgen.corpus import Corpus, CorpusGenerator
+
+    rng = random.Random(args.seed)
+    rates = [float(rate) for rate in args.rates.split(",") if rate]
+    schedules = [arrival_times(args.arrival, rate, args.duration, rng, args.burst_factor,
+                               args.burst_every, args.burst_length) for rate in rates]
+
+    options = {key: value for key, value in (("body_kb_median", args.body_kb_median),
+                                              ("items_mean", args.items_mean)) if value is not None}
+    generator = CorpusGenerator(seed=args.seed, users=args.users, **options)
+    corpus = Corpus(generator.generate(sum(len(times) for times in schedules)))
+    stats = corpus.summary()
+    print(f"🧪 Corpus: {stats['emails']} emails | body p50 {stats['size_p50'] / 1024:.1f}KB | "
+          f"p95 {stats['size_p95'] / 1024:.1f}KB")
+
+    llm, db = start_standins(args, corpus, generator.seed_tables())
+    print(f"🎭 Stand-ins: LLM {llm.url} | DB {db.url}")
+
+    from workflow.graph import get_workflow
+
+    await asyncio.to_thread(get_workflow)
+
+    results, offset = [], 0
+    for rate, times in zip(rates, schedules):
+        rows = [email.row for email in corpus.emails[offset:offset + len(times)]]
+        offset += len(times)
+        print(f"\n📈 Step: {args.arrival} arrivals @ {rate:g}/s for {args.duration:g}s ({len(times)} emails)")
+        step = await run_step(rate, args.duration, times, rows, args.concurrency, args.drain_timeout)
+        step["saturated"] = saturation_reason(step, args.slo)
+        results.append(step)
+
+    llm.stop()
+    db.stop()
+    print_results(results, llm.summary(), db.summary())
+    return results
+
+
+def print_results(results: List[dict], llm_stats: dict, db_stats: dict) -> None:
+    print("\n📊 Latency curve (from scheduled arrival)")
+    for step in results:
+        print(f"{step['rate']:>6g}/s | done {step['completed']}/{step['arrivals']} | "
+              f"offered {step['offered']:.2f}/s | throughput {step['throughput']:.2f}/s | p50 {step['latency_p50']:.2f}s | "
+              f"p95 {step['latency_p95']:.2f}s | p99 {step['latency_p99']:.2f}s | "
+              f"peak in flight {step['peak_in_flight']} | failed {step['failed']} | "
+              f"{step['saturated'] or 'ok'}")
+
+    saturated = next((step for step in results if step["saturated"]), None)
+    if saturated:
+        print(f"\n🧱 Saturation at ~{saturated['rate']:g} emails/s ({saturated['saturated']})")
+    elif results:
+        print(f"\n✅ No saturation up to {results[-1]['rate']:g} emails/s")
+
+    calls = {key.split(":", 1)[1]: count for key, count in llm_stats.items() if key.startswith("calls:")}
+    print(f"🎭 LLM stand-in: {sum(calls.values())} calls {calls} | "
+          f"{llm_stats.get('rate_limited', 0)} rate-limited | {llm_stats.get('errors', 0)} errors")
+    print(f"🎭 DB stand-in: {sum(db_stats['requests'].values())} requests | rows {db_stats['rows']}")
+
+
+def main():
+    args = parse_args()
+    start = time.perf_counter()
+    results = asyncio.run(run(args))
+    print(f"⏱️ Load test finished in {time.perf_counter() - start:.1f}s")
+
+    from main import print_usage_summary
+
+    print_usage_summary()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f"💾 Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
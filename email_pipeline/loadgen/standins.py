@@ -0,0 +1,474 @@
+"""
+🎭 loadgen/standins.py
+
+Local stand-ins for OpenAI and Supabase, so load tests run without live services
+and without paying for tokens.
+
+- `FakeLLMServer`: an OpenAI-compatible `/v1/chat/completions` endpoint (plain,
+  JSON-mode, structured outputs, logprobs and streaming). It recognizes the prompt
+  by its system message (`prompts.registry.PROMPTS`), finds the email by its
+  reference token (`loadgen.corpus.REF_PATTERN`) and answers with the corpus' ground
+  truth. Latency is time-to-first-token plus per-output-token time, both log-normal;
+  requests above `capacity` concurrent calls get a 429 like a real rate limit.
+- `FakePostgrest`: the PostgREST subset the pipeline uses (select with
+  eq/neq/gt/gte/lt/lte/like/ilike/in/is filters, `or`, order, limit; insert, upsert,
+  update, delete) over in-memory tables, with log-normal latency.
+
+Both are `ThreadingHTTPServer`s started on an ephemeral local port. Point the
+pipeline at them with LLM_BASE_URL=`llm.url` and SUPABASE_URL=`db.url` before the
+pipeline modules are imported (see `loadgen/driver.py`).
+"""
+
+import re
+import time
+import random
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+from loadgen.corpus import Corpus
+
+# Primary keys of the tables the pipeline writes (others default to "id")
+TABLE_KEYS = {"order_details": "entry_id", "returns_refunds": "id", "dead_letter_emails": "id", "email_extracts": "id"}
+
+
+class LatencyModel:
+    """Log-normal latency with the given median (ms); sigma controls the tail."""
+
+    def __init__(self, median_ms: float, sigma: float = 0.5, seed: Optional[int] = None):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        """One latency in seconds."""
+        if self.median_ms <= 0:
+            return 0.0
+        with self._lock:
+            return self.median_ms / 1000 * self._rng.lognormvariate(0, self.sigma)
+
+
+class _StandIn:
+    """Threaded local HTTP server with request metrics."""
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        handler = type("Handler", (self.handler_class,), {"standin": self})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.metrics = defaultdict(int)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "_StandIn":
+        self._thread = threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.metrics[key] += amount
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    standin: _StandIn
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        import orjson
+
+        length = int(self.headers.get("Content-Length") or 0)
+        return orjson.loads(self.rfile.read(length)) if length else None
+
+    def _send_json(self, status: int, payload, headers: Optional[Dict[str, str]] = None) -> None:
+        import orjson
+
+        data = orjson.dumps(payload)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+# --------------------------------------------------
+# 🤖 OpenAI-compatible LLM stand-in
+# --------------------------------------------------
+
+class _LLMHandler(_JSONHandler):
+    standin: "FakeLLMServer"
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        self.standin.handle(self, self._body())
+
+    def send_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeLLMServer(_StandIn):
+    """
+    OpenAI chat-completions stand-in answering from a synthetic corpus.
+
+    Args:
+        corpus (Corpus): Emails (and ground truth) the prompts will contain.
+        ttft (LatencyModel): Time to first token.
+        token_ms (float): Generation time per output token (~4 characters).
+        capacity (int): Concurrent requests served before answering 429 (0 = unlimited).
+        error_rate (float): Share of requests failing with a 500.
+    """
+
+    handler_class = _LLMHandler
+
+    def __init__(self, corpus: Corpus, ttft: Optional[LatencyModel] = None, token_ms: float = 8.0,
+                 capacity: int = 0, error_rate: float = 0.0, seed: int = 7, **kwargs):
+        super().__init__(**kwargs)
+        self.corpus = corpus
+        self.ttft = ttft or LatencyModel(400)
+        self.token_ms = token_ms
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._active = 0
+        self._prompts: Optional[Dict[str, str]] = None
+        self._seen_prefixes: set = set()
+
+    def _prompt_name(self, system: str) -> Optional[str]:
+        if self._prompts is None:
+            from prompts.registry import PROMPTS
+
+            self._prompts = {prompt.system: name for name, prompt in PROMPTS.items()}
+        return self._prompts.get(system)
+
+    def answer(self, name: Optional[str], user: str) -> str:
+        """The content the model would return for prompt `name`."""
+        import orjson
+
+        if name == "classify":
+            found = self.corpus.find(user)
+            return found[0].category if found else "promos"
+        if name == "classify_batch":
+            blocks = re.split(r"^### Email (\S+)$", user, flags=re.MULTILINE)[1:]
+            labels = {}
+            for key, text in zip(blocks[::2], blocks[1::2]):
+                found = self.corpus.find(text)
+                labels[key] = found[0].category if found else "promos"
+            return orjson.dumps(labels).decode()
+        if name == "fallback_match":
+            return "{}"
+
+        from LLM.extractor import EXTRACTION_SPECS
+        from loadgen.corpus import CATEGORY_SCHEMAS, _truth
+
+        schema = EXTRACTION_SPECS[name][1] if name in EXTRACTION_SPECS else None
+        found = self.corpus.find(user)
+        if found and found[0].extraction and CATEGORY_SCHEMAS.get(found[0].category) is schema:
+            return orjson.dumps(found[0].extraction).decode()
+        # Misrouted email or unknown prompt: a valid but empty extraction
+        return orjson.dumps(_truth(schema, {}, []) if schema else {}).decode()
+
+    def handle(self, request: _LLMHandler, body: dict) -> None:
+        with self._lock:
+            over = self.capacity and self._active >= self.capacity
+            failed = not over and self._rng.random() < self.error_rate
+            if not over and not failed:
+                self._active += 1
+        if over:
+            self.count("rate_limited")
+            request._send_json(429, {"error": {"message": "Rate limit reached (stand-in capacity)",
+                                               "type": "requests", "code": "rate_limit_exceeded"}},
+                               {"retry-after-ms": "200"})
+            return
+        if failed:
+            self.count("errors")
+            request._send_json(500, {"error": {"message": "stand-in failure", "type": "server_error"}})
+            return
+
+        try:
+            messages = body.get("messages") or []
+            system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+            user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+            name = self._prompt_name(system)
+            content = self.answer(name, user)
+            self.count(f"calls:{name}")
+
+            prompt_tokens = (len(system) + len(user)) // 4
+            with self._lock:
+                cached = len(system) // 4 if system in self._seen_prefixes else 0
+                self._seen_prefixes.add(system)
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": max(1, len(content) // 4),
+                     "total_tokens": prompt_tokens + max(1, len(content) // 4),
+                     "prompt_tokens_details": {"cached_tokens": cached}}
+
+            time.sleep(self.ttft.sample())
+            if body.get("stream"):
+                self._stream(request, body, content, usage)
+            else:
+                time.sleep(usage["completion_tokens"] * self.token_ms / 1000)
+                request._send_json(200, self._completion(body, content, usage))
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def _completion(self, body: dict, content: str, usage: dict) -> dict:
+        logprobs = None
+        if body.get("logprobs"):
+            logprobs = {"content": [{"token": content, "logprob": -0.01, "bytes": None, "top_logprobs": []}]}
+        return {
+            "id": f"chatcmpl-standin-{time.monotonic_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stand-in"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content, "refusal": None},
+                         "logprobs": logprobs, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    def _stream(self, request: _LLMHandler, body: dict, content: str, usage: dict) -> None:
+        import orjson
+
+        request.send_response(200)
+        request.send_header("Content-Type", "text/event-stream")
+        request.send_header("Transfer-Encoding", "chunked")
+        request.end_headers()
+
+        base = {"id": f"chatcmpl-standin-{time.monotonic_ns()}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": body.get("model", "stand-in")}
+
+        def event(choices: list, **extra) -> None:
+            request.send_chunk(b"data: " + orjson.dumps({**base, "choices": choices, **extra}) + b"\n\n")
+
+        event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        step = 16  # ~4 tokens per chunk
+        for start in range(0, len(content), step):
+            time.sleep(4 * self.token_ms / 1000)
+            event([{"index": 0, "delta": {"content": content[start:start + step]}, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            event([], usage=usage)
+        request.send_chunk(b"data: [DONE]\n\n")
+        request.send_chunk(b"")
+
+    def summary(self) -> dict:
+        with self._lock:
+            return dict(self.metrics)
+
+
+# --------------------------------------------------
+# 🗄️ PostgREST stand-in
+# --------------------------------------------------
+
+def _split_top_level(text: str) -> List[str]:
+    """Split on commas outside quotes and parentheses."""
+    parts, depth, quoted, current = [], 0, False, []
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif char == "," and not quoted and depth == 0:
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current))
+    return [part for part in parts if part]
+
+
+def _unquote(value: str) -> str:
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+
+def _compare(row_value, value: str) -> Tuple[object, object]:
+    """Bring a filter value to the row value's type for ordering comparisons."""
+    if isinstance(row_value, (int, float)) and not isinstance(row_value, bool):
+        try:
+            return row_value, float(value)
+        except ValueError:
+            pass
+    return str(row_value), value
+
+
+def _matches(row: dict, column: str, expression: str) -> bool:
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    op, _, value = expression.partition(".")
+    row_value = row.get(column)
+
+    if op == "is":
+        result = row_value is None if value == "null" else str(row_value).lower() == value
+    elif op == "in":
+        result = str(row_value) in {_unquote(v) for v in _split_top_level(value.strip("()"))}
+    elif op in ("like", "ilike"):
+        pattern = re.escape(_unquote(value)).replace(r"\*", ".*").replace("%", ".*")
+        flags = re.IGNORECASE | re.DOTALL if op == "ilike" else re.DOTALL
+        result = row_value is not None and re.fullmatch(pattern, str(row_value), flags) is not None
+    elif op in ("eq", "neq"):
+        equal = row_value is not None and str(row_value if not isinstance(row_value, bool)
+                                              else str(row_value).lower()) == _unquote(value)
+        result = equal if op == "eq" else not equal
+    elif op in ("gt", "gte", "lt", "lte"):
+        if row_value is None:
+            return False
+        left, right = _compare(row_value, _unquote(value))
+        result = {"gt": left > right, "gte": left >= right, "lt": left < right, "lte": left <= right}[op]
+    else:
+        raise ValueError(f"unsupported filter operator {op!r}")
+    return not result if negate else result
+
+
+def _matches_or(row: dict, group: str) -> bool:
+    for condition in _split_top_level(group.strip("()")):
+        column, _, expression = condition.partition(".")
+        if _matches(row, column, expression):
+            return True
+    return False
+
+
+class _PostgrestHandler(_JSONHandler):
+    standin: "FakePostgrest"
+
+    def _route(self):
+        parts = urlsplit(self.path)
+        table = parts.path.rstrip("/").rsplit("/", 1)[-1]
+        return table, parse_qsl(parts.query, keep_blank_values=True)
+
+    def _handle(self, method: str) -> None:
+        table, params = self._route()
+        try:
+            body = self._body() if method in ("POST", "PATCH") else None
+            status, payload = self.standin.request(method, table, params, body, self.headers.get("Prefer") or "")
+        except ValueError as e:
+            status, payload = 400, {"message": str(e), "code": "PGRST100"}
+        self._send_json(status, payload)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+class FakePostgrest(_StandIn):
+    """
+    In-memory PostgREST stand-in (`/rest/v1/<table>`).
+
+    Args:
+        latency (LatencyModel): Per-request latency.
+        tables (Dict[str, List[dict]]): Initial rows per table.
+    """
+
+    handler_class = _PostgrestHandler
+
+    def __init__(self, latency: Optional[LatencyModel] = None, tables: Optional[Dict[str, List[dict]]] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency or LatencyModel(15)
+        self.tables: Dict[str, List[dict]] = defaultdict(list)
+        self._next_id: Dict[str, int] = defaultdict(lambda: 1)
+        for table, rows in (tables or {}).items():
+            self._insert(table, rows)
+
+    def _insert(self, table: str, rows: List[dict]) -> List[dict]:
+        pk = TABLE_KEYS.get(table, "id")
+        inserted = []
+        for row in rows:
+            row = dict(row)
+            if row.get(pk) is None:
+                row[pk] = self._next_id[table]
+            self._next_id[table] = max(self._next_id[table], int(row[pk]) + 1)
+            self.tables[table].append(row)
+            inserted.append(row)
+        return inserted
+
+    def _filter(self, table: str, params: List[Tuple[str, str]]) -> List[dict]:
+        rows = self.tables[table]
+        for key, value in params:
+            if key in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+                continue
+            if key == "or":
+                rows = [row for row in rows if _matches_or(row, value)]
+            else:
+                rows = [row for row in rows if _matches(row, key, value)]
+        return rows
+
+    def request(self, method: str, table: str, params: List[Tuple[str, str]], body, prefer: str):
+        time.sleep(self.latency.sample())
+        self.count(f"{method} {table}")
+        options = dict(params)
+        with self._lock:
+            if method == "GET":
+                rows = self._filter(table, params)
+                for term in reversed(_split_top_level(options.get("order", ""))):
+                    column, _, direction = term.partition(".")
+                    rows = sorted(rows, key=lambda row: (row.get(column) is None, row.get(column)),
+                                  reverse=direction.startswith("desc"))
+                offset = int(options.get("offset", 0))
+                rows = rows[offset:offset + int(options["limit"])] if "limit" in options else rows[offset:]
+                columns = [_unquote(c.strip()) for c in options.get("select", "*").split(",")]
+                if "*" not in columns:
+                    rows = [{c: row.get(c) for c in columns} for row in rows]
+                return 200, [dict(row) for row in rows]
+
+            if method == "POST":
+                rows = body if isinstance(body, list) else [body]
+                if "merge-duplicates" in prefer:
+                    return 201, self._upsert(table, rows, options.get("on_conflict") or TABLE_KEYS.get(table, "id"))
+                return 201, self._insert(table, rows)
+
+            if method == "PATCH":
+                rows = self._filter(table, params)
+                for row in rows:
+                    row.update(body or {})
+                return 200, [dict(row) for row in rows]
+
+            if method == "DELETE":
+                doomed = {id(row) for row in self._filter(table, params)}
+                removed = [row for row in self.tables[table] if id(row) in doomed]
+                self.tables[table] = [row for row in self.tables[table] if id(row) not in doomed]
+                return 200, removed
+        raise ValueError(f"unsupported method {method}")
+
+    def _upsert(self, table: str, rows: List[dict], key: str) -> List[dict]:
+        existing = {row.get(key): row for row in self.tables[table]}
+        result = []
+        for row in rows:
+            current = existing.get(row.get(key))
+            if current is not None and row.get(key) is not None:
+                current.update(row)
+                result.append(dict(current))
+            else:
+                result.extend(self._insert(table, [row]))
+        return result
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {"requests": dict(self.metrics), "rows": {table: len(rows) for table, rows in self.tables.items()}}
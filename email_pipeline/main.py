@@ -1,12 +1,19 @@
 import os
 import time
 import asyncio
+import argparse
 from dotenv import load_dotenv
-from typing import Optional
-from parser.email_parser import clean_email_html
-from realtime import AsyncRealtimeClient, RealtimeSubscribeStates
-from supabase_client import supabase
-from workflow.graph import workflow  # LangGraph workflow
+from supabase_client import dead_letter
+from workflow.graph import get_workflow, run_email  # LangGraph workflow, compiled on first use
+from workflow.scheduler import BACKFILL, REALTIME, FairScheduler, scheduler
+from workflow.journal import journal
+from workflow.prefilter import prefilter
+from utils.profiling import profiler
+from LLM.usage import usage_store
+from LLM.cascade import cascade_stats
+from LLM.speculation import SPECULATIVE_PREFETCH, speculative_prefetcher
+from supabase_client.db_client import row_cache
+from supabase_client.queries import email_page_query
 
 # Load environment variables
 load_dotenv()
@@ -21,6 +28,112 @@ def get_realtime_url(database_url: str) -> str:
     return f"wss://{database_url.split('//')[1]}/realtime/v1"
 
 
+def print_usage_summary():
+    """
+    Print LLM tokens, cache hits, latency and cost per graph node and per retailer.
+    """
+    from parser.fingerprint import template_store
+    from parser.item_index import item_index
+    from parser.identifiers import identifier_stats
+    from nodes.classify import classification_batcher
+
+    for group in ("node", "retailer"):
+        stats = usage_store.summary(by=(group,))
+        if not stats:
+            continue
+        print(f"\n💸 LLM Usage by {group}")
+        for key, entry in sorted(stats.items(), key=lambda kv: -kv[1]["cost_usd"]):
+            print(f"{key}: {entry['calls']} calls | in {entry['prompt_tokens']} "
+                  f"(cached {entry['cache_ratio']:.0%}) | out {entry['completion_tokens']} | "
+                  f"avg {entry['avg_wall_time']:.2f}s | ${entry['cost_usd']:.4f}")
+
+    stats = cascade_stats.summary()
+    if stats:
+        print("\n🪜 Model cascade")
+        for node, entry in sorted(stats.items()):
+            for tier, tier_stats in entry["tiers"].items():
+                print(f"{node} / {tier}: {tier_stats['calls']} calls | "
+                      f"escalated {tier_stats['escalation_rate']:.0%} | failed {tier_stats['failed']} | "
+                      f"p50 {tier_stats['latency_p50']:.2f}s | p95 {tier_stats['latency_p95']:.2f}s")
+            if entry["reasons"]:
+                print(f"{node} escalation reasons: {entry['reasons']}")
+
+    if classification_batcher is not None:
+        stats = classification_batcher.summary()
+        print(f"\n📦 Classification batches: {stats['items']} emails in {stats['batches']} calls | "
+              f"avg {stats['avg_batch_size']:.1f} per call | {stats['unanswered']} classified alone | "
+              f"{stats['failed_batches']} failed batches")
+
+    if SPECULATIVE_PREFETCH:
+        stats = speculative_prefetcher.summary()
+        print(f"\n🔮 Speculation: {stats.get('started', 0)} started | {stats.get('hits', 0)} hits | "
+              f"{stats.get('misses', 0)} misses | hit rate {stats['hit_rate']:.0%}")
+
+    if template_store is not None:
+        stats = template_store.summary()
+        print(f"\n🧬 Templates: {stats['templates']} known | {stats['trusted']} trusted | "
+              f"{stats['local']} local extractions | {stats['sampled']} sampled | "
+              f"{stats['sample_mismatch']} sample mismatches")
+
+    if identifier_stats:
+        print(f"\n🔎 Identifier fast path: {dict(identifier_stats)}")
+
+    if item_index is not None:
+        stats = item_index.summary()
+        print(f"\n🧲 Item index: {stats['items']} items in {stats['orders']} orders | "
+              f"{stats['hits']} hits | {stats['misses']} misses")
+
+    if journal.enabled:
+        stats = journal.summary()
+        print(f"\n📓 Journal: {stats['in_flight']} in flight | {stats['resumed']}/{stats['recovered']} recovered resumed | "
+              f"{stats['cached_nodes']} nodes and {stats['cached_extractions']} extractions reused | "
+              f"{stats['skipped_writes']} writes skipped | {stats['compactions']} compactions")
+
+    if prefilter is not None:
+        stats = prefilter.summary()
+        print(f"\n🚦 Pre-filter: {stats['dropped']}/{stats['checked']} dropped ({stats['drop_rate']:.0%}) | "
+              f"{stats['trusted']}/{stats['senders']} learned senders trusted | {stats['hits']} table hits")
+        for reason, entry in stats["reasons"].items():
+            print(f"{reason}: {entry['matched']} matched | {entry['dropped']} dropped | {entry['audited']} audited | "
+                  f"{entry['false_negatives']} false negatives ({entry['fn_rate']:.0%})")
+
+    if profiler.metrics["emails"]:
+        print(f"\n🔥 Profiles: {profiler.metrics['emails']} emails | {profiler.metrics['samples']} samples | "
+              f"{profiler.metrics['files']} files in {profiler.out_dir}/")
+        for node, entry in sorted(profiler.summary().items(), key=lambda kv: -kv[1]["seconds"]):
+            shares = ", ".join(f"{category} {share:.0%}" for category, share in entry["categories"].items())
+            print(f"{node}: {entry['seconds']:.2f}s sampled | {shares}")
+            for name, seconds in entry["hot_spots"]:
+                print(f"    {seconds:.2f}s  {name}")
+
+    stats = row_cache.summary()
+    print(f"\n🗄️ Row cache: {stats['keys']} orders cached | {stats.get('hits', 0)} hits | "
+          f"{stats.get('misses', 0)} misses | hit rate {stats['hit_rate']:.0%} | "
+          f"{stats.get('evictions', 0)} evicted | {stats.get('expired', 0)} expired")
+
+
+def print_scheduler_summary(fair_scheduler: FairScheduler):
+    """
+    Print the concurrency limit, queue wait percentiles per lane and the busiest tenants' backlogs.
+    """
+    stats = fair_scheduler.summary()
+    concurrency = stats["concurrency"]
+    if "decisions" in concurrency:
+        decisions = ", ".join(f"{reason} {count}" for reason, count in concurrency["decisions"].items()) or "none"
+        print(f"\n🎚️ Adaptive concurrency: limit {concurrency['limit']} ({concurrency['min']}-{concurrency['max']}) | "
+              f"latency {concurrency['latency_recent']:.2f}s vs baseline {concurrency['latency_baseline']:.2f}s | "
+              f"errors {concurrency['error_rate']:.0%} | decisions: {decisions}")
+    for lane in (REALTIME, BACKFILL):
+        entry = stats[lane]
+        if entry["queued"]:
+            print(f"\n⚖️ {lane}: {entry['done']}/{entry['queued']} done | "
+                  f"wait p50 {entry['wait_p50']:.2f}s | p99 {entry['wait_p99']:.2f}s")
+    busiest = sorted(stats["tenants"].items(), key=lambda kv: -kv[1]["backlog"])[:5]
+    for user_id, entry in busiest:
+        if entry["backlog"] or entry["running"]:
+            print(f"   tenant {user_id}: {entry['running']} running | {entry['backlog']} queued")
+
+
 async def load_test_pipeline(batch_size: int = 50):
     """
     Process the latest `batch_size` emails sequentially to test pipeline accuracy/performance.
@@ -28,11 +141,7 @@ async def load_test_pipeline(batch_size: int = 50):
     print(f"\n🚀 Running load test on {batch_size} recent emails...")
 
     try:
-        response = supabase.table("email_extracts") \
-            .select("*") \
-            .order("id", desc=True) \
-            .limit(batch_size) \
-            .execute()
+        response = email_page_query("email_extracts", limit=batch_size, newest_first=True).execute()
 
         emails = response.data
         if not emails:
@@ -42,14 +151,10 @@ async def load_test_pipeline(batch_size: int = 50):
         durations = []
         for index, email in enumerate(emails, 1):
             email_id = email["id"]
-            email["msg"] = clean_email_html(email["msg"])
             start = time.perf_counter()
 
             try:
-                await workflow.ainvoke(
-                    {"record": email},
-                    {"configurable": {"thread_id": str(email_id)}}
-                )
+                await run_email(email, str(email_id))
                 elapsed = time.perf_counter() - start
                 durations.append(elapsed)
             except Exception:
@@ -59,6 +164,7 @@ async def load_test_pipeline(batch_size: int = 50):
             print("\n📊 Load Test Results")
             print(f"Total: {len(durations)} | Avg: {sum(durations)/len(durations):.2f}s | "
                   f"Min: {min(durations):.2f}s | Max: {max(durations):.2f}s")
+            print_usage_summary()
 
     except Exception as e:
         print(f"❌ Load test error: {e}")
@@ -67,97 +173,204 @@ async def load_test_pipeline(batch_size: int = 50):
 async def load_test_pipeline_parallel(batch_size: int = 50, concurrency: int = 5):
     """
     Parallel load test to simulate high-throughput pipeline execution.
+
+    Emails go through a `FairScheduler` backfill lane, so per-tenant quotas and
+    fair sharing between users apply exactly as in a real backfill. With
+    ADAPTIVE_CONCURRENCY=1, `concurrency` is only the starting limit.
     """
     print(f"\n🚀 Parallel load test: {batch_size} emails @ concurrency {concurrency}")
 
     try:
-        response = supabase.table("email_extracts") \
-            .select("*") \
-            .order("id", desc=True) \
-            .limit(batch_size) \
-            .execute()
+        response = email_page_query("email_extracts", limit=batch_size, newest_first=True).execute()
 
         emails = response.data
         if not emails:
             print("⚠️ No emails found.")
             return
 
-        semaphore = asyncio.Semaphore(concurrency)
+        load_scheduler = FairScheduler(concurrency=concurrency)
         durations = []
 
         async def process(email: dict, index: int):
-            async with semaphore:
-                email_id = email["id"]
-                start = time.perf_counter()
-                try:
-                    await workflow.ainvoke(
-                        {"record": email},
-                        {"configurable": {"thread_id": str(email_id)}}
-                    )
-                    durations.append(time.perf_counter() - start)
-                except Exception:
-                    print(f"❌ Failed email ID {email_id}")
+            email_id = email["id"]
+            start = time.perf_counter()
+            try:
+                await load_scheduler.run(email.get("user_id"), BACKFILL, lambda: run_email(email, str(email_id)))
+                durations.append(time.perf_counter() - start)
+            except Exception:
+                print(f"❌ Failed email ID {email_id}")
 
         await asyncio.gather(*[
             process(email, i + 1) for i, email in enumerate(emails)
         ])
+        await load_scheduler.close()
 
         if durations:
             print("\n📊 Parallel Load Test Results")
             print(f"Total: {len(durations)} | Avg: {sum(durations)/len(durations):.2f}s | "
                   f"Min: {min(durations):.2f}s | Max: {max(durations):.2f}s")
+            print_scheduler_summary(load_scheduler)
+            print_usage_summary()
 
     except Exception as e:
         print(f"❌ Parallel test error: {e}")
 
 
-async def handle_realtime_event(payload: dict):
+async def handle_realtime_email(email: dict, source: str = "live"):
     """
-    Callback for new email insert from Supabase Realtime.
-    Triggers the LangGraph workflow.
+    Process a new email_extracts row delivered (or caught up) by the realtime supervisor.
+
+    Live and gap-recovered emails take the realtime lane of the fair scheduler;
+    catch-up pages (possibly a long outage's worth) and journal resumes take the
+    backfill lane, so they never hold back new mail.
     """
-    email = payload["data"]["record"]
     email_id = email["id"]
+    lane = BACKFILL if source in ("caught_up", "resumed") else REALTIME
 
     start = time.perf_counter()
     try:
-        await workflow.ainvoke(
-            {"record": email},
-            {"configurable": {"thread_id": str(email_id)}}
-        )
+        await scheduler.run(email.get("user_id"), lane, lambda: run_email(email, str(email_id)))
         print(f"📩 Processed realtime email ID {email_id} in {time.perf_counter() - start:.2f}s")
-    except Exception:
-        print(f"🔥 Realtime processing failed for email ID {email_id}")
+    except Exception as e:
+        print(f"🔥 Realtime processing failed for email ID {email_id}: {e}")
+        dead_letter.record_dead_letter(email, e)
 
 
-async def main():
+async def resume_in_flight(rows: list):
+    """
+    Finish the emails the processing journal recorded as in flight when the process died.
+
+    Each one resumes from its journaled stages (see `workflow/journal.py`): finished
+    nodes and LLM extractions are not run again and journaled inserts are skipped.
+    """
+    if not rows:
+        return
+    print(f"\n📓 Resuming {len(rows)} email(s) left in flight at the last shutdown...")
+    await asyncio.gather(*(handle_realtime_email(row, "resumed") for row in rows))
+
+
+async def resume_journal():
     """
-    Entry point: Connects to Supabase Realtime and listens for new inserts.
+    `--resume`: finish the journal's in-flight emails (e.g. after a crashed load test) and exit.
     """
-    realtime_url = get_realtime_url(SUPABASE_URL)
-    client = AsyncRealtimeClient(realtime_url, SUPABASE_ANON_KEY)
-    channel = client.channel("realtime:public:email_extracts")
+    rows = journal.recovered()
+    if not rows:
+        print("📭 No emails in flight in the processing journal.")
+        return
+    await resume_in_flight(rows)
+    await scheduler.close()
+    print_usage_summary()
+
+
+async def redrive_dead_letters(limit: int = 100):
+    """
+    Re-run the workflow for pending dead-lettered emails.
+
+    Spooled entries (written while the DB was unreachable) are flushed into the
+    table first. Emails run through the backfill lane of the fair scheduler.
+    Successful emails are marked 'redriven'; failures stay pending with an
+    incremented attempt count.
+    """
+    flushed = dead_letter.flush_spool()
+    if flushed:
+        print(f"💾 Flushed {flushed} spooled dead letter(s) into the DB")
+
+    pending = dead_letter.fetch_pending(limit)
+    if not pending:
+        print("📭 No pending dead letters.")
+        return
+
+    print(f"\n♻️ Redriving {len(pending)} dead-lettered email(s)...")
+
+    async def redrive(entry: dict) -> bool:
+        email = entry["payload"]
+        try:
+            await scheduler.run(email.get("user_id"), BACKFILL, lambda: run_email(email, f"redrive-{entry['id']}"))
+            dead_letter.mark_redriven(entry["id"])
+            return True
+        except Exception as e:
+            print(f"❌ Redrive failed for email ID {email.get('id')}: {e}")
+            dead_letter.mark_failed_again(entry, e)
+            return False
 
-    def on_insert(payload, ref=None):
-        asyncio.create_task(handle_realtime_event(payload))
+    succeeded = sum(await asyncio.gather(*(redrive(entry) for entry in pending)))
+    await scheduler.close()
+    print(f"✅ Redrive complete: {succeeded}/{len(pending)} succeeded")
 
-    def on_subscribe(status: RealtimeSubscribeStates, err: Optional[Exception]):
-        print(f"🟢 Realtime Subscribed" if not err else f"🔴 Subscribe failed: {err}")
 
-    channel.on_postgres_changes(
-        event="INSERT",
-        schema="public",
-        table="email_extracts",
-        callback=on_insert
-    )
+async def main():
+    """
+    Entry point: Listens for new inserts through the supervised Supabase Realtime listener.
 
-    await channel.subscribe(on_subscribe)
-    await client.connect()
+    The listener reconnects with backoff and catches up on emails inserted while it
+    was disconnected (see `workflow/listener.py`). The workflow is compiled in a
+    background thread while the first connection is set up.
 
-    print("✅ Pipeline is now listening for new emails...")
-    while True:
-        await asyncio.sleep(1)
+    With PROCESSING_JOURNAL=1, emails in flight at the last shutdown resume from the
+    journal: those above the realtime checkpoint come back through catch-up, the
+    others (no checkpoint yet, load tests, redrives) are resumed here.
+    """
+    from workflow.listener import RealtimeSupervisor
+
+    warmup = asyncio.create_task(asyncio.to_thread(get_workflow))
+    supervisor = RealtimeSupervisor(handle_realtime_email, get_realtime_url(SUPABASE_URL), SUPABASE_ANON_KEY)
+
+    last_id = supervisor.watermark.value
+    recovered = [row for row in journal.recovered() if last_id is None or row["id"] <= last_id]
+    resume = asyncio.create_task(resume_in_flight(recovered)) if recovered else None
+    try:
+        await supervisor.run(warmup)
+    finally:
+        if resume:
+            resume.cancel()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Email classification & extraction pipeline")
+    parser.add_argument("--redrive", action="store_true",
+                        help="Reprocess pending dead-lettered emails and exit")
+    parser.add_argument("--resume", action="store_true",
+                        help="Finish the emails left in flight in the processing journal and exit")
+    parser.add_argument("--limit", type=int, default=100,
+                        help="Max dead letters to redrive (default: 100)")
+    parser.add_argument("--load-test", type=int, metavar="N",
+                        help="Run the pipeline on the latest N emails and exit")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Concurrency for --load-test (default: 1, sequential)")
+    parser.add_argument("--usage-export", metavar="PATH",
+                        help="Write per-call LLM usage records to PATH (.csv or .json) on exit")
+    parser.add_argument("--profile", type=float, nargs="?", const=1.0, metavar="RATE",
+                        help="Profile this fraction of emails (default: all) into PROFILE_DIR")
+    return parser.parse_args()
+
+
+def export_usage(path: str):
+    """
+    Export the collected LLM usage records as CSV or JSON depending on the extension.
+    """
+    if path.endswith(".csv"):
+        usage_store.export_csv(path)
+    else:
+        usage_store.export_json(path)
+    print(f"💾 Exported {len(usage_store.records())} LLM usage record(s) to {path}")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    if args.profile is not None:
+        profiler.sample_rate = args.profile
+    try:
+        if args.redrive:
+            asyncio.run(redrive_dead_letters(args.limit))
+        elif args.resume:
+            asyncio.run(resume_journal())
+        elif args.load_test and args.concurrency > 1:
+            asyncio.run(load_test_pipeline_parallel(args.load_test, args.concurrency))
+        elif args.load_test:
+            asyncio.run(load_test_pipeline(args.load_test))
+        else:
+            asyncio.run(main())
+    finally:
+        journal.close()
+        if args.usage_export:
+            export_usage(args.usage_export)
@@ -1,25 +1,159 @@
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
-from typing import Dict
+import os
+import math
+import time
+import functools
+from typing import List, Optional
 from shared.types import AgentState
-from prompts.templates import CLASSIFICATION_TEMPLATE
+from prompts.registry import CLASSIFY_BATCH_ITEM, PROMPTS
+from LLM.batching import MicroBatcher
+from LLM.cascade import ModelTier, run_cascade, tiers_for
+from LLM.extractor import query_openai
+from LLM.usage import record_langchain_usage, shared_usage_context
 
 # --------------------------------------------------
 # 🧠 Setup: Classification Chain using GPT-4o-mini
 # --------------------------------------------------
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.1)
-parser = StrOutputParser()
+# Labels the classifier may return (see CLASSIFICATION_INSTRUCTIONS)
+CLASSIFICATION_LABELS = frozenset({
+    "promos", "goods receipt", "retailer order confirmation", "retailer shipping confirmation",
+    "services receipt", "shipping update", "return confirmation", "return update", "refund",
+    "retailer order update",
+})
 
-classification_prompt = PromptTemplate.from_template(CLASSIFICATION_TEMPLATE)
-classification_chain = classification_prompt | llm | parser
+# Below this label probability a cheaper tier escalates to the next one
+CLASSIFY_MIN_CONFIDENCE = float(os.getenv("CLASSIFY_MIN_CONFIDENCE", "0.8"))
+
+# Micro-batching (CLASSIFY_BATCH_SIZE > 1): emails arriving within the window share one call
+CLASSIFY_BATCH_SIZE = int(os.getenv("CLASSIFY_BATCH_SIZE", "1"))
+CLASSIFY_BATCH_WINDOW_MS = float(os.getenv("CLASSIFY_BATCH_WINDOW_MS", "100"))
+CLASSIFY_BATCH_CONCURRENCY = int(os.getenv("CLASSIFY_BATCH_CONCURRENCY", "4"))
+
+
+@functools.lru_cache(maxsize=None)
+def get_llm(tier: Optional[ModelTier] = None, logprobs: bool = False):
+    """
+    Classification model for a cascade tier, created (and LangChain/OpenAI imported) on first use.
+    """
+    from langchain_openai import ChatOpenAI
+
+    tier = tier or tiers_for("classify")[0]
+    return ChatOpenAI(
+        model=tier.model,
+        temperature=tier.temperature,
+        max_tokens=tier.max_tokens,
+        base_url=tier.base_url,
+        api_key=tier.api_key,
+        logprobs=logprobs or None,
+    )
+
+
+def label_confidence(response) -> Optional[float]:
+    """
+    Probability of the whole returned label (product of its token probabilities),
+    or None when the endpoint did not return logprobs.
+    """
+    tokens = ((getattr(response, "response_metadata", None) or {}).get("logprobs") or {}).get("content")
+    if not tokens:
+        return None
+    return math.exp(sum(token["logprob"] for token in tokens))
+
+
+def check_classification(response) -> Optional[str]:
+    """
+    Cascade check: escalate unknown labels and low-probability answers.
+    """
+    if response.content.strip().lower() not in CLASSIFICATION_LABELS:
+        return "unknown label"
+    confidence = label_confidence(response)
+    if confidence is not None and confidence < CLASSIFY_MIN_CONFIDENCE:
+        return "low confidence"
+    return None
+
+
+# Precompiled prompt: the static definitions/examples are one shared SystemMessage
+# (byte-identical on every call, so it hits OpenAI's prompt cache) and only the
+# email fields are joined into the human message -- no ChatPromptTemplate parsing.
+classification_prompt = PROMPTS["classify"]
+
+
+# --------------------------------------------------
+# 📦 Micro-batched classification
+# --------------------------------------------------
+
+def classify_batch(records: List[dict]) -> List[Optional[str]]:
+    """
+    Classify several emails in one call that returns a key -> category JSON map.
+
+    Returns:
+        List[Optional[str]]: One label per record; None where the answer is missing or
+                             not a known label (the caller classifies that email alone).
+    """
+    if len(records) == 1:
+        # Nothing to amortize: the single-email prompt is just as cheap
+        return [None]
+
+    emails = "".join(
+        CLASSIFY_BATCH_ITEM.render(
+            key=str(index),
+            from_field=record.get("from", ""),
+            subject=record.get("subject", ""),
+            body=record.get("msg", "")
+        )
+        for index, record in enumerate(records, 1)
+    )
+    # The call serves many emails: each is charged an equal share (email, retailer, user)
+    with shared_usage_context(records, node="classify"):
+        labels = query_openai(PROMPTS["classify_batch"].messages(emails=emails), name="classify_batch")
+    if not isinstance(labels, dict):
+        return [None] * len(records)
+
+    results = []
+    for index in range(1, len(records) + 1):
+        label = str(labels.get(str(index)) or "").strip().lower()
+        results.append(label if label in CLASSIFICATION_LABELS else None)
+    return results
+
+
+classification_batcher: Optional[MicroBatcher] = MicroBatcher(
+    classify_batch,
+    max_size=CLASSIFY_BATCH_SIZE,
+    window_s=CLASSIFY_BATCH_WINDOW_MS / 1000,
+    concurrency=CLASSIFY_BATCH_CONCURRENCY,
+    name="classify"
+) if CLASSIFY_BATCH_SIZE > 1 else None
 
 
 # --------------------------------------------------
 # 🔎 Node: Email Classification
 # --------------------------------------------------
 
+def classify_single(email_record: dict) -> str:
+    """
+    Classify one email with its own call through the classification cascade.
+
+    Cheap tiers escalate to the next model when the label is unknown or its
+    probability is below CLASSIFY_MIN_CONFIDENCE (see `LLM.cascade`).
+    """
+    messages = classification_prompt.langchain_messages(
+        from_field=email_record.get("from", ""),
+        subject=email_record.get("subject", ""),
+        body=email_record.get("msg", "")
+    )
+
+    tiers = tiers_for("classify")
+
+    def invoke(tier: ModelTier):
+        start = time.perf_counter()
+        # Token logprobs are only needed to decide whether to escalate
+        response = get_llm(tier, logprobs=tier is not tiers[-1]).invoke(messages)
+        record_langchain_usage("classify", response, time.perf_counter() - start)
+        return response
+
+    response = run_cascade("classify", invoke, check=check_classification, label="classify")
+    return response.content.strip().lower()
+
+
 def classify_node(state: AgentState) -> dict:
     """
     LangGraph node: Classify an incoming email based on its sender, subject, and body.
@@ -27,25 +161,26 @@ def classify_node(state: AgentState) -> dict:
     This uses an OpenAI prompt to categorize the email into one of:
     promos, refund, return confirmation, order update, shipping update, etc.
 
+    With CLASSIFY_BATCH_SIZE > 1 the email waits up to CLASSIFY_BATCH_WINDOW_MS to be
+    classified together with other emails in one call; emails the batch could not
+    label are classified on their own.
+
     Args:
         state (AgentState): Current pipeline state containing full email record.
 
     Returns:
         dict: A dictionary with a single key: 'category', indicating the classification result.
+
+    Raises:
+        RetryExhaustedError: If the LLM keeps failing after all retries.
     """
     email_record = state["record"]
 
-    try:
-        classification_input = {
-            "from_field": email_record.get("from", ""),
-            "subject": email_record.get("subject", ""),
-            "body": email_record.get("msg", "")
-        }
-
-        category = classification_chain.invoke(classification_input).strip().lower()
-        print(f"📂 Email classified as: {category}")
-        return {"category": category}
+    category = None
+    if classification_batcher is not None:
+        category = classification_batcher.submit(email_record).result()
+    if category is None:
+        category = classify_single(email_record)
 
-    except Exception as e:
-        print(f"❌ Classification error: {e}")
-        return {"category": "unknown"}
+    print(f"📂 Email classified as: {category}")
+    return {"category": category}
@@ -1,9 +1,38 @@
-import json
 from shared.types import AgentState
-from LLM.extractor import query_openai
-from parser.email_parser import parse_item_details
-from prompts.templates import PROMPT_TEMPLATE
+from LLM.extractor import extract_email
+from LLM.streaming import STREAM_EXTRACTION, ItemPipeline
+from parser.normalize import normalize_items
+from parser.item_index import item_index
 from supabase_client import supabase
+from supabase_client.db_client import execute_write
+from workflow.journal import journal
+
+
+def build_order_row(email_record: dict, order_info: dict, item) -> dict:
+    """
+    Combine one extracted item with the order fields (normalized in bulk by `insert_order_rows`).
+    """
+    return {
+        "user_email": email_record.get("user_email"),
+        "user_id": email_record.get("user_id"),
+        **order_info,
+        **item.model_dump()
+    }
+
+
+def insert_order_rows(order_rows: list) -> None:
+    """
+    Normalize rows in one pass (description split into base/color/size, canonical
+    colors/sizes/dates/prices, see `parser.normalize`), insert them into
+    `order_details` and index them (with their entry_ids) for later linking.
+    """
+    order_rows = normalize_items(order_rows, split_desc=True)
+    print(f"✅ Inserting {len(order_rows)} order items into DB...")
+    response = execute_write(supabase.table("order_details").insert(order_rows), "order_details")
+
+    # Index the inserted rows (with their entry_ids) for later shipping/return linking
+    if item_index:
+        item_index.add(response.data or [])
 
 
 def extract_order_node(state: AgentState) -> dict:
@@ -14,6 +43,11 @@ def extract_order_node(state: AgentState) -> dict:
     - Normalizes product attributes (desc, color, size)
     - Inserts cleaned item records into Supabase `order_details`
 
+    With STREAM_EXTRACTION=1 each item is inserted as soon as the model has finished
+    generating it, while the remaining items are still streaming in. Inserts are
+    journaled per item in both modes (PROCESSING_JOURNAL=1), so a resumed email does
+    not insert an item twice, even if STREAM_EXTRACTION changed in between.
+
     Args:
         state (AgentState): Contains the full email record.
 
@@ -21,69 +55,46 @@ def extract_order_node(state: AgentState) -> dict:
         dict: Empty dict (used for chaining, no intermediate output needed here)
     """
     email_record = state["record"]
+    email_id = email_record.get("id")
 
     # ------------------------------------------
-    # 🧠 Step 1: Generate prompt and call OpenAI
+    # 🧠 Step 1: Call OpenAI; top-level order fields arrive before the items
     # ------------------------------------------
-    prompt = PROMPT_TEMPLATE.format(
-        subject=email_record.get("subject", ""),
-        body=email_record.get("msg", "")
-    )
+    order_info = {}
+    order_rows = []
+    pipeline = ItemPipeline() if STREAM_EXTRACTION else None
 
-    extracted = query_openai(prompt)
-    if not extracted:
-        return {}
+    def on_field(key, value):
+        if key == "order_info":
+            order_info.clear()
+            order_info.update(value.model_dump())
 
     # ------------------------------------------
-    # 📦 Step 2: Extract top-level order fields
+    # 🧾 Step 2: Normalize and enrich each item (inserted right away when streaming)
     # ------------------------------------------
-    order_field_names = [
-        "retailer", "order_id", "order_date", "order_total", "tax_total",
-        "shipping_total", "discount_total", "shipping_address", "zip_code", "archive_flag"
-    ]
-
-    item_field_names = [
-        "item_desc", "item_price", "item_sku", "item_qty", "item_color", "item_size",
-        "item_discount", "image_name", "item_tax", "item_shipping", "shipping_method",
-        "tracking_num", "expected_deliv_date", "status", "carrier", "actual_deliv_date"
-    ]
+    def on_item(item):
+        row = build_order_row(email_record, order_info, item)
+        if pipeline:
+            key = f"item-{len(order_rows)}"
+            order_rows.append(row)
+            pipeline.submit(journal.write_once, email_id, "order", key, lambda: insert_order_rows([row]))
+        else:
+            order_rows.append(row)
 
-    raw_order_info = extracted.get("order_info", {}) or {}
-    order_info = {field: raw_order_info.get(field, None) for field in order_field_names}
-
-    # ------------------------------------------
-    # 🧾 Step 3: Normalize and enrich each item
-    # ------------------------------------------
-    order_rows = []
-    for item in extracted.get("items", []) or []:
-        item_data = {field: item.get(field, None) for field in item_field_names}
-
-        # Normalize item description (split out base/size/color)
-        raw_description = (item.get("item_desc") or "").strip()
-        base_desc, parsed_color, parsed_size = parse_item_details(raw_description)
-
-        item_data["item_desc"] = base_desc
-        item_data["item_color"] = item.get("item_color") or parsed_color or None
-        item_data["item_size"] = item.get("item_size") or parsed_size or None
-        item_data["item_sku"] = item_data.get("item_sku") or ""
-
-        # Combine all data into a single row
-        row = {
-            "user_email": email_record.get("user_email"),
-            "user_id": email_record.get("user_id"),
-            **order_info,
-            **item_data
-        }
-        order_rows.append(row)
+    try:
+        extracted = extract_email("order", email_record, on_field=on_field, on_item=on_item)
+    finally:
+        # Let inserts already dispatched finish even if the stream failed
+        if pipeline:
+            pipeline.wait()
+    if not extracted:
+        return {}
 
     # ------------------------------------------
-    # 💾 Step 4: Insert rows into Supabase
+    # 💾 Step 3: Insert rows into Supabase
     # ------------------------------------------
-    try:
-        if order_rows:
-            print(f"✅ Inserting {len(order_rows)} order items into DB...")
-            supabase.table("order_details").insert(order_rows).execute()
-    except Exception as e:
-        print(f"❌ DB insert error: {e}")
+    if order_rows and not pipeline:
+        journal.write_each_once(email_id, "order", [f"item-{n}" for n in range(len(order_rows))],
+                                lambda pending: insert_order_rows([order_rows[n] for n in pending]))
 
     return {}
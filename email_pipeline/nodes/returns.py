@@ -0,0 +1,334 @@
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from LLM.extractor import EXTRACTION_SPECS, extract_email, match_item_desc_via_gpt_returns
+from LLM.streaming import STREAM_EXTRACTION, ItemPipeline
+from parser.item_index import ITEM_INDEX, match_candidate
+from parser.normalize import normalize_items
+from supabase_client import supabase
+from supabase_client.db_client import PRIMARY_KEYS, execute, execute_write
+from supabase_client.queries import NORMALIZED_FIELDS, return_candidates_query, rows_by_key_query, text_contains
+from shared.types import AgentState
+from workflow.journal import journal
+
+# --------------------------------------------------
+# ↩️ Returns engine (refund / return_confirmation / return_update)
+# --------------------------------------------------
+#
+# All three return categories write item-level rows into `returns_refunds` and
+# only differ in their prompt/schema, so they share one pipeline and one update
+# policy (the one the three original nodes each implemented):
+#
+#   extract -> merge summary + items -> one fetch of every candidate row
+#   (matching columns only) -> in-memory match per item (field match, local
+#   index, GPT fallback) -> one fetch of the matched rows in full
+#   -> one bulk upsert of matched rows + one bulk insert of new rows
+#
+# With STREAM_EXTRACTION=1 candidates for the return summary are fetched and each
+# item is matched while the model is still generating the next ones; the bulk
+# writes happen once the stream is complete.
+
+RETURNS_TABLE = "returns_refunds"
+
+# Identifiers that are always present (empty string instead of null) on written rows
+KEY_FIELDS = ("return_id", "order_id", "user_email")
+
+# Item attributes compared (case-insensitive contains) when matching an existing row
+MATCH_FIELDS = ("return_item_desc", "return_item_color", "return_item_size")
+
+# Fields never overwritten once the matched row has a value
+PROTECTED_FIELDS = ("return_id", "order_id", "return_item_desc")
+
+
+@dataclass(frozen=True)
+class ReturnsCategory:
+    """
+    One return category of the returns engine.
+
+    Attributes:
+        node (str): Graph node / `EXTRACTION_SPECS` key (prompt + schema).
+        label (str): Human-readable name used in log lines.
+    """
+    node: str
+    label: str
+
+    @property
+    def schema(self):
+        return EXTRACTION_SPECS[self.node][1]
+
+
+RETURN_CATEGORIES: Dict[str, ReturnsCategory] = {
+    "refund": ReturnsCategory(node="refund", label="refund"),
+    "return_confirmation": ReturnsCategory(node="return_confirmation", label="return confirmation"),
+    "return_update": ReturnsCategory(node="return_update", label="return update"),
+}
+
+
+def _contains(needle: Optional[str], haystack: Optional[str]) -> bool:
+    """Case-insensitive substring test (the in-memory equivalent of `ilike %needle%`)."""
+    return bool(needle) and needle.lower() in (haystack or "").lower()
+
+
+def merge_items(return_info: dict, items: List[dict]) -> List[dict]:
+    """
+    Combine the email-level return summary with each item (item fields win) and
+    normalize all of them in one pass (canonical colors/sizes/dates/amounts).
+    """
+    merged = []
+    for item in items:
+        row = {**return_info, **item}
+        for key in KEY_FIELDS:
+            row[key] = row.get(key) or ""
+        merged.append(row)
+    return normalize_items(merged, prefix="return_")
+
+
+def candidate_filters(merged: List[dict]) -> set:
+    """PostgREST `or` filters for rows whose return_id or order_id contains an extracted ID."""
+    return {
+        f'{field}.ilike."*{row[field]}*"'
+        for row in merged for field in ("return_id", "order_id") if row[field]
+    }
+
+
+def fetch_candidates(merged: List[dict]) -> List[dict]:
+    """
+    Fetch every row that could match any item of the email in a single query.
+
+    Rows match when their return_id or order_id contains one of the extracted IDs.
+    """
+    return _fetch_filtered(candidate_filters(merged))
+
+
+def _fetch_filtered(filters: set) -> List[dict]:
+    if not filters:
+        return []
+    return execute(return_candidates_query(filters), label=RETURNS_TABLE).data or []
+
+
+def _upsert_payload(full_row: dict, changes: dict) -> dict:
+    """Full row + changes, without the generated `*_norm` columns (not writable)."""
+    generated = {f"{field}_norm" for field in NORMALIZED_FIELDS[RETURNS_TABLE]}
+    return {k: v for k, v in {**full_row, **changes}.items() if k not in generated}
+
+
+def match_item(item: dict, candidates: List[dict]) -> Optional[dict]:
+    """
+    Find the existing row for one item, narrowing the candidates the same way
+    the per-node lookups did: return_id + order_id, then return_id, then order_id.
+    Within each tier: attribute match, local embedding match, then GPT.
+    """
+    return_id, order_id = item["return_id"], item["order_id"]
+    tiers = []
+    if return_id and order_id:
+        tiers.append(("return id and order id", [
+            row for row in candidates
+            if _contains(return_id, row.get("return_id")) and _contains(order_id, row.get("order_id"))
+        ]))
+    if return_id:
+        tiers.append(("return id only", [row for row in candidates if _contains(return_id, row.get("return_id"))]))
+    if order_id:
+        tiers.append(("order id only", [row for row in candidates if _contains(order_id, row.get("order_id"))]))
+
+    item_desc = item.get("return_item_desc") or ""
+    for name, rows in tiers:
+        if not rows:
+            continue
+        for row in rows:
+            if all(not item.get(field) or text_contains(item[field], row, field) for field in MATCH_FIELDS):
+                print(f"✅ Field-based match found ({name}).")
+                return row
+
+        # Local embedding match first; GPT only if nothing is similar enough
+        if ITEM_INDEX:
+            local_match = match_candidate(item_desc, rows, prefix="return_")
+            if local_match:
+                return local_match
+
+        print(f"🤖 Trying GPT fallback match {name}")
+        gpt_match = match_item_desc_via_gpt_returns(item_desc, rows)
+        if gpt_match:
+            return gpt_match
+    return None
+
+
+def build_update(item: dict, row: dict) -> dict:
+    """
+    The values to write for an item: extracted values that are set, minus the
+    `PROTECTED_FIELDS` the matched row already has (`row` is {} for an insert).
+    """
+    cleaned = {
+        k: v for k, v in item.items()
+        if v is not None and (k != "return_item_desc" or str(v).strip() != "")
+    }
+    for field in PROTECTED_FIELDS:
+        if row.get(field):
+            cleaned.pop(field, None)
+    return cleaned
+
+
+def _update_by_identity(row: dict, changes: dict):
+    """Update one row by its identifying columns (rows fetched without a primary key)."""
+    query = supabase.table(RETURNS_TABLE).update(changes)
+    for key in ("return_id", "order_id", "return_item_desc", "return_item_sku", "return_item_size", "return_item_color"):
+        if row.get(key):
+            query = query.eq(key, row[key])
+    return execute_write(query, RETURNS_TABLE)
+
+
+class ReturnsSync:
+    """
+    Matches items as they arrive and accumulates the writes for one email.
+
+    Candidate rows are fetched once per new set of IDs (matching columns only), so a
+    whole email normally costs one fetch; `flush` reads the matched rows in full and
+    performs the bulk upsert + insert.
+    """
+
+    def __init__(self, category: ReturnsCategory, email_id: Optional[int] = None):
+        self.category = category
+        self.email_id = email_id
+        self.candidates: List[dict] = []
+        self._fetched: set = set()
+        self.updates: Dict[object, dict] = {}  # pk -> changes
+        self.unkeyed_updates: List[Tuple[dict, dict]] = []
+        self.inserts: List[dict] = []
+        self._count = 0
+
+    def prefetch(self, merged: List[dict]) -> None:
+        """Fetch candidates for IDs not fetched yet."""
+        filters = candidate_filters(merged) - self._fetched
+        if filters:
+            # Same canonical colors/sizes as the items they are compared with
+            self.candidates.extend(normalize_items(_fetch_filtered(filters), prefix="return_"))
+            self._fetched |= filters
+
+    def add(self, item: dict) -> None:
+        """Match one merged item against the candidates and queue its update or insert."""
+        self._count += 1
+        print(f"\n🔹 Item {self._count} — {item.get('return_item_desc') or ''}")
+        self.prefetch([item])
+        row = match_item(item, self.candidates)
+        if not row:
+            print("🆕 No match found. Will insert new record.")
+            self.inserts.append(build_update(item, {}))
+            return
+
+        pk = PRIMARY_KEYS[RETURNS_TABLE]
+        changes = build_update(item, row)
+        if row.get(pk) is None:
+            self.unkeyed_updates.append((row, changes))
+        else:
+            # Two items resolved to the same row: fold into a single upsert row
+            self.updates.setdefault(row[pk], {}).update(changes)
+
+    def flush(self) -> Tuple[int, int]:
+        """
+        Write all matched updates in one upsert and all new rows in one insert.
+
+        Returns:
+            Tuple[int, int]: (rows updated, rows inserted)
+        """
+        pk = PRIMARY_KEYS[RETURNS_TABLE]
+        if self.updates:
+            # Candidates carry only the matching columns; a bulk upsert needs complete,
+            # uniform rows (NOT NULL columns are checked before the conflict resolves)
+            full_rows = execute(rows_by_key_query(RETURNS_TABLE, pk, self.updates), label=RETURNS_TABLE).data or []
+            payload = [_upsert_payload(row, self.updates[row[pk]]) for row in full_rows if row[pk] in self.updates]
+            if len(payload) < len(self.updates):
+                print(f"⚠️ {len(self.updates) - len(payload)} matched row(s) no longer exist; skipped.")
+            if payload:
+                print(f"🛠️ Upserting {len(payload)} existing {self.category.label} row(s)...")
+                execute_write(supabase.table(RETURNS_TABLE).upsert(payload, on_conflict=pk), RETURNS_TABLE)
+        for row, changes in self.unkeyed_updates:
+            if not _update_by_identity(row, changes).data:
+                print("⚠️ Update ran but returned no data.")
+
+        if self.inserts:
+            print(f"📥 Inserting {len(self.inserts)} new row(s)...")
+            print(json.dumps(self.inserts, indent=2))
+            # Upserts are idempotent; the insert is journaled so a resumed email does not repeat it
+            journal.write_once(self.email_id, self.category.node, "insert", lambda: execute_write(
+                supabase.table(RETURNS_TABLE).insert(self.inserts), RETURNS_TABLE))
+        else:
+            print("📭 No rows to insert.")
+
+        return len(self.updates) + len(self.unkeyed_updates), len(self.inserts)
+
+
+def sync_returns(category: ReturnsCategory, merged: List[dict], email_id: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Match every item against one candidate fetch and write all changes in bulk.
+
+    Returns:
+        Tuple[int, int]: (rows updated, rows inserted)
+    """
+    sync = ReturnsSync(category, email_id)
+    sync.prefetch(merged)
+    for item in merged:
+        sync.add(item)
+    return sync.flush()
+
+
+def build_returns_node(category: ReturnsCategory):
+    """
+    Create the LangGraph node function for one return category.
+    """
+    def node(state: AgentState) -> dict:
+        email_record = state["record"]
+        print(f"📨 Extracting {category.label} from email...")
+
+        if not STREAM_EXTRACTION:
+            extracted = extract_email(category.node, email_record)
+            if not extracted:
+                print("❌ No data extracted from OpenAI.")
+                return {}
+            return_info = extracted.return_info.model_dump()
+            items = [item.model_dump() for item in extracted.items]
+
+            print(f"📦 {category.label.capitalize()} Summary Extracted")
+            print(json.dumps(return_info, indent=2))
+
+            sync_returns(category, merge_items(return_info, items), email_record.get("id"))
+            return {}
+
+        # Streaming: fetch candidates as soon as the summary is complete, match items as they arrive
+        return_info: dict = {}
+        sync = ReturnsSync(category, email_record.get("id"))
+        pipeline = ItemPipeline()
+
+        def on_field(key, value):
+            if key == "return_info":
+                return_info.clear()
+                return_info.update(value.model_dump())
+                pipeline.submit(sync.prefetch, merge_items(return_info, [{}]))
+
+        def on_item(item):
+            pipeline.submit(sync.add, merge_items(return_info, [item.model_dump()])[0])
+
+        try:
+            extracted = extract_email(category.node, email_record, on_field=on_field, on_item=on_item)
+        finally:
+            pipeline.wait()
+        if not extracted:
+            print("❌ No data extracted from OpenAI.")
+            return {}
+
+        print(f"📦 {category.label.capitalize()} Summary Extracted")
+        print(json.dumps(return_info, indent=2))
+
+        sync.flush()
+        return {}
+
+    node.__name__ = f"extract_{category.node}_node"
+    node.__doc__ = f"""
+    LangGraph node: Extract {category.label} details and sync them to `{RETURNS_TABLE}`
+    through the shared returns engine (see `nodes/returns.py`). Nothing is added to
+    the graph state: the rows live in the DB, not in every checkpoint.
+    """
+    return node
+
+
+extract_refund_node = build_returns_node(RETURN_CATEGORIES["refund"])
+extract_return_confirmation_node = build_returns_node(RETURN_CATEGORIES["return_confirmation"])
+extract_return_update_node = build_returns_node(RETURN_CATEGORIES["return_update"])
@@ -1,9 +1,11 @@
-import json
-from typing import Dict
-from LLM.extractor import query_openai, match_item_desc_via_gpt
-from parser.email_parser import parse_item_details
-from prompts.templates import SHIPPING_PROMPT_TEMPLATE
+from LLM.extractor import extract_email, release_extraction, match_item_desc_via_gpt
+from parser.identifiers import IDENTIFIER_SKIP_EMPTY, identifier_stats, scan_email
+from parser.item_index import item_index, item_text
+from utils.retry import RetryExhaustedError
+from parser.normalize import normalize_items
 from supabase_client import supabase
+from supabase_client.db_client import execute_write, select_order_rows
+from supabase_client.queries import text_contains, text_equals
 from shared.types import AgentState
 
 
@@ -14,65 +16,78 @@ def extract_shipping_node(state: AgentState) -> dict:
     This function:
     - Parses shipping email using GPT
     - Matches each item to the original order using item_desc, color, size, sku
-    - Falls back to GPT semantic matching if no direct DB match is found
+    - Tries the local item-embedding index (ITEM_INDEX=1) if no direct DB match is found
+    - Falls back to GPT semantic matching as a last resort
     - Updates matching rows with tracking, delivery, carrier, and shipping fields
+
+    A single scanned order ID / tracking number fills LLM gaps. With
+    IDENTIFIER_SKIP_EMPTY=1, emails the scan rules out (no identifier, status or
+    mention of one) are skipped before the LLM call.
     """
     email_record = state["record"]
 
+    identifiers = scan_email(email_record)
+    if IDENTIFIER_SKIP_EMPTY and identifiers.rules_out_shipment:
+        print("⏭️ Skipping shipping confirmation — no order ID, tracking number or shipment mention found.")
+        identifier_stats["skipped:shipping"] += 1
+        release_extraction(email_record)
+        return {}
+
     # Step 1: Send prompt to OpenAI
-    prompt = SHIPPING_PROMPT_TEMPLATE.format(
-        subject=email_record.get("subject", ""),
-        body=email_record.get("msg", "")
-    )
-    extracted = query_openai(prompt)
+    extracted = extract_email("shipping", email_record)
     if not extracted:
         return {}
 
-    order_info = extracted.get("order_info", {}) or {}
-    items = extracted.get("items", []) or []
+    order_info = extracted.order_info
+    tracking = identifiers.single_tracking
+
+    # Normalize all items in one pass (base/color/size split, canonical values)
+    items = normalize_items([item.model_dump() for item in extracted.items], split_desc=True)
 
     for item in items:
         user_id = email_record.get("user_id")
-        order_id = (order_info.get("order_id") or "").strip()
+        order_id = order_info.order_id or identifiers.single_order_id or ""
 
-        # Normalize item description
-        raw_desc = item.get("item_desc", "").strip()
-        base_desc, parsed_color, parsed_size = parse_item_details(raw_desc)
+        if tracking:
+            item["tracking_num"] = item["tracking_num"] or tracking.number
+            item["carrier"] = item["carrier"] or tracking.carrier
 
-        color = item.get("item_color") or parsed_color
-        size = item.get("item_size") or parsed_size
-        item_sku = (item.get("item_sku") or "").strip()
+        base_desc, color, size, item_sku = item["item_desc"], item["item_color"], item["item_size"], item["item_sku"]
 
         if not all([user_id, order_id, base_desc]):
             continue  # Cannot update without these keys
 
         try:
-            # Step 2: Attempt DB match by user/order/item_desc
-            query = supabase.table("order_details").select("*") \
-                .eq("order_id", order_id) \
-                .eq("item_desc", base_desc) \
-                .eq("user_id", user_id)
-
-            def flexible_filter(q, field, value):
-                if value:
-                    return q.filter(field, "ilike", f"%{value}%")
-                return q
+            # Step 2: Match by item_desc (exact) + color/size/sku (case-insensitive contains)
+            # against the order's rows, read through the per-order cache
+            # (normalized text with DB_NORMALIZED_COLUMNS=1, see supabase_client/queries.py);
+            # rows get the same canonical colors/sizes as the items
+            order_rows = normalize_items(select_order_rows("order_details", user_id, order_id))
+
+            def flexible_match(row, field, value):
+                return not value or text_contains(value, row, field)
+
+            matched_rows = [
+                row for row in order_rows
+                if text_equals(base_desc, row, "item_desc")
+                and flexible_match(row, "item_color", color)
+                and flexible_match(row, "item_size", size)
+                and flexible_match(row, "item_sku", item_sku)
+            ]
 
-            query = flexible_filter(query, "item_color", color)
-            query = flexible_filter(query, "item_size", size)
-            query = flexible_filter(query, "item_sku", item_sku)
+            # Step 3: If no match, link via the local embedding index, then GPT
+            if not matched_rows and item_index:
+                if not item_index.has_order(user_id, order_id):
+                    # Orders inserted before the index existed: warm it once
+                    item_index.add(order_rows)
 
-            response = query.execute()
-            matched_rows = response.data or []
+                local_match = item_index.search(user_id, order_id, [item_text(base_desc, color, size)])[0]
+                if local_match:
+                    print(f"🧲 Linked '{base_desc}' via item index ({local_match[1]:.2f})")
+                    matched_rows = [local_match[0]]
 
-            # Step 3: If no match, use GPT fallback
             if not matched_rows:
-                fallback_query = supabase.table("order_details").select("*") \
-                    .eq("order_id", order_id).eq("user_id", user_id)
-                fallback_response = fallback_query.execute()
-                fallback_candidates = fallback_response.data or []
-
-                best_match = match_item_desc_via_gpt(base_desc, fallback_candidates)
+                best_match = match_item_desc_via_gpt(base_desc, order_rows)
                 if best_match:
                     matched_rows = [best_match]
 
@@ -85,8 +100,8 @@ def extract_shipping_node(state: AgentState) -> dict:
                 "expected_deliv_date", "actual_deliv_date", "carrier", "status"
             ]
             update_data = {field: item.get(field) for field in shipping_fields}
-            update_data["shipping_address"] = order_info.get("shipping_address")
-            update_data["zip_code"] = order_info.get("zip_code")
+            update_data["shipping_address"] = order_info.shipping_address
+            update_data["zip_code"] = order_info.zip_code
 
             # Skip empty update
             if all(value is None for value in update_data.values()):
@@ -96,11 +111,13 @@ def extract_shipping_node(state: AgentState) -> dict:
             for row in matched_rows:
                 update_query = supabase.table("order_details").update(update_data) \
                     .eq("entry_id", row["entry_id"])
-                update_response = update_query.execute()
+                update_response = execute_write(update_query, "order_details")
 
                 if update_response.data:
                     print(f"✅ Shipping info updated for entry_id={row['entry_id']}")
 
+        except RetryExhaustedError:
+            raise
         except Exception as e:
             print(f"❌ Error updating shipping info for order_id={order_id}: {e}")
 
@@ -1,8 +1,11 @@
-import json
-import re
-from LLM.extractor import query_openai
-from prompts.templates import SHIPPING_UPDATE_PROMPT_TEMPLATE
+from LLM.extractor import extract_email, release_extraction
+from parser.identifiers import IDENTIFIER_SHORT_CIRCUIT, IDENTIFIER_SKIP_EMPTY, identifier_stats, scan_email
+from parser.normalize import normalize_item
+from shared.schemas import ShippingUpdateExtraction, ShippingUpdateInfo
+from utils.retry import RetryExhaustedError
 from supabase_client import supabase
+from supabase_client.db_client import execute, execute_write, select_order_rows
+from supabase_client.queries import tracking_rows_query
 from shared.types import AgentState
 
 
@@ -11,37 +14,60 @@ def extract_shipping_update_node(state: AgentState) -> dict:
     LangGraph node: Extract shipping progress update (delivered, delayed, etc.)
     from email and apply updates to `order_details` table in Supabase.
 
+    Identifier fast path (see `parser.identifiers`):
+    - Optionally (IDENTIFIER_SKIP_EMPTY=1) emails the scan rules out (no identifier,
+      status or mention of one) are skipped before any LLM call
+    - Fields the LLM left empty are pre-filled from the scanner
+    - Optionally (IDENTIFIER_SHORT_CIRCUIT=1) the LLM is skipped entirely
+
     Matching logic (in order):
     - Match by user_id + order_id + tracking_num
     - Fallback to user_id + tracking_num
     - Skip update if no match found
     """
-
-    def clean_field(value):
-        """Sanitize values: convert 'null' → None, strip whitespace, trim datetime to date only."""
-        if isinstance(value, str):
-            value = value.strip()
-            if value.lower() == "null":
-                return None
-            if re.match(r"^\d{4}-\d{2}-\d{2}", value):
-                return value[:10]
-        return value
-
     email_record = state["record"]
     user_id = email_record.get("user_id")
 
-    # Generate the prompt and get extracted data
-    prompt = SHIPPING_UPDATE_PROMPT_TEMPLATE.format(
-        subject=email_record.get("subject", ""),
-        body=email_record.get("msg", "")
-    )
-    extracted = query_openai(prompt)
+    if not user_id:
+        print("⏭️ Skipping shipping update — missing user_id.")
+        release_extraction(email_record)
+        return {}
+
+    identifiers = scan_email(email_record)
+    if IDENTIFIER_SKIP_EMPTY and identifiers.rules_out_shipment:
+        print("⏭️ Skipping shipping update — no tracking number, order ID or shipment mention found.")
+        identifier_stats["skipped:shipping_update"] += 1
+        release_extraction(email_record)
+        return {}
+
+    tracking = identifiers.single_tracking
+    if IDENTIFIER_SHORT_CIRCUIT and tracking and identifiers.status:
+        print(f"⚡ Shipping update resolved without LLM: {tracking.carrier} {tracking.number} → {identifiers.status}")
+        identifier_stats["short_circuit"] += 1
+        release_extraction(email_record)
+        extracted = ShippingUpdateExtraction(order_info=ShippingUpdateInfo(
+            order_id=identifiers.single_order_id, shipping_method=None, tracking_num=tracking.number,
+            expected_deliv_date=None, actual_deliv_date=None, status=identifiers.status,
+            carrier=tracking.carrier, shipping_address=None, zip_code=None
+        ))
+    else:
+        # Generate the prompt and get extracted data
+        extracted = extract_email("shipping_update", email_record)
     if not extracted:
         return {}
 
-    shipping_info = extracted.get("order_info", {}) or {}
-    order_id = (shipping_info.get("order_id") or "").strip() or None
-    tracking_number = (shipping_info.get("tracking_num") or "").strip() or None
+    # Values are already stripped and "null"-free (schema); dates are canonicalized here
+    shipping_info = normalize_item(extracted.order_info.model_dump())
+
+    # Pre-fill what the LLM missed from the deterministic scan
+    if tracking:
+        shipping_info["tracking_num"] = shipping_info["tracking_num"] or tracking.number
+        shipping_info["carrier"] = shipping_info["carrier"] or tracking.carrier
+    shipping_info["order_id"] = shipping_info["order_id"] or identifiers.single_order_id
+    shipping_info["status"] = shipping_info["status"] or identifiers.status
+
+    order_id = shipping_info["order_id"]
+    tracking_number = shipping_info["tracking_num"]
 
     if not user_id or not tracking_number:
         print("❌ Skipping update — missing user_id or tracking number.")
@@ -51,19 +77,14 @@ def extract_shipping_update_node(state: AgentState) -> dict:
     try:
         # Step 1: Best match — user_id + order_id + tracking_num
         if order_id:
-            response = supabase.table("order_details").select("*") \
-                .eq("user_id", user_id) \
-                .eq("order_id", order_id) \
-                .eq("tracking_num", tracking_number) \
-                .execute()
-            matching_rows = response.data or []
+            matching_rows = [
+                row for row in select_order_rows("order_details", user_id, order_id)
+                if row.get("tracking_num") == tracking_number
+            ]
 
         # Step 2: Fallback match — user_id + tracking_num
         if not matching_rows:
-            response = supabase.table("order_details").select("*") \
-                .eq("user_id", user_id) \
-                .eq("tracking_num", tracking_number) \
-                .execute()
+            response = execute(tracking_rows_query(user_id, tracking_number), label="order_details")
             matching_rows = response.data or []
 
         if not matching_rows:
@@ -75,9 +96,9 @@ def extract_shipping_update_node(state: AgentState) -> dict:
         # Exclude keys that should never be overwritten
         immutable_fields = {"order_id", "user_id", "item_desc", "item_sku"}
         update_payload = {
-            key: clean_field(value)
+            key: value
             for key, value in shipping_info.items()
-            if key not in immutable_fields and clean_field(value) is not None
+            if key not in immutable_fields and value is not None
         }
 
         for row in matching_rows:
@@ -89,12 +110,14 @@ def extract_shipping_update_node(state: AgentState) -> dict:
             if order_id:
                 update_query = update_query.eq("order_id", order_id)
 
-            update_response = update_query.execute()
+            update_response = execute_write(update_query, "order_details")
             if update_response.data:
                 print(f"✅ Updated entry_id={row['entry_id']}")
             else:
                 print(f"⚠️ No data returned for entry_id={row['entry_id']}")
 
+    except RetryExhaustedError:
+        raise
     except Exception as e:
         print(f"❌ Shipping update failed: {e}")
 
@@ -1,5 +1,10 @@
 import re
-from bs4 import BeautifulSoup
+from shared.types import EmailRecord
+
+# `parse_item_details` formats (shared with the vectorized version in parser/normalize.py)
+DESC_WITH_ATTRIBUTES_PATTERN = re.compile(r"^(.*?)\.\s*([^,]+),\s*(.+)$")
+COLOR_LINE_PATTERN = re.compile(r"Color:\s*(.+)", re.IGNORECASE)
+SIZE_LINE_PATTERN = re.compile(r"Size:\s*(.+)", re.IGNORECASE)
 
 
 def clean_email_html(html: str) -> str:
@@ -12,9 +17,27 @@ def clean_email_html(html: str) -> str:
     Returns:
         str: Cleaned plain-text version with line breaks preserved.
     """
+    from bs4 import BeautifulSoup  # deferred: only needed once an email is processed
+
     return BeautifulSoup(html, 'html.parser').get_text(separator='\n', strip=True)
 
 
+def email_text(record: dict) -> str:
+    """
+    Return the plain text of an email record, cleaning HTML only if the body still contains tags.
+
+    Args:
+        record (dict): email_extracts row (or an `EmailRecord`, whose body is already clean).
+
+    Returns:
+        str: Plain-text body.
+    """
+    if isinstance(record, EmailRecord):
+        return record.msg
+    msg = record.get("msg") or ""
+    return clean_email_html(msg) if "<" in msg and ">" in msg else msg
+
+
 def parse_item_details(description: str) -> tuple[str, str, str]:
     """
     Extract structured attributes (base description, color, size) from a product description string.
@@ -33,7 +56,7 @@ def parse_item_details(description: str) -> tuple[str, str, str]:
         return "", "", ""
 
     # Format 1: "Product Name. Color, Size"
-    match = re.match(r"^(.*?)\.\s*([^,]+),\s*(.+)$", description)
+    match = DESC_WITH_ATTRIBUTES_PATTERN.match(description)
     if match:
         base = match.group(1).strip()
         color = match.group(2).strip()
@@ -42,8 +65,8 @@ def parse_item_details(description: str) -> tuple[str, str, str]:
 
     # Format 2: Multiline with "Color: xyz", "Size: abc"
     base = description.split("\n")[0].strip()
-    color_match = re.search(r"Color:\s*(.+)", description, re.IGNORECASE)
-    size_match = re.search(r"Size:\s*(.+)", description, re.IGNORECASE)
+    color_match = COLOR_LINE_PATTERN.search(description)
+    size_match = SIZE_LINE_PATTERN.search(description)
     color = color_match.group(1).strip() if color_match else ""
     size = size_match.group(1).strip() if size_match else ""
 
@@ -0,0 +1,423 @@
+"""
+🧬 parser/fingerprint.py
+
+Template fingerprinting and learned deterministic extraction.
+
+Large retailers send the same templates over and over. Emails are clustered by
+(sender domain, structural signature, node); from verified LLM extractions we
+learn one regex per field plus one repeating item pattern. Once a template's
+rules have reproduced the LLM output exactly `MIN_VERIFICATIONS` times in a row,
+matching emails are extracted locally. A sample of them (1 in `SAMPLE_EVERY`)
+still goes to the LLM, and any mismatch demotes the template until it is
+re-verified.
+
+Enable with TEMPLATE_EXTRACTION=1. Learned templates persist to TEMPLATE_STORE_PATH.
+"""
+
+import os
+import re
+import json
+import atexit
+import threading
+from datetime import datetime
+from dataclasses import dataclass, field, asdict
+from typing import Optional, Type, get_args, get_origin
+import xxhash
+from pydantic import BaseModel, ValidationError
+from parser.email_parser import email_text
+from utils.helpers import sender_domain
+
+TEMPLATE_EXTRACTION = os.getenv("TEMPLATE_EXTRACTION", "0") == "1"
+TEMPLATE_STORE_PATH = os.getenv("TEMPLATE_STORE_PATH", "templates.json")
+MIN_VERIFICATIONS = int(os.getenv("TEMPLATE_MIN_VERIFICATIONS", "3"))
+SAMPLE_EVERY = int(os.getenv("TEMPLATE_SAMPLE_EVERY", "20"))
+
+# Date renderings tried when locating an extracted YYYY-MM-DD value in the text
+DATE_FORMATS = [
+    "%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%B %d, %Y", "%b %d, %Y", "%b. %d, %Y",
+    "%A, %B %d, %Y", "%a, %b %d, %Y", "%d %B %Y", "%d %b %Y", "%B %d", "%A, %B %d", "%a, %b %d",
+]
+
+_LABEL_MAX = 40
+_LABEL_LINE = re.compile(r"^\s*([^:\d\n]+?)\s*(?::|#|\bno\.)")
+_ITEM_WINDOW_LINES = 4
+
+
+# --------------------------------------------------
+# 🧱 Structural signature
+# --------------------------------------------------
+
+def template_signature(text: str) -> str:
+    """
+    Hash the template's static skeleton: the ordered, de-duplicated labels of
+    label-like lines ("Subtotal:", "Tracking number:", "Order #"), ignoring values,
+    item lines and free text so every email from the same template gets the same signature.
+    """
+    labels = []
+    seen = set()
+    for line in text.splitlines():
+        match = _LABEL_LINE.match(line)
+        if not match:
+            continue
+        label = re.sub(r"\s+", " ", match.group(1)).strip().lower()
+        if 2 < len(label) <= _LABEL_MAX and label not in seen:
+            seen.add(label)
+            labels.append(label)
+    return xxhash.xxh64("\n".join(labels).encode()).hexdigest()
+
+
+# --------------------------------------------------
+# 📏 Rule learning helpers
+# --------------------------------------------------
+
+def _literal(text: str) -> str:
+    """Escape literal text, generalizing digits and whitespace."""
+    parts = re.split(r"(\d+|\s+)", text)
+    out = []
+    for part in parts:
+        if not part:
+            continue
+        if part.isdigit():
+            out.append(r"\d+")
+        elif part.isspace():
+            out.append(r"\s+")
+        else:
+            out.append(re.escape(part))
+    return "".join(out)
+
+
+def _date_shape(rendering: str) -> str:
+    return re.sub(r"\d+", r"\\d{1,4}", re.sub(r"[A-Za-z]+", "[A-Za-z]+", re.escape(rendering)))
+
+
+def _renderings(value) -> list[tuple[str, str, Optional[str]]]:
+    """
+    Candidate textual forms of an extracted value.
+
+    Returns:
+        list: (rendering, kind, date_format) tuples, most specific first.
+    """
+    if isinstance(value, bool) or value is None:
+        return []
+    if isinstance(value, int):
+        return [(str(value), "int", None)]
+    if isinstance(value, float):
+        return [(f"{value:,.2f}", "amount", None), (f"{value:.2f}", "amount", None)]
+    if isinstance(value, str) and re.fullmatch(r"\d{4}-\d{2}-\d{2}", value):
+        date = datetime.strptime(value, "%Y-%m-%d")
+        forms = []
+        for fmt in DATE_FORMATS:
+            rendered = date.strftime(fmt)
+            forms.append((rendered, "date", fmt))
+            unpadded = re.sub(r"\b0(\d)", r"\1", rendered)
+            if unpadded != rendered:
+                forms.append((unpadded, "date", fmt))
+        return forms + [(value, "text", None)]
+    return [(str(value), "text", None)]
+
+
+_VALUE_PATTERNS = {
+    "int": r"\d+",
+    "amount": r"[\d,]+\.\d{2}",
+    "text": r".+?",
+}
+
+
+def _value_pattern(kind: str, rendering: str) -> str:
+    return _date_shape(rendering) if kind == "date" else _VALUE_PATTERNS[kind]
+
+
+def _convert(raw: str, kind: str, date_format: Optional[str]):
+    raw = raw.strip()
+    if kind == "int":
+        return int(raw)
+    if kind == "amount":
+        return float(raw.replace(",", ""))
+    if kind == "date":
+        date = datetime.strptime(raw, date_format)
+        if "%Y" not in date_format and "%y" not in date_format:
+            date = date.replace(year=datetime.now().year)
+        return date.strftime("%Y-%m-%d")
+    return raw
+
+
+@dataclass
+class FieldRule:
+    kind: str                           # "text" | "amount" | "int" | "date" | "const"
+    pattern: Optional[str] = None       # regex with one capture group (None for const)
+    date_format: Optional[str] = None
+    value: object = None                # constant value for kind == "const"
+
+    def apply(self, text: str):
+        if self.kind == "const":
+            return self.value
+        match = re.search(self.pattern, text, re.MULTILINE)
+        if not match:
+            return None
+        try:
+            return _convert(match.group(1), self.kind, self.date_format)
+        except ValueError:
+            return None
+
+
+def _learn_field(text: str, value) -> Optional[FieldRule]:
+    """Learn a rule that extracts `value` from `text` using its line label as anchor."""
+    if value is None:
+        return None
+    for rendering, kind, fmt in _renderings(value):
+        index = text.find(rendering)
+        if index < 0:
+            continue
+        line_start = text.rfind("\n", 0, index) + 1
+        line_end = text.find("\n", index)
+        line_end = len(text) if line_end < 0 else line_end
+        prefix = text[line_start:index]
+        suffix = text[index + len(rendering):line_end]
+
+        if prefix.strip():
+            anchor = "^" + _literal(prefix.lstrip())
+        else:
+            previous = text[:max(line_start - 1, 0)].rsplit("\n", 1)[-1].strip()
+            if not previous:
+                continue
+            anchor = "^" + _literal(previous) + r"\s*\n\s*"
+
+        pattern = f"{anchor}({_value_pattern(kind, rendering)}){_literal(suffix.rstrip())}\\s*$"
+        rule = FieldRule(kind=kind, pattern=pattern, date_format=fmt)
+        if rule.apply(text) == value:
+            return rule
+
+    # Values the text never states literally (e.g. inferred status) are kept as
+    # per-template constants; verification on later emails confirms or rejects them.
+    return FieldRule(kind="const", value=value)
+
+
+@dataclass
+class ItemRule:
+    pattern: str                                     # regex with one named group per located field
+    kinds: dict = field(default_factory=dict)        # field -> (kind, date_format)
+    constants: dict = field(default_factory=dict)    # field -> constant value
+
+    def apply(self, text: str) -> list[dict]:
+        items = []
+        for match in re.finditer(self.pattern, text, re.MULTILINE):
+            item = dict(self.constants)
+            try:
+                for name, (kind, fmt) in self.kinds.items():
+                    item[name] = _convert(match.group(name), kind, fmt)
+            except ValueError:
+                continue
+            items.append(item)
+        return items
+
+
+def _learn_items(text: str, item: dict) -> Optional[ItemRule]:
+    """Learn a repeating item pattern from one extracted item, anchored on its description."""
+    desc_field = next((k for k in item if k.endswith("_desc") and item[k]), None)
+    if not desc_field:
+        return None
+    desc_index = text.find(item[desc_field])
+    if desc_index < 0:
+        return None
+
+    start = text.rfind("\n", 0, desc_index) + 1
+    window_end = start
+    for _ in range(_ITEM_WINDOW_LINES):
+        next_break = text.find("\n", window_end + 1)
+        window_end = len(text) if next_break < 0 else next_break
+    window = text[start:window_end]
+
+    spans, kinds, constants = [], {}, {}
+    for name, value in item.items():
+        if value is None:
+            continue
+        located = False
+        for rendering, kind, fmt in _renderings(value):
+            offset = window.find(rendering)
+            if offset < 0 or any(offset < end and offset + len(rendering) > begin for begin, end, *_ in spans):
+                continue
+            spans.append((offset, offset + len(rendering), name, kind, rendering))
+            kinds[name] = (kind, fmt)
+            located = True
+            break
+        if not located:
+            constants[name] = value
+
+    spans.sort()
+    pattern, cursor = "^", 0
+    for begin, end, name, kind, rendering in spans:
+        pattern += _literal(window[cursor:begin]) + f"(?P<{name}>{_value_pattern(kind, rendering)})"
+        cursor = end
+    tail = window[cursor:].split("\n", 1)[0]
+    pattern += _literal(tail.rstrip()) + r"\s*$"
+    return ItemRule(pattern=pattern, kinds=kinds, constants=constants)
+
+
+# --------------------------------------------------
+# 🗂️ Template store
+# --------------------------------------------------
+
+@dataclass
+class TemplateEntry:
+    rules: dict = field(default_factory=dict)        # "section.field" -> FieldRule
+    item_rule: Optional[ItemRule] = None
+    verified: int = 0
+    local_hits: int = 0
+    mismatches: int = 0
+
+
+class TemplateStore:
+    """
+    Learned templates keyed by (sender domain, signature, node).
+    """
+
+    def __init__(self, path: str = TEMPLATE_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: dict[str, TemplateEntry] = {}
+        self._dirty = 0
+        self.metrics = {"local": 0, "sampled": 0, "sample_mismatch": 0, "learned": 0}
+        self._load()
+
+    # ---------- persistence ----------
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            raw = json.load(f)
+        for key, entry in raw.items():
+            self._entries[key] = TemplateEntry(
+                rules={name: FieldRule(**rule) for name, rule in entry["rules"].items()},
+                item_rule=ItemRule(**entry["item_rule"]) if entry.get("item_rule") else None,
+                verified=entry["verified"],
+                local_hits=entry["local_hits"],
+                mismatches=entry["mismatches"],
+            )
+
+    def save(self) -> None:
+        with self._lock:
+            data = {key: asdict(entry) for key, entry in self._entries.items()}
+            self._dirty = 0
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    # ---------- extraction ----------
+
+    @staticmethod
+    def _key(record: dict, text: str, node: str) -> str:
+        return f"{sender_domain(record.get('from', ''))}|{template_signature(text)}|{node}"
+
+    @staticmethod
+    def _apply(entry: TemplateEntry, text: str, schema: Type[BaseModel]) -> Optional[BaseModel]:
+        data = {}
+        for name, rule in entry.rules.items():
+            section, field_name = name.split(".", 1)
+            data.setdefault(section, {})[field_name] = rule.apply(text)
+        items = entry.item_rule.apply(text) if entry.item_rule else []
+        try:
+            return schema.model_validate(_fill_missing(data, items, schema))
+        except ValidationError:
+            return None
+
+    def extract(self, node: str, record: dict, schema: Type[BaseModel]) -> Optional[BaseModel]:
+        """
+        Extract locally if the email matches a verified template.
+
+        Returns:
+            The schema instance, or None if the LLM should be used (unknown/unverified
+            template, or this email was picked for an accuracy sample).
+        """
+        text = email_text(record)
+        key = self._key(record, text, node)
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry or entry.verified < MIN_VERIFICATIONS:
+                return None
+            entry.local_hits += 1
+            if entry.local_hits % SAMPLE_EVERY == 0:
+                self.metrics["sampled"] += 1
+                return None
+
+        result = self._apply(entry, text, schema)
+        if result is not None:
+            with self._lock:
+                self.metrics["local"] += 1
+            print(f"🧬 Extracted email ID {record.get('id')} locally via template {key}")
+        return result
+
+    def learn(self, node: str, record: dict, extracted: BaseModel) -> None:
+        """
+        Verify (or learn) the template rules against a trusted LLM extraction.
+        """
+        text = email_text(record)
+        key = self._key(record, text, node)
+        expected = extracted.model_dump()
+        schema = type(extracted)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry and entry.rules:
+            predicted = self._apply(entry, text, schema)
+            if predicted is not None and predicted.model_dump() == expected:
+                with self._lock:
+                    entry.verified += 1
+                    self._dirty += 1
+                self._maybe_save()
+                return
+            with self._lock:
+                if entry.verified >= MIN_VERIFICATIONS:
+                    self.metrics["sample_mismatch"] += 1
+                    print(f"⚠️ Template {key} disagreed with the LLM; demoting")
+                entry.mismatches += 1
+
+        # (Re)learn rules from this extraction; they count as verified once only if
+        # they reproduce this very email.
+        fresh = TemplateEntry(mismatches=entry.mismatches if entry else 0)
+        for section, values in expected.items():
+            if isinstance(values, dict):
+                for field_name, value in values.items():
+                    rule = _learn_field(text, value)
+                    if rule:
+                        fresh.rules[f"{section}.{field_name}"] = rule
+            elif isinstance(values, list) and values:
+                fresh.item_rule = _learn_items(text, values[0])
+
+        predicted = self._apply(fresh, text, schema) if fresh.rules else None
+        fresh.verified = 1 if predicted is not None and predicted.model_dump() == expected else 0
+        with self._lock:
+            self._entries[key] = fresh
+            self.metrics["learned"] += 1
+            self._dirty += 1
+        self._maybe_save()
+
+    def _maybe_save(self, every: int = 20) -> None:
+        if self._dirty >= every:
+            self.save()
+
+    def summary(self) -> dict:
+        with self._lock:
+            trusted = sum(1 for e in self._entries.values() if e.verified >= MIN_VERIFICATIONS)
+            return {"templates": len(self._entries), "trusted": trusted, **self.metrics}
+
+
+def _fill_missing(data: dict, items: list[dict], schema: Type[BaseModel]) -> dict:
+    """Give every schema field a value (None / []) so partial rule sets still validate."""
+    for name, info in schema.model_fields.items():
+        annotation = info.annotation
+        if get_origin(annotation) is list:
+            item_model = get_args(annotation)[0]
+            data[name] = [{f: item.get(f) for f in item_model.model_fields} for item in items]
+        elif isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            section = data.get(name) or {}
+            data[name] = {f: section.get(f) for f in annotation.model_fields}
+    return data
+
+
+template_store = TemplateStore() if TEMPLATE_EXTRACTION else None
+
+if template_store is not None:
+    atexit.register(template_store.save)
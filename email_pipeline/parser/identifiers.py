@@ -0,0 +1,225 @@
+"""
+🔎 parser/identifiers.py
+
+Fast, LLM-free scanner for shipment identifiers in cleaned email text:
+- carrier tracking numbers (UPS, FedEx, USPS, DHL, OnTrac, LaserShip, Amazon
+  Logistics), validated with each carrier's check-digit algorithm where one exists
+- common order-ID formats ("Order #...", Amazon 123-1234567-1234567)
+- delivery-status phrases mapped to the statuses used in our prompts
+
+All patterns are compiled once into a single alternation and the text is scanned
+in one pass.
+
+With IDENTIFIER_SKIP_EMPTY=1, shipping emails are skipped before the LLM call when
+the scan rules them out: no identifier, no delivery status and no mention of an
+order or tracking number at all. The scanner's recall is far from perfect, so any
+hint of a shipment still goes to the LLM.
+
+With IDENTIFIER_SHORT_CIRCUIT=1, shipping updates carrying exactly one validated
+tracking number and a status phrase are applied without an LLM call (delivery
+dates are then left untouched).
+"""
+
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+from parser.email_parser import email_text
+
+IDENTIFIER_SHORT_CIRCUIT = os.getenv("IDENTIFIER_SHORT_CIRCUIT", "0") == "1"
+IDENTIFIER_SKIP_EMPTY = os.getenv("IDENTIFIER_SKIP_EMPTY", "0") == "1"
+
+# Fast-path counters ("skipped:<node>", "short_circuit"), shown in the usage summary
+identifier_stats = Counter()
+
+# --------------------------------------------------
+# ✅ Check-digit validators
+# --------------------------------------------------
+
+def _ups_valid(number: str) -> bool:
+    """1Z + 15 alphanumerics + check digit (letters map to (ord - 63) % 10)."""
+    body, check = number[2:17], number[17]
+    total = 0
+    for index, char in enumerate(body):
+        value = int(char) if char.isdigit() else (ord(char) - 63) % 10
+        total += value * 2 if index % 2 else value
+    remainder = total % 10
+    return str((10 - remainder) % 10) == check
+
+
+def _mod10_valid(number: str) -> bool:
+    """GS1-style mod 10 (weights 3,1 from the right) used by USPS IMpb and FedEx Ground."""
+    digits = [int(d) for d in number]
+    body, check = digits[:-1], digits[-1]
+    total = sum(d * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(body)))
+    return (10 - total % 10) % 10 == check
+
+
+def _fedex_express_valid(number: str) -> bool:
+    """12-digit FedEx Express: weights 3,1,7 over the first 11 digits, mod 11, mod 10."""
+    weights = (3, 1, 7)
+    total = sum(int(d) * weights[i % 3] for i, d in enumerate(number[:11]))
+    return total % 11 % 10 == int(number[11])
+
+
+def _s10_valid(number: str) -> bool:
+    """UPU S10 international (e.g. EC123456785US): weights 8,6,4,2,3,5,9,7, mod 11."""
+    digits = number[2:10]
+    total = sum(int(d) * w for d, w in zip(digits, (8, 6, 4, 2, 3, 5, 9, 7)))
+    check = 11 - total % 11
+    check = {10: 0, 11: 5}.get(check, check)
+    return check == int(number[10])
+
+
+def _dhl_valid(number: str) -> bool:
+    """10-digit DHL Express waybill: last digit = first nine digits mod 7."""
+    return int(number[:9]) % 7 == int(number[9])
+
+
+# --------------------------------------------------
+# 🧩 Compiled patterns
+# --------------------------------------------------
+
+# (group name, carrier, regex, validator or None)
+_TRACKING_FORMATS = [
+    ("ups", "UPS", r"1Z[0-9A-Z]{16}", _ups_valid),
+    ("usps_impb", "USPS", r"9[2345]\d{2}(?:\s?\d{4}){4}\s?\d{2}", _mod10_valid),
+    ("usps_s10", "USPS", r"[A-Z]{2}\d{9}US", _s10_valid),
+    ("fedex_ground", "FedEx", r"96\d{20}|\d{15}", _mod10_valid),
+    ("fedex_express", "FedEx", r"\d{12}", _fedex_express_valid),
+    ("dhl", "DHL", r"\d{10}", _dhl_valid),
+    ("ontrac", "OnTrac", r"[CD]\d{14}", None),
+    ("lasership", "LaserShip", r"1LS\d{12,13}|LX\d{8}", None),
+    ("amazon", "Amazon Logistics", r"TBA\d{12}", None),
+]
+
+_VALIDATORS = {name: (carrier, validator) for name, carrier, _, validator in _TRACKING_FORMATS}
+
+# Bare-digit formats collide with phone/invoice numbers, so they also need the carrier named
+_REQUIRES_MENTION = {"fedex_ground": "FEDEX", "fedex_express": "FEDEX", "dhl": "DHL", "ontrac": "ONTRAC"}
+
+TRACKING_PATTERN = re.compile(
+    "|".join(rf"(?<![0-9A-Z])(?P<{name}>{regex})(?![0-9A-Z])" for name, _, regex, _ in _TRACKING_FORMATS)
+)
+
+# A generic order ID needs a label word ("order number", "order no.", "order ID"), a
+# separator ("order #", "order:") or "order is/was" before it, and at least 5
+# characters with a digit ("ORDER2024" in a promo code is not an order ID)
+ORDER_ID_PATTERN = re.compile(
+    r"\b(?P<amazon>\d{3}-\d{7}-\d{7})\b"
+    r"|\border(?:\s+(?:number|no|id)\b\.?\s*(?:(?:is|was)\s+)?[:#]?|\s*[:#]|\s+(?:is|was)\s+)"
+    r"\s*#?\s*(?P<generic>(?=[A-Z0-9-]*\d)[A-Z0-9][A-Z0-9-]{4,24})\b",
+    re.IGNORECASE,
+)
+
+# Any hint of a shipment, even one the patterns above cannot read
+SHIPMENT_MENTION = re.compile(
+    r"\btrack(?:ing)?\b|\bwaybill\b|\bshipment\b|\border\s*(?:number|no\b|id\b|#)|\bcarrier\b",
+    re.IGNORECASE,
+)
+
+# Ordered by precedence: when several phrases appear, the earliest entry wins
+STATUS_PHRASES = [
+    ("returned", r"returned to (?:the )?sender|return to sender"),
+    ("delivered", r"\bdelivered\b(?! by| between| to you by)|delivery complete"),
+    ("out for delivery", r"out for delivery"),
+    ("delayed", r"running late|\bdelayed\b|delivery exception|rescheduled"),
+    ("shipped", r"in transit|on (?:its|the) way|has shipped|have shipped|\bshipped\b|picked up"),
+]
+STATUS_PATTERN = re.compile("|".join(f"(?P<s{i}>{p})" for i, (_, p) in enumerate(STATUS_PHRASES)), re.IGNORECASE)
+
+
+# --------------------------------------------------
+# 📦 Scanner
+# --------------------------------------------------
+
+@dataclass
+class TrackingNumber:
+    number: str
+    carrier: str
+    validated: bool
+
+
+@dataclass
+class Identifiers:
+    tracking_numbers: List[TrackingNumber] = field(default_factory=list)
+    order_ids: List[str] = field(default_factory=list)
+    status: Optional[str] = None
+    mentions_shipment: bool = False
+
+    @property
+    def empty(self) -> bool:
+        return not self.tracking_numbers and not self.order_ids
+
+    @property
+    def rules_out_shipment(self) -> bool:
+        """No identifier, no delivery status and no mention of a tracking or order number."""
+        return self.empty and self.status is None and not self.mentions_shipment
+
+    @property
+    def single_tracking(self) -> Optional[TrackingNumber]:
+        """The only validated tracking number, if exactly one was found."""
+        validated = [t for t in self.tracking_numbers if t.validated]
+        return validated[0] if len(validated) == 1 else None
+
+    @property
+    def single_order_id(self) -> Optional[str]:
+        return self.order_ids[0] if len(self.order_ids) == 1 else None
+
+
+def scan_identifiers(text: str) -> Identifiers:
+    """
+    Scan cleaned email text for tracking numbers, order IDs and a delivery status.
+
+    Numbers that look like a carrier format but fail its check digit are dropped,
+    except for formats without a check digit (Amazon Logistics). Bare-digit FedEx/DHL
+    formats also require the carrier to be named in the text.
+
+    Args:
+        text (str): Cleaned plain text (subject + body).
+
+    Returns:
+        Identifiers: De-duplicated findings in order of appearance.
+    """
+    found = Identifiers()
+    seen = set()
+    upper = text.upper()
+
+    for match in TRACKING_PATTERN.finditer(upper):
+        name = match.lastgroup
+        number = re.sub(r"\s", "", match.group(name))
+        carrier, validator = _VALIDATORS[name]
+        if validator and not validator(number):
+            continue
+        if name in _REQUIRES_MENTION and _REQUIRES_MENTION[name] not in upper:
+            continue
+        if number not in seen:
+            seen.add(number)
+            found.tracking_numbers.append(TrackingNumber(number, carrier, validator is not None))
+
+    for match in ORDER_ID_PATTERN.finditer(text):
+        order_id = match.group("amazon") or match.group("generic")
+        if order_id not in found.order_ids and order_id not in seen:
+            found.order_ids.append(order_id)
+
+    statuses = {int(match.lastgroup[1:]) for match in STATUS_PATTERN.finditer(text)}
+    if statuses:
+        found.status = STATUS_PHRASES[min(statuses)][0]
+    found.mentions_shipment = SHIPMENT_MENTION.search(text) is not None
+
+    return found
+
+
+def scan_email(record: dict) -> Identifiers:
+    """
+    Scan an email record's subject and cleaned body.
+    """
+    return scan_identifiers(f"{record.get('subject') or ''}\n{email_text(record)}")
+
+
+def scan_batch(texts: Iterable[str]) -> List[Identifiers]:
+    """
+    Scan many emails (e.g. a backfill) with the shared compiled patterns.
+    """
+    return [scan_identifiers(text) for text in texts]
@@ -0,0 +1,341 @@
+"""
+🧲 parser/item_index.py
+
+Local item-embedding index for linking shipping / return items to ordered items.
+
+Every item inserted by `extract_order_node` is embedded with a hashed character
+n-gram vector (no model, no network) and stored under its (user_id, order_id).
+Later emails for the same order are linked with one batched cosine-similarity
+product over that order's vectors, before the GPT semantic fallback is tried.
+
+Vectors persist to ITEM_INDEX_PATH as shards (`vectors-<start>-<end>.npy` +
+`meta-<start>-<end>.json`, rows start..end) and are memory-mapped on restart.
+New items are appended in memory; a save writes them as a new shard, folded
+together with the trailing shards that are less than twice its size. Saves cost
+the new rows plus those small shards, not the whole index: a row is rewritten
+O(log n) times in total and there are O(log n) shards.
+
+Enable with ITEM_INDEX=1.
+"""
+
+import os
+import re
+import json
+import atexit
+import threading
+from collections import defaultdict
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+import xxhash
+
+ITEM_INDEX = os.getenv("ITEM_INDEX", "0") == "1"
+ITEM_INDEX_PATH = os.getenv("ITEM_INDEX_PATH", "item_index")
+ITEM_INDEX_DIM = int(os.getenv("ITEM_INDEX_DIM", "512"))
+ITEM_INDEX_MIN_SCORE = float(os.getenv("ITEM_INDEX_MIN_SCORE", "0.55"))
+
+_NGRAM = 3
+_SAVE_EVERY = 200
+_SHARD_NAME = re.compile(r"vectors-(\d{10})-(\d{10})\.npy")
+
+# Row fields kept alongside each vector (enough to update the row without re-fetching it)
+META_FIELDS = ["entry_id", "user_id", "order_id", "item_desc", "item_color", "item_size", "item_sku"]
+
+
+# --------------------------------------------------
+# 🔢 Hashed n-gram embedding
+# --------------------------------------------------
+
+def item_text(desc: Optional[str], color: Optional[str] = None, size: Optional[str] = None) -> str:
+    """Normalize an item into the text that gets embedded."""
+    text = " ".join(part for part in (desc, color, size) if part)
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+def embed(texts: Sequence[str], dim: int = ITEM_INDEX_DIM) -> np.ndarray:
+    """
+    Embed texts as L2-normalized signed feature-hashing vectors of character
+    trigrams (word-boundary padded) plus whole words.
+
+    Args:
+        texts (Sequence[str]): Texts already normalized with `item_text`.
+        dim (int): Vector size.
+
+    Returns:
+        np.ndarray: float32 array of shape (len(texts), dim).
+    """
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.split():
+            padded = f" {word} "
+            features = [padded[i:i + _NGRAM] for i in range(len(padded) - _NGRAM + 1)]
+            features.append(word)
+            for feature in features:
+                h = xxhash.xxh64_intdigest(feature.encode())
+                vectors[row, h % dim] += 1.0 if (h >> 63) else -1.0
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def best_matches(queries: Sequence[str], candidates: Sequence[str],
+                 min_score: float = ITEM_INDEX_MIN_SCORE) -> List[Optional[Tuple[int, float]]]:
+    """
+    Batched cosine match of each query against a candidate list.
+
+    Returns:
+        List[Optional[Tuple[int, float]]]: Per query, (candidate index, score) or None below `min_score`.
+    """
+    if not queries or not candidates:
+        return [None] * len(queries)
+    scores = embed(queries) @ embed(candidates).T
+    best = scores.argmax(axis=1)
+    return [
+        (int(i), float(scores[q, i])) if scores[q, i] >= min_score else None
+        for q, i in enumerate(best)
+    ]
+
+
+def match_candidate(desc: str, candidates: List[dict], prefix: str = "") -> Optional[dict]:
+    """
+    Pick the candidate row most similar to `desc` by local cosine similarity.
+
+    Args:
+        desc (str): Item description from the email.
+        candidates (List[dict]): DB rows with `{prefix}item_desc/color/size` columns.
+        prefix (str): Column prefix, e.g. "return_" for `returns_refunds`.
+
+    Returns:
+        Optional[dict]: The best row, or None if nothing scores above ITEM_INDEX_MIN_SCORE.
+    """
+    texts = [
+        item_text(row.get(f"{prefix}item_desc"), row.get(f"{prefix}item_color"), row.get(f"{prefix}item_size"))
+        for row in candidates
+    ]
+    match = best_matches([item_text(desc)], texts)[0]
+    if not match:
+        return None
+    print(f"🧲 Local item match ({match[1]:.2f}): {candidates[match[0]].get(f'{prefix}item_desc')}")
+    return candidates[match[0]]
+
+
+# --------------------------------------------------
+# 🗂️ Persistent per-order index
+# --------------------------------------------------
+
+class _Shard(NamedTuple):
+    start: int               # index of the shard's first row
+    vectors: np.ndarray      # memory-mapped, read-only
+    files: Tuple[str, str]   # (vectors, metadata)
+
+
+class ItemIndex:
+    """
+    Append-only store of item vectors keyed by (user_id, order_id).
+    """
+
+    def __init__(self, path: str = ITEM_INDEX_PATH, min_score: float = ITEM_INDEX_MIN_SCORE):
+        self.path = path
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # one writer at a time
+        self._shards: List[_Shard] = []
+        self._persisted = 0  # rows covered by the shards; later rows are in `_fresh`
+        self._fresh = np.zeros((0, ITEM_INDEX_DIM), dtype=np.float32)
+        self._meta: List[dict] = []
+        self._by_order = defaultdict(list)
+        self._known = set()
+        self._dirty = 0
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    # ---------- persistence ----------
+
+    def _shard_files(self, start: int, end: int) -> Tuple[str, str]:
+        name = f"{start:010d}-{end:010d}"
+        return os.path.join(self.path, f"vectors-{name}.npy"), os.path.join(self.path, f"meta-{name}.json")
+
+    def _load(self) -> None:
+        if not os.path.isdir(self.path):
+            return
+        found = []
+        for name in os.listdir(self.path):
+            match = _SHARD_NAME.fullmatch(name)
+            if match:
+                start, end = int(match.group(1)), int(match.group(2))
+                found.append((start, end, self._shard_files(start, end)))
+        legacy = (os.path.join(self.path, "vectors.npy"), os.path.join(self.path, "meta.json"))
+        if all(os.path.exists(file) for file in legacy):
+            # Single-file layout of earlier versions: rows 0..n, folded into shards on the next save
+            found.append((0, len(np.load(legacy[0], mmap_mode="r")), legacy))
+
+        # Longest shard first per start; shorter ones were merged into it (or a save was interrupted)
+        stale = []
+        for start, end, files in sorted(found, key=lambda shard: (shard[0], -shard[1])):
+            if start < len(self._meta):
+                stale.append(files)
+                continue
+            if start > len(self._meta):
+                print(f"⚠️ Item index at {self.path} is missing rows {len(self._meta)}-{start}; ignoring later shards.")
+                break
+            try:
+                vectors = np.load(files[0], mmap_mode="r")
+                with open(files[1], encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta, vectors = None, None
+            if vectors is None or vectors.shape != (end - start, ITEM_INDEX_DIM) or len(meta) != end - start:
+                print(f"⚠️ Ignoring item index shard {os.path.basename(files[0])}: incomplete or wrong dimension.")
+                stale.append(files)
+                continue
+            self._shards.append(_Shard(start, vectors, files))
+            for row in meta:
+                self._remember(row)
+        self._persisted = len(self._meta)
+        _remove(stale)
+
+    def save(self) -> None:
+        """
+        Write the rows added since the last save as one shard, merged with the trailing
+        shards less than twice its size. Saves are serialized; adds continue meanwhile.
+        """
+        with self._save_lock:
+            with self._lock:
+                fresh = self._fresh
+                if not len(fresh):
+                    return
+                self._dirty = 0
+                end = self._persisted + len(fresh)
+                merged, rows = [], len(fresh)
+                for shard in reversed(self._shards):
+                    if len(shard.vectors) >= 2 * rows:
+                        break
+                    merged.insert(0, shard)
+                    rows += len(shard.vectors)
+                start = end - rows
+                meta = self._meta[start:end]
+
+            # Shards are immutable and only replaced under `_save_lock`, so they can be read unlocked
+            vectors = np.concatenate([shard.vectors for shard in merged] + [fresh])
+            os.makedirs(self.path, exist_ok=True)
+            files = self._shard_files(start, end)
+            # np.save appends ".npy" to names without it, so keep the suffix on the temp file
+            np.save(f"{files[0]}.tmp.npy", vectors)
+            with open(f"{files[1]}.tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(f"{files[1]}.tmp", files[1])
+            os.replace(f"{files[0]}.tmp.npy", files[0])
+
+            shard = _Shard(start, np.load(files[0], mmap_mode="r"), files)
+            with self._lock:
+                # Anything added while saving stays in `_fresh`
+                self._shards = self._shards[:len(self._shards) - len(merged)] + [shard]
+                self._fresh = self._fresh[len(fresh):]
+                self._persisted = end
+            _remove([old.files for old in merged])
+
+    # ---------- indexing ----------
+
+    def _remember(self, meta: dict) -> None:
+        self._by_order[(str(meta["user_id"]), str(meta["order_id"]))].append(len(self._meta))
+        self._known.add(meta.get("entry_id"))
+        self._meta.append(meta)
+
+    def add(self, rows: List[dict]) -> int:
+        """
+        Index `order_details` rows (as returned by the insert). Rows without
+        user_id/order_id/item_desc, or already indexed by entry_id, are skipped.
+
+        Returns:
+            int: Number of rows added.
+        """
+        with self._lock:
+            new = [
+                {field: row.get(field) for field in META_FIELDS} for row in rows
+                if row.get("user_id") and row.get("order_id") and row.get("item_desc")
+                and (row.get("entry_id") is None or row.get("entry_id") not in self._known)
+            ]
+        if not new:
+            return 0
+
+        vectors = embed([item_text(m["item_desc"], m["item_color"], m["item_size"]) for m in new])
+        with self._lock:
+            self._fresh = np.vstack([self._fresh, vectors])
+            for meta in new:
+                self._remember(meta)
+            self._dirty += len(new)
+            should_save = self._dirty >= _SAVE_EVERY
+        if should_save:
+            self.save()
+        return len(new)
+
+    def has_order(self, user_id, order_id) -> bool:
+        with self._lock:
+            return bool(self._by_order.get((str(user_id), str(order_id))))
+
+    def _vectors(self, ids: List[int]) -> np.ndarray:
+        blocks = [(shard.start, shard.vectors) for shard in self._shards] + [(self._persisted, self._fresh)]
+        positions = np.searchsorted([start for start, _ in blocks], ids, side="right") - 1
+        return np.vstack([blocks[p][1][i - blocks[p][0]] for p, i in zip(positions, ids)])
+
+    # ---------- search ----------
+
+    def search(self, user_id, order_id, queries: Sequence[str]) -> List[Optional[Tuple[dict, float]]]:
+        """
+        Link several item texts of one email to the order's indexed items in one product.
+
+        Args:
+            user_id: Owner of the order.
+            order_id: Order to search within.
+            queries (Sequence[str]): Texts built with `item_text`.
+
+        Returns:
+            List[Optional[Tuple[dict, float]]]: Per query, (row metadata incl. entry_id, cosine score),
+                                                or None when nothing scores above `min_score`.
+        """
+        with self._lock:
+            ids = list(self._by_order.get((str(user_id), str(order_id)), []))
+            if not ids:
+                self.misses += len(queries)
+                return [None] * len(queries)
+            matrix = self._vectors(ids)
+            metas = [self._meta[i] for i in ids]
+
+        scores = embed(queries) @ matrix.T
+        best = scores.argmax(axis=1)
+        results = []
+        for q, i in enumerate(best):
+            score = float(scores[q, i])
+            results.append((metas[i], score) if score >= self.min_score else None)
+
+        with self._lock:
+            hits = sum(result is not None for result in results)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "items": len(self._meta),
+                "orders": len(self._by_order),
+                "shards": len(self._shards),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def _remove(file_groups: List[Tuple[str, str]]) -> None:
+    """Delete superseded shard files (best effort: leftovers are skipped on load)."""
+    for files in file_groups:
+        for file in files:
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+
+
+item_index = ItemIndex() if ITEM_INDEX else None
+if item_index:
+    atexit.register(item_index.save)
@@ -0,0 +1,261 @@
+"""
+🧮 parser/normalize.py
+
+Bulk normalization of extracted item rows (order, shipping and return items).
+
+All rows handed in are normalized together, column by column, with pandas string
+operations, precompiled patterns and lookup tables; a single email's items and a
+10k-email backfill go through the same code:
+
+- item descriptions are split into base / color / size (`parse_item_details`
+  formats) and whitespace-collapsed,
+- colors and sizes are canonicalized ("blk" -> "Black", "x-large" -> "XL"),
+- dates become YYYY-MM-DD, prices are rounded to cents, quantities are integers.
+
+Canonical values serve both sides of matching (extracted items and the DB rows
+they are compared with) and the bulk writes. Any `<field>_norm` twin present in
+the rows (see `sql/indexes.sql`) is refreshed from the canonical value.
+
+`python -m parser.normalize --emails 10000` times a synthetic backfill.
+"""
+
+import re
+import time
+import argparse
+from typing import Dict, List
+from parser.email_parser import COLOR_LINE_PATTERN, DESC_WITH_ATTRIBUTES_PATTERN, SIZE_LINE_PATTERN
+
+DATE_FIELDS = (
+    "order_date", "expected_deliv_date", "actual_deliv_date", "created_at",
+    "return_dropoff_deadline", "return_deadline", "exp_refund_date", "act_refund_date",
+)
+PRICE_FIELDS = (
+    "order_total", "tax_total", "shipping_total", "discount_total", "item_price", "item_discount",
+    "item_tax", "item_shipping", "exp_refund_amt", "refund_amt", "item_amt", "ship_amt", "taxes_amt", "other_amt",
+)
+QUANTITY_FIELDS = ("item_qty", "return_item_qty")
+
+# Defaults the order/shipping nodes apply to split item rows
+ORDER_ITEM_DEFAULTS = {"item_sku": ""}
+
+# Word-level color abbreviations used by retailers (expanded before title-casing)
+COLOR_ABBREVIATIONS: Dict[str, str] = {
+    "blk": "black", "bk": "black", "wht": "white", "wh": "white", "nvy": "navy", "nav": "navy",
+    "gry": "grey", "gray": "grey", "brn": "brown", "grn": "green", "blu": "blue", "pnk": "pink",
+    "prpl": "purple", "pur": "purple", "org": "orange", "orng": "orange", "ylw": "yellow", "yel": "yellow",
+    "slv": "silver", "gld": "gold", "bge": "beige", "ivry": "ivory", "crm": "cream", "chrcl": "charcoal",
+    "hthr": "heather", "htr": "heather", "lt": "light", "dk": "dark", "mlt": "multi", "multicolour": "multicolor",
+}
+
+# Whole-value size synonyms (after lower-casing and collapsing whitespace)
+SIZE_SYNONYMS: Dict[str, str] = {
+    **dict.fromkeys(("xs", "x-small", "x small", "xsmall", "extra small", "extra-small"), "XS"),
+    **dict.fromkeys(("s", "sm", "small"), "S"),
+    **dict.fromkeys(("m", "md", "med", "medium"), "M"),
+    **dict.fromkeys(("l", "lg", "lrg", "large"), "L"),
+    **dict.fromkeys(("xl", "x-large", "x large", "xlarge", "extra large", "extra-large"), "XL"),
+    **dict.fromkeys(("xxl", "2xl", "2x", "xx-large", "xx large", "xxlarge", "2x-large"), "XXL"),
+    **dict.fromkeys(("xxxl", "3xl", "3x", "xxx-large", "xxx large", "3x-large"), "XXXL"),
+    **dict.fromkeys(("os", "o/s", "one size", "one-size", "onesize", "one size fits all", "osfa"), "One Size"),
+}
+
+_WHITESPACE = r"\s+"
+_COLOR_WORDS = re.compile(r"\b(" + "|".join(sorted(COLOR_ABBREVIATIONS, key=len, reverse=True)) + r")\b")
+_CURRENCY = r"[^\d.\-]"
+_ISO_DATE = r"^\d{4}-\d{2}-\d{2}"
+_NORM_TEXT = r"[^a-z0-9]+"
+
+
+# --------------------------------------------------
+# 🧮 Column normalizers (pandas Series in, Series out)
+# --------------------------------------------------
+
+def _text(series):
+    """Strip + collapse whitespace; empty -> None."""
+    cleaned = series.str.strip().str.replace(_WHITESPACE, " ", regex=True)
+    return cleaned.where(cleaned.str.len() > 0, None)
+
+
+def split_descriptions(series):
+    """
+    Vectorized `parse_item_details`.
+
+    Returns:
+        Tuple[Series, Series, Series]: base description, color, size ("" when absent).
+    """
+    text = series.fillna("")
+    attributes = text.str.extract(DESC_WITH_ATTRIBUTES_PATTERN)
+    inline = attributes[0].notna()
+
+    base = text.str.split("\n", n=1).str[0].str.strip()
+    color = text.str.extract(COLOR_LINE_PATTERN)[0].str.strip().fillna("")
+    size = text.str.extract(SIZE_LINE_PATTERN)[0].str.strip().fillna("")
+
+    base = attributes[0].str.strip().where(inline, base)
+    color = attributes[1].str.strip().where(inline, color)
+    size = attributes[2].str.strip().where(inline, size)
+    return base, color, size
+
+
+def canonical_colors(series):
+    """Expand abbreviations word by word and title-case ("NVY/WHT" -> "Navy/White")."""
+    lowered = _text(series).str.lower()
+    expanded = lowered.str.replace(_COLOR_WORDS, lambda match: COLOR_ABBREVIATIONS[match.group(1)], regex=True)
+    return expanded.str.title()
+
+
+def canonical_sizes(series):
+    """Map size synonyms to one spelling; other sizes ("10.5", "32x30") are kept as written."""
+    cleaned = _text(series)
+    return cleaned.str.lower().map(SIZE_SYNONYMS).fillna(cleaned)
+
+
+def canonical_dates(series):
+    """ISO prefixes are trimmed; other formats ("May 1, 2024", "05/01/2024") are parsed, unparseable ones kept."""
+    import pandas as pd
+
+    text = _text(series)
+    iso = text.str.match(_ISO_DATE, na=False).astype(bool)
+    result = text.where(~iso, text.str.slice(0, 10))
+
+    other = text.notna() & ~iso
+    if other.any():
+        parsed = pd.to_datetime(text[other], errors="coerce", format="mixed")
+        formatted = parsed.dt.strftime("%Y-%m-%d").astype(object)
+        result[other] = formatted.where(parsed.notna(), text[other])
+    return result
+
+
+def canonical_prices(series):
+    """Numbers rounded to cents; strings lose currency symbols and thousands separators."""
+    import pandas as pd
+
+    text = series.astype(object).where(series.notna(), None)
+    as_text = text.map(lambda value: value if isinstance(value, str) else None).astype(object)
+    stripped = as_text.str.replace(_CURRENCY, "", regex=True)
+    values = pd.to_numeric(stripped.where(as_text.notna(), text), errors="coerce")
+    return values.round(2)
+
+
+def canonical_quantities(series):
+    import pandas as pd
+
+    return pd.to_numeric(series, errors="coerce").round().astype("Int64")
+
+
+def norm_text(series):
+    """Vectorized `supabase_client.queries.normalize_item_text` (the `*_norm` columns)."""
+    lowered = series.str.lower().str.replace(_NORM_TEXT, " ", regex=True).str.strip()
+    return lowered.where(lowered.str.len() > 0, None)
+
+
+# --------------------------------------------------
+# 📦 Row-level entry point
+# --------------------------------------------------
+
+def _to_records(frame) -> List[dict]:
+    """DataFrame -> list of dicts with native Python values and None for missing."""
+    columns = list(frame.columns)
+    data = frame.astype(object).where(frame.notna(), None)
+    return [dict(zip(columns, values)) for values in data.itertuples(index=False, name=None)]
+
+
+def normalize_items(rows: List[dict], prefix: str = "", split_desc: bool = False) -> List[dict]:
+    """
+    Normalize every row in one pass per column.
+
+    Args:
+        rows (List[dict]): Item rows (extracted items, rows about to be written, or DB rows to
+                           compare against). Every row gets the union of the rows' keys.
+        prefix (str): Attribute prefix ("return_" for `returns_refunds` rows).
+        split_desc (bool): Split `item_desc` into base / color / size first (order and shipping
+                           items); an explicit color/size wins over the parsed one, and
+                           `ORDER_ITEM_DEFAULTS` are applied.
+
+    Returns:
+        List[dict]: New dicts (the input rows are not modified).
+    """
+    if not rows:
+        return []
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(rows).astype(object)
+    desc, color, size = f"{prefix}item_desc", f"{prefix}item_color", f"{prefix}item_size"
+
+    if split_desc and desc in frame:
+        base, parsed_color, parsed_size = split_descriptions(frame[desc])
+        frame[desc] = _text(base).fillna("")
+        for field, parsed in ((color, parsed_color), (size, parsed_size)):
+            explicit = frame[field] if field in frame else pd.Series(None, index=frame.index, dtype=object)
+            present = explicit.notna() & (explicit.astype(str).str.strip() != "")
+            frame[field] = explicit.where(present, parsed)
+        for field, default in ORDER_ITEM_DEFAULTS.items():
+            if field in frame:
+                frame[field] = frame[field].where(frame[field].notna() & (frame[field] != ""), default)
+    elif desc in frame:
+        frame[desc] = _text(frame[desc])
+
+    if color in frame:
+        frame[color] = canonical_colors(frame[color])
+    if size in frame:
+        frame[size] = canonical_sizes(frame[size])
+    for field in (desc, color, size):
+        if field in frame and f"{field}_norm" in frame:
+            frame[f"{field}_norm"] = norm_text(frame[field])
+
+    for field in DATE_FIELDS:
+        if field in frame:
+            frame[field] = canonical_dates(frame[field])
+    for field in PRICE_FIELDS:
+        if field in frame:
+            frame[field] = canonical_prices(frame[field])
+    for field in QUANTITY_FIELDS:
+        if field in frame:
+            frame[field] = canonical_quantities(frame[field])
+
+    return _to_records(frame)
+
+
+def normalize_item(row: dict, prefix: str = "", split_desc: bool = False) -> dict:
+    """Single-row convenience wrapper around `normalize_items`."""
+    return normalize_items([row], prefix=prefix, split_desc=split_desc)[0]
+
+
+# --------------------------------------------------
+# ⏱️ Backfill timing
+# --------------------------------------------------
+
+def _synthetic_items(emails: int, items_per_email: int = 3) -> List[dict]:
+    colors = ["Navy Blue", "BLK", "off-white", "Hthr Gry", None]
+    sizes = ["x-large", "M", "10.5", "one size", None]
+    rows = []
+    for i in range(emails * items_per_email):
+        rows.append({
+            "item_desc": f"Relaxed Fit Tee {i % 500}. {colors[i % 4]}, {sizes[i % 4]}" if i % 3 == 0
+            else f"Slim Chino {i % 700}\nColor: {colors[i % 4]}\nSize: {sizes[i % 4]}",
+            "item_color": colors[i % 5] if i % 2 else None,
+            "item_size": sizes[i % 5] if i % 2 else None,
+            "item_sku": None if i % 4 else f"SKU{i}",
+            "item_price": ["$1,299.99", 49.5, "12", None][i % 4],
+            "item_qty": [1, "2", 3.0, None][i % 4],
+            "order_date": ["2024-05-01T10:00:00Z", "May 1, 2024", "05/02/2024", None][i % 4],
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time bulk normalization of a synthetic backfill")
+    parser.add_argument("--emails", type=int, default=10_000)
+    parser.add_argument("--items-per-email", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = _synthetic_items(args.emails, args.items_per_email)
+    start = time.perf_counter()
+    normalized = normalize_items(rows, split_desc=True)
+    elapsed = time.perf_counter() - start
+    print(f"🧮 Normalized {len(normalized)} items ({args.emails} emails) in {elapsed * 1000:.0f}ms")
+    print(f"   e.g. {rows[0]} -> {normalized[0]}")
+
+
+if __name__ == "__main__":
+    main()
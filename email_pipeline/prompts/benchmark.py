@@ -0,0 +1,73 @@
+"""
+⏱️ prompts/benchmark.py
+
+Micro-benchmark: per-call prompt building (old path) vs the precompiled registry.
+
+    python -m prompts.benchmark --iterations 20000 --body-kb 8
+"""
+
+import argparse
+import timeit
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+from prompts.registry import PROMPTS
+from prompts.templates import (
+    EXTRACTION_RULES, EMAIL_CONTENT_TEMPLATE, ORDER_INSTRUCTIONS,
+    CLASSIFICATION_INSTRUCTIONS, CLASSIFICATION_EMAIL_TEMPLATE
+)
+
+
+def run(iterations: int, body_kb: int) -> dict:
+    """
+    Time both paths for an extraction prompt and the classification prompt.
+
+    Returns:
+        dict: {case: (legacy µs/call, registry µs/call)}
+    """
+    body = ("Your order has shipped. Item: Men's Running Shoe, Black, Size 10. " * 16 * body_kb)[:body_kb * 1024]
+    email = {"from": "Shop <orders@shop.com>", "subject": "Your order #123-4567890-1234567", "msg": body}
+
+    def legacy_extraction():
+        prompt = EMAIL_CONTENT_TEMPLATE.format(subject=email["subject"], body=email["msg"])
+        return [
+            {"role": "system", "content": f"{EXTRACTION_RULES}\n\n{ORDER_INSTRUCTIONS}"},
+            {"role": "user", "content": prompt}
+        ]
+
+    def registry_extraction():
+        return PROMPTS["order"].messages(subject=email["subject"], body=email["msg"])
+
+    legacy_template = ChatPromptTemplate.from_messages([
+        SystemMessage(content=CLASSIFICATION_INSTRUCTIONS),
+        ("human", CLASSIFICATION_EMAIL_TEMPLATE),
+    ])
+
+    def legacy_classification():
+        return legacy_template.invoke({"from_field": email["from"], "subject": email["subject"], "body": email["msg"]})
+
+    def registry_classification():
+        return PROMPTS["classify"].langchain_messages(
+            from_field=email["from"], subject=email["subject"], body=email["msg"]
+        )
+
+    cases = {
+        "extraction (openai messages)": (legacy_extraction, registry_extraction),
+        "classification (langchain)": (legacy_classification, registry_classification),
+    }
+    results = {}
+    for case, (legacy, registry) in cases.items():
+        legacy_us = min(timeit.repeat(legacy, number=iterations, repeat=3)) / iterations * 1e6
+        registry_us = min(timeit.repeat(registry, number=iterations, repeat=3)) / iterations * 1e6
+        results[case] = (legacy_us, registry_us)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark prompt rendering")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--body-kb", type=int, default=8, help="Email body size in KB")
+    args = parser.parse_args()
+
+    for case, (legacy_us, registry_us) in run(args.iterations, args.body_kb).items():
+        print(f"⏱️ {case}: legacy {legacy_us:.2f} µs | registry {registry_us:.2f} µs | "
+              f"{legacy_us / registry_us:.1f}x faster")
@@ -0,0 +1,129 @@
+"""
+🗂️ prompts/registry.py
+
+Precompiled chat prompts.
+
+Each prompt pairs a static system message with a small per-email user template.
+Everything static is prepared once at import:
+- user templates are split into literal segments and field names (validated up
+  front, and the literal prefix feeds the cache key); rendering only fills in the
+  dynamic fields with the C-level `format_map`, which benchmarks faster than a
+  Python-level join of the segments,
+- the system message dict / LangChain `SystemMessage` is built once and the same
+  object is reused in every request,
+- `cache_key` hashes the static prefix, e.g. for grouping usage or local caches
+  by prompt version.
+
+Run `python -m prompts.benchmark` to compare against per-call formatting.
+"""
+
+import string
+from typing import Dict, List, Tuple
+import xxhash
+from prompts.templates import (
+    EXTRACTION_RULES, EMAIL_CONTENT_TEMPLATE, FALLBACK_MATCH_INSTRUCTIONS, FALLBACK_MATCH_TEMPLATE,
+    CLASSIFICATION_INSTRUCTIONS, CLASSIFICATION_EMAIL_TEMPLATE,
+    BATCH_CLASSIFICATION_INSTRUCTIONS, BATCH_CLASSIFICATION_TEMPLATE, BATCH_CLASSIFICATION_ITEM_TEMPLATE,
+    ORDER_INSTRUCTIONS, SHIPPING_INSTRUCTIONS, SHIPPING_UPDATE_INSTRUCTIONS, REFUND_INSTRUCTIONS,
+    RETURN_CONFIRMATION_INSTRUCTIONS, RETURN_UPDATE_INSTRUCTIONS
+)
+
+
+class CompiledTemplate:
+    """
+    A `str.format`-style template pre-split into literal segments and field names.
+    """
+
+    def __init__(self, template: str):
+        # Always one more literal than fields; escaped braces arrive as extra literal chunks
+        literals: List[str] = [""]
+        fields: List[str] = []
+        for literal, field, spec, conversion in string.Formatter().parse(template):
+            literals[-1] += literal
+            if field is None:
+                continue
+            if not field or spec or conversion:
+                raise ValueError(f"Only named fields without format specs are supported: {{{field}}}")
+            fields.append(field)
+            literals.append("")
+
+        self.template = template
+        self.fields: Tuple[str, ...] = tuple(fields)
+        self.literals: Tuple[str, ...] = tuple(literals)
+        # Text before the first field never changes between calls
+        self.static_prefix = literals[0]
+        self._format_map = template.format_map
+
+    def render(self, **values) -> str:
+        """
+        Fill in the dynamic fields (missing fields raise KeyError).
+        """
+        return self._format_map(values)
+
+
+class ChatPrompt:
+    """
+    Static system message + compiled user template, rendered into chat messages.
+    """
+
+    def __init__(self, name: str, system: str, user_template: str):
+        self.name = name
+        self.system = system
+        self.user = CompiledTemplate(user_template)
+        self.system_message = {"role": "system", "content": system}
+        self.cache_key = xxhash.xxh64(f"{system}\0{self.user.static_prefix}".encode()).hexdigest()
+        self._langchain_system = None
+        self._render = self.user._format_map
+
+    def messages(self, **values) -> List[dict]:
+        """
+        OpenAI chat messages; the system message object is shared across calls.
+        """
+        return [self.system_message, {"role": "user", "content": self._render(values)}]
+
+    def langchain_messages(self, **values) -> list:
+        """
+        LangChain message objects for `llm.invoke`, skipping `ChatPromptTemplate` parsing.
+        """
+        from langchain_core.messages import HumanMessage, SystemMessage
+
+        if self._langchain_system is None:
+            self._langchain_system = SystemMessage(content=self.system)
+        return [self._langchain_system, HumanMessage(content=self._render(values))]
+
+
+PROMPTS: Dict[str, ChatPrompt] = {}
+
+
+def register(name: str, system: str, user_template: str) -> ChatPrompt:
+    """Compile and register a prompt under `name`."""
+    prompt = ChatPrompt(name, system, user_template)
+    PROMPTS[name] = prompt
+    return prompt
+
+
+def get_prompt(name: str) -> ChatPrompt:
+    return PROMPTS[name]
+
+
+# --------------------------------------------------
+# 📚 Registered prompts
+# --------------------------------------------------
+
+# Extraction nodes share the JSON rules; the node's instructions follow in the same system message
+for _node, _instructions in {
+    "order": ORDER_INSTRUCTIONS,
+    "shipping": SHIPPING_INSTRUCTIONS,
+    "shipping_update": SHIPPING_UPDATE_INSTRUCTIONS,
+    "refund": REFUND_INSTRUCTIONS,
+    "return_confirmation": RETURN_CONFIRMATION_INSTRUCTIONS,
+    "return_update": RETURN_UPDATE_INSTRUCTIONS,
+}.items():
+    register(_node, f"{EXTRACTION_RULES}\n\n{_instructions}", EMAIL_CONTENT_TEMPLATE)
+
+register("fallback_match", f"{EXTRACTION_RULES}\n\n{FALLBACK_MATCH_INSTRUCTIONS}", FALLBACK_MATCH_TEMPLATE)
+register("classify", CLASSIFICATION_INSTRUCTIONS, CLASSIFICATION_EMAIL_TEMPLATE)
+register("classify_batch", BATCH_CLASSIFICATION_INSTRUCTIONS, BATCH_CLASSIFICATION_TEMPLATE)
+
+# One block per email inside the classify_batch user message
+CLASSIFY_BATCH_ITEM = CompiledTemplate(BATCH_CLASSIFICATION_ITEM_TEMPLATE)
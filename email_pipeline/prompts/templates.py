@@ -3,18 +3,40 @@
 
 This module contains all the prompt templates used to extract structured data from emails.
 Each prompt follows a strict schema and is used in different LangGraph nodes.
+
+Prompts are split for provider-side prompt caching:
+- `*_INSTRUCTIONS` are static and sent as the system message. They must stay
+  byte-identical between calls (no formatting, timestamps or per-email data),
+  so OpenAI can reuse the cached prefix.
+- `*_EMAIL_TEMPLATE` / `FALLBACK_MATCH_TEMPLATE` hold the only per-email content
+  and are sent as the user message, after the cached prefix.
+"""
+
+# --------------------------------------------------
+# 🧱 Shared extraction rules + per-email user message
+# --------------------------------------------------
+
+EXTRACTION_RULES = (
+    "Extract structured data from emails. "
+    "Return ONLY valid JSON. Enclose all keys and string values in double quotes. "
+    "Return no more than 5 items. No explanation or extra text."
+)
+
+EMAIL_CONTENT_TEMPLATE = """Email Subject: {subject}
+Email Content:
+{body}
 """
 
 # --------------------------------------------------
 # 🛒 Order Extraction Prompt (Initial Order Email)
 # --------------------------------------------------
 
-PROMPT_TEMPLATE = """Extract order details from this email into JSON. 
+ORDER_INSTRUCTIONS = """Extract order details from this email into JSON.
 Order details go in the order_info object, and each purchased item goes into the items array.
 
 Return this structure:
-{{
-  "order_info": {{
+{
+  "order_info": {
     "retailer": "string",
     "order_id": "string",
     "order_date": "YYYY-MM-DD",
@@ -25,9 +47,9 @@ Return this structure:
     "shipping_address": "string",
     "zip_code": "string",
     "archive_flag": bool
-  }},
+  },
   "items": [
-    {{
+    {
       "item_desc": "string",
       "item_price": float,
       "item_sku": "string",
@@ -44,9 +66,9 @@ Return this structure:
       "status": "string",
       "carrier": "string",
       "actual_deliv_date": "YYYY-MM-DD"
-    }}
+    }
   ]
-}}
+}
 
 Rules:
 1. Use null for unknown values
@@ -60,21 +82,17 @@ Rules:
 7. Each image_name should contain the item image URL or best value found in an <img> tag or hyperlink.
 8. Don't include any escape character in extraction like in shipping address etc.
 10. Extract information from structured or semi-structured text (tables, lists, bullet points, etc.) and emails with or without HTML.
-
-Email Subject: {subject}
-Email Content:
-{body}
 """
 
 # --------------------------------------------------
 # 💰 Refund Confirmation Prompt
 # --------------------------------------------------
 
-REFUND_PROMPT_TEMPLATE = """Extract refund details from this email into JSON format. 
+REFUND_INSTRUCTIONS = """Extract refund details from this email into JSON format.
 
 Return this structure:
-{{
-  "return_info": {{
+{
+  "return_info": {
     "created_at": "YYYY-MM-DD",
     "retailer": "string",
     "return_id": "string",
@@ -94,9 +112,9 @@ Return this structure:
     "qr_label": "string",
     "user_email": "string",
     "status": "Initiated | Approved | In Transit"
-  }},
+  },
   "items": [
-    {{
+    {
       "return_item_desc": "string",
       "return_item_sku": "string",
       "return_item_qty": integer,
@@ -108,9 +126,9 @@ Return this structure:
       "ship_amt": float,
       "taxes_amt": float,
       "other_amt": float
-    }}
+    }
   ]
-}}
+}
 
 Guidelines:
 1. Use null if a value is not present or cannot be found.
@@ -119,22 +137,18 @@ Guidelines:
 4. Only return the JSON object—no comments or extra text.
 5. This prompt is for emails confirming a refund.
 6. Choose the most appropriate return_status: Initiated, Approved, or In Transit.
-
-Email Subject: {subject}
-Email Content:
-{body}
 """
 
 # --------------------------------------------------
 # 🚚 Shipping Update Prompt (Post-Shipment Email)
 # --------------------------------------------------
 
-SHIPPING_UPDATE_PROMPT_TEMPLATE = """Extract delivery details from this email into JSON format. 
+SHIPPING_UPDATE_INSTRUCTIONS = """Extract delivery details from this email into JSON format.
 Focus on identifying the expected and actual delivery dates, along with relevant shipping info.
 
 Return this structure:
-{{
-  "order_info": {{
+{
+  "order_info": {
     "order_id": "string",
     "shipping_method": "string",
     "tracking_num": "string",
@@ -144,8 +158,8 @@ Return this structure:
     "carrier": "string",
     "shipping_address": "string",
     "zip_code": "string"
-  }}
-}}
+  }
+}
 
 Extraction Instructions:
 1. Use null for any value that is unknown or not present.
@@ -161,28 +175,25 @@ Extraction Instructions:
     - Look for phrases near tracking numbers or shipping sections like:
       "Carrier: USPS", "Delivered via FedEx", "Tracking via UPS"
     - Extract just the carrier name: "UPS", "FedEx", "DHL", "USPS"
-Email Subject: {subject}
-Email Content:
-{body}
 """
 
 # --------------------------------------------------
 # 📦 Shipping Confirmation Prompt (Initial Shipping Email)
 # --------------------------------------------------
 
-SHIPPING_PROMPT_TEMPLATE = """Extract order details from this email into JSON. 
+SHIPPING_INSTRUCTIONS = """Extract order details from this email into JSON.
 Order details go in the order_info object, and each purchased item goes into the items array.
 
 Return this structure:
-{{
-  "order_info": {{
+{
+  "order_info": {
     "retailer": "string",
     "order_id": "string",
     "shipping_address": "string",
     "zip_code": "string"
-  }},
+  },
   "items": [
-    {{
+    {
       "item_desc": "string",
       "item_price": float,
       "item_sku": "string",
@@ -199,9 +210,9 @@ Return this structure:
       "status": "string",
       "carrier": "string",
       "actual_deliv_date": "YYYY-MM-DD"
-    }}
+    }
   ]
-}}
+}
 
 Rules:
 1. Use null for unknown values.
@@ -222,21 +233,17 @@ Rules:
 9. For carrier:
     - Look near tracking numbers for: "Carrier: USPS", "Delivered via FedEx", etc.
     - Extract just the carrier name like: "UPS", "FedEx", "DHL", "USPS".
-
-Email Subject: {subject}
-Email Content:
-{body}
 """
 
 # --------------------------------------------------
 # 🔁 Return Confirmation Prompt
 # --------------------------------------------------
 
-RETURN_CONFIRMATION_PROMPT_TEMPLATE = """Extract return confirmation details from this email into JSON format.
+RETURN_CONFIRMATION_INSTRUCTIONS = """Extract return confirmation details from this email into JSON format.
 
 Return this structure:
-{{
-  "return_info": {{
+{
+  "return_info": {
     "created_at": "YYYY-MM-DD",
     "retailer": "string",
     "return_id": "string",
@@ -256,9 +263,9 @@ Return this structure:
     "qr_label": "string",
     "user_email": "string",
     "status": "Initiated | Approved | In Transit"
-  }},
+  },
   "items": [
-    {{
+    {
       "return_item_desc": "string",
       "return_item_sku": "string",
       "return_item_qty": integer,
@@ -270,9 +277,9 @@ Return this structure:
       "ship_amt": float,
       "taxes_amt": float,
       "other_amt": float
-    }}
+    }
   ]
-}}
+}
 
 Guidelines:
 1. Use null if a value is not present or cannot be found.
@@ -281,21 +288,17 @@ Guidelines:
 4. Only return the JSON object—no comments or extra text.
 5. This prompt is for emails confirming a return has been requested, approved, or started.
 6. Choose the most appropriate return_status: Initiated, Approved, or In Transit.
-
-Email Subject: {subject}
-Email Content:
-{body}
 """
 
 # --------------------------------------------------
 # 🔁 Return Update Prompt (Post-return Email)
 # --------------------------------------------------
 
-RETURN_UPDATE_PROMPT_TEMPLATE = """Extract return update details from this email into JSON format.
+RETURN_UPDATE_INSTRUCTIONS = """Extract return update details from this email into JSON format.
 
 Return this structure:
-{{
-  "return_info": {{
+{
+  "return_info": {
     "created_at": "YYYY-MM-DD",
     "retailer": "string",
     "return_id": "string",
@@ -315,9 +318,9 @@ Return this structure:
     "qr_label": "string",
     "user_email": "string",
     "status": "Received | Inspected | Rejected | Processing Refund"
-  }},
+  },
   "items": [
-    {{
+    {
       "return_item_desc": "string",
       "return_item_sku": "string",
       "return_item_qty": integer,
@@ -329,9 +332,9 @@ Return this structure:
       "ship_amt": float,
       "taxes_amt": float,
       "other_amt": float
-    }}
+    }
   ]
-}}
+}
 
 Guidelines:
 1. Use null if a value is not present or cannot be found.
@@ -340,18 +343,13 @@ Guidelines:
 4. Only return the JSON object—no extra text or commentary.
 5. This prompt is used for emails indicating progress after a return was confirmed (e.g., item received, refund processing).
 6. Choose the most appropriate status: Received, Inspected, Rejected, Processing Refund.
-
-Email Subject: {subject}
-Email Content:
-{body}
 """
 
 # --------------------------------------------------
 # 📊 Email Classification Prompt
 # --------------------------------------------------
 
-CLASSIFICATION_TEMPLATE = """
-You are an email classifier. Classify each email into exactly one of the following categories:
+CLASSIFICATION_INSTRUCTIONS = """You are an email classifier. Classify each email into exactly one of the following categories:
 promos, goods receipt, retailer order confirmation, retailer shipping confirmation, services receipt, shipping update, return confirmation, return update, refund, retailer order update.
 
 Definitions:
@@ -447,26 +445,41 @@ Subject: Refund issued
 Email Content: We’ve issued your refund of $29.99 to your original payment method.  
 Category: refund
 
-Now classify this email:
-From: {from_field}  
-Subject: {subject}  
-Email Content: {body}  
-Only write the category name exactly as listed above (no explanation).  
+Only write the category name exactly as listed above (no explanation).
+"""
+
+CLASSIFICATION_EMAIL_TEMPLATE = """Now classify this email:
+From: {from_field}
+Subject: {subject}
+Email Content: {body}
 Category:
 """
 
+# Micro-batched classification: the same instructions, several emails per call
+BATCH_CLASSIFICATION_INSTRUCTIONS = CLASSIFICATION_INSTRUCTIONS + """
+Batch mode: you will receive several emails, each introduced by a line "### Email <key>".
+Classify every email independently and return only a JSON object mapping each key to its category, e.g.
+{"1": "shipping update", "2": "promos"}
+"""
+
+BATCH_CLASSIFICATION_TEMPLATE = """Now classify these emails:
+
+{emails}
+JSON:
+"""
+
+BATCH_CLASSIFICATION_ITEM_TEMPLATE = """### Email {key}
+From: {from_field}
+Subject: {subject}
+Email Content: {body}
+
+"""
+
 # --------------------------------------------------
 # 🤖 GPT Matching Fallback Prompt
 # --------------------------------------------------
 
-FALLBACK_MATCH_PROMPT = """
-You are helping to identify whether a product description from a shipping email matches any item from a list of known order items.
-
-Extracted Description:
-"{short_desc}"
-
-Known Items (list of dictionaries):
-{candidates}
+FALLBACK_MATCH_INSTRUCTIONS = """You are helping to identify whether a product description from a shipping email matches any item from a list of known order items.
 
 Instructions:
 - Your task is to return the dictionary of the single best-matching item, if one exists.
@@ -486,3 +499,10 @@ Instructions:
 Output Format:
 Return ONLY the matching dictionary from the list. If no match is found, return `null`.
 """
+
+FALLBACK_MATCH_TEMPLATE = """Extracted Description:
+"{short_desc}"
+
+Known Items (list of dictionaries):
+{candidates}
+"""
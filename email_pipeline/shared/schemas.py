@@ -0,0 +1,211 @@
+"""
+📐 shared/schemas.py
+
+Pydantic models mirroring the JSON structures requested by each prompt in
+`prompts/templates.py`. They are sent to OpenAI as strict JSON-schema
+structured outputs and used to validate the response in a single pass, so
+nodes receive typed, already-normalized data.
+"""
+
+import re
+from functools import lru_cache
+from typing import Annotated, List, Optional, Type
+from pydantic import BaseModel, BeforeValidator, ConfigDict
+
+
+# --------------------------------------------------
+# 🧹 Field normalizers (replace per-node cleanup loops)
+# --------------------------------------------------
+
+def _clean_str(value):
+    """Strip whitespace and turn "", "null" and "none" into None."""
+    if isinstance(value, str):
+        value = value.strip()
+        if value == "" or value.lower() in {"null", "none"}:
+            return None
+    return value
+
+
+def _clean_date(value):
+    """Trim datetimes such as 2024-05-01T10:00:00Z down to YYYY-MM-DD."""
+    value = _clean_str(value)
+    if isinstance(value, str) and re.match(r"^\d{4}-\d{2}-\d{2}", value):
+        return value[:10]
+    return value
+
+
+Text = Annotated[Optional[str], BeforeValidator(_clean_str)]
+Date = Annotated[Optional[str], BeforeValidator(_clean_date)]
+Amount = Annotated[Optional[float], BeforeValidator(_clean_str)]
+Quantity = Annotated[Optional[int], BeforeValidator(_clean_str)]
+Flag = Annotated[Optional[bool], BeforeValidator(_clean_str)]
+
+
+class ExtractionModel(BaseModel):
+    """Base model: ignore unexpected keys instead of failing the whole email."""
+    model_config = ConfigDict(extra="ignore")
+
+
+# --------------------------------------------------
+# 🛒 Order / Shipping
+# --------------------------------------------------
+
+class OrderInfo(ExtractionModel):
+    retailer: Text
+    order_id: Text
+    order_date: Date
+    order_total: Amount
+    tax_total: Amount
+    shipping_total: Amount
+    discount_total: Amount
+    shipping_address: Text
+    zip_code: Text
+    archive_flag: Flag
+
+
+class OrderItem(ExtractionModel):
+    item_desc: Text
+    item_price: Amount
+    item_sku: Text
+    item_qty: Quantity
+    item_color: Text
+    item_size: Text
+    item_discount: Amount
+    image_name: Text
+    item_tax: Amount
+    item_shipping: Amount
+    shipping_method: Text
+    tracking_num: Text
+    expected_deliv_date: Date
+    status: Text
+    carrier: Text
+    actual_deliv_date: Date
+
+
+class OrderExtraction(ExtractionModel):
+    order_info: OrderInfo
+    items: List[OrderItem]
+
+
+class ShippingOrderInfo(ExtractionModel):
+    retailer: Text
+    order_id: Text
+    shipping_address: Text
+    zip_code: Text
+
+
+class ShippingExtraction(ExtractionModel):
+    order_info: ShippingOrderInfo
+    items: List[OrderItem]
+
+
+class ShippingUpdateInfo(ExtractionModel):
+    order_id: Text
+    shipping_method: Text
+    tracking_num: Text
+    expected_deliv_date: Date
+    actual_deliv_date: Date
+    status: Text
+    carrier: Text
+    shipping_address: Text
+    zip_code: Text
+
+
+class ShippingUpdateExtraction(ExtractionModel):
+    order_info: ShippingUpdateInfo
+
+
+# --------------------------------------------------
+# ↩️ Returns / Refunds
+# --------------------------------------------------
+
+class ReturnInfo(ExtractionModel):
+    created_at: Date
+    retailer: Text
+    return_id: Text
+    return_method: Text
+    return_tracking_num: Text
+    return_carrier: Text
+    return_confirmation: Text
+    return_dropoff_deadline: Date
+    return_deadline: Date
+    exp_refund_amt: Amount
+    refund_method: Text
+    refund_status: Text
+    exp_refund_date: Date
+    act_refund_date: Date
+    refund_amt: Amount
+    order_id: Text
+    qr_label: Text
+    user_email: Text
+    status: Text
+
+
+class ReturnItem(ExtractionModel):
+    return_item_desc: Text
+    return_item_sku: Text
+    return_item_qty: Quantity
+    return_item_size: Text
+    return_item_color: Text
+    return_reason: Text
+    return_condition: Text
+    item_amt: Amount
+    ship_amt: Amount
+    taxes_amt: Amount
+    other_amt: Amount
+
+
+class RefundExtraction(ExtractionModel):
+    return_info: ReturnInfo
+    items: List[ReturnItem]
+
+
+class ReturnConfirmationExtraction(ExtractionModel):
+    return_info: ReturnInfo
+    items: List[ReturnItem]
+
+
+class ReturnUpdateExtraction(ExtractionModel):
+    return_info: ReturnInfo
+    items: List[ReturnItem]
+
+
+# --------------------------------------------------
+# 🔒 Strict JSON-schema conversion for OpenAI structured outputs
+# --------------------------------------------------
+
+def _make_strict(node):
+    """Recursively apply OpenAI strict-mode rules to a JSON schema fragment."""
+    if isinstance(node, dict):
+        node.pop("title", None)
+        node.pop("default", None)
+        if node.get("type") == "object" and "properties" in node:
+            node["additionalProperties"] = False
+            node["required"] = list(node["properties"])
+        for value in node.values():
+            _make_strict(value)
+    elif isinstance(node, list):
+        for value in node:
+            _make_strict(value)
+    return node
+
+
+@lru_cache(maxsize=None)
+def response_format_for(model: Type[BaseModel]) -> dict:
+    """
+    Build (once per model) the `response_format` payload for strict structured outputs.
+
+    Args:
+        model (Type[BaseModel]): One of the extraction models above.
+
+    Returns:
+        dict: {"type": "json_schema", "json_schema": {...}} ready for chat.completions.create.
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": model.__name__,
+            "strict": True,
+            "schema": _make_strict(model.model_json_schema()),
+        },
+    }
@@ -1,13 +1,84 @@
+import os
+import sys
+import zlib
+from dataclasses import dataclass
 from typing import TypedDict, Optional
 
+# Bodies longer than this (characters) are held zlib-compressed
+EMAIL_BODY_COMPRESS_MIN = int(os.getenv("EMAIL_BODY_COMPRESS_MIN", "2048"))
+
+
+def _intern(value):
+    """Intern repeated short strings (senders, user ids/emails) so emails share one copy."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@dataclass(frozen=True, slots=True)
+class EmailRecord:
+    """
+    The slice of an `email_extracts` row the graph needs.
+
+    Only id, sender, subject, cleaned body, user_id and user_email are kept (no raw
+    HTML or other columns), so every checkpoint of the state stays small. The body
+    is held once, zlib-compressed when large, and decoded on access.
+
+    Nodes can keep reading it like the row dict: `record.get("from")`, `record["msg"]`.
+    """
+    id: Optional[int]
+    sender: str
+    subject: str
+    user_id: Optional[str]
+    user_email: Optional[str]
+    body: bytes
+    compressed: bool = False
+
+    # Row column -> attribute, for dict-style access
+    _COLUMNS = {"from": "sender", "msg": "msg"}
+
+    @classmethod
+    def from_row(cls, row: dict) -> "EmailRecord":
+        """
+        Build a record from an `email_extracts` row, cleaning the HTML body once.
+        """
+        from parser.email_parser import email_text
+
+        body = email_text(row).encode("utf-8")
+        compressed = len(body) >= EMAIL_BODY_COMPRESS_MIN
+        return cls(
+            id=row.get("id"),
+            sender=_intern(row.get("from") or ""),
+            subject=row.get("subject") or "",
+            user_id=_intern(row.get("user_id")),
+            user_email=_intern(row.get("user_email")),
+            body=zlib.compress(body, 1) if compressed else body,
+            compressed=compressed,
+        )
+
+    @property
+    def msg(self) -> str:
+        return (zlib.decompress(self.body) if self.compressed else self.body).decode("utf-8")
+
+    def get(self, key: str, default=None):
+        value = getattr(self, self._COLUMNS.get(key, key), None) if key in _RECORD_KEYS else None
+        return default if value is None else value
+
+    def __getitem__(self, key: str):
+        if key not in _RECORD_KEYS:
+            raise KeyError(key)
+        return getattr(self, self._COLUMNS.get(key, key))
+
+
+_RECORD_KEYS = frozenset({"id", "from", "subject", "msg", "user_id", "user_email"})
+
+
 class AgentState(TypedDict):
     """
     Shared state definition used throughout the LangGraph pipeline.
 
     Attributes:
-        record (dict): The full email record from the database, including fields like
-                       id, subject, body, user_email, etc.
+        record (EmailRecord): The slim email record (id, from, subject, cleaned msg,
+                              user_id, user_email); see `EmailRecord.from_row`.
         category (Optional[str]): The email classification label (e.g., "refund", "shipping confirmation").
     """
-    record: dict
+    record: EmailRecord
     category: Optional[str]
@@ -1,6 +1,6 @@
 import os
+import threading
 from dotenv import load_dotenv
-from supabase import create_client
 
 # Load environment variables from .env
 load_dotenv()
@@ -9,9 +9,39 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
-# Ensure keys are set
-if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
-    raise ValueError("❌ SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY is missing from .env")
+_client = None
+_client_lock = threading.Lock()
 
-# Create global client instance for use across the project
-supabase = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+
+def get_supabase():
+    """
+    Return the shared Supabase client, creating it on first use.
+
+    The `supabase` package and the credentials are only needed once a query is
+    actually made, so importing the pipeline (CLI, tests, cold start) stays cheap.
+
+    Raises:
+        ValueError: If SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY is missing.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # Ensure keys are set
+                if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
+                    raise ValueError("❌ SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY is missing from .env")
+
+                from supabase import create_client
+                _client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+    return _client
+
+
+class _LazySupabase:
+    """Module-level stand-in that creates the real client on first attribute access."""
+
+    def __getattr__(self, name):
+        return getattr(get_supabase(), name)
+
+
+# Global client instance for use across the project (`supabase.table(...)`)
+supabase = _LazySupabase()
@@ -0,0 +1,256 @@
+import os
+import time
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from supabase_client.queries import order_rows_query, project
+from utils.retry import ErrorKind, retry_call
+
+# --------------------------------------------------
+# 🗄️ Per-order row cache
+# --------------------------------------------------
+#
+# One order produces a burst of emails (confirmation, shipped, out for delivery,
+# delivered, return, refund), each of which reads the same order's rows again.
+# `select_order_rows` reads through a cache keyed by (table, user_id, order_id);
+# writes made with `execute_write` fold the returned rows back into any cached
+# entry, so the nodes' own inserts/updates keep it current. Entries expire after
+# ROW_CACHE_TTL seconds (writes from other processes) and the least recently used
+# key is evicted beyond ROW_CACHE_MAX_KEYS.
+#
+# Entries hold only the columns the matching steps read (`queries.ROW_COLUMNS`);
+# absorbed write results are trimmed to the same columns. A (table, primary key)
+# index finds the entry holding a written row without scanning the cache.
+#
+# Reads race with writes: a read that started before a write to its key may
+# finish after the write was absorbed. Every absorbed write stamps its key with a
+# write sequence number; `put` drops a read result older than the key's last
+# write. Empty reads are never cached (the order's first rows may be in flight).
+
+ROW_CACHE_TTL = float(os.getenv("ROW_CACHE_TTL", "900"))
+ROW_CACHE_MAX_KEYS = int(os.getenv("ROW_CACHE_MAX_KEYS", "5000"))
+
+# Primary key per table, used to replace updated rows in place
+PRIMARY_KEYS = {"order_details": "entry_id", "returns_refunds": "id"}
+
+CacheKey = Tuple[str, Optional[str], Optional[str]]
+RowId = Tuple[str, object]  # (table, primary key value)
+
+
+def execute(query, label: str = "supabase"):
+    """
+    Execute a Supabase query builder with DB retry/backoff.
+
+    Args:
+        query: Any postgrest request builder (select/insert/update/upsert).
+        label (str): Short name used in retry log lines, usually the table name.
+
+    Returns:
+        The postgrest APIResponse.
+
+    Raises:
+        RetryExhaustedError: When the query keeps failing after all retries.
+    """
+    return retry_call(query.execute, label=label, default_kind=ErrorKind.DB)
+
+
+def _key(table: str, user_id, order_id) -> CacheKey:
+    return table, str(user_id) if user_id is not None else None, str(order_id) if order_id is not None else None
+
+
+class RowCache:
+    """
+    Thread-safe TTL + LRU cache of row lists per (table, user_id, order_id).
+    """
+
+    def __init__(self, ttl: float = ROW_CACHE_TTL, max_keys: int = ROW_CACHE_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[CacheKey, Tuple[float, List[dict]]]" = OrderedDict()
+        self._owners: Dict[RowId, CacheKey] = {}
+        # Last write per key (bounded; forgotten keys count as written at `_written_floor`)
+        self._write_seq = 0
+        self._written: "OrderedDict[CacheKey, int]" = OrderedDict()
+        self._written_floor = 0
+        self.metrics = Counter()
+
+    # ---------- index & write stamps (lock held) ----------
+
+    def _row_id(self, table: str, row: dict) -> Optional[RowId]:
+        pk = PRIMARY_KEYS.get(table)
+        return (table, row[pk]) if pk and row.get(pk) is not None else None
+
+    def _drop(self, key: CacheKey) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        for row in entry[1]:
+            row_id = self._row_id(key[0], row)
+            if row_id and self._owners.get(row_id) == key:
+                del self._owners[row_id]
+        return True
+
+    def _mark_written(self, key: CacheKey) -> None:
+        self._write_seq += 1
+        self._written[key] = self._write_seq
+        self._written.move_to_end(key)
+        while len(self._written) > self.max_keys:
+            _, seq = self._written.popitem(last=False)
+            self._written_floor = max(self._written_floor, seq)
+
+    # ---------- public API ----------
+
+    def generation(self) -> int:
+        """Write sequence number to pass to `put` for a read started now."""
+        with self._lock:
+            return self._write_seq
+
+    def get(self, key: CacheKey) -> Optional[List[dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.metrics["misses"] += 1
+                return None
+            stored_at, rows = entry
+            if time.monotonic() - stored_at > self.ttl:
+                self._drop(key)
+                self.metrics["expired"] += 1
+                self.metrics["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.metrics["hits"] += 1
+            return [dict(row) for row in rows]
+
+    def put(self, key: CacheKey, rows: List[dict], generation: Optional[int] = None) -> None:
+        """
+        Cache `rows` for `key`. With `generation` (from `generation()` before the read),
+        the rows are dropped if the key was written since.
+        """
+        with self._lock:
+            if generation is not None and self._written.get(key, self._written_floor) > generation:
+                self.metrics["stale_puts"] += 1
+                return
+            self._drop(key)
+            self._entries[key] = (time.monotonic(), [dict(row) for row in rows])
+            for row in rows:
+                row_id = self._row_id(key[0], row)
+                if row_id:
+                    self._owners[row_id] = key
+            while len(self._entries) > self.max_keys:
+                self._drop(next(iter(self._entries)))
+                self.metrics["evictions"] += 1
+
+    def invalidate(self, key: CacheKey) -> None:
+        with self._lock:
+            self._mark_written(key)
+            if self._drop(key):
+                self.metrics["invalidations"] += 1
+
+    def absorb(self, table: str, rows: Iterable[dict]) -> None:
+        """
+        Fold rows returned by an insert/update into the cached entries they belong to.
+
+        Rows replace the cached row with the same primary key (and are removed from
+        the entry that held them, in case their order_id changed) or are appended.
+        Keys that are not cached are left alone: a partial entry would hide older DB
+        rows. Without a known primary key the affected entries are invalidated instead.
+        Every key touched is stamped as written, so reads still in flight don't cache.
+        """
+        pk = PRIMARY_KEYS.get(table)
+        with self._lock:
+            for row in rows:
+                key = _key(table, row.get("user_id"), row.get("order_id"))
+                self._mark_written(key)
+                row_id = self._row_id(table, row)
+                if row_id is None:
+                    if self._drop(key):
+                        self.metrics["invalidations"] += 1
+                    continue
+
+                owner = self._owners.get(row_id)
+                if owner is not None and owner != key:
+                    self._mark_written(owner)
+                    del self._owners[row_id]
+                    moved_from = self._entries.get(owner)
+                    if moved_from is not None:
+                        moved_from[1][:] = [r for r in moved_from[1] if r.get(pk) != row[pk]]
+
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                row = project(table, row)
+                cached = entry[1]
+                for index, existing in enumerate(cached):
+                    if existing.get(pk) == row[pk]:
+                        cached[index] = dict(row)
+                        break
+                else:
+                    cached.append(dict(row))
+                self._owners[row_id] = key
+                self.metrics["absorbed"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._owners.clear()
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: keys / hits / misses / expired / evictions / invalidations / absorbed /
+                  stale_puts and hit_rate.
+        """
+        with self._lock:
+            stats = dict(self.metrics)
+            stats["keys"] = len(self._entries)
+        lookups = stats.get("hits", 0) + stats.get("misses", 0)
+        stats["hit_rate"] = round(stats.get("hits", 0) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+row_cache = RowCache()
+
+
+def select_order_rows(table: str, user_id, order_id) -> List[dict]:
+    """
+    Read all rows of one user's order, through the row cache.
+
+    Only the matching columns are selected (`queries.ROW_COLUMNS`); callers that
+    write rows back do so by primary key. Empty results are not cached, and a result
+    is not cached if the order was written while it was being read.
+
+    Args:
+        table (str): "order_details" or "returns_refunds".
+        user_id: Owner of the order.
+        order_id: Order to read.
+
+    Returns:
+        List[dict]: The rows (copies; safe to mutate).
+    """
+    key = _key(table, user_id, order_id)
+    rows = row_cache.get(key)
+    if rows is not None:
+        return rows
+
+    generation = row_cache.generation()
+    rows = execute(order_rows_query(table, user_id, order_id), label=table).data or []
+    if rows:
+        row_cache.put(key, rows, generation)
+    return [dict(row) for row in rows]
+
+
+def execute_write(query, table: str):
+    """
+    Execute an insert/update/upsert with retries and keep the row cache current.
+
+    Args:
+        query: postgrest write builder (returning the written rows, the default).
+        table (str): Table being written.
+
+    Returns:
+        The postgrest APIResponse.
+    """
+    response = execute(query, label=table)
+    row_cache.absorb(table, response.data or [])
+    return response
@@ -0,0 +1,131 @@
+import os
+import json
+from datetime import datetime, timezone
+from typing import List
+from supabase_client import supabase
+from supabase_client.db_client import execute
+from supabase_client.queries import DEAD_LETTER_COLUMNS, select_columns
+from utils.retry import PipelineStageError, classify_error
+
+# --------------------------------------------------
+# ☠️ Dead-letter store for emails that exhausted their retries
+# --------------------------------------------------
+#
+# Rows live in the Supabase `dead_letter_emails` table:
+#   id, email_id, stage, error_kind, error, payload (jsonb), attempts,
+#   status ('pending' | 'redriven'), created_at, updated_at
+#
+# If the DB itself is the thing that is failing, the entry is spooled to a
+# local JSONL file and flushed into the table on the next redrive.
+
+DEAD_LETTER_TABLE = "dead_letter_emails"
+DEAD_LETTER_SPOOL = os.getenv("DEAD_LETTER_SPOOL", "dead_letters.jsonl")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def build_dead_letter(email: dict, error: BaseException) -> dict:
+    """
+    Build a dead-letter row for a failed email.
+
+    Args:
+        email (dict): The email_extracts record that failed.
+        error (BaseException): The exception raised by the workflow.
+
+    Returns:
+        dict: Row ready for insertion into `dead_letter_emails`.
+    """
+    stage = error.stage if isinstance(error, PipelineStageError) else "ingest"
+    cause = error.cause if isinstance(error, PipelineStageError) else error
+
+    return {
+        "email_id": email.get("id"),
+        "stage": stage,
+        "error_kind": classify_error(error).value,
+        "error": f"{type(cause).__name__}: {cause}"[:2000],
+        "payload": email,
+        "attempts": 1,
+        "status": "pending",
+        "created_at": _now(),
+        "updated_at": _now(),
+    }
+
+
+def record_dead_letter(email: dict, error: BaseException) -> None:
+    """
+    Persist a failed email to the dead-letter table (or the local spool if the DB is down).
+    """
+    row = build_dead_letter(email, error)
+    try:
+        execute(supabase.table(DEAD_LETTER_TABLE).insert(row), label=DEAD_LETTER_TABLE)
+        print(f"☠️ Dead-lettered email ID {row['email_id']} at stage '{row['stage']}' ({row['error_kind']})")
+    except Exception as e:
+        with open(DEAD_LETTER_SPOOL, "a", encoding="utf-8") as spool:
+            spool.write(json.dumps(row, default=str) + "\n")
+        print(f"💾 DB unavailable ({e}); spooled dead letter for email ID {row['email_id']} to {DEAD_LETTER_SPOOL}")
+
+
+def flush_spool() -> int:
+    """
+    Move locally spooled dead letters into the Supabase table.
+
+    Returns:
+        int: Number of spooled rows flushed.
+    """
+    if not os.path.exists(DEAD_LETTER_SPOOL):
+        return 0
+
+    with open(DEAD_LETTER_SPOOL, encoding="utf-8") as spool:
+        rows = [json.loads(line) for line in spool if line.strip()]
+
+    if rows:
+        execute(supabase.table(DEAD_LETTER_TABLE).insert(rows), label=DEAD_LETTER_TABLE)
+    os.remove(DEAD_LETTER_SPOOL)
+    return len(rows)
+
+
+def fetch_pending(limit: int = 100) -> List[dict]:
+    """
+    Fetch pending dead letters, oldest first.
+    """
+    response = execute(
+        select_columns(DEAD_LETTER_TABLE, DEAD_LETTER_COLUMNS)
+        .eq("status", "pending")
+        .order("id")
+        .limit(limit),
+        label=DEAD_LETTER_TABLE
+    )
+    return response.data or []
+
+
+def mark_redriven(dead_letter_id: int) -> None:
+    """
+    Mark a dead letter as successfully reprocessed.
+    """
+    execute(
+        supabase.table(DEAD_LETTER_TABLE)
+        .update({"status": "redriven", "updated_at": _now()})
+        .eq("id", dead_letter_id),
+        label=DEAD_LETTER_TABLE
+    )
+
+
+def mark_failed_again(dead_letter: dict, error: BaseException) -> None:
+    """
+    Record another failed redrive attempt, keeping the row pending.
+    """
+    row = build_dead_letter(dead_letter["payload"], error)
+    execute(
+        supabase.table(DEAD_LETTER_TABLE)
+        .update({
+            "stage": row["stage"],
+            "error_kind": row["error_kind"],
+            "error": row["error"],
+            "attempts": (dead_letter.get("attempts") or 1) + 1,
+            "updated_at": _now(),
+        })
+        .eq("id", dead_letter["id"]),
+        label=DEAD_LETTER_TABLE
+    )
@@ -0,0 +1,171 @@
+"""
+🗂️ supabase_client/queries.py
+
+Column-pruned query builders.
+
+Every read names the columns its matching step uses instead of `select("*")`:
+order rows carry the keys and item attributes, tracking lookups only what the
+update needs, email pages only what `EmailRecord` keeps. Filters stay server-side
+(`eq` / `ilike` / `gt`) and line up with the index set in `sql/indexes.sql`.
+
+With DB_NORMALIZED_COLUMNS=1 (after applying `sql/indexes.sql`) the item
+description / color / size are also read from their generated `*_norm` columns,
+computed by the `normalize_item_text` SQL function at write time, and the
+matching helpers below compare against those instead of lower-casing in Python.
+`normalize_item_text` here is the Python mirror used for the extracted side (and
+for rows that were written before the migration).
+"""
+
+import os
+import re
+from typing import Iterable, Optional, Tuple
+from supabase_client import supabase
+
+DB_NORMALIZED_COLUMNS = os.getenv("DB_NORMALIZED_COLUMNS", "0") == "1"
+
+# Attributes with a generated `<column>_norm` twin (see sql/indexes.sql)
+NORMALIZED_FIELDS = {
+    "order_details": ("item_desc", "item_color", "item_size"),
+    "returns_refunds": ("return_item_desc", "return_item_color", "return_item_size"),
+}
+
+
+def _with_norm(table: str, columns: Tuple[str, ...]) -> Tuple[str, ...]:
+    if not DB_NORMALIZED_COLUMNS:
+        return columns
+    return columns + tuple(f"{field}_norm" for field in NORMALIZED_FIELDS[table] if field in columns)
+
+
+# --------------------------------------------------
+# 📋 Column sets per matching step
+# --------------------------------------------------
+
+# Everything `EmailRecord.from_row` keeps
+EMAIL_COLUMNS = ("id", "from", "subject", "msg", "user_id", "user_email")
+
+# Shipping / shipping-update matching, the item index and the GPT fallback (needs entry_id)
+ORDER_MATCH_COLUMNS = _with_norm("order_details", (
+    "entry_id", "user_id", "order_id", "item_desc", "item_color", "item_size", "item_sku", "tracking_num"
+))
+
+# Shipping-update fallback by tracking number
+TRACKING_COLUMNS = ("entry_id", "order_id", "tracking_num")
+
+# Returns matching: identity columns (also the protected fields) + attributes compared
+RETURN_MATCH_COLUMNS = _with_norm("returns_refunds", (
+    "id", "return_id", "order_id", "return_item_desc", "return_item_sku", "return_item_size", "return_item_color"
+))
+
+# Redrive only replays the payload and bumps the attempt counter
+DEAD_LETTER_COLUMNS = ("id", "payload", "attempts")
+
+# Columns read through `select_order_rows`, per table
+ROW_COLUMNS = {
+    "order_details": ORDER_MATCH_COLUMNS,
+    "returns_refunds": RETURN_MATCH_COLUMNS,
+}
+
+
+def select_columns(table: str, columns: Iterable[str]):
+    """
+    Start a select on `table` limited to `columns`.
+
+    Returns:
+        postgrest select builder.
+    """
+    return supabase.table(table).select(",".join(columns))
+
+
+def project(table: str, row: dict) -> dict:
+    """Trim a full row (e.g. returned by a write) to the columns read for `table`."""
+    columns = ROW_COLUMNS.get(table)
+    if columns is None:
+        return dict(row)
+    return {column: row[column] for column in columns if column in row}
+
+
+# --------------------------------------------------
+# 🔎 Query builders
+# --------------------------------------------------
+
+def order_rows_query(table: str, user_id, order_id):
+    """All rows of one user's order (index: `(user_id, order_id)`)."""
+    return select_columns(table, ROW_COLUMNS.get(table, ("*",))).eq("user_id", user_id).eq("order_id", order_id)
+
+
+def tracking_rows_query(user_id, tracking_num: str):
+    """Order rows of one user carrying a tracking number (index: `(user_id, tracking_num)`)."""
+    return select_columns("order_details", TRACKING_COLUMNS).eq("user_id", user_id).eq("tracking_num", tracking_num)
+
+
+def return_candidates_query(filters: Iterable[str]):
+    """
+    Return rows whose return_id / order_id contain an extracted ID.
+
+    Args:
+        filters: PostgREST `ilike` filters (served by the trigram indexes).
+    """
+    return select_columns("returns_refunds", RETURN_MATCH_COLUMNS).or_(",".join(sorted(filters)))
+
+
+def rows_by_key_query(table: str, key: str, values: Iterable):
+    """Full rows for a set of primary keys (complete, uniform payloads for bulk upserts)."""
+    return supabase.table(table).select("*").in_(key, list(values))
+
+
+def email_page_query(table: str, after: Optional[int] = None, before: Optional[int] = None,
+                     limit: int = 500, newest_first: bool = False):
+    """
+    A page of emails by id (primary key index), with only the columns the pipeline reads.
+    """
+    query = select_columns(table, EMAIL_COLUMNS)
+    if after is not None:
+        query = query.gt("id", after)
+    if before is not None:
+        query = query.lt("id", before)
+    return query.order("id", desc=newest_first).limit(limit)
+
+
+# --------------------------------------------------
+# 🔤 Normalized matching
+# --------------------------------------------------
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_item_text(value: Optional[str]) -> Optional[str]:
+    """
+    Python mirror of the `normalize_item_text` SQL function: lower-case, every run of
+    non-alphanumerics collapsed to one space, trimmed; empty -> None.
+    """
+    if value is None:
+        return None
+    return _NON_ALNUM.sub(" ", str(value).lower()).strip() or None
+
+
+def _row_norm(row: dict, field: str) -> str:
+    norm_field = f"{field}_norm"
+    if norm_field in row:
+        return row[norm_field] or ""
+    return normalize_item_text(row.get(field)) or ""
+
+
+def text_contains(value: Optional[str], row: dict, field: str) -> bool:
+    """
+    Case-insensitive "row[field] contains value"; on normalized text with DB_NORMALIZED_COLUMNS=1.
+    """
+    if not value:
+        return False
+    if DB_NORMALIZED_COLUMNS:
+        needle = normalize_item_text(value)
+        return bool(needle) and needle in _row_norm(row, field)
+    return value.lower() in (row.get(field) or "").lower()
+
+
+def text_equals(value: Optional[str], row: dict, field: str) -> bool:
+    """
+    "row[field] == value"; on normalized text with DB_NORMALIZED_COLUMNS=1.
+    """
+    if DB_NORMALIZED_COLUMNS:
+        return bool(value) and normalize_item_text(value) == _row_norm(row, field)
+    return row.get(field) == value
@@ -0,0 +1,276 @@
+"""
+📐 supabase_client/query_benchmark.py
+
+Query-plan and latency benchmark for the pipeline's reads against a local Postgres.
+
+Builds scratch copies of `order_details`, `returns_refunds`, `email_extracts` and
+`dead_letter_emails` in their own schema, fills them with synthetic rows, and runs
+the SQL PostgREST generates for each query builder in `supabase_client/queries.py`:
+
+    - `select *` (before) vs the pruned column list (after)
+    - without and with `sql/indexes.sql` applied
+
+For every combination it prints the plan's scan nodes, the row width the planner
+expects, the server-side execution time and client-side p50/p95 latency (which
+includes transferring the selected columns).
+
+Usage:
+    python -m supabase_client.query_benchmark --dsn postgresql://postgres@localhost/postgres --rows 200000
+
+Requires psycopg2 and a server with the pg_trgm extension available. The scratch
+schema is dropped afterwards unless --keep is given.
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+from typing import Callable, Dict, List, Tuple
+from supabase_client.queries import (
+    DEAD_LETTER_COLUMNS, EMAIL_COLUMNS, ORDER_MATCH_COLUMNS, RETURN_MATCH_COLUMNS, TRACKING_COLUMNS
+)
+
+SCHEMA = "query_bench"
+INDEXES_SQL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sql", "indexes.sql")
+
+# Column layout of the production tables (types as the pipeline writes them)
+TABLES_SQL = """
+create table order_details (
+    entry_id bigserial primary key,
+    user_id text, user_email text, retailer text, order_id text, order_date date,
+    order_total numeric, tax_total numeric, shipping_total numeric, discount_total numeric,
+    shipping_address text, zip_code text, archive_flag boolean,
+    item_desc text, item_price numeric, item_sku text, item_qty integer, item_color text, item_size text,
+    item_discount numeric, image_name text, item_tax numeric, item_shipping numeric, shipping_method text,
+    tracking_num text, expected_deliv_date date, status text, carrier text, actual_deliv_date date
+);
+
+create table returns_refunds (
+    id bigserial primary key,
+    user_email text, created_at date, retailer text, return_id text, return_method text,
+    return_tracking_num text, return_carrier text, return_confirmation text,
+    return_dropoff_deadline date, return_deadline date, exp_refund_amt numeric, refund_method text,
+    refund_status text, exp_refund_date date, act_refund_date date, refund_amt numeric, order_id text,
+    qr_label text, status text, return_item_desc text, return_item_sku text, return_item_qty integer,
+    return_item_size text, return_item_color text, return_reason text, return_condition text,
+    item_amt numeric, ship_amt numeric, taxes_amt numeric, other_amt numeric
+);
+
+create table email_extracts (
+    id bigserial primary key,
+    "from" text, subject text, msg text, user_id text, user_email text, created_at timestamptz default now()
+);
+
+create table dead_letter_emails (
+    id bigserial primary key,
+    email_id bigint, stage text, error_kind text, error text, payload jsonb, attempts integer,
+    status text, created_at timestamptz, updated_at timestamptz
+);
+"""
+
+# Three items per order, ~70% shipped, one return row per ten order rows (`%%` is a literal modulo for psycopg2)
+LOAD_SQL = """
+insert into order_details (
+    user_id, user_email, retailer, order_id, order_date, order_total, tax_total, shipping_total, discount_total,
+    shipping_address, zip_code, archive_flag, item_desc, item_price, item_sku, item_qty, item_color, item_size,
+    item_discount, image_name, item_tax, item_shipping, shipping_method, tracking_num, expected_deliv_date,
+    status, carrier, actual_deliv_date
+)
+select
+    'user-' || (i / 3) %% %(users)s, 'user' || (i / 3) %% %(users)s || '@example.com', 'Retailer ' || i %% 40,
+    'ORD-' || i / 3, date '2024-01-01' + i %% 365, 120.50, 9.10, 5.00, 0,
+    i || ' Long Street Name Apartment ' || i %% 500 || ', Springfield, IL', lpad((i %% 99999)::text, 5, '0'), false,
+    'Relaxed Fit Cotton Item ' || md5(i::text), 40.17, 'SKU' || i, 1 + i %% 3,
+    (array['Navy Blue', 'Black', 'Off-White', 'Heather Grey'])[1 + i %% 4], (array['S', 'M', 'L', 'XL'])[1 + i %% 4],
+    0, 'https://cdn.example.com/images/' || md5((i * 7)::text) || '.jpg', 3.05, 0, 'Standard',
+    case when i %% 10 < 7 then '1Z' || lpad((i / 3)::text, 16, '0') end, date '2024-01-08' + i %% 365,
+    'shipped', 'UPS', null
+from generate_series(1, %(rows)s) as i;
+
+insert into returns_refunds (
+    user_email, created_at, retailer, return_id, return_method, return_tracking_num, return_carrier,
+    return_confirmation, return_deadline, exp_refund_amt, refund_method, refund_status, order_id, status,
+    return_item_desc, return_item_sku, return_item_qty, return_item_size, return_item_color, return_reason, item_amt
+)
+select
+    'user' || i %% %(users)s || '@example.com', date '2024-02-01' + i %% 365, 'Retailer ' || i %% 40,
+    'RMA-' || i / 2, 'Drop-off', '9400' || lpad(i::text, 18, '0'), 'USPS', 'Confirmed', date '2024-03-01' + i %% 365,
+    40.17, 'Original payment', 'pending', 'ORD-' || (i * 5) / 3, 'return_started',
+    'Relaxed Fit Cotton Item ' || md5((i * 5)::text), 'SKU' || i * 5, 1,
+    (array['S', 'M', 'L', 'XL'])[1 + i %% 4], (array['Navy Blue', 'Black', 'Off-White', 'Heather Grey'])[1 + i %% 4],
+    'Too small', 40.17
+from generate_series(1, %(rows)s / 10) as i;
+
+insert into email_extracts ("from", subject, msg, user_id, user_email)
+select
+    'orders@retailer' || i %% 40 || '.com', 'Your order ORD-' || i || ' has shipped',
+    repeat('Thanks for your order. ' || md5(i::text) || ' ', 40), 'user-' || i %% %(users)s,
+    'user' || i %% %(users)s || '@example.com'
+from generate_series(1, %(rows)s / 2) as i;
+
+insert into dead_letter_emails (email_id, stage, error_kind, error, payload, attempts, status, created_at, updated_at)
+select
+    i, 'extract', 'rate_limit', 'RateLimitError: too many requests',
+    jsonb_build_object('id', i, 'subject', 'Order ' || i, 'msg', repeat('x', 2000)), 1,
+    case when i %% 50 = 0 then 'pending' else 'redriven' end, now(), now()
+from generate_series(1, %(rows)s / 20) as i;
+"""
+
+
+def _columns(columns) -> str:
+    return ", ".join(f'"{column}"' for column in columns)
+
+
+def build_cases(rows: int, users: int, rng: random.Random) -> Dict[str, Tuple[str, Callable[[], tuple]]]:
+    """
+    Parameterized SQL per query builder, as PostgREST renders it, with a parameter sampler.
+
+    `{columns}` is replaced by `*` or the pruned list.
+    """
+    def order_params():
+        i = rng.randint(1, rows)
+        return f"user-{(i // 3) % users}", f"ORD-{i // 3}"
+
+    def tracking_params():
+        i = rng.randint(1, rows)
+        return f"user-{(i // 3) % users}", f"1Z{i // 3:016d}"
+
+    def return_params():
+        i = rng.randint(1, rows // 10)
+        return f"%RMA-{i // 2}%", f"%ORD-{(i * 5) // 3}%"
+
+    def page_params():
+        return (rng.randint(1, rows // 2),)
+
+    return {
+        "order_rows_query": (
+            "select {columns} from order_details where user_id = %s and order_id = %s", order_params),
+        "tracking_rows_query": (
+            "select {columns} from order_details where user_id = %s and tracking_num = %s", tracking_params),
+        "return_candidates_query": (
+            "select {columns} from returns_refunds where return_id ilike %s or order_id ilike %s", return_params),
+        "email_page_query": (
+            "select {columns} from email_extracts where id > %s order by id limit 500", page_params),
+        "fetch_pending": (
+            "select {columns} from dead_letter_emails where status = 'pending' order by id limit 100", lambda: ()),
+    }
+
+
+PRUNED = {
+    "order_rows_query": ORDER_MATCH_COLUMNS,
+    "tracking_rows_query": TRACKING_COLUMNS,
+    "return_candidates_query": RETURN_MATCH_COLUMNS,
+    "email_page_query": EMAIL_COLUMNS,
+    "fetch_pending": DEAD_LETTER_COLUMNS,
+}
+
+
+def _scan_nodes(plan: dict) -> List[str]:
+    nodes = []
+    if "Scan" in plan["Node Type"] or plan["Node Type"] == "BitmapOr":
+        name = plan["Node Type"]
+        if plan.get("Index Name"):
+            name += f" ({plan['Index Name']})"
+        nodes.append(name)
+    for child in plan.get("Plans", []):
+        nodes.extend(_scan_nodes(child))
+    return nodes
+
+
+def measure(cursor, sql: str, sample: Callable[[], tuple], iterations: int) -> dict:
+    """
+    Returns:
+        dict: plan (scan nodes), width (bytes/row estimate), exec_ms (server, median of 5),
+              p50_ms / p95_ms (client round trip incl. fetch), rows (last run).
+    """
+    explained = []
+    for _ in range(5):
+        cursor.execute(f"explain (analyze, format json) {sql}", sample())
+        explained.append(cursor.fetchone()[0][0])
+    explained.sort(key=lambda entry: entry["Execution Time"])
+    median = explained[len(explained) // 2]
+
+    latencies, fetched = [], 0
+    for _ in range(iterations):
+        params = sample()
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        fetched = len(cursor.fetchall())
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "plan": " + ".join(_scan_nodes(median["Plan"])),
+        "width": median["Plan"]["Plan Width"],
+        "exec_ms": round(median["Execution Time"], 3),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+        "rows": fetched,
+    }
+
+
+def run(dsn: str, rows: int, users: int, iterations: int, keep: bool, seed: int) -> List[dict]:
+    import psycopg2
+
+    connection = psycopg2.connect(dsn)
+    connection.autocommit = True
+    connection.set_client_encoding("UTF8")  # indexes.sql is UTF-8 (comments)
+    cursor = connection.cursor()
+    results = []
+    try:
+        cursor.execute("create extension if not exists pg_trgm")
+        cursor.execute(f"drop schema if exists {SCHEMA} cascade")
+        cursor.execute(f"create schema {SCHEMA}")
+        cursor.execute(f"set search_path to {SCHEMA}, public")
+        cursor.execute(TABLES_SQL)
+
+        print(f"📥 Loading {rows} order rows (+ returns, emails, dead letters)...")
+        start = time.perf_counter()
+        cursor.execute(LOAD_SQL, {"rows": rows, "users": users})
+        cursor.execute("analyze")
+        print(f"   loaded in {time.perf_counter() - start:.1f}s")
+
+        cases = build_cases(rows, users, random.Random(seed))
+        for phase in ("no indexes", "indexes.sql"):
+            if phase == "indexes.sql":
+                print(f"🗂️ Applying {INDEXES_SQL}...")
+                with open(INDEXES_SQL, encoding="utf-8") as f:
+                    cursor.execute(f.read())
+                cursor.execute("analyze")
+
+            for name, (template, sample) in cases.items():
+                # The generated *_norm columns only exist once indexes.sql is applied
+                pruned = [c for c in PRUNED[name] if phase == "indexes.sql" or not c.endswith("_norm")]
+                for variant, columns in (("select *", "*"), ("pruned", _columns(pruned))):
+                    result = measure(cursor, template.format(columns=columns), sample, iterations)
+                    results.append({"query": name, "phase": phase, "variant": variant, **result})
+                    print(f"   {phase:<11} | {name:<23} | {variant:<8} | {result['plan']:<60} | "
+                          f"width {result['width']:>5} | exec {result['exec_ms']:>8.3f}ms | "
+                          f"p50 {result['p50_ms']:>8.3f}ms | p95 {result['p95_ms']:>8.3f}ms")
+    finally:
+        if not keep:
+            cursor.execute(f"drop schema if exists {SCHEMA} cascade")
+        connection.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark query plans/latency for the pipeline's reads")
+    parser.add_argument("--dsn", default=os.getenv("BENCHMARK_DSN", "postgresql://postgres@localhost:5432/postgres"))
+    parser.add_argument("--rows", type=int, default=200_000, help="order_details rows to generate")
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--iterations", type=int, default=200, help="timed runs per query/variant")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--keep", action="store_true", help=f"Keep the {SCHEMA} schema for manual EXPLAINs")
+    args = parser.parse_args()
+
+    results = run(args.dsn, args.rows, args.users, args.iterations, args.keep, args.seed)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
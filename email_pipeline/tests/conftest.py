@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The pipeline's modules import each other from the email_pipeline directory (e.g. `from workflow.graph import ...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
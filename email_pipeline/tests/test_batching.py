@@ -0,0 +1,62 @@
+import threading
+import time
+
+from LLM.batching import MicroBatcher
+
+
+class _Recorder:
+    def __init__(self, answer=lambda item: item * 10):
+        self.batches = []
+        self.answer = answer
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        return [self.answer(item) for item in items]
+
+
+def test_a_full_batch_flushes_before_the_window():
+    calls = _Recorder()
+    batcher = MicroBatcher(calls, max_size=3, window_s=10, name="test")
+    start = time.monotonic()
+    futures = [batcher.submit(n) for n in range(3)]
+    assert [future.result(timeout=2) for future in futures] == [0, 10, 20]
+    assert time.monotonic() - start < 2
+    assert calls.batches == [[0, 1, 2]]
+
+
+def test_the_window_flushes_a_partial_batch():
+    calls = _Recorder()
+    batcher = MicroBatcher(calls, max_size=10, window_s=0.05, name="test")
+    first = batcher.submit(1)
+    second = batcher.submit(2)
+    assert (first.result(timeout=2), second.result(timeout=2)) == (10, 20)
+    assert calls.batches == [[1, 2]]
+
+    late = batcher.submit(3)  # after the flush: starts a new window
+    assert late.result(timeout=2) == 30
+    assert calls.batches == [[1, 2], [3]]
+    assert batcher.summary()["batches"] == 2
+
+
+def test_overflow_goes_to_the_next_batch():
+    release = threading.Event()
+    calls = _Recorder(answer=lambda item: release.wait(2) and item)
+    batcher = MicroBatcher(calls, max_size=2, window_s=0.05, name="test")
+    futures = [batcher.submit(n) for n in range(5)]
+    release.set()
+    assert [future.result(timeout=2) for future in futures] == [0, 1, 2, 3, 4]
+    assert sorted(map(len, calls.batches)) == [1, 2, 2]
+
+
+def test_missing_answers_and_failed_batches_resolve_to_none():
+    batcher = MicroBatcher(lambda items: [None if item % 2 else item for item in items],
+                           max_size=4, window_s=0.05, name="test")
+    assert [f.result(timeout=2) for f in [batcher.submit(n) for n in range(4)]] == [0, None, 2, None]
+    assert batcher.summary()["unanswered"] == 2
+
+    def fail(items):
+        raise RuntimeError("429")
+
+    failing = MicroBatcher(fail, max_size=2, window_s=0.05, name="test")
+    assert [f.result(timeout=2) for f in [failing.submit(n) for n in range(2)]] == [None, None]
+    assert failing.summary()["failed_batches"] == 1
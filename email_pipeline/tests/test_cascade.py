@@ -0,0 +1,102 @@
+import json
+
+import httpx
+import pytest
+
+import LLM.cascade as cascade
+import utils.retry as retry
+from LLM.cascade import CascadeStats, ModelTier, load_cascades, run_cascade
+from utils.retry import ErrorKind, RetryExhaustedError
+
+
+@pytest.fixture(autouse=True)
+def tiers(monkeypatch):
+    monkeypatch.setattr(cascade, "CASCADES", load_cascades(enabled=True, raw=""))
+    monkeypatch.setattr(cascade, "cascade_stats", CascadeStats())
+    monkeypatch.setattr(retry.time, "sleep", lambda seconds: None)
+
+
+def _rate_limited() -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return httpx.HTTPStatusError("429", request=request, response=httpx.Response(429, request=request))
+
+
+class _Invoke:
+    """Stub `call(tier)`: per model, a list of outcomes (exceptions are raised), consumed in order."""
+
+    def __init__(self, outcomes: dict):
+        self.outcomes = {model: list(results) for model, results in outcomes.items()}
+        self.models = []
+
+    def __call__(self, tier: ModelTier):
+        self.models.append(tier.model)
+        outcome = self.outcomes[tier.model].pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def test_legacy_and_default_tier_selection(tmp_path):
+    assert [t.model for t in load_cascades(enabled=False, raw="")["classify"]] == ["gpt-4o-mini"]
+    assert [t.model for t in load_cascades(enabled=False, raw="")["default"]] == ["gpt-4o-mini"]
+    enabled = load_cascades(enabled=True, raw="")
+    assert [t.model for t in enabled["classify"]] == ["gpt-4.1-nano", "gpt-4o-mini"]
+    assert [t.model for t in enabled["default"]] == ["gpt-4o-mini", "gpt-4o"]
+    assert cascade.tiers_for("refund") == enabled["default"]
+
+    config = tmp_path / "cascade.json"
+    config.write_text(json.dumps({"refund": [{"model": "local-7b", "base_url": "http://localhost:8000/v1"}]}))
+    [tier] = load_cascades(enabled=False, raw=str(config))["refund"]
+    assert (tier.model, tier.label, tier.api_key) == ("local-7b", "local-7b@http://localhost:8000/v1", "local")
+    with pytest.raises(ValueError):
+        load_cascades(raw='{"refund": []}')
+
+
+def test_rejected_cheap_tier_escalates_and_the_last_answer_is_returned():
+    invoke = _Invoke({"gpt-4.1-nano": ["nonsense"], "gpt-4o-mini": ["still unsure"]})
+    result = run_cascade("classify", invoke, check=lambda label: "unknown label")
+    assert result == "still unsure"  # the last tier is returned even though the check rejects it
+    assert invoke.models == ["gpt-4.1-nano", "gpt-4o-mini"]
+
+    tiers = cascade.cascade_stats.summary()["classify"]
+    assert tiers["tiers"]["gpt-4.1-nano"]["escalated"] == 1 and tiers["tiers"]["gpt-4o-mini"]["accepted"] == 1
+    assert tiers["reasons"] == {"unknown label": 1}
+
+
+def test_accepted_cheap_tier_stops_the_cascade():
+    invoke = _Invoke({"gpt-4.1-nano": ["refund"]})
+    assert run_cascade("classify", invoke, check=lambda label: None) == "refund"
+    assert invoke.models == ["gpt-4.1-nano"]
+
+
+def test_invalid_json_escalates_without_retrying_the_cheap_tier():
+    bad = json.JSONDecodeError("Unterminated string", '{"order', 2)
+    invoke = _Invoke({"gpt-4o-mini": [bad], "gpt-4o": [{"order_id": "A-1"}]})
+    assert run_cascade("order", invoke) == {"order_id": "A-1"}
+    assert invoke.models == ["gpt-4o-mini", "gpt-4o"]
+    assert cascade.cascade_stats.summary()["order"]["reasons"] == {"invalid_output": 1}
+
+
+def test_invalid_json_on_the_last_tier_is_retried_then_raised():
+    bad = json.JSONDecodeError("Unterminated string", '{"order', 2)
+    invoke = _Invoke({"gpt-4o-mini": [bad], "gpt-4o": [bad] * 3})
+    with pytest.raises(RetryExhaustedError) as info:
+        run_cascade("order", invoke)
+    assert info.value.kind is ErrorKind.JSON_DECODE
+    assert invoke.models == ["gpt-4o-mini"] + ["gpt-4o"] * retry.RETRY_POLICIES[ErrorKind.JSON_DECODE].max_attempts
+
+
+def test_rate_limits_are_retried_on_the_same_tier():
+    invoke = _Invoke({"gpt-4.1-nano": [_rate_limited(), _rate_limited(), "refund"]})
+    assert run_cascade("classify", invoke, check=lambda label: None) == "refund"
+    assert invoke.models == ["gpt-4.1-nano"] * 3
+
+
+def test_exhausted_rate_limits_fail_instead_of_escalating():
+    attempts = retry.RETRY_POLICIES[ErrorKind.RATE_LIMIT].max_attempts
+    invoke = _Invoke({"gpt-4.1-nano": [_rate_limited() for _ in range(attempts)], "gpt-4o-mini": ["refund"]})
+    with pytest.raises(RetryExhaustedError) as info:
+        run_cascade("classify", invoke)
+    assert info.value.kind is ErrorKind.RATE_LIMIT
+    assert invoke.models == ["gpt-4.1-nano"] * attempts
+    assert cascade.cascade_stats.summary()["classify"]["tiers"]["gpt-4.1-nano"]["failed"] == 1
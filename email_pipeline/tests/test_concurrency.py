@@ -0,0 +1,56 @@
+from utils.retry import ErrorKind
+from workflow.concurrency import AdaptiveLimit
+
+
+def _limit(**kwargs) -> AdaptiveLimit:
+    options = {"initial": 4, "min_limit": 1, "max_limit": 16, "backoff": 0.5, "tolerance": 2.0, "cooldown": 0}
+    options.update(kwargs)
+    return AdaptiveLimit(**options)
+
+
+def test_additive_increase_only_while_the_limit_is_used():
+    limit = _limit()
+    for _ in range(8):
+        limit.record(1.0, None, in_flight=1)
+    assert limit.limit == 4
+
+    for _ in range(8):
+        limit.record(1.0, None, in_flight=limit.limit)
+    assert limit.limit == 5  # about +1 per `limit` completions
+
+
+def test_overload_backs_off_multiplicatively_and_ignores_other_errors():
+    limit = _limit(initial=8)
+    limit.overload(ErrorKind.JSON_DECODE)
+    assert limit.limit == 8
+    limit.overload(ErrorKind.RATE_LIMIT)
+    assert limit.limit == 4
+    limit.overload(ErrorKind.TIMEOUT)
+    assert limit.limit == 2
+
+
+def test_cooldown_counts_one_burst_once():
+    limit = _limit(initial=8, cooldown=60)
+    for _ in range(5):
+        limit.overload(ErrorKind.RATE_LIMIT)
+    assert limit.limit == 4
+    assert limit.summary()["decisions"]["backoff_rate_limit_suppressed"] == 4
+
+
+def test_latency_gradient_shrinks_the_limit_within_bounds():
+    limit = _limit(initial=10, min_limit=3)
+    for _ in range(20):
+        limit.record(1.0, None, in_flight=1)
+    for _ in range(20):
+        limit.record(20.0, None, in_flight=1)
+    assert limit.limit == 3
+    assert limit.summary()["decisions"]["latency"] >= 1
+
+
+def test_errors_hold_the_limit():
+    limit = _limit(max_error_rate=0.1)
+    for _ in range(5):
+        limit.record(1.0, ErrorKind.DB, in_flight=4)
+    for _ in range(10):
+        limit.record(1.0, None, in_flight=4)
+    assert limit.limit == 4
@@ -0,0 +1,109 @@
+from typing import List, Optional
+
+import pytest
+from pydantic import BaseModel
+
+import parser.fingerprint as fingerprint
+from parser.fingerprint import TemplateStore, template_signature
+
+
+class Info(BaseModel):
+    order_id: Optional[str]
+    order_date: Optional[str]
+    order_total: Optional[float]
+
+
+class Item(BaseModel):
+    item_desc: Optional[str]
+    item_qty: Optional[int]
+    item_price: Optional[float]
+
+
+class Extraction(BaseModel):
+    order_info: Info
+    items: List[Item]
+
+
+def _email(email_id: int, order_id: str, date: str, items: list, total: str) -> dict:
+    lines = ["Thanks for shopping with Acme!", f"Order #: {order_id}", f"Order date: {date}", "Items"]
+    for desc, qty, price in items:
+        lines += [desc, f"Qty: {qty}", f"Price: ${price}"]
+    lines.append(f"Order total: ${total}")
+    return {"id": email_id, "from": "Acme <orders@acme.com>", "subject": "Your order", "msg": "\n".join(lines)}
+
+
+def _extraction(order_id: str, date: str, items: list, total: float) -> Extraction:
+    return Extraction(
+        order_info=Info(order_id=order_id, order_date=date, order_total=total),
+        items=[Item(item_desc=desc, item_qty=qty, item_price=price) for desc, qty, price in items],
+    )
+
+
+FIRST = (_email(1, "A-1001", "March 4, 2025", [("Linen Shirt", 2, "40.17")], "80.34"),
+         _extraction("A-1001", "2025-03-04", [("Linen Shirt", 2, 40.17)], 80.34))
+SECOND = (_email(2, "B-2002", "April 12, 2025", [("Wool Scarf", 1, "25.00"), ("Canvas Tote", 3, "12.50")], "62.50"),
+          _extraction("B-2002", "2025-04-12", [("Wool Scarf", 1, 25.0), ("Canvas Tote", 3, 12.5)], 62.5))
+THIRD = (_email(3, "C-3003", "May 1, 2025", [("Silk Tie", 1, "55.00")], "55.00"),
+         _extraction("C-3003", "2025-05-01", [("Silk Tie", 1, 55.0)], 55.0))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TemplateStore(path=str(tmp_path / "templates.json"))
+
+
+def test_signature_ignores_values_and_item_lines():
+    assert template_signature(FIRST[0]["msg"]) == template_signature(SECOND[0]["msg"])
+    assert template_signature(FIRST[0]["msg"]) != template_signature("Confirmation number: 1\nTotal: $1.00")
+
+
+def test_rules_learned_from_one_email_extract_another(store, monkeypatch):
+    monkeypatch.setattr(fingerprint, "MIN_VERIFICATIONS", 1)
+    record, extracted = FIRST
+    store.learn("order", record, extracted)
+    assert store.summary()["trusted"] == 1
+
+    record, expected = SECOND
+    assert store.extract("order", record, Extraction) == expected
+    assert store.summary()["local"] == 1
+
+
+def test_templates_are_used_only_once_verified(store):
+    store.learn("order", *FIRST)
+    store.learn("order", *SECOND)
+    assert store.extract("order", THIRD[0], Extraction) is None  # verified twice, three needed
+
+    store.learn("order", *THIRD)
+    assert store.extract("order", SECOND[0], Extraction) == SECOND[1]
+    assert store.extract("shipping", SECOND[0], Extraction) is None  # learned per node
+
+
+def test_a_mismatching_sample_demotes_the_template(store):
+    for record, extracted in (FIRST, SECOND, THIRD):
+        store.learn("order", record, extracted)
+    assert store.summary()["trusted"] == 1
+
+    record, extracted = SECOND
+    corrected = extracted.model_copy(update={"order_info": Info(order_id="B-2002", order_date="2025-04-13",
+                                                                order_total=62.5)})
+    store.learn("order", record, corrected)
+
+    summary = store.summary()
+    assert (summary["trusted"], summary["sample_mismatch"]) == (0, 1)
+    assert store.extract("order", THIRD[0], Extraction) is None
+
+
+def test_unseen_template_returns_none(store, monkeypatch):
+    monkeypatch.setattr(fingerprint, "MIN_VERIFICATIONS", 1)
+    store.learn("order", *FIRST)
+    other = {"id": 9, "from": "orders@acme.com", "msg": "Confirmation number: X-1\nGrand total: $5.00"}
+    assert store.extract("order", other, Extraction) is None
+    assert store.extract("order", {**FIRST[0], "from": "orders@other.com"}, Extraction) is None
+
+
+def test_learned_templates_persist(store, tmp_path):
+    for record, extracted in (FIRST, SECOND, THIRD):
+        store.learn("order", record, extracted)
+    store.save()
+    reloaded = TemplateStore(path=str(tmp_path / "templates.json"))
+    assert reloaded.extract("order", SECOND[0], Extraction) == SECOND[1]
@@ -0,0 +1,84 @@
+import pytest
+
+from parser.identifiers import (
+    _dhl_valid,
+    _fedex_express_valid,
+    _mod10_valid,
+    _s10_valid,
+    _ups_valid,
+    scan_identifiers,
+)
+
+
+def _tamper(number: str) -> str:
+    """Change the check digit."""
+    return number[:-1] + str((int(number[-1]) + 1) % 10)
+
+
+@pytest.mark.parametrize("validator, number", [
+    (_ups_valid, "1Z999AA10123456784"),
+    (_s10_valid, "EC123456785"),             # weights 8,6,4,2,3,5,9,7: 11 - 204 % 11 == 5
+    (_dhl_valid, "1234567891"),              # 123456789 % 7 == 1
+    (_mod10_valid, "9400100000000000000006"),  # weights 3,1 from the right: 34 -> 6
+    (_fedex_express_valid, "123456789012"),  # weights 3,1,7: 178 % 11 % 10 == 2
+])
+def test_check_digits_accept_valid_and_reject_tampered(validator, number):
+    assert validator(number)
+    assert not validator(_tamper(number))
+
+
+def test_scan_finds_validated_ups_number_and_status():
+    found = scan_identifiers("Your UPS package 1Z999AA10123456784 is out for delivery.")
+    assert [(t.number, t.carrier, t.validated) for t in found.tracking_numbers] == [
+        ("1Z999AA10123456784", "UPS", True)]
+    assert found.status == "out for delivery"
+    assert found.single_tracking.number == "1Z999AA10123456784"
+
+
+def test_bad_check_digit_is_dropped():
+    assert scan_identifiers("Tracking 1Z999AA10123456785").tracking_numbers == []
+
+
+def test_bare_digit_formats_need_the_carrier_named():
+    assert scan_identifiers("Call us at 1234567891").tracking_numbers == []
+    assert [t.carrier for t in scan_identifiers("DHL waybill 1234567891").tracking_numbers] == ["DHL"]
+
+
+def test_order_number_is_phrase_and_ontrac():
+    found = scan_identifiers("Your order number is W123456789. It has shipped via OnTrac tracking D10011223344556.")
+    assert found.order_ids == ["W123456789"]
+    assert [(t.number, t.carrier) for t in found.tracking_numbers] == [("D10011223344556", "OnTrac")]
+    assert not found.empty
+
+
+def test_lasership():
+    found = scan_identifiers("LaserShip 1LS123456789012 is on its way")
+    assert [(t.number, t.carrier) for t in found.tracking_numbers] == [("1LS123456789012", "LaserShip")]
+
+
+def test_promo_code_is_not_an_order_id():
+    found = scan_identifiers("Save 20% with code ORDER2024")
+    assert found.order_ids == []
+    assert found.rules_out_shipment
+
+
+@pytest.mark.parametrize("text, order_id", [
+    ("Order #12345 confirmed", "12345"),
+    ("Order No. A-55821 shipped", "A-55821"),
+    ("Order: 98765X", "98765X"),
+    ("Order ID 113-1234567-1234567", "113-1234567-1234567"),
+    ("Your order was 77123", "77123"),
+])
+def test_order_id_formats(text, order_id):
+    assert scan_identifiers(text).order_ids == [order_id]
+
+
+@pytest.mark.parametrize("text", ["Order #1234", "Order #ABCDEF", "Your order is on its way"])
+def test_short_or_digitless_values_are_not_order_ids(text):
+    assert scan_identifiers(text).order_ids == []
+
+
+def test_shipment_mentions_keep_unreadable_mail():
+    assert not scan_identifiers("Track your package here").rules_out_shipment
+    assert not scan_identifiers("It has shipped!").rules_out_shipment
+    assert scan_identifiers("Thanks for being a member").rules_out_shipment
@@ -0,0 +1,107 @@
+import os
+import threading
+
+import numpy as np
+
+import parser.item_index as item_index_module
+from parser.item_index import ItemIndex, item_text
+
+COLORS = ["Navy", "Black", "Red", "Olive"]
+
+
+def _rows(order: int, start_entry: int, count: int = 2) -> list:
+    names = ["Relaxed Linen Shirt", "Canvas Tote Bag", "Merino Wool Scarf", "Leather Belt"]
+    return [{"entry_id": start_entry + n, "user_id": "u1", "order_id": f"ORD-{order}",
+             "item_desc": names[n % len(names)], "item_color": COLORS[order % len(COLORS)], "item_size": "M"}
+            for n in range(count)]
+
+
+def _shard_files(path) -> list:
+    return sorted(name for name in os.listdir(path) if name.startswith("vectors-"))
+
+
+def test_add_save_reload_search(tmp_path):
+    path = str(tmp_path / "index")
+    index = ItemIndex(path)
+    assert index.add(_rows(1, 1)) == 2
+    assert index.add(_rows(1, 1)) == 0  # already indexed by entry_id
+    index.save()
+    index.add(_rows(2, 10, count=3))  # not saved: lost on restart, re-warmed by the nodes
+
+    reloaded = ItemIndex(path)
+    assert isinstance(reloaded._shards[0].vectors, np.memmap)
+    assert reloaded.summary()["items"] == 2 and not reloaded.has_order("u1", "ORD-2")
+    [(meta, score)] = reloaded.search("u1", "ORD-1", [item_text("linen shirt", "navy")])
+    assert meta["entry_id"] == 1 and score > 0.55
+    assert reloaded.search("u1", "ORD-1", [item_text("garden hose")]) == [None]
+
+    # Fresh rows after a reload are searched together with the mapped ones
+    reloaded.add([{**_rows(1, 50)[1], "item_desc": "Waxed Canvas Backpack"}])
+    queries = [item_text("relaxed linen shirt"), item_text("waxed backpack")]
+    assert [match[0]["entry_id"] for match in reloaded.search("u1", "ORD-1", queries)] == [1, 51]
+
+
+def test_saves_write_new_rows_and_merge_small_shards(tmp_path):
+    path = str(tmp_path / "index")
+    index = ItemIndex(path)
+    for order in range(8):
+        index.add(_rows(order, order * 10))
+        index.save()
+        # Equal-sized saves merge like a binary counter: one shard per set bit of the save count
+        assert len(_shard_files(path)) == bin(order + 1).count("1")
+    assert _shard_files(path) == ["vectors-0000000000-0000000016.npy"]
+
+    reloaded = ItemIndex(path)
+    assert reloaded.summary()["items"] == 16
+    assert all(reloaded.search("u1", f"ORD-{order}", [item_text("canvas tote bag")])[0][0]["entry_id"]
+               == order * 10 + 1 for order in range(8))
+
+
+def test_concurrent_saves_do_not_race(tmp_path, monkeypatch):
+    monkeypatch.setattr(item_index_module, "_SAVE_EVERY", 1)  # every add saves
+    path = str(tmp_path / "index")
+    index = ItemIndex(path)
+    threads = [threading.Thread(target=lambda n=n: index.add(_rows(n, n * 10, count=3))) for n in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    index.save()
+
+    assert not [name for name in os.listdir(path) if ".tmp" in name]
+    reloaded = ItemIndex(path)
+    assert reloaded.summary()["items"] == 48
+    assert all(reloaded.has_order("u1", f"ORD-{n}") for n in range(16))
+
+
+def test_leftovers_of_an_interrupted_merge_are_skipped(tmp_path):
+    path = str(tmp_path / "index")
+    index = ItemIndex(path)
+    index.add(_rows(1, 1))
+    index.save()
+    kept = _shard_files(path)
+    index.add(_rows(2, 10))
+    index.save()  # merges into rows 0-4 and removes the 0-2 shard
+    # Simulate a crash before the superseded shard was removed
+    np.save(os.path.join(path, kept[0]), np.asarray(index._shards[0].vectors[:2]))
+    with open(os.path.join(path, kept[0].replace("vectors-", "meta-").replace(".npy", ".json")), "w") as f:
+        f.write("[{}, {}]")
+
+    reloaded = ItemIndex(path)
+    assert reloaded.summary()["items"] == 4
+    assert _shard_files(path) == ["vectors-0000000000-0000000004.npy"]
+
+
+def test_legacy_single_file_layout_is_loaded_and_folded(tmp_path):
+    path = tmp_path / "index"
+    path.mkdir()
+    rows = _rows(1, 1)
+    vectors = item_index_module.embed([item_text(r["item_desc"], r["item_color"], r["item_size"]) for r in rows])
+    np.save(path / "vectors.npy", vectors)
+    (path / "meta.json").write_text(__import__("json").dumps(rows))
+
+    index = ItemIndex(str(path))
+    assert index.search("u1", "ORD-1", [item_text("canvas tote")])[0][0]["entry_id"] == 2
+    index.add(_rows(2, 10))
+    index.save()
+    assert sorted(os.listdir(path)) == ["meta-0000000000-0000000004.json", "vectors-0000000000-0000000004.npy"]
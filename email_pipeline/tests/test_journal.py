@@ -0,0 +1,92 @@
+from workflow.journal import ProcessingJournal
+
+
+def _row(email_id: int) -> dict:
+    return {"id": email_id, "from": "orders@shop.com", "subject": "Order #12345", "msg": "<p>hi</p>",
+            "user_id": "u1", "user_email": "u1@example.com"}
+
+
+def _crash(journal: ProcessingJournal) -> None:
+    """Drop the journal without closing it, like a killed process (every record is already flushed)."""
+    journal._file = None
+
+
+def test_items_written_while_streaming_are_not_rewritten_in_bulk_after_resume(tmp_path):
+    path = str(tmp_path / "journal.jsonl.zst")
+    inserted = []
+
+    first = ProcessingJournal(path, enabled=True)
+    first.start(_row(1))
+    for n in range(2):  # STREAM_EXTRACTION=1: items inserted one by one, then the process dies
+        first.write_once(1, "order", f"item-{n}", lambda n=n: inserted.append(n))
+    _crash(first)
+
+    second = ProcessingJournal(path, enabled=True)
+    assert second.start(_row(1)) is not None  # resumed, not restarted
+    written = second.write_each_once(1, "order", [f"item-{n}" for n in range(3)],
+                                     lambda pending: inserted.extend(pending))
+    assert written == 1
+    assert inserted == [0, 1, 2]
+    assert second.summary()["skipped_writes"] == 2
+
+
+def test_crash_resume_round_trip(tmp_path):
+    path = str(tmp_path / "journal.jsonl.zst")
+    first = ProcessingJournal(path, enabled=True)
+    for email_id in (1, 2, 3):
+        first.start(_row(email_id))
+    first.node_done(1, "classify", {"category": "refund"})
+    first.extracted(1, "refund", {"return_info": {"order_id": "A-1"}, "items": []})
+    first.write_once(1, "refund", "insert", lambda: None)
+    first.finish(2)
+    first.finish(3, failed=True)
+    _crash(first)
+
+    second = ProcessingJournal(path, enabled=True)
+    assert [row["id"] for row in second.recovered()] == [1]
+    assert second.start(_row(1)) is not None
+    assert second.node_output(1, "classify") == {"category": "refund"}
+    assert second.extraction(1, "refund") == {"return_info": {"order_id": "A-1"}, "items": []}
+    assert second.write_once(1, "refund", "insert", lambda: None) is False
+    second.finish(1)
+    second.close()
+
+    third = ProcessingJournal(path, enabled=True)
+    assert third.recovered() == []
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    path = tmp_path / "journal.jsonl.zst"
+    first = ProcessingJournal(str(path), enabled=True)
+    first.start(_row(1))
+    first.node_done(1, "classify", {"category": "promos"})
+    _crash(first)
+    path.write_bytes(path.read_bytes()[:-7])  # the last record was cut mid-write
+
+    second = ProcessingJournal(str(path), enabled=True)
+    assert [row["id"] for row in second.recovered()] == [1]
+
+
+def test_compaction_keeps_only_emails_in_flight(tmp_path):
+    path = tmp_path / "journal.jsonl.zst"
+    journal = ProcessingJournal(str(path), enabled=True, max_bytes=2048)
+    for email_id in range(200):
+        journal.start(_row(email_id))
+        journal.node_done(email_id, "classify", {"category": "order confirmation"})
+        if email_id != 150:
+            journal.finish(email_id)
+    assert journal.summary()["compactions"] > 1
+    _crash(journal)
+
+    recovered = ProcessingJournal(str(path), enabled=True)
+    assert [row["id"] for row in recovered.recovered()] == [150]
+    assert path.stat().st_size < 2048
+
+
+def test_disabled_journal_records_nothing(tmp_path):
+    path = tmp_path / "journal.jsonl.zst"
+    journal = ProcessingJournal(str(path), enabled=False)
+    assert journal.start(_row(1)) is None
+    calls = []
+    assert journal.write_once(1, "order", "item-0", lambda: calls.append(1)) is True
+    assert calls == [1] and not path.exists()
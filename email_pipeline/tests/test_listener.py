@@ -0,0 +1,46 @@
+from workflow.listener import Watermark
+
+
+def _watermark(tmp_path, start: int = 10) -> Watermark:
+    watermark = Watermark(str(tmp_path / "checkpoint.json"))
+    watermark.start_at(start)
+    return watermark
+
+
+def test_claim_deduplicates_and_ignores_processed_ids(tmp_path):
+    watermark = _watermark(tmp_path)
+    assert not watermark.claim(10)
+    assert watermark.claim(11)
+    assert not watermark.claim(11)
+
+
+def test_advances_only_past_finished_emails(tmp_path):
+    watermark = _watermark(tmp_path)
+    for email_id in (11, 12, 13):
+        watermark.claim(email_id)
+    watermark.done(12)
+    assert watermark.value == 10  # 11 still in flight
+    watermark.done(11)
+    assert watermark.value == 12  # 13 still in flight
+    watermark.done(13)
+    assert watermark.value == 13
+
+
+def test_gap_hold_keeps_the_watermark_below_unverified_ids(tmp_path):
+    watermark = _watermark(tmp_path)
+    watermark.claim(11)
+    watermark.hold(11)
+    watermark.claim(15)  # 12-14 not seen yet
+    watermark.done(11)
+    watermark.done(15)
+    assert watermark.value == 11
+    watermark.release(11)
+    assert watermark.value == 15
+
+
+def test_checkpoint_survives_a_restart(tmp_path):
+    watermark = _watermark(tmp_path)
+    watermark.claim(11)
+    watermark.done(11)
+    watermark.save()
+    assert Watermark(str(tmp_path / "checkpoint.json")).value == 11
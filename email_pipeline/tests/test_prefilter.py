@@ -0,0 +1,75 @@
+from workflow.prefilter import PreFilter, SenderTable, Verdict
+
+PROMO = {"id": 1, "from": "Shop <news@shop.com>", "subject": "40% off starts now",
+         "msg": '<p>SHOP NOW</p><a href="https://shop.com/u?utm_campaign=x">Unsubscribe</a>'}
+
+
+def _prefilter(audit_every: int = 0, **table) -> PreFilter:
+    return PreFilter(SenderTable(path="", **table), audit_every=audit_every)
+
+
+def _row(**fields) -> dict:
+    return {**PROMO, **fields}
+
+
+def test_marketing_mail_is_dropped_before_cleaning():
+    assert _prefilter().check(PROMO) == Verdict("marketing", "promos")
+
+
+def test_transactional_signals_veto_the_heuristics():
+    prefilter = _prefilter()
+    assert prefilter.check(_row(subject="Your order has shipped - 20% off next time")) is None
+    assert prefilter.check(_row(msg=PROMO["msg"] + "<p>Order #: 12345</p>")) is None
+    assert prefilter.check(_row(msg="<p>Big sale</p>")) is None  # promo subject, but no bulk markers
+
+
+def test_list_unsubscribe_header_counts_as_a_marker():
+    row = _row(msg="<p>Shop our sale</p>", headers={"List-Unsubscribe": "<mailto:u@shop.com>"})
+    assert _prefilter().check(row) is None  # one marker only
+    row["msg"] += " view in browser"
+    assert _prefilter().check(row).reason == "marketing"
+
+
+def test_sender_lists():
+    prefilter = PreFilter(SenderTable(path=""), allow=frozenset({"shop.com"}), deny=frozenset({"spam@other.com"}))
+    assert prefilter.check(PROMO) is None
+    assert prefilter.check(_row(**{"from": "spam@other.com"})).reason == "deny_list"
+    assert prefilter.check(_row(**{"from": "Uber <receipts@uber.com>", "subject": "Your trip"})).reason == "deny_list"
+
+
+def test_learned_senders_need_enough_ignored_mail_and_count_hits():
+    prefilter = _prefilter(min_samples=3, min_share=0.9)
+    row = _row(subject="Your receipt", msg="<p>Invoice</p>")
+    for _ in range(2):
+        prefilter.observe(row, "goods receipt")
+    assert prefilter.check(row) is None
+    prefilter.observe(row, "goods receipt")
+    assert prefilter.check(row) == Verdict("learned", "goods receipt")
+    assert prefilter.summary()["hits"] == 1
+
+    prefilter.observe(row, "retailer order confirmation")  # 3/4 ignored < 0.9
+    assert prefilter.check(row) is None
+
+
+def test_every_nth_match_per_rule_is_audited():
+    prefilter = _prefilter(audit_every=4)
+    verdicts = [prefilter.check(PROMO) for _ in range(8)]
+    assert [verdict.audit for verdict in verdicts] == [False, False, False, True] * 2
+    stats = prefilter.summary()["reasons"]["marketing"]
+    assert (stats["matched"], stats["dropped"], stats["audited"]) == (8, 6, 2)
+
+
+def test_audits_measure_false_negatives():
+    prefilter = _prefilter(audit_every=1)
+    prefilter.observe(PROMO, "promos", prefilter.check(PROMO))
+    prefilter.observe(PROMO, "retailer order confirmation", prefilter.check(PROMO))
+    stats = prefilter.summary()["reasons"]["marketing"]
+    assert stats["false_negatives"] == 1 and stats["fn_rate"] == 0.5
+
+
+def test_sender_table_persists(tmp_path):
+    path = str(tmp_path / "senders.json")
+    table = SenderTable(path=path, min_samples=1, min_share=1.0)
+    table.observe("news@shop.com", "Promos")
+    table.save()
+    assert SenderTable(path=path, min_samples=1, min_share=1.0).ignored("news@shop.com") == "promos"
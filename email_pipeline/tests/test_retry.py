@@ -0,0 +1,136 @@
+import json
+
+import pytest
+
+import supabase_client.dead_letter as dead_letter
+import utils.retry as retry
+from utils.retry import ErrorKind, PipelineStageError, RetryExhaustedError, classify_error, retry_call, track_stage
+
+
+class _Flaky:
+    """Raises `errors` in order, then returns "ok"."""
+
+    __name__ = "flaky"
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(retry.time, "sleep", delays.append)
+    return delays
+
+
+def test_classify_error():
+    assert classify_error(TimeoutError()) is ErrorKind.TIMEOUT
+    assert classify_error(json.JSONDecodeError("bad", "{", 0)) is ErrorKind.JSON_DECODE
+    assert classify_error(ValueError("boom")) is ErrorKind.UNKNOWN
+    assert classify_error(RetryExhaustedError(ErrorKind.DB, 5, ValueError())) is ErrorKind.DB
+
+
+def test_unknown_errors_are_not_retried(sleeps):
+    fn = _Flaky(ValueError("boom"))
+    with pytest.raises(RetryExhaustedError) as info:
+        retry_call(fn)
+    assert (info.value.kind, info.value.attempts, fn.calls, sleeps) == (ErrorKind.UNKNOWN, 1, 1, [])
+
+
+def test_transient_errors_back_off_then_succeed(sleeps):
+    fn = _Flaky(TimeoutError(), TimeoutError())
+    assert retry_call(fn) == "ok"
+    assert fn.calls == 3 and len(sleeps) == 2
+    policy = retry.RETRY_POLICIES[ErrorKind.TIMEOUT]
+    assert all(0 <= delay <= min(policy.max_delay, policy.base_delay * 2 ** n) for n, delay in enumerate(sleeps))
+
+
+@pytest.mark.parametrize("kind, error", [(ErrorKind.TIMEOUT, TimeoutError), (ErrorKind.RATE_LIMIT, None)])
+def test_transient_errors_raise_once_the_policy_is_exhausted(sleeps, monkeypatch, kind, error):
+    if error is None:
+        # No client library needed: a RetryExhaustedError from a nested call keeps its kind
+        error = lambda: RetryExhaustedError(ErrorKind.RATE_LIMIT, 1, RuntimeError("429"))  # noqa: E731
+    max_attempts = retry.RETRY_POLICIES[kind].max_attempts
+    fn = _Flaky(*(error() for _ in range(max_attempts + 1)))
+    with pytest.raises(RetryExhaustedError) as info:
+        retry_call(fn)
+    assert (info.value.kind, info.value.attempts, fn.calls) == (kind, max_attempts, max_attempts)
+    assert len(sleeps) == max_attempts - 1
+
+
+def test_default_kind_and_fail_fast(sleeps):
+    fn = _Flaky(ValueError("constraint"), ValueError("constraint"))
+    assert retry_call(fn, default_kind=ErrorKind.DB) == "ok"
+    assert len(sleeps) == 2
+
+    sleeps.clear()
+    fn = _Flaky(TimeoutError())
+    with pytest.raises(RetryExhaustedError) as info:
+        retry_call(fn, fail_fast=(ErrorKind.TIMEOUT,))
+    assert (info.value.attempts, fn.calls, len(sleeps)) == (1, 1, 0)
+
+
+def test_failure_listeners_see_every_failed_attempt(sleeps):
+    seen = []
+    retry.add_failure_listener(seen.append)
+    try:
+        retry_call(_Flaky(TimeoutError(), TimeoutError()))
+    finally:
+        retry.remove_failure_listener(seen.append)
+    assert seen == [ErrorKind.TIMEOUT, ErrorKind.TIMEOUT]
+
+
+def test_track_stage_names_the_failing_node():
+    @track_stage("refund")
+    def node(state):
+        raise RetryExhaustedError(ErrorKind.RATE_LIMIT, 6, RuntimeError("429"))
+
+    with pytest.raises(PipelineStageError) as info:
+        node({})
+    assert (info.value.stage, info.value.kind) == ("refund", ErrorKind.RATE_LIMIT)
+
+    @track_stage("order")
+    def outer(state):
+        node(state)
+
+    with pytest.raises(PipelineStageError) as info:
+        outer({})
+    assert info.value.stage == "refund"  # the innermost stage wins
+
+
+def test_dead_letter_row_records_stage_and_cause():
+    email = {"id": 9, "subject": "Refund"}
+    error = PipelineStageError("refund", ErrorKind.TIMEOUT, TimeoutError("read timed out"))
+    row = dead_letter.build_dead_letter(email, error)
+    assert (row["email_id"], row["stage"], row["error_kind"], row["status"]) == (9, "refund", "timeout", "pending")
+    assert row["error"] == "TimeoutError: read timed out" and row["payload"] is email
+    assert dead_letter.build_dead_letter(email, ValueError("x"))["stage"] == "ingest"
+
+
+def test_dead_letters_spool_locally_while_the_db_is_down(tmp_path, monkeypatch):
+    inserted = []
+
+    def down(query, label):
+        raise RetryExhaustedError(ErrorKind.DB, 5, ConnectionError("refused"))
+
+    class Table:
+        def insert(self, rows):
+            return rows
+
+    monkeypatch.setattr(dead_letter, "DEAD_LETTER_SPOOL", str(tmp_path / "dead_letters.jsonl"))
+    monkeypatch.setattr(dead_letter, "supabase", type("Client", (), {"table": lambda self, name: Table()})())
+    monkeypatch.setattr(dead_letter, "execute", down)
+    dead_letter.record_dead_letter({"id": 1}, TimeoutError())
+    dead_letter.record_dead_letter({"id": 2}, TimeoutError())
+
+    monkeypatch.setattr(dead_letter, "execute", lambda query, label: inserted.append(query))
+    assert dead_letter.flush_spool() == 2
+    assert [row["email_id"] for row in inserted[0]] == [1, 2]
+    assert dead_letter.flush_spool() == 0
@@ -0,0 +1,129 @@
+import re
+
+import pytest
+
+import nodes.returns as returns
+import supabase_client.queries as queries
+from nodes.returns import RETURN_CATEGORIES, match_item, merge_items, sync_returns
+
+FILTER = re.compile(r'(\w+)\.ilike\."\*(.*)\*"')
+
+
+class _Query:
+    """Just enough of a postgrest builder for the returns engine: select / or_ / in_ / upsert / insert."""
+
+    def __init__(self, table):
+        self.table = table
+        self.rows = table.rows
+
+    def select(self, columns):
+        self.table.selects += 1
+        return self
+
+    def or_(self, filters):
+        matches = [FILTER.fullmatch(f).groups() for f in filters.split(",")]
+        self.rows = [row for row in self.rows if any(needle.lower() in (row.get(field) or "").lower()
+                                                     for field, needle in matches)]
+        return self
+
+    def in_(self, key, values):
+        self.rows = [row for row in self.rows if row[key] in values]
+        return self
+
+    def upsert(self, payload, on_conflict):
+        self.table.calls.append(("upsert", payload))
+        return self
+
+    def insert(self, payload):
+        self.table.calls.append(("insert", payload))
+        return self
+
+    def run(self):
+        return type("Response", (), {"data": [dict(row) for row in self.rows]})()
+
+
+class _Table:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+        self.selects = 0
+
+    def table(self, name):
+        assert name == "returns_refunds"
+        return _Query(self)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    fake = _Table([
+        {"id": 1, "return_id": "RMA-1", "order_id": "ORD-9", "return_item_desc": "Linen Shirt",
+         "return_item_color": "Navy", "return_item_size": "M", "status": "return_started"},
+        {"id": 2, "return_id": "RMA-2", "order_id": "ORD-9", "return_item_desc": "Canvas Tote",
+         "return_item_color": None, "return_item_size": None, "status": "return_started"},
+    ])
+    monkeypatch.setattr(returns, "supabase", fake)
+    monkeypatch.setattr(queries, "supabase", fake)
+    monkeypatch.setattr(returns, "execute", lambda query, label: query.run())
+    monkeypatch.setattr(returns, "execute_write", lambda query, label: query.run())
+    monkeypatch.setattr(returns, "match_item_desc_via_gpt_returns", lambda desc, rows: {})
+    return fake
+
+
+def _item(**fields):
+    return {"return_id": "", "order_id": "", "user_email": "", "return_item_desc": None,
+            "return_item_color": None, "return_item_size": None, **fields}
+
+
+def test_match_tiers_run_in_order(table, monkeypatch):
+    candidates = table.rows
+    # return + order id narrows to row 2 although row 1 shares the order
+    assert match_item(_item(return_id="RMA-2", order_id="ORD-9", return_item_desc="Tote"), candidates)["id"] == 2
+    # an unknown order id falls through to the return-id-only tier
+    assert match_item(_item(return_id="RMA-1", order_id="ORD-0", return_item_desc="Shirt"), candidates)["id"] == 1
+    # without a return id, the order-id tier matches on attributes
+    assert match_item(_item(order_id="ORD-9", return_item_desc="Linen"), candidates)["id"] == 1
+
+    tiers = []
+    monkeypatch.setattr(returns, "match_item_desc_via_gpt_returns", lambda desc, rows: tiers.append(
+        sorted(row["id"] for row in rows)) or {})
+    assert match_item(_item(return_id="RMA-1", order_id="ORD-9", return_item_desc="Scarf"), candidates) is None
+    # GPT is asked once per tier, narrowest first
+    assert tiers == [[1], [1], [1, 2]]
+
+
+def test_protected_fields_are_not_overwritten():
+    row = {"return_id": "RMA-1", "order_id": "", "return_item_desc": "Linen Shirt"}
+    item = {"return_id": "RMA-1X", "order_id": "ORD-9", "return_item_desc": "Shirt", "refund_amt": 40.0,
+            "refund_status": None}
+    assert returns.build_update(item, row) == {"order_id": "ORD-9", "refund_amt": 40.0}
+    assert returns.build_update(item, {}) == {"return_id": "RMA-1X", "order_id": "ORD-9",
+                                              "return_item_desc": "Shirt", "refund_amt": 40.0}
+
+
+def test_sync_upserts_matches_and_inserts_the_rest_in_bulk(table):
+    merged = merge_items({"return_id": "", "order_id": "ORD-9", "refund_status": "refunded"}, [
+        {"return_item_desc": "Linen Shirt", "return_item_color": "navy"},
+        {"return_item_desc": "canvas tote"},
+        {"return_item_desc": "Wool Scarf"},
+    ])
+    assert sync_returns(RETURN_CATEGORIES["refund"], merged) == (2, 1)
+
+    (upsert, payload), (insert, new_rows) = table.calls
+    assert (upsert, insert) == ("upsert", "insert")
+    # full rows with the changes applied; protected fields keep the stored values
+    assert {row["id"]: (row["return_item_desc"], row["refund_status"]) for row in payload} == {
+        1: ("Linen Shirt", "refunded"), 2: ("Canvas Tote", "refunded")}
+    assert [(row["return_item_desc"], row["order_id"]) for row in new_rows] == [("Wool Scarf", "ORD-9")]
+    # one candidate read for the email, one read of the matched rows in full
+    assert table.selects == 2
+
+
+def test_items_resolving_to_the_same_row_fold_into_one_upsert(table):
+    merged = merge_items({"return_id": "RMA-2", "order_id": "ORD-9"}, [
+        {"return_item_desc": "Canvas Tote", "return_reason": "Too small"},
+        {"return_item_desc": "Canvas Tote", "return_condition": "New"},
+    ])
+    assert sync_returns(RETURN_CATEGORIES["return_update"], merged) == (1, 0)
+    [(kind, payload)] = table.calls
+    assert kind == "upsert" and len(payload) == 1
+    assert (payload[0]["return_reason"], payload[0]["return_condition"]) == ("Too small", "New")
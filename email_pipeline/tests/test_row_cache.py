@@ -0,0 +1,73 @@
+from supabase_client.db_client import RowCache, _key
+
+
+def _row(entry_id, order_id="A1", **fields):
+    return {"entry_id": entry_id, "user_id": "u1", "order_id": order_id, "item_desc": "Tee", **fields}
+
+
+def test_absorb_updates_and_appends_cached_rows():
+    cache = RowCache()
+    key = _key("order_details", "u1", "A1")
+    cache.put(key, [_row(1)])
+
+    cache.absorb("order_details", [_row(1, tracking_num="1Z999"), _row(2)])
+
+    rows = cache.get(key)
+    assert [row["entry_id"] for row in rows] == [1, 2]
+    assert rows[0]["tracking_num"] == "1Z999"
+
+
+def test_absorb_moves_a_row_whose_order_changed():
+    cache = RowCache()
+    old, new = _key("order_details", "u1", "A1"), _key("order_details", "u1", "B2")
+    cache.put(old, [_row(1), _row(2)])
+    cache.put(new, [_row(3, order_id="B2")])
+
+    cache.absorb("order_details", [_row(1, order_id="B2")])
+
+    assert [row["entry_id"] for row in cache.get(old)] == [2]
+    assert sorted(row["entry_id"] for row in cache.get(new)) == [1, 3]
+
+
+def test_uncached_keys_are_not_populated_by_writes():
+    cache = RowCache()
+    cache.absorb("order_details", [_row(1)])
+    assert cache.get(_key("order_details", "u1", "A1")) is None
+
+
+def test_read_older_than_a_write_is_not_cached():
+    cache = RowCache()
+    key = _key("order_details", "u1", "A1")
+
+    generation = cache.generation()         # reader starts (sees no rows yet)
+    cache.absorb("order_details", [_row(1)])  # concurrent insert lands first
+    cache.put(key, [], generation)           # the reader's stale result arrives
+
+    assert cache.get(key) is None
+    assert cache.summary()["stale_puts"] == 1
+
+    cache.put(key, [_row(1)], cache.generation())
+    assert [row["entry_id"] for row in cache.get(key)] == [1]
+
+
+def test_forgotten_write_stamps_stay_conservative():
+    cache = RowCache(max_keys=2)
+    generation = cache.generation()
+    for order_id in ("A1", "B2", "C3"):
+        cache.absorb("order_details", [_row(order_id, order_id=order_id)])
+
+    # A1's stamp was pushed out; a read that started before it must still be dropped
+    cache.put(_key("order_details", "u1", "A1"), [_row(9)], generation)
+    assert cache.get(_key("order_details", "u1", "A1")) is None
+
+
+def test_eviction_and_invalidation_clear_the_index():
+    cache = RowCache(max_keys=1)
+    first, second = _key("order_details", "u1", "A1"), _key("order_details", "u1", "B2")
+    cache.put(first, [_row(1)])
+    cache.put(second, [_row(2, order_id="B2")])
+    assert cache.get(first) is None
+    assert cache._owners == {("order_details", 2): second}
+
+    cache.invalidate(second)
+    assert cache._owners == {}
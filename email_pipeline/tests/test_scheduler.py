@@ -0,0 +1,99 @@
+import asyncio
+
+from LLM.usage import usage_store
+from utils import retry
+from workflow.concurrency import AdaptiveLimit
+from workflow.scheduler import BACKFILL, REALTIME, FairScheduler, TenantQuota
+
+
+def _scheduler(concurrency: int = 1, **kwargs) -> FairScheduler:
+    return FairScheduler(concurrency=concurrency, quotas={}, default_quota=TenantQuota(max_concurrency=8), **kwargs)
+
+
+def test_realtime_overtakes_queued_backfill_on_one_scheduler():
+    order = []
+
+    async def scenario():
+        scheduler = _scheduler(concurrency=1)
+        gate = asyncio.Event()
+
+        async def job(name: str, wait: bool = False):
+            if wait:
+                await gate.wait()
+            order.append(name)
+
+        backfill = [asyncio.create_task(scheduler.run("bulk", BACKFILL, lambda: job("backfill-0", wait=True)))]
+        await asyncio.sleep(0)  # backfill-0 takes the only slot
+        backfill += [asyncio.create_task(scheduler.run("bulk", BACKFILL, lambda i=i: job(f"backfill-{i}")))
+                     for i in range(1, 4)]
+        realtime = asyncio.create_task(scheduler.run("alice", REALTIME, lambda: job("realtime")))
+        await asyncio.sleep(0.01)
+        gate.set()
+        await asyncio.gather(realtime, *backfill)
+        stats = scheduler.summary()
+        await scheduler.close()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert order == ["backfill-0", "realtime", "backfill-1", "backfill-2", "backfill-3"]
+    assert stats[REALTIME]["done"] == 1 and stats[BACKFILL]["done"] == 4
+
+
+def test_tenants_share_a_lane_fairly():
+    order = []
+
+    async def scenario():
+        scheduler = _scheduler(concurrency=1)
+
+        async def job(name: str):
+            order.append(name)
+
+        # One tenant queues a large backfill before another tenant's two emails arrive
+        tasks = [scheduler.run("big", BACKFILL, lambda i=i: job(f"big-{i}")) for i in range(6)]
+        tasks += [scheduler.run("small", BACKFILL, lambda i=i: job(f"small-{i}")) for i in range(2)]
+        await asyncio.gather(*tasks)
+        await scheduler.close()
+
+    asyncio.run(scenario())
+    assert order.index("small-1") < order.index("big-3")
+
+
+def test_job_exceptions_reach_the_caller():
+    async def scenario():
+        scheduler = _scheduler()
+
+        async def boom():
+            raise ValueError("bad email")
+
+        try:
+            await scheduler.run("alice", REALTIME, boom)
+        finally:
+            await scheduler.close()
+
+    try:
+        asyncio.run(scenario())
+    except ValueError as e:
+        assert str(e) == "bad email"
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_close_unregisters_process_wide_listeners():
+    listeners_before = len(usage_store._listeners)
+    failure_listeners_before = len(retry._failure_listeners)
+
+    async def scenario():
+        scheduler = _scheduler(adaptive=AdaptiveLimit(initial=2, min_limit=1, max_limit=4))
+
+        async def job():
+            return 42
+
+        assert await scheduler.run("alice", REALTIME, job) == 42
+        assert len(usage_store._listeners) == listeners_before + 1
+        assert len(retry._failure_listeners) == failure_listeners_before + 1
+        await scheduler.close()
+
+    for _ in range(3):
+        asyncio.run(scenario())
+    assert len(usage_store._listeners) == listeners_before
+    assert len(retry._failure_listeners) == failure_listeners_before
@@ -0,0 +1,71 @@
+import nodes.shipping as shipping
+import LLM.extractor as extractor
+from shared.schemas import OrderItem, ShippingExtraction
+from utils.retry import ErrorKind, RetryExhaustedError
+
+ORDER_ROWS = [
+    {"entry_id": 1, "item_desc": "Linen Shirt", "item_color": "Navy", "item_size": "M", "item_sku": "SKU1"},
+    {"entry_id": 2, "item_desc": "Canvas Tote", "item_color": None, "item_size": None, "item_sku": "SKU2"},
+]
+
+
+class _Query:
+    def __init__(self, writes, payload):
+        self.writes, self.payload = writes, payload
+
+    def eq(self, column, value):
+        self.writes.append((value, self.payload))
+        return self
+
+
+class _Table:
+    def __init__(self, writes):
+        self.writes = writes
+
+    def update(self, payload):
+        return _Query(self.writes, payload)
+
+
+class _Supabase:
+    def __init__(self):
+        self.writes = []
+
+    def table(self, name):
+        return _Table(self.writes)
+
+
+def _extraction(*descs):
+    return ShippingExtraction.model_validate({
+        "order_info": {"order_id": "ORD-1", "retailer": "Shop", "shipping_address": None, "zip_code": None},
+        "items": [{**dict.fromkeys(OrderItem.model_fields), "item_desc": desc,
+                   "tracking_num": "1Z999AA10123456784", "carrier": "UPS"} for desc in descs],
+    })
+
+
+def test_failed_fallback_match_skips_the_item(monkeypatch):
+    client = _Supabase()
+
+    def exhausted(*args, **kwargs):
+        raise RetryExhaustedError(ErrorKind.TIMEOUT, 4, TimeoutError("read timed out"))
+
+    monkeypatch.setattr(shipping, "extract_email", lambda node, record: _extraction("Linen Shirt", "Wool Scarf"))
+    monkeypatch.setattr(shipping, "select_order_rows", lambda table, user_id, order_id: [dict(r) for r in ORDER_ROWS])
+    monkeypatch.setattr(shipping, "execute_write", lambda query, label: type("R", (), {"data": [1]})())
+    monkeypatch.setattr(shipping, "supabase", client)
+    monkeypatch.setattr(shipping, "item_index", None)
+    monkeypatch.setattr(extractor, "query_openai", exhausted)
+
+    result = shipping.extract_shipping_node({"record": {"id": 7, "user_id": "u1", "subject": "", "msg": ""}})
+
+    assert result == {}
+    assert [entry_id for entry_id, _ in client.writes] == [1]
+    assert client.writes[0][1]["tracking_num"] == "1Z999AA10123456784"
+
+
+def test_fallback_helpers_return_no_match_when_the_llm_fails(monkeypatch):
+    def exhausted(*args, **kwargs):
+        raise RetryExhaustedError(ErrorKind.RATE_LIMIT, 6, RuntimeError("429"))
+
+    monkeypatch.setattr(extractor, "query_openai", exhausted)
+    assert extractor.match_item_desc_via_gpt("Scarf", ORDER_ROWS) == {}
+    assert extractor.match_item_desc_via_gpt_returns("Scarf", ORDER_ROWS) == {}
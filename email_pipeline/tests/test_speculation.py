@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+import nodes.classify
+import workflow.graph as graph
+from LLM.speculation import SenderHistory, SpeculativePrefetcher
+from shared.types import EmailRecord
+
+
+def _record(email_id: int = 1) -> EmailRecord:
+    return EmailRecord.from_row({"id": email_id, "from": "UPS <mcinfo@ups.com>", "subject": "Delivered",
+                                 "msg": "Your package was delivered.", "user_id": "u1"})
+
+
+def test_history_predicts_a_dominant_route_only():
+    history = SenderHistory(min_samples=3, min_share=0.8)
+    for _ in range(3):
+        history.observe("shop.com", "order")
+    assert history.predict("shop.com") == "order"
+    history.observe("shop.com", "refund")
+    assert history.predict("shop.com") is None
+    assert history.predict("ups.com") == "shipping_update"  # seeded carrier route
+
+
+def test_failed_classification_discards_the_prefetch(monkeypatch):
+    prefetcher = SpeculativePrefetcher(SenderHistory())
+    release = threading.Event()
+
+    def slow_extract(node, record):
+        release.wait(5)
+        return "extracted"
+
+    def failing_classify(state):
+        raise RuntimeError("retries exhausted")
+
+    monkeypatch.setattr(graph, "SPECULATIVE_PREFETCH", True)
+    monkeypatch.setattr(graph, "speculative_prefetcher", prefetcher)
+    monkeypatch.setattr(graph, "_speculative_extract", slow_extract)
+    monkeypatch.setattr(nodes.classify, "classify_node", failing_classify)
+
+    with pytest.raises(RuntimeError):
+        graph.classify_with_speculation({"record": _record()})
+    release.set()
+
+    assert prefetcher._pending == {}
+    assert prefetcher.summary()["started"] == 1
+
+
+def test_hit_hands_over_the_prefetched_result():
+    prefetcher = SpeculativePrefetcher(SenderHistory())
+    record = _record()
+    assert prefetcher.start(record, lambda node, r: f"{node} result") == "shipping_update"
+    prefetcher.settle(record, "shipping_update")
+    assert prefetcher.claim(record["id"], "shipping_update") == (True, "shipping_update result")
+    assert prefetcher.summary()["hit_rate"] == 1.0
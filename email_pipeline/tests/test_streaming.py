@@ -0,0 +1,56 @@
+from LLM.streaming import ItemPipeline, StreamingJSONParser
+from LLM.usage import _attribution, usage_context
+
+
+def test_item_pipeline_runs_in_order_with_the_callers_attribution():
+    seen = []
+
+    def work(n):
+        attribution = _attribution.get()
+        seen.append((n, attribution.email_id, attribution.node))
+        return n * 2
+
+    pipeline = ItemPipeline()
+    with usage_context(email_id=7, node="refund", user_id="u1"):
+        for n in range(3):
+            pipeline.submit(work, n)
+    assert pipeline.wait() == [0, 2, 4]
+    assert seen == [(0, 7, "refund"), (1, 7, "refund"), (2, 7, "refund")]
+
+
+DOCUMENT = (
+    '{"order_info": {"order_id": "A-1", "note": "braces } and \\"quotes\\" in strings"}, '
+    '"total": 42.5, "items": [{"item_desc": "Tee {blue}", "qty": 1}, {"item_desc": "Cap", "qty": 2}], '
+    '"status": null}'
+)
+
+
+def _events(chunks):
+    parser = StreamingJSONParser()
+    events = [event for chunk in chunks for event in parser.feed(chunk)]
+    return parser, events
+
+
+def test_push_parser_reports_fields_and_items_in_order():
+    _, events = _events([DOCUMENT])
+    assert events == [
+        ("field", "order_info", {"order_id": "A-1", "note": 'braces } and "quotes" in strings'}),
+        ("field", "total", 42.5),
+        ("item", 0, {"item_desc": "Tee {blue}", "qty": 1}),
+        ("item", 1, {"item_desc": "Cap", "qty": 2}),
+        ("field", "status", None),
+    ]
+
+
+def test_push_parser_is_independent_of_chunk_boundaries():
+    _, whole = _events([DOCUMENT])
+    parser, by_char = _events(list(DOCUMENT))
+    assert by_char == whole
+    assert parser.text == DOCUMENT
+
+
+def test_item_is_reported_as_soon_as_it_closes():
+    parser = StreamingJSONParser()
+    head, cap, tail = DOCUMENT.partition('{"item_desc": "Cap"')
+    assert ("item", 0, {"item_desc": "Tee {blue}", "qty": 1}) in parser.feed(head)
+    assert parser.feed(cap + tail)[0] == ("item", 1, {"item_desc": "Cap", "qty": 2})
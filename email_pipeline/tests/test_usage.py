@@ -0,0 +1,61 @@
+import pytest
+
+import LLM.usage as usage
+import nodes.classify as classify
+from LLM.usage import UsageStore, shared_usage_context, usage_context
+
+RECORDS = [
+    {"id": 1, "from": "orders@acme.com", "user_id": "u1"},
+    {"id": 2, "from": "news@shop.com", "user_id": "u2"},
+    {"id": 3, "from": "orders@acme.com", "user_id": "u1"},
+]
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = UsageStore()
+    monkeypatch.setattr(usage, "usage_store", store)
+    return store
+
+
+def _call(prompt_tokens=1000, completion_tokens=31, cached_tokens=500):
+    usage._record("classify_batch", "gpt-4o-mini", prompt_tokens, completion_tokens, cached_tokens, 0.9)
+
+
+def test_single_email_calls_are_recorded_whole(store):
+    with usage_context(email_id=7, node="order", retailer="acme.com", user_id="u1"):
+        _call()
+    [record] = store.records()
+    assert (record.email_id, record.user_id, record.share, record.prompt_tokens) == (7, "u1", 1.0, 1000)
+    assert store.summary()["order"]["calls"] == 1
+
+
+def test_shared_calls_are_split_across_the_emails(store):
+    with shared_usage_context(RECORDS, node="classify"):
+        _call()
+    records = store.records()
+    assert [(r.email_id, r.user_id, r.retailer) for r in records] == [
+        (1, "u1", "acme.com"), (2, "u2", "shop.com"), (3, "u1", "acme.com")]
+    assert [r.completion_tokens for r in records] == [11, 10, 10]
+    whole = usage.estimate_cost("gpt-4o-mini", 1000, 31, 500)
+    assert sum(r.cost_usd for r in records) == pytest.approx(whole)
+
+    by_user = store.summary(by=("user_id",))
+    assert by_user["u1"]["cost_usd"] == pytest.approx(2 * whole / 3, abs=1e-6)
+    assert by_user["u1"]["prompt_tokens"] + by_user["u2"]["prompt_tokens"] == 1000
+    assert store.summary()["classify"]["calls"] == 1
+
+
+def test_tenant_listeners_are_charged_for_batched_classification(store, monkeypatch):
+    charged = {}
+    store.add_listener(lambda record: charged.__setitem__(
+        record.user_id, charged.get(record.user_id, 0) + record.cost_usd))
+
+    def query_openai(messages, name):
+        _call()
+        return {"1": "promos", "2": "refund", "3": "nonsense"}
+
+    monkeypatch.setattr(classify, "query_openai", query_openai)
+    assert classify.classify_batch(RECORDS) == ["promos", "refund", None]
+    assert set(charged) == {"u1", "u2"}
+    assert sum(charged.values()) == pytest.approx(usage.estimate_cost("gpt-4o-mini", 1000, 31, 500))
@@ -0,0 +1,40 @@
+import re
+
+_EMAIL_ADDRESS = re.compile(r"[\w.+-]+@([\w-]+(?:\.[\w-]+)+)")
+
+
+def sender_address(from_field: str) -> str:
+    """
+    Extract the sender's address from a From header.
+
+    Args:
+        from_field (str): Raw From header or bare address.
+
+    Returns:
+        str: Lower-cased address, or "" if no address is found.
+    """
+    match = _EMAIL_ADDRESS.search(from_field or "")
+    return match.group(0).lower() if match else ""
+
+
+def sender_domain(from_field: str) -> str:
+    """
+    Extract the sender's domain from a From header.
+
+    Subdomains are collapsed to the registrable part, so
+    "Amazon <shipment-tracking@email.amazon.com>" -> "amazon.com".
+
+    Args:
+        from_field (str): Raw From header or bare address.
+
+    Returns:
+        str: Lower-cased domain, or "" if no address is found.
+    """
+    match = _EMAIL_ADDRESS.search(from_field or "")
+    if not match:
+        return ""
+    parts = match.group(1).lower().split(".")
+    # Keep one more label for two-letter country TLDs with a second-level part (e.g. co.uk)
+    if len(parts) >= 3 and len(parts[-1]) == 2 and parts[-2] in {"co", "com", "org", "net", "ac", "gov"}:
+        return ".".join(parts[-3:])
+    return ".".join(parts[-2:])
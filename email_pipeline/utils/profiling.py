@@ -0,0 +1,308 @@
+"""
+🔥 utils/profiling.py
+
+Opt-in sampling profiler for individual pipeline runs.
+
+A profiled email gets a wall-clock sampler: every PROFILE_INTERVAL_MS a background
+thread reads the stacks of the threads working on that email and counts them per
+graph node. Wall-clock sampling sees both CPU work (`clean_email_html`, JSON parsing
+and validation, matching, normalization) and time blocked on the network (the
+OpenAI and Supabase clients are synchronous, so waiting shows up as a socket read
+under `openai` / `postgrest`).
+
+Threads are attributed to an email while they run one of its nodes (`profiled`),
+its speculative extraction, or per-item work handed to an `ItemPipeline`; the
+event loop thread is attributed while the email's row is cleaned (`prepare`).
+
+Enable with PROFILE_SAMPLE_RATE (fraction of emails, e.g. 0.05) or `main.py
+--profile [RATE]`. Per email, PROFILE_DIR receives a speedscope file (one sampled
+profile per node, open at https://www.speedscope.app) and/or collapsed stacks
+(`flamegraph.pl`, also readable by speedscope), see PROFILE_FORMAT. With
+PROFILE_MIN_SECONDS only emails at least that slow are written. A one-line
+summary per email and the aggregated hot spots per node (`summary()`) name the
+top functions and the share of time per category (llm_wait, db_wait,
+html_cleaning, json_parsing, matching, normalize, other).
+"""
+
+import os
+import sys
+import time
+import random
+import functools
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MIN_SECONDS = float(os.getenv("PROFILE_MIN_SECONDS", "0"))
+PROFILE_FORMAT = os.getenv("PROFILE_FORMAT", "speedscope")  # speedscope | collapsed | both
+
+# Deepest stack kept per sample (innermost frames win)
+_MAX_DEPTH = 96
+_TOP_SPOTS = 5
+
+Frame = Tuple[str, int, str]  # (file, first line, function)
+Stack = Tuple[Frame, ...]     # root -> leaf
+
+# Sample categories: the first rule matching from the leaf upwards wins
+CATEGORY_RULES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("html_cleaning", ("bs4/", "html/parser.py", "clean_email_html")),
+    ("json_parsing", ("json/", "orjson", "pydantic", "LLM/streaming.py", "shared/schemas.py")),
+    ("llm_wait", ("openai/", "langchain_openai/")),
+    ("db_wait", ("postgrest/", "supabase/", "supabase_client/db_client.py")),
+    ("normalize", ("parser/normalize.py", "pandas/")),
+    ("matching", ("parser/item_index.py", "supabase_client/queries.py", "match_")),
+]
+
+
+def categorize(stack: Stack) -> str:
+    for frame_file, _, function in reversed(stack):
+        for category, needles in CATEGORY_RULES:
+            if any(needle in frame_file or needle in function for needle in needles):
+                return category
+    return "other"
+
+
+def _frame_name(frame: Frame) -> str:
+    path, line, function = frame
+    return f"{function} ({os.path.basename(path)}:{line})"
+
+
+class EmailProfile:
+    """Samples of one email, per node."""
+
+    def __init__(self, email_id):
+        self.email_id = email_id
+        self.started = time.perf_counter()
+        self.wall = 0.0
+        self.samples: Dict[str, Counter] = defaultdict(Counter)  # node -> stack -> count
+
+    def node_seconds(self, interval: float) -> Dict[str, float]:
+        return {node: sum(stacks.values()) * interval for node, stacks in self.samples.items()}
+
+    def collapsed(self) -> List[str]:
+        """Brendan Gregg collapsed stacks: `node;frame;...;leaf count`."""
+        return [
+            ";".join([node] + [_frame_name(frame) for frame in stack]) + f" {count}"
+            for node, stacks in self.samples.items() for stack, count in stacks.items()
+        ]
+
+    def speedscope(self, interval: float) -> dict:
+        """speedscope file: one sampled profile per node, weights in seconds."""
+        frames: Dict[Frame, int] = {}
+        profiles = []
+        for node, stacks in self.samples.items():
+            samples, weights = [], []
+            for stack, count in stacks.items():
+                samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+                weights.append(count * interval)
+            profiles.append({
+                "type": "sampled", "name": f"email {self.email_id} · {node}", "unit": "seconds",
+                "startValue": 0, "endValue": sum(weights), "samples": samples, "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"email {self.email_id}",
+            "exporter": "email_pipeline utils.profiling",
+            "shared": {"frames": [{"name": function, "file": path, "line": line}
+                                  for path, line, function in frames]},
+            "profiles": profiles,
+        }
+
+
+class SamplingProfiler:
+    """
+    Wall-clock stack sampler for the emails selected by `sample_rate`.
+
+    The sampler thread only runs while at least one profiled email is in flight.
+    """
+
+    def __init__(self, sample_rate: float = PROFILE_SAMPLE_RATE, interval_ms: float = PROFILE_INTERVAL_MS,
+                 out_dir: str = PROFILE_DIR, min_seconds: float = PROFILE_MIN_SECONDS, fmt: str = PROFILE_FORMAT):
+        self.sample_rate = sample_rate
+        self.interval = interval_ms / 1000
+        self.out_dir = out_dir
+        self.min_seconds = min_seconds
+        self.fmt = fmt
+        self._lock = threading.Lock()
+        self._profiles: Dict[object, EmailProfile] = {}
+        self._threads: Dict[int, List[Tuple[object, str]]] = defaultdict(list)  # thread -> (email, node) stack
+        self._wake = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._hot: Dict[str, Counter] = defaultdict(Counter)         # node -> leaf frame -> samples
+        self._categories: Dict[str, Counter] = defaultdict(Counter)  # node -> category -> samples
+        self.metrics = defaultdict(int)
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    # ---------- attribution ----------
+
+    @contextmanager
+    def email(self, email_id) -> Iterator[Optional[EmailProfile]]:
+        """Profile one pipeline run if it is sampled; yields the profile or None."""
+        if not self.enabled or email_id is None or random.random() >= self.sample_rate:
+            yield None
+            return
+        profile = EmailProfile(email_id)
+        with self._lock:
+            self._profiles[email_id] = profile
+            self._ensure_sampler()
+        self._wake.set()
+        try:
+            yield profile
+        finally:
+            profile.wall = time.perf_counter() - profile.started
+            with self._lock:
+                self._profiles.pop(email_id, None)
+                if not self._profiles:
+                    self._wake.clear()
+            self._finish(profile)
+
+    @contextmanager
+    def span(self, email_id, node: str) -> Iterator[None]:
+        """Attribute the current thread's samples to (email, node) while inside."""
+        if not self.enabled or email_id not in self._profiles:
+            yield
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident].append((email_id, node))
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads[ident].pop()
+                if not self._threads[ident]:
+                    del self._threads[ident]
+
+    def bind(self, fn: Callable) -> Callable:
+        """Wrap `fn` so it runs under the calling thread's attribution on whatever thread runs it."""
+        if not self.enabled:
+            return fn
+        with self._lock:
+            current = self._threads.get(threading.get_ident())
+            attribution = current[-1] if current else None
+        if attribution is None:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.span(*attribution):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    # ---------- sampling ----------
+
+    def _ensure_sampler(self) -> None:
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+            self._sampler.start()
+
+    def _sample_loop(self) -> None:
+        me = threading.get_ident()
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, attributions in self._threads.items():
+                    frame = frames.get(ident)
+                    if ident == me or frame is None or not attributions:
+                        continue
+                    email_id, node = attributions[-1]
+                    profile = self._profiles.get(email_id)
+                    if profile is not None:
+                        profile.samples[node][self._stack(frame)] += 1
+                        self.metrics["samples"] += 1
+
+    @staticmethod
+    def _stack(frame) -> Stack:
+        stack = []
+        while frame is not None and len(stack) < _MAX_DEPTH:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        return tuple(reversed(stack))
+
+    # ---------- output ----------
+
+    def _finish(self, profile: EmailProfile) -> None:
+        self.metrics["emails"] += 1
+        by_node: Dict[str, Counter] = defaultdict(Counter)
+        with self._lock:
+            for node, stacks in profile.samples.items():
+                for stack, count in stacks.items():
+                    category = categorize(stack)
+                    by_node[node][category] += count
+                    self._categories[node][category] += count
+                    if stack:
+                        self._hot[node][_frame_name(stack[-1])] += count
+
+        seconds = profile.node_seconds(self.interval)
+        parts = []
+        for node, total in sorted(seconds.items(), key=lambda kv: -kv[1]):
+            top = by_node[node].most_common(2)
+            shares = ", ".join(f"{category} {count / sum(by_node[node].values()):.0%}" for category, count in top)
+            parts.append(f"{node} {total:.2f}s ({shares})")
+        path = self._write(profile) if profile.wall >= self.min_seconds else None
+        print(f"🔥 Profiled email ID {profile.email_id}: {profile.wall:.2f}s wall | "
+              + (" | ".join(parts) or "no samples") + (f" → {path}" if path else ""))
+
+    def _write(self, profile: EmailProfile) -> Optional[str]:
+        import orjson
+
+        if not profile.samples:
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, f"email-{profile.email_id}-{int(time.time())}")
+        written = []
+        if self.fmt in ("speedscope", "both"):
+            with open(f"{base}.speedscope.json", "wb") as f:
+                f.write(orjson.dumps(profile.speedscope(self.interval)))
+            written.append(f"{base}.speedscope.json")
+        if self.fmt in ("collapsed", "both"):
+            with open(f"{base}.collapsed", "w", encoding="utf-8") as f:
+                f.write("\n".join(profile.collapsed()) + "\n")
+            written.append(f"{base}.collapsed")
+        self.metrics["files"] += len(written)
+        return ", ".join(written) or None
+
+    def summary(self, top: int = _TOP_SPOTS) -> dict:
+        """
+        Returns:
+            dict: node -> seconds sampled, share per category and the `top` leaf functions
+                  (self time) across every profiled email so far.
+        """
+        with self._lock:
+            result = {}
+            for node, categories in self._categories.items():
+                total = sum(categories.values())
+                result[node] = {
+                    "seconds": total * self.interval,
+                    "categories": {category: count / total for category, count in categories.most_common()},
+                    "hot_spots": [(name, count * self.interval) for name, count in self._hot[node].most_common(top)],
+                }
+            return result
+
+
+def profiled(node: str):
+    """
+    Decorator for graph nodes: while the node runs, the current thread's samples
+    count towards the email's profile under `node`.
+    """
+    def decorate(fn: Callable[[dict], dict]) -> Callable[[dict], dict]:
+        @functools.wraps(fn)
+        def wrapper(state: dict) -> dict:
+            with profiler.span(state["record"].get("id"), node):
+                return fn(state)
+        return wrapper
+    return decorate
+
+
+# Singleton used by the workflow, the nodes and main.py
+profiler = SamplingProfiler()
@@ -0,0 +1,198 @@
+"""
+🔁 utils/retry.py
+
+Retry helpers shared by the LLM and database layers.
+
+Every failure is classified into an `ErrorKind` so that rate limits, timeouts,
+malformed JSON and database errors each get their own backoff policy. When a
+call runs out of attempts a `RetryExhaustedError` is raised, and the graph
+wraps it in a `PipelineStageError` so the dead-letter store knows which node failed.
+"""
+
+import sys
+import json
+import time
+import random
+import functools
+from enum import Enum
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class ErrorKind(str, Enum):
+    """Failure classes that drive the retry policy."""
+    RATE_LIMIT = "rate_limit"
+    TIMEOUT = "timeout"
+    JSON_DECODE = "json_decode"
+    DB = "db"
+    UNKNOWN = "unknown"
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter.
+
+    Attributes:
+        max_attempts (int): Total attempts including the first call.
+        base_delay (float): Delay (seconds) before the first retry.
+        max_delay (float): Upper bound for a single backoff sleep.
+    """
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+
+    def backoff(self, attempt: int) -> float:
+        """Return the jittered sleep before retry number `attempt` (1-based)."""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+RETRY_POLICIES = {
+    ErrorKind.RATE_LIMIT: RetryPolicy(max_attempts=6, base_delay=2.0, max_delay=60.0),
+    ErrorKind.TIMEOUT: RetryPolicy(max_attempts=4, base_delay=1.0, max_delay=20.0),
+    ErrorKind.JSON_DECODE: RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=2.0),
+    ErrorKind.DB: RetryPolicy(max_attempts=5, base_delay=0.5, max_delay=15.0),
+    ErrorKind.UNKNOWN: RetryPolicy(max_attempts=1, base_delay=0.0, max_delay=0.0),
+}
+
+
+# Called with the ErrorKind of every failed attempt (e.g. the adaptive concurrency limit)
+_failure_listeners: List[Callable[[ErrorKind], None]] = []
+
+
+def add_failure_listener(listener: Callable[[ErrorKind], None]) -> None:
+    """Register a callback for every failed attempt; it runs in the calling thread and must be cheap."""
+    _failure_listeners.append(listener)
+
+
+def remove_failure_listener(listener: Callable[[ErrorKind], None]) -> None:
+    """Unregister a callback added with `add_failure_listener`."""
+    if listener in _failure_listeners:
+        _failure_listeners.remove(listener)
+
+
+class RetryExhaustedError(Exception):
+    """Raised when a call keeps failing after its policy's last attempt."""
+
+    def __init__(self, kind: ErrorKind, attempts: int, cause: BaseException):
+        super().__init__(f"{kind.value} failure after {attempts} attempt(s): {cause}")
+        self.kind = kind
+        self.attempts = attempts
+        self.cause = cause
+
+
+class PipelineStageError(Exception):
+    """Raised by a graph node so callers know which stage failed and why."""
+
+    def __init__(self, stage: str, kind: ErrorKind, cause: BaseException):
+        super().__init__(f"[{stage}] {kind.value}: {cause}")
+        self.stage = stage
+        self.kind = kind
+        self.cause = cause
+
+
+def classify_error(exc: BaseException) -> ErrorKind:
+    """
+    Map an exception raised by OpenAI, Supabase or the JSON parser to an `ErrorKind`.
+
+    Args:
+        exc (BaseException): The exception to classify.
+
+    Returns:
+        ErrorKind: The failure class used to pick a retry policy.
+    """
+    if isinstance(exc, (RetryExhaustedError, PipelineStageError)):
+        return exc.kind
+    if isinstance(exc, json.JSONDecodeError):
+        return ErrorKind.JSON_DECODE
+    if isinstance(exc, TimeoutError):
+        return ErrorKind.TIMEOUT
+
+    # Client libraries are looked up instead of imported: an exception can only come
+    # from a library that is already loaded, and importing them here would put
+    # OpenAI/httpx/postgrest on the startup path of every module using retries.
+    pydantic = sys.modules.get("pydantic")
+    openai = sys.modules.get("openai")
+    httpx = sys.modules.get("httpx")
+    postgrest = sys.modules.get("postgrest.exceptions")
+
+    if pydantic and isinstance(exc, pydantic.ValidationError):
+        return ErrorKind.JSON_DECODE
+    if openai:
+        if isinstance(exc, openai.RateLimitError):
+            return ErrorKind.RATE_LIMIT
+        if isinstance(exc, (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)):
+            return ErrorKind.TIMEOUT
+    if httpx:
+        if isinstance(exc, httpx.TimeoutException):
+            return ErrorKind.TIMEOUT
+        if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 429:
+            return ErrorKind.RATE_LIMIT
+        if isinstance(exc, httpx.HTTPError):
+            return ErrorKind.DB
+    if postgrest and isinstance(exc, postgrest.APIError):
+        return ErrorKind.DB
+    return ErrorKind.UNKNOWN
+
+
+def retry_call(fn: Callable[..., T], *args, label: str = "", default_kind: Optional[ErrorKind] = None,
+               fail_fast: Iterable[ErrorKind] = (), **kwargs) -> T:
+    """
+    Call `fn(*args, **kwargs)` and retry it according to the failure's `ErrorKind`.
+
+    Args:
+        fn (Callable): The function to call.
+        label (str): Short name used in log lines (e.g. "openai", "order_details").
+        default_kind (Optional[ErrorKind]): Kind to use when an error is otherwise UNKNOWN
+                                            (the DB layer passes ErrorKind.DB).
+        fail_fast (Iterable[ErrorKind]): Kinds raised after the first failure instead of retried
+                                         (the model cascade escalates bad output to the next tier).
+
+    Returns:
+        The return value of `fn`.
+
+    Raises:
+        RetryExhaustedError: When the policy for the failure kind runs out of attempts.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            kind = classify_error(e)
+            if kind is ErrorKind.UNKNOWN and default_kind is not None:
+                kind = default_kind
+            for listener in _failure_listeners:
+                listener(kind)
+
+            policy = RETRY_POLICIES[kind]
+            if attempt >= policy.max_attempts or kind in fail_fast:
+                raise RetryExhaustedError(kind, attempt, e) from e
+
+            delay = policy.backoff(attempt)
+            print(f"🔁 {label or fn.__name__}: {kind.value} error ({e}); retry {attempt}/{policy.max_attempts - 1} in {delay:.2f}s")
+            time.sleep(delay)
+
+
+def track_stage(stage: str) -> Callable:
+    """
+    Decorate a LangGraph node so any failure surfaces as a `PipelineStageError`.
+
+    Args:
+        stage (str): Node name recorded on the dead-letter row (e.g. "classify", "refund").
+    """
+    def decorator(node: Callable[..., dict]) -> Callable[..., dict]:
+        @functools.wraps(node)
+        def wrapper(state, *args, **kwargs):
+            try:
+                return node(state, *args, **kwargs)
+            except PipelineStageError:
+                raise
+            except Exception as e:
+                raise PipelineStageError(stage, classify_error(e), e) from e
+        return wrapper
+    return decorator
@@ -0,0 +1,86 @@
+"""
+⏱️ utils/startup_profile.py
+
+Measure cold-start cost: import time per module (`python -X importtime`), total
+wall time and peak memory of a fresh interpreter importing `main`, optionally
+also compiling the workflow.
+
+    python -m utils.startup_profile            # import main only
+    python -m utils.startup_profile --build    # + build the LangGraph workflow
+    python -m utils.startup_profile --top 30
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+_PROBE = """
+import json, time, resource
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+if {build}:
+    main.get_workflow()
+built = time.perf_counter()
+print("STARTUP_PROFILE " + json.dumps({{
+    "import_s": imported - start,
+    "build_s": built - imported,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+"""
+
+
+def profile(build: bool = False) -> dict:
+    """
+    Run the probe in a fresh interpreter with `-X importtime`.
+
+    Returns:
+        dict: import_s, build_s, max_rss_mb and `modules` [(name, self_us, cumulative_us, depth)].
+    """
+    # The probe never touches the network; placeholder credentials keep config checks quiet
+    env = {"SUPABASE_URL": "https://profile.invalid", "SUPABASE_KEY": "profile", **os.environ}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(build=build)],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup probe failed:\n{result.stderr[-2000:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+
+    summary_line = next(l for l in result.stdout.splitlines() if l.startswith("STARTUP_PROFILE "))
+    stats = json.loads(summary_line.split(" ", 1)[1])
+    stats["modules"] = modules
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile pipeline cold start")
+    parser.add_argument("--build", action="store_true", help="Also compile the workflow")
+    parser.add_argument("--top", type=int, default=20, help="Number of modules to list")
+    args = parser.parse_args()
+
+    stats = profile(build=args.build)
+    print(f"⏱️ import main: {stats['import_s'] * 1000:.0f} ms"
+          + (f" | build workflow: {stats['build_s'] * 1000:.0f} ms" if args.build else "")
+          + f" | peak RSS: {stats['max_rss_mb']:.0f} MB | {len(stats['modules'])} modules")
+
+    # main's direct imports by cumulative time, then the heaviest individual modules
+    top_level = sorted((m for m in stats["modules"] if m[3] <= 1), key=lambda m: -m[2])[: args.top]
+    print("\n📦 Slowest direct imports (cumulative)")
+    for name, _, cumulative_us, _ in top_level:
+        print(f"{cumulative_us / 1000:8.1f} ms  {name}")
+
+    print("\n🔥 Slowest modules (self)")
+    for name, self_us, _, _ in sorted(stats["modules"], key=lambda m: -m[1])[: args.top]:
+        print(f"{self_us / 1000:8.1f} ms  {name}")
@@ -0,0 +1,163 @@
+"""
+🎚️ workflow/concurrency.py
+
+Adaptive concurrency limit for the fair scheduler (AIMD with a latency gradient).
+
+The right number of emails in flight depends on OpenAI and Supabase latency,
+which shift during the day. `AdaptiveLimit` finds it from what it observes:
+
+- additive increase: while the limit is actually in use, latency is within
+  ADAPTIVE_LATENCY_TOLERANCE x its long-term baseline and the recent error rate is
+  below ADAPTIVE_MAX_ERROR_RATE, the limit grows by about one per `limit` completions,
+- multiplicative decrease: a 429 or timeout (seen by `utils.retry` on every attempt,
+  not only when retries run out) multiplies the limit by ADAPTIVE_BACKOFF; latency
+  above the tolerance shrinks it by the latency gradient (baseline / recent),
+- decreases are spaced by ADAPTIVE_COOLDOWN_SECONDS so one burst of 429s from the
+  same overload counts once.
+
+The current limit, latency averages, error rate and every decision are exposed in
+`summary()` (printed with the scheduler stats).
+
+Enable with ADAPTIVE_CONCURRENCY=1; SCHEDULER_CONCURRENCY (or --concurrency for load
+tests) becomes the starting limit, bounded by ADAPTIVE_MIN/MAX_CONCURRENCY.
+"""
+
+import os
+import time
+import threading
+from collections import defaultdict, deque
+from typing import Deque, Optional, Tuple
+from utils.retry import ErrorKind
+
+ADAPTIVE_CONCURRENCY = os.getenv("ADAPTIVE_CONCURRENCY", "0") == "1"
+ADAPTIVE_MIN_CONCURRENCY = int(os.getenv("ADAPTIVE_MIN_CONCURRENCY", "1"))
+ADAPTIVE_MAX_CONCURRENCY = int(os.getenv("ADAPTIVE_MAX_CONCURRENCY", "64"))
+ADAPTIVE_BACKOFF = float(os.getenv("ADAPTIVE_BACKOFF", "0.7"))
+ADAPTIVE_LATENCY_TOLERANCE = float(os.getenv("ADAPTIVE_LATENCY_TOLERANCE", "2.0"))
+ADAPTIVE_MAX_ERROR_RATE = float(os.getenv("ADAPTIVE_MAX_ERROR_RATE", "0.1"))
+ADAPTIVE_COOLDOWN_SECONDS = float(os.getenv("ADAPTIVE_COOLDOWN_SECONDS", "5"))
+
+# Failure kinds that mean "too much load", not "bad email"
+OVERLOAD_KINDS = (ErrorKind.RATE_LIMIT, ErrorKind.TIMEOUT)
+
+# EWMA weights: recent latency vs. long-term baseline
+_SHORT_ALPHA = 0.2
+_LONG_ALPHA = 0.01
+# Outcomes kept for the error rate, decisions kept for the summary
+_OUTCOME_WINDOW = 100
+_DECISION_HISTORY = 50
+# Latency samples before latency can shrink the limit
+_WARMUP_SAMPLES = 10
+
+
+class AdaptiveLimit:
+    """
+    Thread-safe AIMD concurrency limit. Completions are recorded from the event loop,
+    overload signals from the worker threads that make LLM / DB calls.
+    """
+
+    def __init__(self, initial: int, min_limit: int = ADAPTIVE_MIN_CONCURRENCY,
+                 max_limit: int = ADAPTIVE_MAX_CONCURRENCY, backoff: float = ADAPTIVE_BACKOFF,
+                 tolerance: float = ADAPTIVE_LATENCY_TOLERANCE, max_error_rate: float = ADAPTIVE_MAX_ERROR_RATE,
+                 cooldown: float = ADAPTIVE_COOLDOWN_SECONDS):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self._limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self._lock = threading.Lock()
+        self._short: Optional[float] = None
+        self._long: Optional[float] = None
+        self._samples = 0
+        self._outcomes: Deque[bool] = deque(maxlen=_OUTCOME_WINDOW)
+        self._decreased_at = float("-inf")
+        self.decisions: Deque[Tuple[float, str, int, int]] = deque(maxlen=_DECISION_HISTORY)
+        self.metrics = defaultdict(int)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _error_rate(self) -> float:
+        return self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+
+    def _set(self, value: float, reason: str) -> None:
+        before = self.limit
+        self._limit = min(max(value, self.min_limit), self.max_limit)
+        if self.limit != before:
+            self.metrics[reason] += 1
+            self.decisions.append((time.time(), reason, before, self.limit))
+            if self.limit < before:
+                print(f"🎚️ Concurrency {before} → {self.limit} ({reason})")
+
+    def _decrease(self, factor: float, reason: str) -> bool:
+        now = time.monotonic()
+        if now - self._decreased_at < self.cooldown:
+            self.metrics[f"{reason}_suppressed"] += 1
+            return False
+        self._decreased_at = now
+        self._set(self._limit * factor, reason)
+        return True
+
+    def overload(self, kind: ErrorKind) -> None:
+        """A call hit a rate limit or timed out: back off multiplicatively."""
+        if kind not in OVERLOAD_KINDS:
+            return
+        with self._lock:
+            self._decrease(self.backoff, f"backoff_{kind.value}")
+
+    def record(self, latency: float, kind: Optional[ErrorKind], in_flight: int) -> None:
+        """
+        Record one finished job.
+
+        Args:
+            latency (float): Job duration in seconds.
+            kind (Optional[ErrorKind]): Failure kind, None on success.
+            in_flight (int): Jobs running when this one finished (including it); the limit
+                             only grows when it is actually being used.
+        """
+        with self._lock:
+            self._outcomes.append(kind is None)
+            if kind in OVERLOAD_KINDS:
+                # Usually already seen per attempt by `overload`; the cooldown dedups it
+                self._decrease(self.backoff, f"backoff_{kind.value}")
+                return
+            if kind is not None:
+                return
+
+            self._samples += 1
+            self._short = latency if self._short is None else self._short + _SHORT_ALPHA * (latency - self._short)
+            self._long = latency if self._long is None else self._long + _LONG_ALPHA * (latency - self._long)
+
+            if self._samples >= _WARMUP_SAMPLES and self._short > self._long * self.tolerance:
+                gradient = self._long * self.tolerance / self._short
+                self._decrease(max(gradient, self.backoff), "latency")
+                return
+            if self._error_rate() > self.max_error_rate:
+                self.metrics["held_errors"] += 1
+                return
+            if in_flight >= self.limit:
+                self._set(self._limit + 1.0 / self._limit, "increase")
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: limit, bounds, latency_recent / latency_baseline (seconds), error_rate,
+                  decision counts and the most recent limit changes.
+        """
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "min": self.min_limit,
+                "max": self.max_limit,
+                "latency_recent": round(self._short or 0.0, 3),
+                "latency_baseline": round(self._long or 0.0, 3),
+                "error_rate": round(self._error_rate(), 3),
+                "decisions": dict(self.metrics),
+                "recent_changes": [
+                    {"at": at, "reason": reason, "from": before, "to": after}
+                    for at, reason, before, after in list(self.decisions)[-5:]
+                ],
+            }
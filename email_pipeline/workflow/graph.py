@@ -1,47 +1,86 @@
-from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
-from typing import Dict
-from shared.types import AgentState
-
-# Processing nodes
-from nodes.classify import classify_node
-from nodes.order import extract_order_node
-from nodes.shipping import extract_shipping_node
-from nodes.shipping_update import extract_shipping_update_node
-from nodes.refund import extract_refund_node
-from nodes.return_confirmation import extract_return_confirmation_node
-from nodes.return_update import extract_return_update_node
+import os
+import threading
+from shared.types import AgentState, EmailRecord
+from utils.retry import track_stage
+from utils.helpers import sender_domain
+from LLM.usage import attribute_node, usage_context
+from LLM.speculation import SPECULATIVE_PREFETCH, speculative_prefetcher
+from workflow.journal import journal, journaled
+from utils.profiling import profiled, profiler
+from workflow.prefilter import IGNORED_CATEGORIES, prefilter
 
 # ----------------------------------------
 # 🧠 Define LangGraph pipeline for email classification and extraction
 # ----------------------------------------
+#
+# LangGraph, the nodes and everything they import (LangChain, OpenAI, pydantic
+# schemas, ...) are loaded when the workflow is first needed, not at import, so
+# the CLI and the listener start fast. Use `get_workflow()` (or the lazily built
+# module attribute `workflow`).
 
-email_graph = StateGraph(AgentState)
+# Keep each email's checkpoints after it finished (only useful for debugging)
+KEEP_CHECKPOINTS = os.getenv("KEEP_CHECKPOINTS", "0") == "1"
 
-# Register all task nodes
-email_graph.add_node("classify", classify_node)
-email_graph.add_node("order", extract_order_node)
-email_graph.add_node("refund", extract_refund_node)
-email_graph.add_node("shipping", extract_shipping_node)
-email_graph.add_node("shipping_update", extract_shipping_update_node)
-email_graph.add_node("return_confirmation", extract_return_confirmation_node)
-email_graph.add_node("return_update", extract_return_update_node)
 
-# Set entry point
-email_graph.set_entry_point("classify")
+def _speculative_extract(node: str, record: dict):
+    """Run a prefetched extraction, attributing its LLM usage to the predicted node."""
+    from LLM.extractor import run_extraction
+
+    with usage_context(email_id=record.get("id"), node=node,
+                       retailer=sender_domain(record.get("from", "")) or "unknown",
+                       user_id=record.get("user_id")), profiler.span(record.get("id"), f"{node} (speculative)"):
+        return run_extraction(node, record)
+
+
+def classify_with_speculation(state: AgentState) -> dict:
+    """
+    Classification node that, in speculative mode, first starts the most likely
+    extractor's LLM call so it runs concurrently with classification.
+
+    If classification fails, `router` never settles the prefetch, so it is
+    discarded here before the error propagates.
+    """
+    from LLM.extractor import EXTRACTION_SPECS
+    from nodes.classify import classify_node
+
+    if not SPECULATIVE_PREFETCH:
+        return classify_node(state)
+
+    record = state["record"]
+    speculative_prefetcher.start(record, _speculative_extract, valid_routes=set(EXTRACTION_SPECS))
+    try:
+        return classify_node(state)
+    except Exception:
+        speculative_prefetcher.discard(record.get("id"))
+        raise
 
 
 def router(state: AgentState) -> str:
     """
     Route classified email to its respective processing node.
 
+    In speculative mode the decision is also reported to the prefetcher, which
+    learns the sender's route and discards a mispredicted prefetch.
+
     Args:
         state (AgentState): Current state with `category` key
 
     Returns:
         str: Node name to transition to, or END
     """
-    category = (state.get("category") or "").lower()
+    route = route_category(state.get("category") or "")
+    if SPECULATIVE_PREFETCH:
+        speculative_prefetcher.settle(state["record"], route)
+    return route
+
+
+def route_category(category: str) -> str:
+    """
+    Map a classification label to a node name (or END).
+    """
+    from langgraph.graph import END
+
+    category = category.lower()
 
     if "order confirmation" in category:
         return "order"
@@ -57,20 +96,132 @@ def router(state: AgentState) -> str:
         return "return_confirmation"
 
     # Ignored or unsupported categories
-    if category in {"promos", "goods receipt", "services receipt"}:
+    if category in IGNORED_CATEGORIES:
         return END
 
     return END
 
 
-# Define flow transitions
-email_graph.add_conditional_edges("classify", router)
-email_graph.add_edge("order", END)
-email_graph.add_edge("refund", END)
-email_graph.add_edge("shipping", END)
-email_graph.add_edge("shipping_update", END)
-email_graph.add_edge("return_confirmation", END)
-email_graph.add_edge("return_update", END)
+def build_workflow():
+    """
+    Import the nodes, assemble the graph and compile it.
+
+    Returns:
+        The compiled LangGraph workflow (with an in-memory checkpointer).
+    """
+    from langgraph.graph import StateGraph, END
+    from langgraph.checkpoint.memory import MemorySaver
+
+    # Processing nodes
+    from nodes.order import extract_order_node
+    from nodes.shipping import extract_shipping_node
+    from nodes.shipping_update import extract_shipping_update_node
+    from nodes.returns import (
+        extract_refund_node,
+        extract_return_confirmation_node,
+        extract_return_update_node,
+    )
+
+    email_graph = StateGraph(AgentState)
+
+    # Register all task nodes (failures are tagged with the node name for the dead-letter store,
+    # finished nodes are journaled for crash recovery, profiled emails are sampled per node,
+    # LLM usage is attributed to the node/email/retailer)
+    nodes = {
+        "classify": classify_with_speculation,
+        "order": extract_order_node,
+        "refund": extract_refund_node,
+        "shipping": extract_shipping_node,
+        "shipping_update": extract_shipping_update_node,
+        "return_confirmation": extract_return_confirmation_node,
+        "return_update": extract_return_update_node,
+    }
+
+    for name, node in nodes.items():
+        email_graph.add_node(name, track_stage(name)(journaled(name)(profiled(name)(attribute_node(name)(node)))))
+
+    # Set entry point
+    email_graph.set_entry_point("classify")
+
+    # Define flow transitions
+    email_graph.add_conditional_edges("classify", router)
+    for name in nodes:
+        if name != "classify":
+            email_graph.add_edge(name, END)
+
+    # Compile the LangGraph workflow
+    return email_graph.compile(checkpointer=MemorySaver())
+
+
+_workflow = None
+_workflow_lock = threading.Lock()
+
+
+def get_workflow():
+    """
+    The compiled workflow, built once on first use (thread-safe, so it can be
+    warmed up in a background thread while the listener connects).
+    """
+    global _workflow
+    if _workflow is None:
+        with _workflow_lock:
+            if _workflow is None:
+                _workflow = build_workflow()
+    return _workflow
+
+
+async def run_email(row: dict, thread_id: str) -> dict:
+    """
+    Run the workflow for one `email_extracts` row.
+
+    The row is reduced to a slim `EmailRecord` (cleaned body, no unused columns)
+    before it enters the graph, and the email's checkpoints are dropped once it
+    finished so the in-memory checkpointer does not grow with every email.
+
+    With PROCESSING_JOURNAL=1 the email is journaled on disk; an email that was in
+    flight when the process died resumes from its journaled stages instead of
+    starting over (see `workflow/journal.py`). Emails picked by the profiler's
+    sample rate are profiled end to end (see `utils/profiling.py`).
+
+    With PREFILTER=1, emails the pre-filter recognizes as ignored mail (promos,
+    receipts) return before cleaning, journaling and classification, except for
+    the sampled audits (see `workflow/prefilter.py`).
+
+    Returns:
+        dict: The final graph state (for a pre-filtered email: its likely category
+              and the pre-filter rule under `prefiltered`).
+    """
+    verdict = prefilter.check(row) if prefilter is not None else None
+    if verdict is not None and not verdict.audit:
+        print(f"🚦 Skipped email ID {row.get('id')} before classification ({verdict.reason}: {verdict.category})")
+        return {"category": verdict.category, "prefiltered": verdict.reason}
+
+    workflow = get_workflow()
+    journal.start(row)
+    try:
+        with profiler.email(row.get("id")):
+            with profiler.span(row.get("id"), "prepare"):
+                record = EmailRecord.from_row(row)
+            state = await workflow.ainvoke(
+                {"record": record},
+                {"configurable": {"thread_id": thread_id}}
+            )
+    except Exception:
+        journal.finish(row.get("id"), failed=True)
+        raise
+    else:
+        journal.finish(row.get("id"))
+        if prefilter is not None:
+            prefilter.observe(row, state.get("category"), verdict)
+        return state
+    finally:
+        delete_thread = getattr(workflow.checkpointer, "delete_thread", None)
+        if delete_thread and not KEEP_CHECKPOINTS:
+            delete_thread(thread_id)
+
 
-# Compile the LangGraph workflow
-workflow = email_graph.compile(checkpointer=MemorySaver())
+def __getattr__(name: str):
+    # Keeps `from workflow.graph import workflow` working; the graph is built on first access
+    if name == "workflow":
+        return get_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
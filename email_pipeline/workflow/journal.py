@@ -0,0 +1,400 @@
+"""
+📓 workflow/journal.py
+
+Append-only on-disk processing journal for crash recovery.
+
+Emails in flight live in asyncio tasks and the in-memory checkpointer, so a crash
+used to lose them together with every LLM call already paid for. With
+PROCESSING_JOURNAL=1 each email's stage transitions are appended to a local,
+zstd-compressed JSONL file (PROCESSING_JOURNAL_PATH):
+
+- `start`: the email row (the columns `EmailRecord` keeps),
+- `node`: a graph node finished, with the state update it returned (e.g. the category),
+- `llm`: an extraction result, as soon as the LLM returned it,
+- `write`: a non-idempotent DB write (order item insert, returns insert) went through,
+- `done` / `fail`: the email left the pipeline (failures are owned by the dead-letter store).
+
+Every record is flushed as a complete zstd block, so after a crash everything up to
+the last finished record decodes; a torn tail is ignored. On the first use after a
+restart the journal is replayed and the emails still in flight are resumed by
+`run_email`: finished nodes return their journaled output, extractions come from
+the journal instead of the LLM, and writes already made are skipped (shipping /
+return updates are idempotent and are simply re-applied). An email whose last node
+finished is rolled forward without any LLM or DB call.
+
+The file is compacted on open and whenever it grows past PROCESSING_JOURNAL_MAX_BYTES:
+only emails still in flight are rewritten into a fresh file, swapped in atomically.
+One journal file per process. With PROCESSING_JOURNAL_FSYNC=1 each record is also
+fsync'ed (survives power loss, not only process death).
+"""
+
+import os
+import time
+import functools
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+PROCESSING_JOURNAL = os.getenv("PROCESSING_JOURNAL", "0") == "1"
+PROCESSING_JOURNAL_PATH = os.getenv("PROCESSING_JOURNAL_PATH", "processing_journal.jsonl.zst")
+PROCESSING_JOURNAL_MAX_BYTES = int(os.getenv("PROCESSING_JOURNAL_MAX_BYTES", str(64 * 1024 * 1024)))
+PROCESSING_JOURNAL_FSYNC = os.getenv("PROCESSING_JOURNAL_FSYNC", "0") == "1"
+
+# Row columns journaled with `start` (what `EmailRecord.from_row` reads)
+JOURNAL_ROW_COLUMNS = ("id", "from", "subject", "msg", "user_id", "user_email")
+
+
+@dataclass
+class JournalEntry:
+    """Replayed state of one email in flight."""
+    email_id: int
+    row: dict
+    started_at: float
+    outputs: Dict[str, dict] = field(default_factory=dict)       # node -> state update
+    extractions: Dict[str, dict] = field(default_factory=dict)   # node -> extraction (JSON)
+    writes: Set[str] = field(default_factory=set)                # "node:key"
+
+    def events(self) -> Iterator[dict]:
+        """The records that rebuild this entry (used by compaction)."""
+        yield {"e": "start", "id": self.email_id, "t": self.started_at, "row": self.row}
+        for node, result in self.extractions.items():
+            yield {"e": "llm", "id": self.email_id, "node": node, "result": result}
+        for write in sorted(self.writes):
+            node, key = write.split(":", 1)
+            yield {"e": "write", "id": self.email_id, "node": node, "key": key}
+        for node, output in self.outputs.items():
+            yield {"e": "node", "id": self.email_id, "node": node, "output": output}
+
+
+def read_journal(path: str) -> Iterator[dict]:
+    """
+    Decode every complete record of a journal file (across zstd frames); a torn
+    last block or line, as left by a crash, is skipped.
+    """
+    import orjson
+    import zstandard as zstd
+
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        data = f.read()
+
+    decoded = []
+    while data:
+        decompressor = zstd.ZstdDecompressor().decompressobj()
+        try:
+            decoded.append(decompressor.decompress(data))
+        except zstd.ZstdError as e:
+            print(f"⚠️ Journal {path}: stopped at a corrupt frame ({e})")
+            break
+        if not decompressor.eof:
+            break
+        data = decompressor.unused_data
+
+    for line in b"".join(decoded).split(b"\n"):
+        if not line:
+            continue
+        try:
+            yield orjson.loads(line)
+        except orjson.JSONDecodeError:
+            continue
+
+
+class ProcessingJournal:
+    """
+    Thread-safe journal of per-email stage transitions (nodes write from worker threads).
+
+    A disabled journal accepts every call and records nothing, so callers never branch.
+    """
+
+    def __init__(self, path: str = PROCESSING_JOURNAL_PATH, enabled: bool = PROCESSING_JOURNAL,
+                 max_bytes: int = PROCESSING_JOURNAL_MAX_BYTES, fsync: bool = PROCESSING_JOURNAL_FSYNC):
+        self.path = path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        self._entries: Dict[int, JournalEntry] = {}
+        self._recovered: List[int] = []
+        self._file = None
+        self._compressor = None
+        self._written = 0
+        self.metrics = {"records": 0, "compactions": 0, "recovered": 0, "resumed": 0,
+                        "cached_nodes": 0, "cached_extractions": 0, "skipped_writes": 0}
+
+    # --------------------------------------------------
+    # 💾 File handling
+    # --------------------------------------------------
+
+    def _open(self) -> None:
+        """Replay the file (first use only), then compact it and start a new frame."""
+        if self._file is not None:
+            return
+        self._replay()
+        self._recovered = sorted(self._entries)
+        self.metrics["recovered"] = len(self._recovered)
+        if self._recovered:
+            print(f"📓 Journal: {len(self._recovered)} email(s) were in flight at the last shutdown")
+        self._compact()
+
+    def _replay(self) -> None:
+        for event in read_journal(self.path):
+            email_id, kind = event.get("id"), event.get("e")
+            if kind == "start":
+                self._entries[email_id] = JournalEntry(email_id, event["row"], event.get("t", 0.0))
+                continue
+            entry = self._entries.get(email_id)
+            if entry is None:
+                continue
+            if kind == "node":
+                entry.outputs[event["node"]] = event.get("output") or {}
+            elif kind == "llm":
+                entry.extractions[event["node"]] = event["result"]
+            elif kind == "write":
+                entry.writes.add(f"{event['node']}:{event['key']}")
+            elif kind in ("done", "fail"):
+                self._entries.pop(email_id, None)
+
+    def _compact(self) -> None:
+        """Rewrite only the emails in flight into a fresh file and swap it in."""
+        import zstandard as zstd
+
+        if self._file is not None:
+            self._file.close()
+        tmp = f"{self.path}.tmp"
+        self._file = open(tmp, "wb")
+        self._compressor = zstd.ZstdCompressor(level=3).compressobj()
+        self._written = 0
+        for entry in list(self._entries.values()):
+            for event in entry.events():
+                self._write(event, flush=False)
+        self._file.write(self._compressor.flush(zstd.COMPRESSOBJ_FLUSH_BLOCK))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        os.replace(tmp, self.path)
+        self.metrics["compactions"] += 1
+
+    def _write(self, event: dict, flush: bool = True) -> None:
+        import orjson
+        import zstandard as zstd
+
+        chunk = self._compressor.compress(orjson.dumps(event) + b"\n")
+        if flush:
+            # A complete block per record: decodable up to here even if the process dies next
+            chunk += self._compressor.flush(zstd.COMPRESSOBJ_FLUSH_BLOCK)
+        self._file.write(chunk)
+        self._written += len(chunk)
+        self.metrics["records"] += 1
+        if flush:
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def _append(self, event: dict) -> None:
+        self._append_many([event])
+
+    def _append_many(self, events: List[dict]) -> None:
+        """Append records with one flush at the end."""
+        now = time.time()
+        with self._lock:
+            self._open()
+            for index, event in enumerate(events):
+                event.setdefault("t", now)
+                self._write(event, flush=index == len(events) - 1)
+            if self._written > self.max_bytes:
+                self._compact()
+
+    def close(self) -> None:
+        """End the zstd frame and close the file (emails in flight stay journaled)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._file is not None:
+                self._file.write(self._compressor.flush())
+                self._file.close()
+                self._file = None
+
+    # --------------------------------------------------
+    # ✍️ Transitions
+    # --------------------------------------------------
+
+    def start(self, row: dict) -> Optional[JournalEntry]:
+        """
+        Journal an email entering the pipeline.
+
+        Returns:
+            Optional[JournalEntry]: The recovered entry when this email was in flight at the
+                                    last shutdown (it is resumed, not restarted), else None.
+        """
+        if not self.enabled or row.get("id") is None:
+            return None
+        email_id = row["id"]
+        with self._lock:
+            self._open()
+            entry = self._entries.get(email_id)
+            if entry is not None:
+                self.metrics["resumed"] += 1
+                print(f"📓 Resuming email ID {email_id} from the journal "
+                      f"({len(entry.outputs)} node(s), {len(entry.extractions)} extraction(s) done)")
+                return entry
+            row = {column: row.get(column) for column in JOURNAL_ROW_COLUMNS}
+            entry = self._entries[email_id] = JournalEntry(email_id, row, time.time())
+            self._append({"e": "start", "id": email_id, "t": entry.started_at, "row": row})
+        return None
+
+    def finish(self, email_id: Optional[int], failed: bool = False) -> None:
+        """Journal an email leaving the pipeline (processed, or handed to the dead-letter store)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._entries.pop(email_id, None) is not None:
+                self._append({"e": "fail" if failed else "done", "id": email_id})
+
+    def node_done(self, email_id: Optional[int], node: str, output: dict) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._entries.get(email_id)
+            if entry is not None:
+                entry.outputs[node] = output
+                self._append({"e": "node", "id": email_id, "node": node, "output": output})
+
+    def extracted(self, email_id: Optional[int], node: str, result: dict) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._entries.get(email_id)
+            if entry is not None:
+                entry.extractions[node] = result
+                self._append({"e": "llm", "id": email_id, "node": node, "result": result})
+
+    def write_once(self, email_id: Optional[int], node: str, key: str, write: Callable[[], None]) -> bool:
+        """
+        Run a non-idempotent write unless the journal shows it already went through.
+
+        Args:
+            key (str): Identifies the write within the node (e.g. "item-2", "insert").
+
+        Returns:
+            bool: False when the write was skipped.
+        """
+        if not self.enabled:
+            write()
+            return True
+        with self._lock:
+            entry = self._entries.get(email_id)
+            if entry is not None and f"{node}:{key}" in entry.writes:
+                self.metrics["skipped_writes"] += 1
+                print(f"📓 Skipping {node} write {key} for email ID {email_id} (already journaled)")
+                return False
+        write()
+        with self._lock:
+            entry = self._entries.get(email_id)
+            if entry is not None:
+                entry.writes.add(f"{node}:{key}")
+                self._append({"e": "write", "id": email_id, "node": node, "key": key})
+        return True
+
+    def write_each_once(self, email_id: Optional[int], node: str, keys: List[str],
+                        write: Callable[[List[int]], None]) -> int:
+        """
+        Batched `write_once`: one write for all keys the journal does not show as done.
+
+        Uses the same per-key records as `write_once`, so rows written one at a time
+        (streaming) and in bulk are recognized either way on resume.
+
+        Args:
+            keys (List[str]): One key per row (e.g. "item-0", "item-1").
+            write (Callable): Called with the indexes into `keys` still to write.
+
+        Returns:
+            int: Number of keys written.
+        """
+        if not self.enabled:
+            write(list(range(len(keys))))
+            return len(keys)
+        with self._lock:
+            entry = self._entries.get(email_id)
+            done = entry.writes if entry is not None else set()
+            pending = [index for index, key in enumerate(keys) if f"{node}:{key}" not in done]
+            if len(pending) < len(keys):
+                self.metrics["skipped_writes"] += len(keys) - len(pending)
+                print(f"📓 Skipping {len(keys) - len(pending)} {node} write(s) for email ID {email_id} (already journaled)")
+        if not pending:
+            return 0
+        write(pending)
+        with self._lock:
+            entry = self._entries.get(email_id)
+            if entry is not None:
+                entry.writes.update(f"{node}:{keys[index]}" for index in pending)
+                self._append_many([{"e": "write", "id": email_id, "node": node, "key": keys[index]}
+                                   for index in pending])
+        return len(pending)
+
+    # --------------------------------------------------
+    # 🔎 Lookups
+    # --------------------------------------------------
+
+    def node_output(self, email_id: Optional[int], node: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(email_id)
+            output = entry.outputs.get(node) if entry is not None else None
+            if output is not None:
+                self.metrics["cached_nodes"] += 1
+            return output
+
+    def extraction(self, email_id: Optional[int], node: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(email_id)
+            result = entry.extractions.get(node) if entry is not None else None
+            if result is not None:
+                self.metrics["cached_extractions"] += 1
+            return result
+
+    def recovered(self) -> List[dict]:
+        """
+        Rows of the emails that were in flight at the last shutdown and have not been
+        resumed yet (oldest id first).
+        """
+        if not self.enabled:
+            return []
+        with self._lock:
+            self._open()
+            return [self._entries[email_id].row for email_id in self._recovered if email_id in self._entries]
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: in_flight, recovered / resumed emails, nodes and extractions served from
+                  the journal, skipped writes, records and compactions.
+        """
+        with self._lock:
+            return {"enabled": self.enabled, "in_flight": len(self._entries), **self.metrics}
+
+
+def journaled(node: str):
+    """
+    Decorator for graph nodes: a node that already finished for this email (per the
+    journal) returns its journaled output instead of running again; otherwise its
+    output is journaled when it returns.
+    """
+    def decorate(fn: Callable[[dict], dict]) -> Callable[[dict], dict]:
+        @functools.wraps(fn)
+        def wrapper(state: dict) -> dict:
+            email_id = state["record"].get("id")
+            cached = journal.node_output(email_id, node)
+            if cached is not None:
+                return cached
+            output = fn(state)
+            journal.node_done(email_id, node, output or {})
+            return output
+        return wrapper
+    return decorate
+
+
+# Singleton used by the workflow, the nodes and main.py
+journal = ProcessingJournal()
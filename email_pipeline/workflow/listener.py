@@ -0,0 +1,341 @@
+"""
+📡 workflow/listener.py
+
+Supervised Supabase Realtime listener for `email_extracts` inserts.
+
+Realtime delivers each event at most once: anything inserted while the websocket
+is down is never replayed. The supervisor makes the listener gap-free:
+
+- a checkpoint (`REALTIME_CHECKPOINT_PATH`) holds the highest id below which every
+  email has been processed (in-flight emails hold it back, so a crash replays them),
+- the connection is watched (channel status callbacks + a heartbeat check of the
+  socket every `REALTIME_HEARTBEAT_SECONDS`); on failure it reconnects with
+  jittered exponential backoff,
+- after every (re)subscribe, a paged catch-up query processes all rows above the
+  checkpoint before live events are relied on again; live events that overlap
+  are de-duplicated by id,
+- a live id that jumps past the last one seen triggers a delayed check of the
+  skipped ids (dropped frames without a disconnect; REALTIME_GAP_CHECKS=0 turns
+  this off when row-level security makes jumps normal).
+"""
+
+import os
+import json
+import time
+import asyncio
+from collections import Counter, defaultdict
+from typing import Awaitable, Callable, List, Optional, Set
+from supabase_client import supabase
+from supabase_client.db_client import execute
+from supabase_client.queries import email_page_query
+from utils.retry import RetryPolicy
+
+REALTIME_CHECKPOINT_PATH = os.getenv("REALTIME_CHECKPOINT_PATH", "realtime_checkpoint.json")
+REALTIME_CATCHUP_PAGE = int(os.getenv("REALTIME_CATCHUP_PAGE", "500"))
+REALTIME_HEARTBEAT_SECONDS = float(os.getenv("REALTIME_HEARTBEAT_SECONDS", "5"))
+REALTIME_SUBSCRIBE_TIMEOUT = float(os.getenv("REALTIME_SUBSCRIBE_TIMEOUT", "15"))
+REALTIME_GAP_CHECKS = os.getenv("REALTIME_GAP_CHECKS", "1") == "1"
+REALTIME_GAP_GRACE_SECONDS = float(os.getenv("REALTIME_GAP_GRACE_SECONDS", "3"))
+
+# Reconnects never give up; only the policy's backoff curve is used
+RECONNECT_POLICY = RetryPolicy(max_attempts=0, base_delay=1.0, max_delay=30.0)
+
+# Checkpoint writes are throttled; the final value is always written on stop
+_CHECKPOINT_EVERY_SECONDS = 1.0
+
+
+class Watermark:
+    """
+    Highest email id below which everything has been processed, persisted to disk.
+
+    Ids above the watermark that were already dispatched are remembered so live
+    events, catch-up pages and gap checks never process the same email twice.
+    """
+
+    def __init__(self, path: str = REALTIME_CHECKPOINT_PATH):
+        self.path = path
+        self.value: Optional[int] = None
+        self._seen: Set[int] = set()
+        self._in_flight: Set[int] = set()
+        self._holds: Counter = Counter()  # lower bounds of unverified id gaps
+        self.max_seen = 0
+        self._saved_at = 0.0
+        self._load()
+
+    def _load(self) -> None:
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self.value = json.load(f).get("last_id")
+            self.max_seen = self.value or 0
+
+    def save(self) -> None:
+        if self.value is None:
+            return
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"last_id": self.value, "updated_at": time.time()}, f)
+        os.replace(f"{self.path}.tmp", self.path)
+        self._saved_at = time.monotonic()
+
+    def start_at(self, last_id: int) -> None:
+        self.value = last_id
+        self.max_seen = max(self.max_seen, last_id)
+        self.save()
+
+    def claim(self, email_id: int) -> bool:
+        """Mark an email as dispatched; False if it was already processed or dispatched."""
+        if (self.value is not None and email_id <= self.value) or email_id in self._seen:
+            return False
+        self._seen.add(email_id)
+        self._in_flight.add(email_id)
+        self.max_seen = max(self.max_seen, email_id)
+        return True
+
+    def hold(self, above: int) -> None:
+        """Keep the watermark at or below `above` until `release(above)`."""
+        self._holds[above] += 1
+
+    def release(self, above: int) -> None:
+        self._holds[above] -= 1
+        if self._holds[above] <= 0:
+            del self._holds[above]
+        self._advance()
+
+    def done(self, email_id: int) -> None:
+        self._in_flight.discard(email_id)
+        self._advance()
+
+    def _advance(self) -> None:
+        limit = self.max_seen
+        if self._in_flight:
+            limit = min(limit, min(self._in_flight) - 1)
+        if self._holds:
+            limit = min(limit, min(self._holds))
+        if self.value is None or limit <= self.value:
+            return
+        self.value = limit
+        self._seen = {email_id for email_id in self._seen if email_id > limit}
+        if time.monotonic() - self._saved_at >= _CHECKPOINT_EVERY_SECONDS:
+            self.save()
+
+
+def fetch_page(table: str, after: int, before: Optional[int] = None, limit: int = REALTIME_CATCHUP_PAGE) -> List[dict]:
+    """Rows with `after < id (< before)` in id order (only the columns the pipeline reads)."""
+    return execute(email_page_query(table, after, before, limit), label=table).data or []
+
+
+def fetch_latest_id(table: str) -> int:
+    rows = execute(supabase.table(table).select("id").order("id", desc=True).limit(1), label=table).data
+    return rows[0]["id"] if rows else 0
+
+
+def connection_alive(client) -> bool:
+    """
+    Heartbeat check of the websocket.
+
+    With auto-reconnect off, realtime keeps `is_connected` True after the socket
+    drops; its listener task ending is the reliable signal.
+    """
+    listen_task = getattr(client, "_listen_task", None)
+    return client.is_connected and listen_task is not None and not listen_task.done()
+
+
+class RealtimeSupervisor:
+    """
+    Keeps a Realtime subscription alive and feeds every new email to `handler` exactly once,
+    as `handler(record, source)` with source "live", "caught_up" or "gap_recovered".
+
+    Usage:
+        await RealtimeSupervisor(handle_email, realtime_url, key).run()
+    """
+
+    def __init__(self, handler: Callable[[dict, str], Awaitable[None]], url: str, key: str,
+                 table: str = "email_extracts", watermark: Optional[Watermark] = None):
+        self.handler = handler
+        self.url = url
+        self.key = key
+        self.table = table
+        self.watermark = watermark or Watermark()
+        self._tasks: Set[asyncio.Task] = set()
+        self._broken: Optional[asyncio.Event] = None
+        self._catching_up = False
+        self.metrics = defaultdict(int)
+        self.last_recovery_s: Optional[float] = None
+
+    # ---------- dispatch ----------
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def dispatch(self, record: dict, source: str) -> None:
+        email_id = record["id"]
+        previous_max = self.watermark.max_seen
+        if not self.watermark.claim(email_id):
+            self.metrics["duplicates"] += 1
+            return
+        self.metrics[source] += 1
+
+        if REALTIME_GAP_CHECKS and source == "live" and not self._catching_up and previous_max and email_id > previous_max + 1:
+            self.watermark.hold(previous_max)
+            self._spawn(self._check_gap(previous_max, email_id))
+        self._spawn(self._process(record, source))
+
+    async def _process(self, record: dict, source: str) -> None:
+        try:
+            await self.handler(record, source)
+        finally:
+            self.watermark.done(record["id"])
+
+    def _on_insert(self, payload, ref=None):
+        self.dispatch(payload["data"]["record"], "live")
+
+    # ---------- recovery ----------
+
+    async def catch_up(self) -> int:
+        """
+        Process every row above the watermark, page by page.
+
+        Returns:
+            int: Rows fetched (some may already have arrived live).
+        """
+        if self.watermark.value is None:
+            # First run: start from the newest email instead of replaying the whole table
+            self.watermark.start_at(await asyncio.to_thread(fetch_latest_id, self.table))
+            print(f"📍 No realtime checkpoint; starting after email ID {self.watermark.value}")
+            return 0
+
+        self._catching_up = True
+        fetched, after = 0, self.watermark.value
+        try:
+            while True:
+                rows = await asyncio.to_thread(fetch_page, self.table, after)
+                for row in rows:
+                    self.dispatch(row, "caught_up")
+                fetched += len(rows)
+                if len(rows) < REALTIME_CATCHUP_PAGE:
+                    break
+                after = rows[-1]["id"]
+        finally:
+            self._catching_up = False
+        if fetched:
+            print(f"🩹 Caught up {fetched} email(s) after ID {self.watermark.value}")
+        return fetched
+
+    async def _check_gap(self, low: int, high: int) -> None:
+        """Look for rows between two live ids once late events had time to arrive (releases the hold)."""
+        try:
+            await asyncio.sleep(REALTIME_GAP_GRACE_SECONDS)
+            rows = await asyncio.to_thread(fetch_page, self.table, low, high)
+            for row in rows:
+                self.dispatch(row, "gap_recovered")
+        except Exception as e:
+            print(f"⚠️ Gap check for IDs {low}-{high} failed: {e}")
+            if self._broken:
+                self._broken.set()
+        finally:
+            self.watermark.release(low)
+
+    # ---------- connection ----------
+
+    async def _session(self, on_ready: Optional[Callable[[], Awaitable[None]]]) -> str:
+        """
+        One connection lifetime: subscribe, catch up, then watch until it breaks.
+
+        Returns:
+            str: Why the session ended.
+        """
+        from realtime import AsyncRealtimeClient, RealtimeSubscribeStates
+
+        self._broken = asyncio.Event()
+        subscribed = asyncio.Event()
+        client = AsyncRealtimeClient(self.url, self.key, auto_reconnect=False)
+        channel = client.channel(f"realtime:public:{self.table}")
+        reason = "closed"
+
+        def on_subscribe(status: RealtimeSubscribeStates, err: Optional[Exception]):
+            if status == RealtimeSubscribeStates.SUBSCRIBED:
+                print("🟢 Realtime Subscribed")
+                subscribed.set()
+            else:
+                print(f"🔴 Realtime channel {status}" + (f": {err}" if err else ""))
+                self._broken.set()
+
+        channel.on_postgres_changes(event="INSERT", schema="public", table=self.table, callback=self._on_insert)
+
+        try:
+            await channel.subscribe(on_subscribe)
+            await client.connect()
+            await asyncio.wait_for(subscribed.wait(), timeout=REALTIME_SUBSCRIBE_TIMEOUT)
+
+            # Subscribed first, then catch up: nothing inserted in between can fall through
+            await self.catch_up()
+            if on_ready:
+                await on_ready()
+
+            while True:
+                try:
+                    await asyncio.wait_for(self._broken.wait(), timeout=REALTIME_HEARTBEAT_SECONDS)
+                    reason = "channel error"
+                    break
+                except asyncio.TimeoutError:
+                    if not connection_alive(client):
+                        reason = "socket closed"
+                        break
+        finally:
+            try:
+                await client.close()
+            except Exception:
+                pass
+        return reason
+
+    async def run(self, warmup: Optional[Awaitable] = None) -> None:
+        """
+        Listen forever, reconnecting with backoff. `warmup` is awaited once the first
+        subscription is up (e.g. the workflow compiling in a background thread).
+        """
+        attempt, dropped_at = 0, None
+
+        async def on_ready():
+            nonlocal attempt, dropped_at, warmup
+            if warmup is not None:
+                await warmup
+                warmup = None
+                print("✅ Pipeline is now listening for new emails...")
+            if dropped_at is not None:
+                self.last_recovery_s = time.monotonic() - dropped_at
+                print(f"✅ Realtime recovered in {self.last_recovery_s:.1f}s")
+                dropped_at = None
+            attempt = 0
+
+        try:
+            while True:
+                try:
+                    reason = await self._session(on_ready)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    reason = f"{type(e).__name__}: {e}"
+
+                dropped_at = dropped_at or time.monotonic()
+                attempt += 1
+                self.metrics["reconnects"] += 1
+                delay = RECONNECT_POLICY.backoff(attempt)
+                print(f"🔌 Realtime connection lost ({reason}); reconnecting in {delay:.1f}s (attempt {attempt})")
+                await asyncio.sleep(delay)
+        finally:
+            self.watermark.save()
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: live / caught_up / gap_recovered / duplicates / reconnects counts,
+                  the checkpoint id and the last recovery time (seconds).
+        """
+        return {
+            **{key: self.metrics[key] for key in ("live", "caught_up", "gap_recovered", "duplicates", "reconnects")},
+            "last_id": self.watermark.value,
+            "in_flight": len(self._tasks),
+            "last_recovery_s": self.last_recovery_s,
+        }
@@ -0,0 +1,281 @@
+"""
+🚦 workflow/prefilter.py
+
+Early exit for mail the pipeline ignores (promos, goods receipts, services receipts).
+
+`router` only sends these to END after `clean_email_html` and an LLM classification.
+With PREFILTER=1, `run_email` first asks the pre-filter, which looks at cheap signals
+of the raw row, in order:
+
+1. Sender lists: PREFILTER_DENY (plus rideshare / food delivery senders, always
+   services receipts) drops, PREFILTER_ALLOW (plus carriers) keeps. Entries are
+   addresses or domains.
+2. Learned sender table: per sender address, the categories the LLM gave its mail.
+   A sender with at least PREFILTER_MIN_SAMPLES classified emails, at least
+   PREFILTER_MIN_SHARE of them ignored, is dropped; every drop counts as a hit on
+   its entry. Keyed by address, not domain: retailers send promos and orders from
+   different addresses.
+3. Marketing heuristics: a promotional subject plus bulk-mail markers in the raw body
+   or headers (List-Unsubscribe / Precedence when the row carries headers, "view in
+   browser", unsubscribe and preference links, campaign parameters), unless the
+   subject or body looks transactional.
+
+Dropped emails are not cleaned, journaled or classified. One in PREFILTER_AUDIT_EVERY
+would-be drops still runs the full pipeline as an audit: if the LLM puts it in a
+category we process, it is a false negative of that rule. Only LLM-classified emails
+(kept and audited) feed the sender table, so it never learns from its own drops.
+The table persists to PREFILTER_STORE_PATH.
+"""
+
+import os
+import re
+import json
+import atexit
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Optional
+from utils.helpers import sender_address, sender_domain
+
+PREFILTER = os.getenv("PREFILTER", "0") == "1"
+PREFILTER_STORE_PATH = os.getenv("PREFILTER_STORE_PATH", "sender_categories.json")
+PREFILTER_MIN_SAMPLES = int(os.getenv("PREFILTER_MIN_SAMPLES", "5"))
+PREFILTER_MIN_SHARE = float(os.getenv("PREFILTER_MIN_SHARE", "0.95"))
+PREFILTER_AUDIT_EVERY = int(os.getenv("PREFILTER_AUDIT_EVERY", "20"))
+PREFILTER_MIN_MARKERS = int(os.getenv("PREFILTER_MIN_MARKERS", "2"))
+
+# Categories `route_category` sends straight to END
+IGNORED_CATEGORIES = frozenset({"promos", "goods receipt", "services receipt"})
+
+# Rideshare and food delivery mail is always a services receipt (see CLASSIFICATION_INSTRUCTIONS)
+SEED_DENY = frozenset({
+    "uber.com", "lyft.com", "doordash.com", "grubhub.com", "postmates.com", "seamless.com", "instacart.com",
+})
+# Carrier mail is always a shipping update
+SEED_ALLOW = frozenset({"ups.com", "fedex.com", "usps.com", "dhl.com", "ontrac.com", "lasership.com"})
+
+
+def _address_list(value: str) -> frozenset:
+    return frozenset(entry.strip().lower() for entry in value.split(",") if entry.strip())
+
+
+PROMO_SUBJECT = re.compile(
+    r"\d+\s?% off|\b(?:sale|deals?|save|savings|coupon|promo(?:tion)?|offers?|free shipping|last chance|"
+    r"ends (?:today|tonight|soon|sunday)|limited time|exclusive|new arrivals|just dropped|newsletter|"
+    r"don'?t miss|flash|clearance|gift guide|black friday|cyber monday|bogo)\b",
+    re.IGNORECASE,
+)
+TRANSACTIONAL_SUBJECT = re.compile(
+    r"\b(?:order|shipped|shipping|shipment|delivered|delivery|tracking|refund|return|receipt|invoice|"
+    r"confirm\w*|cancel\w*|payment|package)\b",
+    re.IGNORECASE,
+)
+TRANSACTIONAL_BODY = re.compile(r"\b(?:order|tracking|confirmation|invoice|return|rma)\s*(?:#|number|no\.|id\b)")
+BULK_HEADERS = ("list-unsubscribe", "precedence: bulk", "precedence: list")
+MARKETING_MARKERS = (
+    "view in browser", "view this email in your browser", "view as a web page", "unsubscribe",
+    "email preferences", "manage preferences", "utm_campaign", "utm_medium=email", "shop now", "% off",
+)
+
+
+@dataclass(frozen=True)
+class Verdict:
+    """A would-be drop: the rule that fired, the category it implies, and whether it runs anyway as an audit."""
+    reason: str
+    category: str
+    audit: bool = False
+
+
+@dataclass
+class SenderEntry:
+    categories: Counter = field(default_factory=Counter)
+    hits: int = 0
+
+
+class SenderTable:
+    """
+    Learned categories per sender address, with hit counts of the drops they caused.
+    """
+
+    def __init__(self, path: str = PREFILTER_STORE_PATH, min_samples: int = PREFILTER_MIN_SAMPLES,
+                 min_share: float = PREFILTER_MIN_SHARE):
+        self.path = path
+        self.min_samples = min_samples
+        self.min_share = min_share
+        self._lock = threading.Lock()
+        self._entries: dict[str, SenderEntry] = defaultdict(SenderEntry)
+        self._dirty = 0
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            raw = json.load(f)
+        for address, entry in raw.items():
+            self._entries[address] = SenderEntry(Counter(entry["categories"]), entry["hits"])
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            data = {address: {"categories": dict(entry.categories), "hits": entry.hits}
+                    for address, entry in self._entries.items()}
+            self._dirty = 0
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def observe(self, address: str, category: str) -> None:
+        if not address or not category:
+            return
+        with self._lock:
+            self._entries[address].categories[category.lower()] += 1
+            self._dirty += 1
+        if self._dirty >= 20:
+            self.save()
+
+    def ignored(self, address: str) -> Optional[str]:
+        """
+        The sender's usual ignored category if enough of its mail was ignored, else None.
+        Counts a hit on the entry when it returns a category.
+        """
+        with self._lock:
+            entry = self._entries.get(address)
+            if not entry:
+                return None
+            total = sum(entry.categories.values())
+            ignored = sum(count for category, count in entry.categories.items() if category in IGNORED_CATEGORIES)
+            if total < self.min_samples or ignored / total < self.min_share:
+                return None
+            entry.hits += 1
+            return max(IGNORED_CATEGORIES, key=lambda category: entry.categories.get(category, 0))
+
+    def summary(self) -> dict:
+        with self._lock:
+            trusted = sum(
+                1 for entry in self._entries.values()
+                if sum(entry.categories.values()) >= self.min_samples
+                and sum(entry.categories[c] for c in IGNORED_CATEGORIES) / sum(entry.categories.values()) >= self.min_share
+            )
+            return {"senders": len(self._entries), "trusted": trusted,
+                    "hits": sum(entry.hits for entry in self._entries.values())}
+
+
+class PreFilter:
+    """
+    Decides on the raw row whether an email can skip cleaning and classification.
+    """
+
+    def __init__(self, table: SenderTable, allow: frozenset = frozenset(), deny: frozenset = frozenset(),
+                 audit_every: int = PREFILTER_AUDIT_EVERY, min_markers: int = PREFILTER_MIN_MARKERS):
+        self.table = table
+        self.allow = SEED_ALLOW | allow
+        self.deny = SEED_DENY | deny
+        self.audit_every = audit_every
+        self.min_markers = min_markers
+        self._lock = threading.Lock()
+        self.metrics = Counter()
+
+    @staticmethod
+    def _listed(entries: frozenset, address: str, domain: str) -> bool:
+        return address in entries or domain in entries
+
+    def _marketing(self, row: dict) -> bool:
+        subject = row.get("subject") or ""
+        if not PROMO_SUBJECT.search(subject) or TRANSACTIONAL_SUBJECT.search(subject):
+            return False
+        body = (row.get("msg") or "").lower()
+        if TRANSACTIONAL_BODY.search(body):
+            return False
+        headers = row.get("headers") or ""
+        if isinstance(headers, dict):
+            headers = "\n".join(f"{name}: {value}" for name, value in headers.items())
+        headers = headers.lower()
+        markers = sum(marker in headers for marker in BULK_HEADERS) + sum(marker in body for marker in MARKETING_MARKERS)
+        return markers >= self.min_markers
+
+    def check(self, row: dict) -> Optional[Verdict]:
+        """
+        Args:
+            row (dict): The raw `email_extracts` row (HTML body, before cleaning).
+
+        Returns:
+            Optional[Verdict]: None if the email must run the pipeline, otherwise the
+                               drop verdict (with `audit=True` if it runs anyway).
+        """
+        address = sender_address(row.get("from", ""))
+        domain = sender_domain(row.get("from", ""))
+
+        if self._listed(self.deny, address, domain):
+            verdict = Verdict("deny_list", self.table.ignored(address) or "services receipt")
+        elif self._listed(self.allow, address, domain):
+            self._count("allowed")
+            return None
+        elif category := self.table.ignored(address):
+            verdict = Verdict("learned", category)
+        elif self._marketing(row):
+            verdict = Verdict("marketing", "promos")
+        else:
+            self._count("kept")
+            return None
+
+        with self._lock:
+            self.metrics[f"matched:{verdict.reason}"] += 1
+            audit = self.audit_every > 0 and self.metrics[f"matched:{verdict.reason}"] % self.audit_every == 0
+            self.metrics[f"{'audited' if audit else 'dropped'}:{verdict.reason}"] += 1
+        return Verdict(verdict.reason, verdict.category, audit=True) if audit else verdict
+
+    def observe(self, row: dict, category: Optional[str], verdict: Optional[Verdict] = None) -> None:
+        """
+        Learn the LLM's category for the sender; for an audited email, check the verdict against it.
+        """
+        from langgraph.graph import END
+        from workflow.graph import route_category
+
+        self.table.observe(sender_address(row.get("from", "")), category or "")
+        if verdict is None or not verdict.audit:
+            return
+        if route_category(category or "") != END:
+            self._count(f"false_negative:{verdict.reason}")
+            print(f"🚦 Pre-filter audit: email ID {row.get('id')} ({verdict.reason}) was classified as {category}")
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.metrics[key] += 1
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: emails checked / dropped, and per rule the emails it matched, dropped and
+                  audited, with its false negatives and false-negative rate among audits.
+        """
+        with self._lock:
+            metrics = dict(self.metrics)
+        reasons = {}
+        for reason in ("deny_list", "learned", "marketing"):
+            audited = metrics.get(f"audited:{reason}", 0)
+            false_negatives = metrics.get(f"false_negative:{reason}", 0)
+            reasons[reason] = {
+                "matched": metrics.get(f"matched:{reason}", 0),
+                "dropped": metrics.get(f"dropped:{reason}", 0),
+                "audited": audited,
+                "false_negatives": false_negatives,
+                "fn_rate": false_negatives / audited if audited else 0.0,
+            }
+        dropped = sum(entry["dropped"] for entry in reasons.values())
+        checked = dropped + sum(entry["audited"] for entry in reasons.values()) \
+            + metrics.get("kept", 0) + metrics.get("allowed", 0)
+        return {"checked": checked, "dropped": dropped, "drop_rate": dropped / checked if checked else 0.0,
+                "reasons": reasons, **self.table.summary()}
+
+
+prefilter = PreFilter(
+    SenderTable(),
+    allow=_address_list(os.getenv("PREFILTER_ALLOW", "")),
+    deny=_address_list(os.getenv("PREFILTER_DENY", "")),
+) if PREFILTER else None
+
+if prefilter is not None:
+    atexit.register(prefilter.table.save)
@@ -0,0 +1,311 @@
+"""
+⚖️ workflow/scheduler.py
+
+Multi-tenant fair scheduler in front of `workflow.ainvoke`.
+
+- Two priority lanes: `realtime` (new mail from the listener) is always served
+  before `backfill` (listener catch-up pages, dead-letter redrives, journal
+  resumes, bulk processing), which runs on leftover capacity of the same
+  `scheduler`.
+- Within a lane, tenants (user_id) share workers by weighted fair queuing: every
+  job gets a virtual finish tag `max(lane clock, tenant's last tag) + 1 / weight`
+  and the smallest eligible tag runs next, so a 20k-email backfill from one user
+  cannot push other users' emails to the back.
+- Per-tenant quotas: max concurrent emails and an LLM budget (USD per rolling
+  window, fed by `LLM.usage`). A tenant at its limit is skipped, not blocking others.
+
+- Total concurrency is SCHEDULER_CONCURRENCY, or with ADAPTIVE_CONCURRENCY=1 an
+  `AdaptiveLimit` that follows observed latency, errors and 429s/timeouts (see
+  `workflow/concurrency.py`).
+
+Quotas come from env: TENANT_MAX_CONCURRENCY, TENANT_LLM_BUDGET_USD (0 = unlimited),
+TENANT_BUDGET_WINDOW (seconds), and per-tenant overrides in TENANT_QUOTAS, e.g.
+'{"<user_id>": {"weight": 2, "max_concurrency": 8, "llm_budget_usd": 5.0}}'.
+"""
+
+import os
+import json
+import time
+import asyncio
+import itertools
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+from LLM.usage import UsageRecord, usage_store
+from utils.retry import add_failure_listener, classify_error, remove_failure_listener
+from workflow.concurrency import ADAPTIVE_CONCURRENCY, AdaptiveLimit
+
+T = TypeVar("T")
+
+REALTIME = "realtime"
+BACKFILL = "backfill"
+LANES = (REALTIME, BACKFILL)
+
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "8"))
+TENANT_MAX_CONCURRENCY = int(os.getenv("TENANT_MAX_CONCURRENCY", "4"))
+TENANT_LLM_BUDGET_USD = float(os.getenv("TENANT_LLM_BUDGET_USD", "0"))
+TENANT_BUDGET_WINDOW = float(os.getenv("TENANT_BUDGET_WINDOW", "3600"))
+TENANT_QUOTAS = os.getenv("TENANT_QUOTAS", "")
+
+# How often blocked workers re-check budgets that may have rolled out of the window
+_BUDGET_RECHECK_SECONDS = 1.0
+# Queue-wait samples kept per lane for the latency percentiles
+_WAIT_SAMPLES = 10000
+
+
+@dataclass(frozen=True)
+class TenantQuota:
+    """
+    Attributes:
+        weight (float): Share of capacity relative to other tenants in the same lane.
+        max_concurrency (int): Max emails of this tenant in flight at once.
+        llm_budget_usd (float): Max LLM spend per budget window (0 = unlimited).
+    """
+    weight: float = 1.0
+    max_concurrency: int = TENANT_MAX_CONCURRENCY
+    llm_budget_usd: float = TENANT_LLM_BUDGET_USD
+
+
+def load_quotas(raw: str = TENANT_QUOTAS) -> Dict[str, TenantQuota]:
+    """
+    Parse per-tenant overrides from a JSON string (or a path to a JSON file).
+    """
+    if not raw:
+        return {}
+    if os.path.exists(raw):
+        with open(raw, encoding="utf-8") as f:
+            raw = f.read()
+    return {str(user_id): TenantQuota(**quota) for user_id, quota in json.loads(raw).items()}
+
+
+@dataclass(order=True)
+class _Job:
+    tag: float
+    seq: int
+    user_id: str = field(compare=False)
+    lane: str = field(compare=False)
+    factory: Callable[[], Awaitable] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False, default_factory=time.perf_counter)
+
+
+class _Tenant:
+    def __init__(self, quota: TenantQuota):
+        self.quota = quota
+        self.queues: Dict[str, Deque[_Job]] = {lane: deque() for lane in LANES}
+        self.last_tag: Dict[str, float] = {lane: 0.0 for lane in LANES}
+        self.running = 0
+        self.spend: Deque = deque()  # (timestamp, cost_usd)
+        self.spend_total = 0.0
+
+
+class FairScheduler:
+    """
+    Runs coroutines for many tenants on a fixed or adaptive number of workers.
+
+    Usage:
+        result = await scheduler.run(user_id, REALTIME, lambda: workflow.ainvoke(...))
+    """
+
+    def __init__(self, concurrency: int = SCHEDULER_CONCURRENCY, quotas: Optional[Dict[str, TenantQuota]] = None,
+                 default_quota: Optional[TenantQuota] = None, budget_window: float = TENANT_BUDGET_WINDOW,
+                 adaptive: Optional[AdaptiveLimit] = None):
+        self.concurrency = concurrency
+        # `concurrency` is the starting point of the adaptive limit when enabled
+        self.adaptive = adaptive or (AdaptiveLimit(initial=concurrency) if ADAPTIVE_CONCURRENCY else None)
+        self._running = 0
+        self.quotas = quotas if quotas is not None else load_quotas()
+        self.default_quota = default_quota or TenantQuota()
+        self.budget_window = budget_window
+        self._tenants: Dict[str, _Tenant] = {}
+        self._clock = {lane: 0.0 for lane in LANES}
+        self._seq = itertools.count()
+        self._cond: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        self._closing = False
+        self._spend_lock = threading.Lock()
+        self._waits: Dict[str, Deque[float]] = {lane: deque(maxlen=_WAIT_SAMPLES) for lane in LANES}
+        self.metrics = defaultdict(int)
+
+    @property
+    def limit(self) -> int:
+        """Jobs allowed in flight right now."""
+        return self.adaptive.limit if self.adaptive else self.concurrency
+
+    # ---------- tenants & quotas ----------
+
+    def _tenant(self, user_id: str) -> _Tenant:
+        tenant = self._tenants.get(user_id)
+        if tenant is None:
+            tenant = self._tenants[user_id] = _Tenant(self.quotas.get(user_id, self.default_quota))
+        return tenant
+
+    def _on_usage(self, record: UsageRecord) -> None:
+        # Called from worker threads (LLM calls run in LangGraph's executor)
+        if record.user_id is None:
+            return
+        with self._spend_lock:
+            tenant = self._tenants.get(str(record.user_id))
+            if tenant is not None:
+                tenant.spend.append((time.time(), record.cost_usd))
+                tenant.spend_total += record.cost_usd
+
+    def _over_budget(self, tenant: _Tenant) -> bool:
+        budget = tenant.quota.llm_budget_usd
+        if not budget:
+            return False
+        cutoff = time.time() - self.budget_window
+        with self._spend_lock:
+            while tenant.spend and tenant.spend[0][0] < cutoff:
+                tenant.spend_total -= tenant.spend.popleft()[1]
+            return tenant.spend_total >= budget
+
+    def _eligible(self, tenant: _Tenant) -> bool:
+        return tenant.running < tenant.quota.max_concurrency and not self._over_budget(tenant)
+
+    # ---------- queueing ----------
+
+    def _pick(self) -> Optional[_Job]:
+        """Smallest virtual finish tag among eligible tenants, realtime lane first."""
+        if self._running >= self.limit:
+            return None
+        for lane in LANES:
+            best = None
+            for tenant in self._tenants.values():
+                queue = tenant.queues[lane]
+                if queue and (best is None or queue[0] < best.queues[lane][0]) and self._eligible(tenant):
+                    best = tenant
+            if best is not None:
+                job = best.queues[lane].popleft()
+                self._clock[lane] = max(self._clock[lane], job.tag)
+                return job
+        return None
+
+    def _ensure_started(self) -> None:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        if not self._workers:
+            # Adaptive: one worker per possible slot; `_pick` enforces the current limit
+            workers = self.adaptive.max_limit if self.adaptive else self.concurrency
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(workers)]
+            # Process-wide listeners only while running, so closed schedulers leave no trace
+            usage_store.add_listener(self._on_usage)
+            if self.adaptive:
+                add_failure_listener(self.adaptive.overload)
+
+    async def run(self, user_id, lane: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        Queue `factory()` for `user_id` in `lane` and wait for its result.
+
+        Args:
+            user_id: Tenant key (the email's user_id; None is treated as one shared tenant).
+            lane (str): REALTIME or BACKFILL.
+            factory (Callable): Creates the coroutine to run (called when the job is dispatched).
+
+        Returns:
+            Whatever the coroutine returns; its exception is re-raised.
+        """
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane: {lane}")
+        self._ensure_started()
+
+        user_id = str(user_id)
+        tenant = self._tenant(user_id)
+        tag = max(self._clock[lane], tenant.last_tag[lane]) + 1.0 / tenant.quota.weight
+        tenant.last_tag[lane] = tag
+        job = _Job(tag, next(self._seq), user_id, lane, factory, asyncio.get_running_loop().create_future())
+
+        async with self._cond:
+            tenant.queues[lane].append(job)
+            self.metrics[f"{lane}_queued"] += 1
+            self._cond.notify()
+        return await job.future
+
+    async def _worker(self) -> None:
+        while True:
+            async with self._cond:
+                job = self._pick()
+                while job is None:
+                    if self._closing:
+                        return
+                    try:
+                        # Budgets free up with time, not only when a job finishes
+                        await asyncio.wait_for(self._cond.wait(), timeout=_BUDGET_RECHECK_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    job = self._pick()
+                tenant = self._tenants[job.user_id]
+                tenant.running += 1
+                self._running += 1
+
+            started = time.perf_counter()
+            self._waits[job.lane].append(started - job.enqueued_at)
+            failure = None
+            try:
+                result = await job.factory()
+                if not job.future.done():
+                    job.future.set_result(result)
+            except Exception as e:
+                failure = classify_error(e)
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                async with self._cond:
+                    if self.adaptive:
+                        self.adaptive.record(time.perf_counter() - started, failure, self._running)
+                    tenant.running -= 1
+                    self._running -= 1
+                    self.metrics[f"{job.lane}_done"] += 1
+                    self._cond.notify_all()
+
+    async def close(self) -> None:
+        """
+        Stop the workers once they are idle (running jobs finish first).
+
+        Workers are woken instead of cancelled: cancelling a task parked in
+        `wait_for(Condition.wait())` can leave it stuck re-acquiring the lock.
+        The usage and failure listeners are unregistered.
+        """
+        if not self._workers:
+            return
+        usage_store.remove_listener(self._on_usage)
+        if self.adaptive:
+            remove_failure_listener(self.adaptive.overload)
+        async with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._closing = False
+
+    # ---------- metrics ----------
+
+    def summary(self) -> dict:
+        """
+        Returns:
+            dict: Per lane queued/done counts and queue-wait p50/p99 (seconds), the
+                  concurrency limit (adaptive state when enabled), plus per-tenant backlog
+                  and in-flight counts.
+        """
+        stats = {"concurrency": self.adaptive.summary() if self.adaptive else {"limit": self.concurrency}}
+        stats["concurrency"]["running"] = self._running
+        for lane in LANES:
+            waits = sorted(self._waits[lane])
+            stats[lane] = {
+                "queued": self.metrics[f"{lane}_queued"],
+                "done": self.metrics[f"{lane}_done"],
+                "wait_p50": round(waits[len(waits) // 2], 3) if waits else 0.0,
+                "wait_p99": round(waits[min(len(waits) - 1, int(len(waits) * 0.99))], 3) if waits else 0.0,
+            }
+        stats["tenants"] = {
+            user_id: {
+                "backlog": sum(len(q) for q in tenant.queues.values()),
+                "running": tenant.running,
+            }
+            for user_id, tenant in self._tenants.items()
+        }
+        return stats
+
+
+scheduler = FairScheduler()